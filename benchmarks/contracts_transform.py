@@ -0,0 +1,148 @@
+"""
+Benchmark and equivalence check of the Arrow contracts engine
+(ContractsSource.transform_arrow) against the pandas transform.
+
+Builds a year of synthetic bronze contracts (or loads one year from the
+contracts parquet file), runs both engines on the same documents and fails
+unless they produce the same silver documents. Contract types and CPVs are
+compared as sorted lists, because the pandas path emits them in set order.
+
+Usage:
+    uv run python benchmarks/contracts_transform.py [--rows 180000]
+    uv run python benchmarks/contracts_transform.py --parquet data/contracts_2009_2024.parquet --year 2023
+"""
+import argparse
+import copy
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sources.contracts_source import ContractsSource, allowed_contract_types  # noqa: E402
+from sources.lookups.districts_municipalities import MUNICIPALITY_LOOKUP  # noqa: E402
+from sources.lookups.procurement_type_method_map import PROCUREMENT_TYPE_METHOD_MAP  # noqa: E402
+
+SET_COLUMNS = ("contract_type", "cpvs")
+
+
+def synthetic_contracts(rows, year=2023, seed=11):
+    rng = random.Random(seed)
+    municipalities = list(MUNICIPALITY_LOOKUP)
+    types = sorted(allowed_contract_types) + ["Outros", "Aquisição de bens"]
+    procedures = list(PROCUREMENT_TYPE_METHOD_MAP) + ["Procedimento desconhecido", None]
+
+    def date():
+        r = rng.random()
+        if r < 0.03:
+            return None
+        if r < 0.04:
+            return "sem data"
+        return f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+
+    def entity():
+        return {"nif": str(rng.randint(500000000, 599999999)), "description": rng.choice(["Empresa, Lda", "-", None])}
+
+    def price():
+        r = rng.random()
+        if r < 0.05:
+            return None
+        if r < 0.07:
+            return 0.0
+        if r < 0.08:
+            return -1.0
+        return round(rng.uniform(100, 500000), 2)
+
+    docs = []
+    for i in range(rows):
+        n_types = rng.randint(1, 2)
+        n_cpvs = rng.choice([0, 1, 1, 2, 3, 25])
+        cpvs = "|".join(f"{rng.randint(3000000, 98000000)}-{rng.randint(0, 9)}" for _ in range(n_cpvs))
+        docs.append({
+            "_id": f"{year}{i:08d}",
+            "_rev": "1-abc",
+            "id": i,
+            "contract_id": f"{year}{i:08d}",
+            "description": f"Contrato {i}",
+            "publication_date": date(),
+            "signing_date": date(),
+            "close_date": date(),
+            "contract_type": "<br/>".join(rng.choice(types) for _ in range(n_types)) if rng.random() > 0.02 else None,
+            "cpvs": cpvs if rng.random() > 0.02 else None,
+            "contracted": [entity()] if rng.random() > 0.02 else None,
+            "contracting_agency": [entity()],
+            "contestants": [entity() for _ in range(rng.randint(0, 4))] if rng.random() > 0.3 else None,
+            "execution_deadline": rng.choice([30, 60, 365, 20000, None]),
+            "initial_price": price(),
+            "final_price": price(),
+            "execution_location": [
+                {"country": "Portugal", "district": None, "municipality": rng.choice(municipalities)}
+            ],
+            "procedure_type": rng.choice(procedures),
+        })
+    return docs
+
+
+def load_parquet_year(path, year):
+    import pyarrow.dataset as ds
+
+    from elt_core.db_connector import DBConnector
+
+    table = ds.dataset(path).to_table()
+    docs = DBConnector.__new__(DBConnector)._sanitize_for_json(table.to_pylist())
+    # Bronze documents carry their dates as ISO strings after the round trip through CouchDB
+    return [d for d in docs if str(d.get("publication_date") or "").startswith(str(year))]
+
+
+def normalise(docs):
+    for doc in docs:
+        for col in SET_COLUMNS:
+            if isinstance(doc.get(col), list):
+                doc[col] = sorted(doc[col])
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=180000, help="Synthetic contracts (about one year)")
+    parser.add_argument("--parquet", help="Contracts parquet file to take one year from")
+    parser.add_argument("--year", type=int, default=2023)
+    args = parser.parse_args()
+
+    docs = load_parquet_year(args.parquet, args.year) if args.parquet else synthetic_contracts(args.rows, args.year)
+    print(f"{len(docs)} contracts")
+
+    logging.getLogger("contracts").setLevel(logging.WARNING)
+    source = ContractsSource(db_connector=None)
+
+    start = time.perf_counter()
+    expected = source.transform(copy.deepcopy(docs))
+    pandas_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = source.transform_arrow(docs)
+    arrow_s = time.perf_counter() - start
+
+    print(f"pandas engine: {pandas_s:.2f}s")
+    print(f"arrow engine:  {arrow_s:.2f}s ({pandas_s / arrow_s:.1f}x)")
+
+    expected, actual = normalise(expected), normalise(actual)
+    if len(expected) != len(actual):
+        print(f"FAIL: {len(expected)} vs {len(actual)} documents")
+        sys.exit(1)
+    # repr() also compares key order and int vs float
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if repr(a) != repr(b)]
+    if mismatches:
+        for i in mismatches[:3]:
+            a, b = expected[i], actual[i]
+            diff = {k: (a.get(k), b.get(k)) for k in dict.fromkeys([*a, *b]) if repr(a.get(k)) != repr(b.get(k))}
+            print(f"doc {i}: {diff or 'key order differs'}")
+        print(f"FAIL: {len(mismatches)} documents differ")
+        sys.exit(1)
+    print(f"OK: {len(actual)} identical silver documents")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Memory held by the low-cardinality fields of the silver contracts
+(elt_core/dictionary_encoding.py).
+
+Bronze documents are round-tripped through JSON first, as when they are read
+from CouchDB, so every value starts as its own str object. For both engines
+the script counts the str objects behind procedure_type, contract_type,
+procurement_method and the location levels of the silver documents and
+compares their size with one object per value (no encoding). It also
+compares the Arrow procedure_type column plain vs. dictionary-encoded and the
+gold/graph interning of documents read back from JSON.
+
+Usage:
+    uv run python benchmarks/dictionary_encoding.py [--rows 180000]
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+import ujson
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.contracts_transform import synthetic_contracts  # noqa: E402
+from elt_core import arrow_transformations as at  # noqa: E402
+from elt_core.dictionary_encoding import (  # noqa: E402
+    LOCATION_COLUMNS,
+    LOCATION_FIELDS,
+    LOW_CARDINALITY_FIELDS,
+    intern_records,
+)
+from elt_core.transformations import to_dataframe, to_dict  # noqa: E402
+from sources.contracts_source import ContractsSource  # noqa: E402
+
+
+def low_cardinality_strings(docs):
+    """Every str value of the low-cardinality fields."""
+    for doc in docs:
+        for field in LOW_CARDINALITY_FIELDS:
+            value = doc.get(field)
+            for v in value if isinstance(value, list) else [value]:
+                if isinstance(v, str):
+                    yield v
+        for column in LOCATION_COLUMNS:
+            for item in doc.get(column) or []:
+                if isinstance(item, dict):
+                    for field in LOCATION_FIELDS:
+                        if isinstance(item.get(field), str):
+                            yield item[field]
+
+
+def report(label, docs):
+    values = list(low_cardinality_strings(docs))
+    distinct = {id(v): v for v in values}
+    naive = sum(sys.getsizeof(v) for v in values)
+    actual = sum(sys.getsizeof(v) for v in distinct.values())
+    print(
+        f"{label:<22} {len(values):>9} values, {len(distinct):>9} str objects: "
+        f"{actual / 1e6:7.2f} MB (one object per value: {naive / 1e6:7.2f} MB)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=180000, help="Synthetic contracts (about one year)")
+    args = parser.parse_args()
+
+    logging.getLogger("contracts").setLevel(logging.WARNING)
+    payload = ujson.dumps(synthetic_contracts(args.rows))
+    source = ContractsSource(db_connector=None)
+
+    silver = to_dict(source.transformation_plan().execute(to_dataframe(ujson.loads(payload))))
+    report("pandas silver", silver)
+
+    frame = at.ColumnFrame.from_records(ujson.loads(payload))
+    plain = frame.columns["procedure_type"].nbytes
+    frame.dictionary_encode(["procedure_type"])
+    encoded = frame.columns["procedure_type"]
+    print(
+        f"arrow procedure_type   {plain / 1e6:7.2f} MB plain, "
+        f"{(encoded.indices.nbytes + encoded.dictionary.nbytes) / 1e6:7.2f} MB dictionary-encoded"
+    )
+    report("arrow silver", source.transform_arrow(ujson.loads(payload)))
+
+    # Gold and graph stages read the silver documents back from CouchDB
+    fetched = ujson.loads(ujson.dumps(silver))
+    report("fetched (gold input)", fetched)
+    intern_records(fetched)
+    report("fetched, interned", fetched)
+
+
+if __name__ == "__main__":
+    main()
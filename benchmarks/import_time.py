@@ -0,0 +1,98 @@
+"""
+Import-time benchmark for the pipeline entry point.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, sums the
+cumulative time of the top-level imports and fails if it exceeds the budget or
+if any heavy stage dependency was loaded eagerly. Also times a full
+`main.py --help` start-up as a proxy for short operational commands.
+
+Usage:
+    uv run python benchmarks/import_time.py [--budget-ms 400] [--startup-budget-ms 1000]
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must only be imported by the stage that needs them
+HEAVY_MODULES = ("pandas", "pyarrow", "neo4j", "bs4", "linkml_runtime", "rdflib", "model", "numpy")
+
+
+def parse_importtime(stderr: str):
+    """
+    Parse `-X importtime` output into (module, self_us, cumulative_us, depth) tuples.
+    Depth 0 are the imports triggered directly by the measured statement.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        module = name.rstrip()
+        # Names are indented by two spaces per nesting level after one separator space
+        depth = (len(module) - len(module.lstrip(" ")) - 1) // 2
+        entries.append((module.strip(), int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure_import(statement: str):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr}")
+    return parse_importtime(result.stderr)
+
+
+def measure_startup(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", *args], cwd=REPO_ROOT, capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=400.0, help="Budget for `import main`")
+    parser.add_argument("--startup-budget-ms", type=float, default=1000.0, help="Budget for `main.py --help`")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to show")
+    args = parser.parse_args()
+
+    entries = measure_import("import main")
+    total_ms = next(e[2] for e in entries if e[0] == "main" and e[3] == 0) / 1000
+    # Children are printed before their parent, so the direct imports of main
+    # are the depth-1 entries that follow the interpreter's own start-up imports
+    main_index = next(i for i, e in enumerate(entries) if e[0] == "main" and e[3] == 0)
+    start_index = max((i for i, e in enumerate(entries[:main_index]) if e[3] == 0), default=-1) + 1
+    direct = [e for e in entries[start_index:main_index] if e[3] == 1]
+    loaded = {e[0] for e in entries}
+    eager_heavy = sorted(m for m in HEAVY_MODULES if m in loaded)
+
+    print(f"import main: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("Slowest imports made by main:")
+    for module, _, cumulative_us, _ in sorted(direct, key=lambda e: -e[2])[: args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+    startup_ms = measure_startup(["--help"])
+    print(f"main.py --help: {startup_ms:.1f} ms wall (budget {args.startup_budget_ms:.0f} ms)")
+
+    failed = False
+    if eager_heavy:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(eager_heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print("FAIL: import budget exceeded")
+        failed = True
+    if startup_ms > args.startup_budget_ms:
+        print("FAIL: start-up budget exceeded")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+Incremental gold builds (BaseDataSource.run_incremental, elt_core/incremental_gold.py)
+against full rebuilds.
+
+Fills an in-memory stand-in for CouchDB (with a _changes feed, _rev checks
+and the dependency view) with silver-like contracts, Orbis DM/SH rows, PEP
+careers and societies, nif.pt results of a few municipalities and Anuario
+companies. Each gold builder is then run incrementally three times:
+
+1. without checkpoints: a full build, which must equal transform() over all
+   silver documents and read each of them once;
+2. right after: nothing changed, so nothing may be read or written;
+3. after `--changes` silver edits per input (updates, a few deletions and
+   inserts, and Orbis rows and PEP records moved to another UCI or person):
+   only the changed documents and the input documents behind the affected
+   gold keys (per the builder's gold_keys) may be read, and gold must again
+   equal a full transform over the edited silver.
+
+Reports the silver documents read and gold documents written by each run
+next to the full rebuild, and the time of both.
+
+Usage:
+    uv run python benchmarks/incremental_gold.py [--rows 50000] [--changes 20]
+"""
+import argparse
+import copy
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from elt_core.db_connector import DocumentConflict  # noqa: E402
+from elt_core.json_records import sanitize_for_json  # noqa: E402
+from elt_core.nif_queue import REVALIDATION_FIELDS  # noqa: E402
+from sources.lookups.districts_municipalities import MUNICIPALITY_LOOKUP  # noqa: E402
+
+
+class MemoryCouch:
+    """The DBConnector methods used by the incremental builds, over dicts."""
+
+    def __init__(self):
+        self.dbs = {}
+        self.seqs = {}
+        # Documents read and written per database
+        self.reads = Counter()
+        self.writes = Counter()
+
+    def _db(self, db_name):
+        return self.dbs.setdefault(db_name, {})
+
+    def _store(self, db_name, doc):
+        db = self._db(db_name)
+        self.seqs[db_name] = self.seqs.get(db_name, 0) + 1
+        old = db.get(doc["_id"])
+        generation = int(old["_rev"].split("-")[0]) + 1 if old else 1
+        stored = {**copy.deepcopy(doc), "_rev": f"{generation}-{self.seqs[db_name]:x}", "_seq": self.seqs[db_name]}
+        db[doc["_id"]] = stored
+        return stored["_rev"]
+
+    def _public(self, doc):
+        return {k: copy.deepcopy(v) for k, v in doc.items() if k not in ("_seq", "_deleted")}
+
+    def get_or_create_db(self, db_name):
+        self._db(db_name)
+
+    def get_db_info(self, db_name):
+        return {"update_seq": self.seqs.get(db_name, 0)} if db_name in self.dbs else None
+
+    def get_document(self, db_name, doc_id):
+        doc = self.dbs.get(db_name, {}).get(doc_id)
+        return None if doc is None or doc.get("_deleted") else self._public(doc)
+
+    def put_document(self, db_name, doc):
+        stored = self._db(db_name).get(doc["_id"])
+        live = stored is not None and not stored.get("_deleted")
+        if (live and doc.get("_rev") != stored["_rev"]) or (not live and doc.get("_rev")):
+            raise DocumentConflict(doc["_id"])
+        return {"ok": True, "id": doc["_id"], "rev": self._store(db_name, doc)}
+
+    def save_documents_bulk(self, db_name, docs, sanitize=True):
+        results = []
+        for doc in docs:
+            stored = self._db(db_name).get(doc["_id"])
+            live = stored is not None and not stored.get("_deleted")
+            if (live and doc.get("_rev") != stored["_rev"]) or (not live and doc.get("_rev") and stored is None):
+                results.append({"id": doc["_id"], "error": "conflict", "reason": "Document update conflict."})
+                continue
+            self.writes[db_name] += 1
+            results.append({"id": doc["_id"], "rev": self._store(db_name, doc)})
+        return results
+
+    def get_documents_by_ids(self, db_name, ids):
+        db = self.dbs.get(db_name, {})
+        docs = [db[doc_id] for doc_id in ids if doc_id in db and not db[doc_id].get("_deleted")]
+        self.reads[db_name] += len(docs)
+        return [self._public(doc) for doc in docs]
+
+    def get_all_documents(self, db_name):
+        docs = [self._public(doc) for _, doc in sorted(self.dbs.get(db_name, {}).items()) if not doc.get("_deleted")]
+        self.reads[db_name] += len(docs)
+        return docs
+
+    def get_changes(self, db_name, since=None, limit=10000):
+        if db_name not in self.dbs:
+            return [], since
+        docs = sorted((doc for doc in self.dbs[db_name].values() if doc["_seq"] > (since or 0)), key=lambda d: d["_seq"])
+        rows = [{"id": doc["_id"], "deleted": bool(doc.get("_deleted"))} for doc in docs[:limit]]
+        last_seq = docs[:limit][-1]["_seq"] if rows else self.seqs.get(db_name, 0)
+        return rows, last_seq
+
+    def ensure_design_document(self, db_name, design_doc):
+        self._db(db_name)
+
+    def query_view(self, db_name, design, view, keys=None, **params):
+        # _design/deps/_view/by_key
+        wanted = set(keys or ())
+        return [
+            {"id": doc["_id"], "key": key, "value": [doc["input"], doc["input_id"]]}
+            for doc in self.dbs.get(db_name, {}).values() if not doc.get("_deleted")
+            for key in doc.get("keys") or () if key in wanted
+        ]
+
+    def find_documents(self, db_name, selector, fields=None, sort=None, limit=None):
+        (field, condition), = selector.items()
+        wanted = set(condition["$in"])
+        docs = [doc for doc in self.dbs.get(db_name, {}).values() if not doc.get("_deleted") and doc.get(field) in wanted]
+        self.reads[db_name] += len(docs)
+        return [self._public(doc) for doc in docs]
+
+    def create_index(self, db_name, fields, name=None):
+        self._db(db_name)
+
+    def live(self, db_name):
+        return {doc_id: self._public(doc) for doc_id, doc in self.dbs.get(db_name, {}).items() if not doc.get("_deleted")}
+
+
+def synthetic_silver(couch, rows, rng):
+    """Silver-like documents of every gold input, keyed like the real databases."""
+    vats = [f"5{rng.randint(0, 99999999):08d}" for _ in range(rows // 2)]
+    municipalities = sorted(MUNICIPALITY_LOOKUP)[:40]
+    silver = {
+        "contracts_silver": [
+            {
+                "_id": f"{i:08d}", "contract_id": i, "object": f"Contrato {i}",
+                "contracted": [{"nif": rng.choice(vats), "description": "Fornecedor"}],
+                "contracting_agency": [{"nif": rng.choice(vats), "description": "Entidade"}],
+                "contestants": [{"nif": rng.choice(vats)} for _ in range(rng.randint(0, 3))],
+                "final_price": round(rng.lognormvariate(9, 2), 2),
+            }
+            for i in range(rows)
+        ],
+        "orbis_dm_silver": [
+            {"_id": f"dm{i:08d}", "UCI": f"UCI{rng.randint(0, rows // 4):07d}", "VAT": rng.choice(vats),
+             "DMFull name": rng.choice([None, f"Pessoa {i}"])}
+            for i in range(rows)
+        ],
+        "orbis_sh_silver": [
+            {"_id": f"sh{i:08d}", "UCI": f"UCI{rng.randint(0, rows // 4):07d}", "VAT": rng.choice(vats),
+             "SH - Name": f"Acionista {i}"}
+            for i in range(rows // 2)
+        ],
+        "social_careers_silver": [
+            {"_id": f"sc{i:08d}", "Nome": f"Pessoa {rng.randint(0, rows // 20)}", "NIPC": rng.choice(vats),
+             "Cargo": rng.choice(["Ministro", "Deputado", "Secretario"]), "Governo": f"G{rng.randint(1, 23)}",
+             "Legislatura": f"L{rng.randint(1, 15)}"}
+            for i in range(rows // 5)
+        ],
+        "societies_source_silver": [
+            {"_id": f"so{i:08d}", "Nome": f"Pessoa {rng.randint(0, rows // 20)}", "NIPC": rng.choice(vats),
+             "Participação Social": f"{rng.randint(1, 100)}%", "Governo": f"G{rng.randint(1, 23)}",
+             "Legislatura": f"L{rng.randint(1, 15)}"}
+            for i in range(rows // 5)
+        ],
+        "nifs_scrape_silver": [
+            {"_id": f"6{i:08d}", "nif": f"6{i:08d}", "valid_nif": True, "postal_code": None,
+             "description": f"Municipio de {municipalities[i]}" if i < len(municipalities) else f"Empresa {i}, Lda",
+             "scraped_at": "2024-01-01T00:00:00Z", "changed_at": "2024-01-01T00:00:00Z", "page_sha256": f"{i:064x}"}
+            for i in range(rows // 10)
+        ],
+        "anuario_occ_silver": [
+            {"_id": f"7{i:08d}", "nif": f"7{i:08d}", "name": f"Empresa Municipal {i}",
+             "municipalities_participation": {m: rng.randint(1, 100) for m in rng.sample(municipalities, rng.randint(1, 3))}}
+            for i in range(200)
+        ],
+    }
+    for db_name, docs in silver.items():
+        couch.save_documents_bulk(db_name, docs)
+    return vats, municipalities
+
+
+def edit_silver(couch, rng, changes, vats, municipalities):
+    """Updates, deletes and inserts `changes` documents per input; some move to another key."""
+    edits = {
+        "contracts_silver": lambda doc: {**doc, "final_price": doc["final_price"] + 1},
+        "orbis_dm_silver": lambda doc: {**doc, "UCI": f"UCI{rng.randint(0, 10**6):07d}"} if rng.random() < 0.5 else {**doc, "VAT": rng.choice(vats)},
+        "orbis_sh_silver": lambda doc: {**doc, "SH - Name": doc["SH - Name"] + " (renamed)"},
+        "social_careers_silver": lambda doc: {**doc, "Nome": "Pessoa nova"} if rng.random() < 0.5 else {**doc, "Cargo": "Presidente"},
+        "societies_source_silver": lambda doc: {**doc, "Participação Social": "0%"},
+        "nifs_scrape_silver": lambda doc: {**doc, "description": f"Municipio de {rng.choice(municipalities)}"},
+        "anuario_occ_silver": lambda doc: {**doc, "municipalities_participation": {rng.choice(municipalities): 50}},
+    }
+    for db_name, edit in edits.items():
+        docs = couch.live(db_name)
+        picked = rng.sample(sorted(docs), min(changes, len(docs)))
+        updates = [edit(docs[doc_id]) for doc_id in picked[:-2]]
+        deletes = [{"_id": doc_id, "_rev": docs[doc_id]["_rev"], "_deleted": True} for doc_id in picked[-2:-1]]
+        inserts = [{**edit({k: v for k, v in docs[picked[-1]].items() if k != "_rev"}), "_id": f"new-{db_name}"}]
+        couch.save_documents_bulk(db_name, updates + deletes + inserts)
+
+
+def revalidate_silver(couch, rng, changes):
+    """Re-checks `changes` scraped NIFs whose page did not change: only their REVALIDATION_FIELDS move."""
+    docs = couch.live("nifs_scrape_silver")
+    picked = rng.sample(sorted(docs), min(changes, len(docs)))
+    couch.save_documents_bulk("nifs_scrape_silver", [{**docs[doc_id], "scraped_at": "2024-06-01T00:00:00Z"} for doc_id in picked])
+
+
+def affected_reads(source, before, after):
+    """
+    Most silver documents an incremental run may read after the edits: per
+    changed input, its changed documents plus the input documents of every
+    gold input behind the keys those changes affect (old and new keys). An
+    input whose changes are applied later is still found by its old keys.
+    """
+    def keys_of(input_db, doc):
+        return set(source.gold_keys(input_db, doc))
+
+    bound = 0
+    for input_db in source.gold_inputs:
+        old, new = before[input_db], after[input_db]
+        changed = {doc_id for doc_id in set(old) | set(new) if old.get(doc_id) != new.get(doc_id)}
+        if not changed:
+            continue
+        keys = set()
+        for doc_id in changed:
+            keys |= keys_of(input_db, new[doc_id]) if doc_id in new else set()
+            if source.tracks_gold_dependencies:
+                keys |= keys_of(input_db, old[doc_id]) if doc_id in old else set()
+            else:
+                keys.add(doc_id)
+        bound += len(changed & set(new))
+        for db_name in source.gold_inputs:
+            if source.tracks_gold_dependencies:
+                bound += sum(
+                    1 for doc_id, doc in after[db_name].items()
+                    if (keys_of(db_name, doc) | (keys_of(db_name, before[db_name][doc_id]) if doc_id in before[db_name] else set())) & keys
+                )
+            else:
+                bound += len(keys & set(after[db_name]))
+    return bound
+
+
+def normalized(docs):
+    return {doc["_id"]: sanitize_for_json({k: v for k, v in doc.items() if k != "_rev"}) for doc in docs}
+
+
+def full_build(source, couch):
+    """transform() over every silver document of the builder, as run() does."""
+    inputs = [couch.get_all_documents(db_name) for db_name in source.gold_inputs]
+    return normalized(source.transform(*inputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000, help="Contracts and Orbis DM rows (other inputs scale with it)")
+    parser.add_argument("--changes", type=int, default=20, help="Silver documents edited per input")
+    args = parser.parse_args()
+    os.environ.setdefault("LOG_PATH", "logs")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    logging.disable(logging.WARNING)
+
+    from sources.gold.contracts_gold import ContractsGoldSource
+    from sources.gold.entities_gold import EntitiesGoldSource
+    from sources.gold.municipal_entities_gold import MunicipalEntitiesGoldSource
+    from sources.gold.orbis_gold import OrbisGoldSource
+    from sources.gold.pep_gold import PEPGoldSource
+
+    rng = random.Random(3)
+    couch = MemoryCouch()
+    vats, municipalities = synthetic_silver(couch, args.rows, rng)
+    builders = [
+        ContractsGoldSource(couch), EntitiesGoldSource(couch), OrbisGoldSource(couch),
+        PEPGoldSource(couch), MunicipalEntitiesGoldSource(couch),
+    ]
+    failed = False
+
+    def run(source, label, expected=None):
+        nonlocal failed
+        couch.reads.clear()
+        couch.writes.clear()
+        start = time.perf_counter()
+        counts = source.run_incremental()
+        elapsed = time.perf_counter() - start
+        reads = sum(couch.reads[db_name] for db_name in source.gold_inputs)
+        writes = couch.writes[source.source_name]
+        couch.reads.clear()
+        start = time.perf_counter()
+        full = full_build(source, couch)
+        full_s = time.perf_counter() - start
+        full_reads = sum(couch.reads.values())
+        gold = normalized(couch.live(source.source_name).values())
+        print(
+            f"{source.source_name:<24} {label:<8} {elapsed:6.2f}s  {counts['changes']:>6} changes -> "
+            f"{counts['keys']:>6} keys, {reads:>7} silver read, {writes:>6} gold written, {counts['unchanged']:>6} unchanged "
+            f"(full rebuild: {full_s:5.2f}s, {full_reads} read, {len(full)} written)"
+        )
+        if gold != full:
+            failed = True
+            wrong = [doc_id for doc_id in set(gold) | set(full) if gold.get(doc_id) != full.get(doc_id)]
+            print(f"FAIL: {len(wrong)} gold documents differ from a full rebuild, e.g. {sorted(wrong)[:3]}")
+        if expected is not None and (reads, writes) != expected:
+            failed = True
+            print(f"FAIL: expected {expected[0]} reads and {expected[1]} writes")
+        return counts, reads, writes, full_reads
+
+    for source in builders:
+        counts, reads, writes, full_reads = run(source, "first")
+        if reads != full_reads:
+            failed = True
+            print(f"FAIL: the first build read {reads} silver documents, a full rebuild {full_reads}")
+        run(source, "again", expected=(0, 0))
+    inputs = {db_name for source in builders for db_name in source.gold_inputs}
+    before = {db_name: couch.live(db_name) for db_name in inputs}
+    edit_silver(couch, rng, args.changes, vats, municipalities)
+    after = {db_name: couch.live(db_name) for db_name in inputs}
+    for source in builders:
+        counts, reads, writes, full_reads = run(source, "changed")
+        bound = affected_reads(source, before, after)
+        if reads > bound:
+            failed = True
+            print(f"FAIL: the incremental run read {reads} silver documents, the affected keys have {bound}")
+    revalidate_silver(couch, rng, args.changes)
+    for source in builders:
+        if "nifs_scrape_silver" not in source.gold_inputs:
+            continue
+        counts, reads, writes, full_reads = run(source, "recheck")
+        if not counts["changes"] or writes:
+            failed = True
+            print(f"FAIL: {counts['changes']} revalidated NIFs rewrote {writes} gold documents")
+        carried = [doc_id for doc_id, doc in couch.live(source.source_name).items() if set(doc) & set(REVALIDATION_FIELDS)]
+        if carried:
+            failed = True
+            print(f"FAIL: {len(carried)} gold documents carry revalidation fields, e.g. {sorted(carried)[:3]}")
+    if failed:
+        sys.exit(1)
+    print("OK: incremental builds equal full rebuilds, only touch the affected keys and ignore revalidations")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Equivalence check and benchmark of the fused LocationEngine against the
+original chain of location transformations used by ContractsSource.
+
+Builds execution_location lists from the real lookup tables (countries placed
+in district/municipality, ambiguous and unknown municipalities, rename-map
+keys, missing keys, empty strings, None and non-list values), runs both
+implementations on copies and fails unless the outputs are identical,
+including the key order of every location dict.
+
+Usage:
+    uv run python benchmarks/location_engine.py [--rows 200000] [--parquet data/contracts_2009_2024.parquet]
+"""
+import argparse
+import copy
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd  # noqa: E402
+
+from elt_core.location_engine import LocationEngine  # noqa: E402
+from elt_core.transformations import (  # noqa: E402
+    enrich_location_from_district,
+    enrich_location_from_municipality,
+    map_location_fixes,
+    normalize_locations,
+)
+from sources.lookups.countries_set import COUNTRIES_SET  # noqa: E402
+from sources.lookups.districts_municipalities import DISTRICT_MUNICIPALITIES_DICT, MUNICIPALITY_LOOKUP  # noqa: E402
+from sources.lookups.location_changes_maps import (  # noqa: E402
+    COUNTRY_CHANGES_MAP,
+    DISTRICT_CHANGES_MAP,
+    MUNICIPALITY_CHANGES_MAP,
+)
+
+COLUMN = "execution_location"
+
+
+def legacy_chain(df):
+    """The location steps of ContractsSource.transform before the engine."""
+    df = normalize_locations(df, COLUMN, set(COUNTRIES_SET))
+    df = enrich_location_from_municipality(df, COLUMN, MUNICIPALITY_LOOKUP)
+    df = enrich_location_from_district(df, COLUMN, DISTRICT_MUNICIPALITIES_DICT)
+    df = map_location_fixes(df, COLUMN, "country", COUNTRY_CHANGES_MAP)
+    df = map_location_fixes(df, COLUMN, "district", DISTRICT_CHANGES_MAP)
+    df = map_location_fixes(df, COLUMN, "municipality", MUNICIPALITY_CHANGES_MAP)
+    df[COLUMN] = df[COLUMN].apply(
+        lambda locs: [loc for loc in locs if any(loc.get(k) for k in ["country", "district"])]
+        if isinstance(locs, list) else locs
+    )
+    return df
+
+
+def synthetic_locations(rows, seed=7):
+    rng = random.Random(seed)
+    countries = list(COUNTRIES_SET)
+    municipalities = list(MUNICIPALITY_LOOKUP) + ["Lugar Inexistente"]
+    districts = list(DISTRICT_MUNICIPALITIES_DICT) + ["Distrito Inexistente"]
+    pools = {
+        "country": ["Portugal", "Espanha", None, ""] + list(COUNTRY_CHANGES_MAP),
+        "district": districts + countries[:5] + [None, ""] + list(DISTRICT_CHANGES_MAP),
+        "municipality": municipalities + countries[:5] + [None, ""] + list(MUNICIPALITY_CHANGES_MAP),
+    }
+
+    def one_location():
+        loc = {}
+        for level in ("country", "district", "municipality"):
+            if rng.random() < 0.8:
+                loc[level] = rng.choice(pools[level])
+        if rng.random() < 0.2:
+            loc["raw"] = "Texto original"
+        # Shuffle key order so order preservation is exercised
+        items = list(loc.items())
+        rng.shuffle(items)
+        return dict(items)
+
+    values = []
+    for _ in range(rows):
+        r = rng.random()
+        if r < 0.03:
+            values.append(None)
+        elif r < 0.05:
+            values.append([])
+        else:
+            values.append([one_location() for _ in range(rng.randint(1, 4))])
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic rows to generate")
+    parser.add_argument("--parquet", help="Use the execution_location column of a contracts parquet file instead")
+    args = parser.parse_args()
+
+    if args.parquet:
+        values = pd.read_parquet(args.parquet, columns=[COLUMN])[COLUMN].tolist()
+        # Parquet yields numpy arrays for list columns; the pipeline sees lists after CouchDB
+        values = [list(v) if hasattr(v, "tolist") and not isinstance(v, str) else v for v in values]
+    else:
+        values = synthetic_locations(args.rows)
+    print(f"{len(values)} rows, {sum(len(v) for v in values if isinstance(v, list))} locations")
+
+    engine = LocationEngine(
+        COUNTRIES_SET, MUNICIPALITY_LOOKUP, DISTRICT_MUNICIPALITIES_DICT,
+        COUNTRY_CHANGES_MAP, DISTRICT_CHANGES_MAP, MUNICIPALITY_CHANGES_MAP,
+    )
+
+    legacy_df = pd.DataFrame({COLUMN: copy.deepcopy(values)})
+    start = time.perf_counter()
+    expected = legacy_chain(legacy_df)[COLUMN].tolist()
+    legacy_s = time.perf_counter() - start
+
+    engine_df = pd.DataFrame({COLUMN: values})
+    start = time.perf_counter()
+    actual = engine.apply(engine_df, COLUMN)[COLUMN].tolist()
+    engine_s = time.perf_counter() - start
+
+    print(f"legacy chain: {legacy_s:.3f}s")
+    print(f"engine:       {engine_s:.3f}s ({legacy_s / engine_s:.1f}x)")
+
+    # repr() compares key order as well as values (None vs NaN included)
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, actual)) if repr(a) != repr(b)]
+    if len(expected) != len(actual) or mismatches:
+        for i in mismatches[:5]:
+            print(f"row {i}:\n  input  {values[i]!r}\n  legacy {expected[i]!r}\n  engine {actual[i]!r}")
+        print(f"FAIL: {len(mismatches)} rows differ")
+        sys.exit(1)
+    print("OK: outputs identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Parse throughput of nif.pt pages (sources/nif_page_parser.py).
+
+Reads the latest page per NIF from an HTML cache (--cache-dir, as written by
+NifScraperSource) or, without one, builds synthetic pages shaped like nif.pt
+result pages: a full layout with head scripts and styles, navigation,
+comments and a footer around a detail block (name, address, postal code), a
+success block or an error block.
+
+Every page is extracted with BeautifulSoup (html.parser) and with the fast
+extractor, which must agree on all of them (pages the fast extractor hands
+back to BeautifulSoup are counted as fallbacks). Reports pages per second
+for both in one process and for the fast extractor in a process pool, as
+NifScraperSource runs it.
+
+Usage:
+    uv run python benchmarks/nif_parse.py [--pages 5000] [--cache-dir data/html_cache/nif] [--processes 4]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from elt_core.html_cache import HtmlCache  # noqa: E402
+from sources.nif_page_parser import extract_bs4, extract_fast, extract_page  # noqa: E402
+
+HEAD = """<!DOCTYPE html>
+<html lang="pt"><head><meta charset="utf-8"><title>NIF {nif} - NIF.PT</title>
+<link rel="stylesheet" href="/css/bootstrap.min.css">
+<style>.detail {{ margin: 1em; }} .search-title {{ font-weight: bold; }} div.alert-message > p {{ color: #333; }}</style>
+<script>window.dataLayer = window.dataLayer || []; function gtag(){{dataLayer.push(arguments);}}
+var tpl = '<div class="detail"><span class="search-title">template 9999-999</span></div>';</script>
+</head><body>
+<div class="topbar"><div class="fill"><div class="container">
+<a class="brand" href="/">NIF.PT</a><ul class="nav">{nav}</ul>
+<form class="pull-right" action="/"><input type="text" name="q" placeholder="NIF ou nome"></form>
+</div></div></div>
+<div class="container"><div class="content"><div class="row"><div class="span10">
+<!-- resultado da pesquisa 0000-000 -->
+"""
+FOOT = """</div><div class="span4"><h3>Pesquisas recentes</h3><ul class="unstyled">{recent}</ul>
+<div class="ad"><script async src="//pagead2.example.com/ads.js"></script></div></div></div></div>
+<footer><p>&copy; NIF.PT 2025 &middot; <a href="/termos/">Termos</a> &middot; <a href="/contactos/">Contactos</a></p></footer>
+</div><script src="/js/jquery.min.js"></script><script>$(function(){{ $('.nav a').tooltip(); }});</script>
+</body></html>"""
+STREETS = ["Rua do Comércio", "Avenida da Liberdade", "Largo de São João", "Travessa das Flores", "Estrada Nacional 10"]
+TOWNS = [("1000", "Lisboa"), ("4000", "Porto"), ("3000", "Coimbra"), ("8000", "Faro"), ("9000", "Funchal")]
+
+
+def synthetic_page(nif, rng):
+    nav = "".join(f'<li><a href="/{s}/">{s.title()}</a></li>' for s in ("api", "pesquisa", "sobre", "blog"))
+    recent = "".join(f'<li><a href="/{rng.randint(500000000, 599999999)}/">Entidade</a></li>' for _ in range(15))
+    kind = rng.random()
+    if kind < 0.7:
+        prefix, town = rng.choice(TOWNS)
+        name = rng.choice(["Sem Nome", f"Entidade {nif} &amp; Filhos, Lda", f"Município de {town}", f"Associação {nif}"])
+        body = (
+            f'<div class="detail"><h1><span class="search-title">{name}</span></h1>\n'
+            f'<p>NIF: <strong>{nif}</strong></p><p>{rng.choice(STREETS)} {rng.randint(1, 300)}<br>\n'
+            f'{prefix}-{rng.randint(0, 999):03d} {town}</p>'
+            f'<div class="well"><p>Estado: <span class="label success">Ativa</span></p></div>'
+            f'<p>Atividade: CAE {rng.randint(10000, 99999)}</p></div>'
+        )
+    elif kind < 0.85:
+        body = '<div class="alert-message success block-message"><p><strong>NIF válido</strong>, sem dados.</p></div>'
+    else:
+        body = '<div class="alert-message error block-message"><p>NIF <strong>inválido</strong>.</p></div>'
+    return HEAD.format(nif=nif, nav=nav) + body + FOOT.format(recent=recent)
+
+
+def load_pages(args):
+    if args.cache_dir:
+        cache = HtmlCache(args.cache_dir, enabled=True)
+        pages = [cache.get(entry["sha256"]) for entry in cache.latest().values()]
+        return pages[: args.pages] if args.pages else pages
+    rng = random.Random(3)
+    return [synthetic_page(500000000 + i, rng) for i in range(args.pages or 5000)]
+
+
+def timed(label, func, pages):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:7.2f}s  {len(pages) / elapsed:9.0f} pages/s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=None, help="Pages (default: 5000 synthetic, or the whole cache)")
+    parser.add_argument("--cache-dir", help="HTML cache to read pages from instead of synthetic ones")
+    parser.add_argument("--processes", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    print(f"{len(pages)} pages, {sum(len(p) for p in pages) / len(pages) / 1e3:.1f} kB on average")
+
+    reference, bs4_s = timed("BeautifulSoup (html.parser)", lambda: [extract_bs4(p) for p in pages], pages)
+    fast, fast_s = timed("fast extractor", lambda: [extract_fast(p) for p in pages], pages)
+    print(f"{'':<34} {bs4_s / fast_s:.1f}x BeautifulSoup")
+
+    with ProcessPoolExecutor(args.processes) as pool:
+        list(pool.map(extract_page, pages[: args.processes * 64], chunksize=64))  # start the workers
+        pooled, _ = timed(
+            f"fast extractor, {args.processes} processes",
+            lambda: list(pool.map(extract_page, pages, chunksize=64)),
+            pages,
+        )
+
+    fallbacks = sum(1 for page in fast if page is None)
+    mismatches = [
+        (i, got, expected) for i, (got, expected) in enumerate(zip(fast, reference))
+        if got is not None and got != expected
+    ]
+    if [page for page, _ in pooled] != reference:
+        mismatches.append(("process pool", None, None))
+    if mismatches:
+        print(f"FAIL: {len(mismatches)} pages differ from BeautifulSoup, e.g. {mismatches[:2]}")
+        sys.exit(1)
+    print(f"OK: {len(pages) - fallbacks} pages identical to BeautifulSoup, {fallbacks} handed to the fallback")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Equivalence check and benchmark of the NIF collection
+(transformations.collect_nifs) and of the status-preserving queue upsert
+(elt_core/nif_queue.py) used by ContractsSource.extract_nifs.
+
+Builds silver-like contracts whose entities are drawn from a pool of NIFs
+(a few agencies contract a lot, most suppliers appear a few times), some with
+placeholder descriptions, and compares collect_nifs with the former
+row-by-row loop. The queue is then written twice against an in-memory
+stand-in for the CouchDB queue: once empty and once after 10% more
+contracts, with some NIFs already marked done. The former code re-saved
+every NIF as pending on each run.
+
+Finally the NIFs are scored by contract value (transformations.nif_priorities,
+checked against a plain sum) and the scores written to the queue
+(nif_queue.set_priorities) for both runs: the second run must only write
+the NIFs whose score changed and keep every status.
+
+Usage:
+    uv run python benchmarks/nif_queue.py [--rows 500000] [--pool 150000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from elt_core.nif_queue import set_priorities, upsert_nifs  # noqa: E402
+from elt_core.transformations import NIF_ROLE_WEIGHTS, collect_nifs, nif_priorities  # noqa: E402
+
+COLUMNS = ["contracted", "contracting_agency", "contestants"]
+
+
+def legacy_extract(data, columns=COLUMNS):
+    nifs_data = {}
+    for row in data:
+        for col in columns:
+            if col in row and row[col]:
+                val = row[col]
+                items = val if isinstance(val, list) else [val]
+                for item in items:
+                    if isinstance(item, dict) and 'nif' in item:
+                        nif = str(item['nif']).strip()
+                        if not nif:
+                            continue
+                        raw_desc = item.get('description')
+                        if not raw_desc or str(raw_desc).strip() in ['-', '']:
+                            description = 'No description'
+                        else:
+                            description = str(raw_desc).strip()
+                        if nif not in nifs_data:
+                            nifs_data[nif] = description
+                        elif nifs_data[nif] == 'No description' and description != 'No description':
+                            nifs_data[nif] = description
+    return nifs_data
+
+
+def synthetic_silver(rows, pool, seed=5):
+    rng = random.Random(seed)
+    agencies = [str(600000000 + i) for i in range(max(pool // 50, 1))]
+    suppliers = [str(500000000 + i) for i in range(pool)]
+
+    def entity(nifs):
+        # Skewed draw: low indices are much more frequent
+        nif = nifs[int(len(nifs) * rng.random() ** 3)]
+        description = rng.choice([f"Entidade {nif}, Lda", "-", "", None]) if rng.random() < 0.3 else f"Entidade {nif}, Lda"
+        return {"nif": nif, "description": description}
+
+    docs = []
+    for _ in range(rows):
+        agency = entity(agencies)
+        price = round(rng.lognormvariate(10, 2), 2)
+        docs.append({
+            "initial_price": price,
+            # Some contracts have no final price yet
+            "final_price": None if rng.random() < 0.1 else round(price * rng.uniform(0.8, 1.1), 2),
+            "contracted": [entity(suppliers) for _ in range(rng.randint(1, 2))],
+            # Some rows hold a single dict instead of a list
+            "contracting_agency": agency if rng.random() < 0.1 else [agency],
+            "contestants": [entity(suppliers) for _ in range(rng.randint(0, 3))],
+        })
+    return docs
+
+
+class MemoryQueue:
+    """Minimal _all_docs-by-keys / _bulk_docs semantics (with _rev checks) of a CouchDB database."""
+
+    def __init__(self):
+        self.docs = {}
+        self.revision = 0
+        self.writes = 0
+
+    def get_or_create_db(self, db_name):
+        pass
+
+    def get_documents_by_ids(self, db_name, ids):
+        return [dict(self.docs[i]) for i in ids if i in self.docs]
+
+    def save_documents_bulk(self, db_name, docs, sanitize=True):
+        results = []
+        for doc in docs:
+            stored = self.docs.get(doc["_id"])
+            if (stored is None and "_rev" in doc) or (stored is not None and stored["_rev"] != doc.get("_rev")):
+                results.append({"id": doc["_id"], "error": "conflict"})
+                continue
+            self.revision += 1
+            self.docs[doc["_id"]] = {**doc, "_rev": str(self.revision)}
+            self.writes += 1
+            results.append({"id": doc["_id"], "rev": str(self.revision), "ok": True})
+        return results
+
+
+def collect(docs):
+    return collect_nifs(docs, COLUMNS)
+
+
+def reference_priorities(data):
+    totals = {}
+    for row in data:
+        value = row["final_price"] if row["final_price"] is not None else row["initial_price"]
+        for role, weight in NIF_ROLE_WEIGHTS.items():
+            cell = row[role]
+            for entity in cell if isinstance(cell, list) else [cell]:
+                totals[entity["nif"]] = totals.get(entity["nif"], 0.0) + value * weight
+    return {nif: round(total, 2) for nif, total in totals.items()}
+
+
+def prioritize(queue, data, label):
+    start = time.perf_counter()
+    scores = nif_priorities(data)
+    score_s = time.perf_counter() - start
+    queue.writes = 0
+    start = time.perf_counter()
+    counts = set_priorities(queue, {
+        row.nif: {"priority": row.priority, "contracts": row.contracts, "roles": row.roles, "last_contract": row.last_contract}
+        for row in scores.itertuples(index=False)
+    })
+    write_s = time.perf_counter() - start
+    print(f"{label}: scored in {score_s:.2f}s, written in {write_s:.2f}s: {counts}, {queue.writes} documents written")
+    expected = reference_priorities(data)
+    actual = dict(zip(scores["nif"], scores["priority"]))
+    wrong = [nif for nif, score in expected.items() if abs(actual.get(nif, -1) - score) > 0.011]
+    stored = [nif for nif, score in actual.items() if queue.docs[nif]["priority"] != score]
+    if wrong or stored or list(scores["priority"]) != sorted(scores["priority"], reverse=True):
+        print(f"FAIL: {len(wrong)} scores differ from the plain sum, {len(stored)} not stored, or not in order")
+        sys.exit(1)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000, help="Silver contracts")
+    parser.add_argument("--pool", type=int, default=150000, help="Distinct supplier NIFs")
+    args = parser.parse_args()
+
+    docs = synthetic_silver(args.rows, args.pool)
+
+    start = time.perf_counter()
+    expected = legacy_extract(docs)
+    legacy_s = time.perf_counter() - start
+    start = time.perf_counter()
+    nifs = collect(docs)
+    collect_s = time.perf_counter() - start
+    actual = dict(zip(nifs["nif"], nifs["description"]))
+    print(f"row loop:     {legacy_s:.2f}s")
+    print(f"collect_nifs: {collect_s:.2f}s ({legacy_s / collect_s:.1f}x)")
+    if list(expected.items()) != list(actual.items()):
+        print(f"FAIL: NIFs differ ({len(expected)} vs {len(actual)})")
+        sys.exit(1)
+    print(f"OK: {len(actual)} identical NIFs and descriptions")
+
+    queue = MemoryQueue()
+    counts = upsert_nifs(queue, zip(nifs["nif"], nifs["description"]), source="contracts")
+    print(f"first run:  {counts}, {queue.writes} documents written")
+
+    # Scraper progress on part of the queue, then a run with 10% more contracts
+    for doc in list(queue.docs.values())[::3]:
+        queue.docs[doc["_id"]] = {**doc, "status": "done"}
+    done = {nif for nif, doc in queue.docs.items() if doc["status"] == "done"}
+    queue.writes = 0
+    more = docs + synthetic_silver(args.rows // 10, args.pool * 2, seed=6)
+    nifs = collect(more)
+    counts = upsert_nifs(queue, zip(nifs["nif"], nifs["description"]), source="contracts")
+    print(f"second run: {counts}, {queue.writes} documents written (row loop re-saved {len(nifs)} as pending)")
+    reset = [nif for nif in done if queue.docs[nif]["status"] != "done"]
+    if reset:
+        print(f"FAIL: {len(reset)} scraped NIFs lost their status")
+        sys.exit(1)
+    print(f"OK: status of {len(done)} scraped NIFs preserved")
+
+    prioritize(queue, docs, "priorities, first run ")
+    statuses = {nif: doc["status"] for nif, doc in queue.docs.items()}
+    counts = prioritize(queue, more, "priorities, second run")
+    if counts["updated"] >= len(queue.docs) or any(queue.docs[nif]["status"] != s for nif, s in statuses.items()):
+        print("FAIL: the second run rewrote unchanged NIFs or changed a status")
+        sys.exit(1)
+    print(f"OK: {counts['updated']} changed scores written, {counts['unchanged']} left alone")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,639 @@
+"""
+NIF scraper engines against a local stub of nif.pt.
+
+Starts a keep-alive HTTP server on localhost that serves canned nif.pt pages
+(a valid NIF with a postal code and name, a valid NIF without a postal code,
+an invalid NIF) with a fixed latency per request. The stub throttles like the
+real site: past `--capacity` requests per second it answers 429 with a
+Retry-After header, and a fraction of requests fail with 503.
+
+Both engines of NifScraperSource (NIF_SCRAPER_ENGINE=threads|asyncio, the
+latter once with AIMD only and once with a token-bucket rate just under the
+stub's capacity) scrape the same queue into an in-memory stand-in for
+CouchDB. A tenth of the queue has wrong check digits, a tenth are
+individuals' NIFs and a tenth are VAT numbers of an Orbis silver database:
+triage must settle those without a request. The script checks that every
+NIF gets the result its canned page (or its triage) implies, that the
+NIFs with the highest `priority` are requested first and that every result
+is also published to entities_gold, and reports throughput, requests sent, 429/5xx answers and, for the asyncio engine, the concurrency
+trajectory of the AIMD limiter and the connections opened per host. Every run
+must leave the whole queue `done`. A further asyncio run is stopped after
+`--crash-after` seconds without committing what it buffered, as a killed
+process would, and a second run resumes it: it must fetch exactly the NIFs
+the first one did not commit. Pages go to a temporary HTML cache, which is
+then re-parsed with the server stopped; the re-parsed results must equal the
+scraped ones.
+
+The results of the rate-limited run are then aged past the refresh TTL and a
+tenth of the entities move (their page shows another postal code); the stub
+answers If-None-Match with 304 for half of the NIFs. After schedule_refresh,
+a run must re-parse only the pages that changed, renew the others through a
+304 or their content hash, and write only the moved entities to
+entities_gold.
+
+Finally `--scrapers` asyncio scrapers share one queue and a global rate budget
+(NIF_SCRAPER_GLOBAL_RATE) just under the stub's capacity, next to a crashed
+scraper that holds leases on a few NIFs: every NIF must be scraped once, the
+crashed scraper's NIFs taken over when its leases expire, and the combined
+rate must stay within the budget. Per-scraper throughput is reported.
+
+Usage:
+    uv run python benchmarks/nif_scraper_stub.py [--nifs 1500] [--latency 0.05] [--capacity 60] [--crash-after 5] [--scrapers 3]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from elt_core.db_connector import DocumentConflict  # noqa: E402
+from elt_core.nif_queue import REVALIDATION_FIELDS  # noqa: E402
+from sources.nif_triage import check_digit  # noqa: E402
+
+PAGE = "<html><head><title>NIF.PT</title></head><body><div class=\"container\">{}</div></body></html>"
+DETAIL = PAGE.format(
+    '<div class="detail"><span class="search-title">Entidade {nif}, Lda</span><br>'
+    "Rua do Exemplo 10<br>{postal} Lisboa<br>Estado: Ativa</div>"
+)
+SUCCESS = PAGE.format('<div class="alert-message success block-message">NIF válido</div>')
+ERROR = PAGE.format('<div class="alert-message error block-message">NIF inválido</div>')
+
+
+def canned_kind(nif):
+    """Page served for a NIF: mostly details, some success-only and invalid pages."""
+    return ("detail", "detail", "detail", "success", "error")[int(nif) % 5]
+
+
+def build_queue(n):
+    """
+    Queue of n NIFs and the triage each should get without a request: every
+    tenth has a wrong check digit, every tenth is an individual's and every
+    tenth is the VAT number of an Orbis company; the rest are companies to scrape.
+    Most NIFs have a skewed priority; some were queued before being scored.
+    """
+    rng = random.Random(11)
+    queue, triaged = [], {}
+    for i in range(n):
+        prefix = str((20000000 if i % 10 == 8 else 50000000) + i)
+        nif = prefix + str(check_digit(prefix))
+        if i % 10 == 9:
+            nif = prefix + str((check_digit(prefix) + 1) % 10)
+            triaged[nif] = "invalid"
+        elif i % 10 == 8:
+            triaged[nif] = "individual"
+        elif i % 10 == 7:
+            triaged[nif] = "orbis"
+        doc = {"_id": nif, "nif": nif, "description": f"queued {nif}", "status": "pending"}
+        if rng.random() < 0.9:
+            doc["priority"] = round(rng.lognormvariate(8, 2), 2)
+        queue.append(doc)
+    return queue, triaged
+
+
+def priority_order(queue, triaged, requests):
+    """Share of the top-decile priority NIFs to scrape that were among the first 20% of requests."""
+    scored = sorted(
+        (doc for doc in queue if doc["_id"] not in triaged and "priority" in doc),
+        key=lambda doc: doc["priority"], reverse=True,
+    )
+    top = {doc["_id"] for doc in scored[: max(len(scored) // 10, 1)]}
+    early = set(requests[: max(len(requests) // 5, 1)])
+    return len(top & early) / len(top)
+
+
+def expected_result(nif, triaged, moved=()):
+    if nif in triaged:
+        return {"valid_nif": triaged[nif] != "invalid", "postal_code": None, "district": None, "description": f"queued {nif}"}
+    kind = canned_kind(nif)
+    if kind == "detail" and nif in moved:
+        return {
+            "valid_nif": True, "postal_code": "4000-001", "district": "Porto", "municipality": "Porto",
+            "description": f"Entidade {nif}, Lda",
+        }
+    if kind == "detail":
+        return {
+            "valid_nif": True, "postal_code": "1000-001", "district": "Lisboa", "municipality": "Lisboa",
+            "description": f"Entidade {nif}, Lda",
+        }
+    if kind == "success":
+        return {"valid_nif": True, "postal_code": None, "district": None, "description": f"queued {nif}"}
+    return {"valid_nif": False, "postal_code": None, "district": None, "description": f"queued {nif}"}
+
+
+class StubState:
+    def __init__(self, latency, capacity, error_rate, seed=7):
+        self.latency = latency
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.counts = {"requests": 0, "200": 0, "304": 0, "429": 0, "503": 0}
+        # NIFs whose page shows another postal code (entities that moved)
+        self.moved = set()
+        self.requested = set()
+        # NIFs in the order of their first request
+        self.request_order = []
+
+    def admit(self, nif):
+        """HTTP status for the next request: 429 past capacity in the current second, some 503s."""
+        with self.lock:
+            if nif not in self.requested:
+                self.request_order.append(nif)
+            self.requested.add(nif)
+            self.counts["requests"] += 1
+            now = time.monotonic()
+            if now - self.window_start >= 1.0:
+                self.window_start, self.window_count = now, 0
+            self.window_count += 1
+            if self.window_count > self.capacity:
+                status = 429
+            elif self.rng.random() < self.error_rate:
+                status = 503
+            else:
+                status = 200
+            self.counts[str(status)] += 1
+            return status
+
+    def not_modified(self):
+        """Counts an admitted request as answered with 304 instead of 200."""
+        with self.lock:
+            self.counts["200"] -= 1
+            self.counts["304"] += 1
+
+    def reset(self):
+        with self.lock:
+            self.counts = dict.fromkeys(self.counts, 0)
+            self.requested = set()
+            self.request_order = []
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(state.latency)
+            nif = parse_qs(urlsplit(self.path).query).get("q", [""])[0]
+            status = state.admit(nif)
+            etag = None
+            if status == 200:
+                kind = canned_kind(nif)
+                postal = "4000-001" if nif in state.moved else "1000-001"
+                body = {"detail": DETAIL.format(nif=nif, postal=postal), "success": SUCCESS, "error": ERROR}[kind]
+                # Half of the pages have an ETag and honour If-None-Match
+                if int(nif) % 2 == 0:
+                    etag = f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        status, body = 304, ""
+                        state.not_modified()
+            else:
+                body = "Too Many Requests" if status == 429 else "Service Unavailable"
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            if status != 304:
+                self.send_header("Content-Length", str(len(payload)))
+            if etag:
+                self.send_header("ETag", etag)
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that went away (the stopped run of the crash check) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MemoryCouch:
+    """The CouchDB connector calls of the scraper and its lease queue, in memory, with _rev conflicts."""
+
+    def __init__(self, queue, orbis_vats=()):
+        self.dbs = {}
+        self.lock = threading.Lock()
+        self.save_documents_bulk("nifs_scrape_queue", queue)
+        self.save_documents_bulk("orbis_dm_silver", [{"_id": f"orbis-{vat}", "VAT": vat} for vat in orbis_vats])
+
+    def get_or_create_db(self, db_name):
+        with self.lock:
+            self.dbs.setdefault(db_name, {})
+
+    def get_document(self, db_name, doc_id):
+        with self.lock:
+            doc = self.dbs.get(db_name, {}).get(doc_id)
+            return None if doc is None else dict(doc)
+
+    def put_document(self, db_name, doc):
+        result, = self.save_documents_bulk(db_name, [doc])
+        if result.get("error"):
+            raise DocumentConflict(f"Update conflict for {db_name}/{doc['_id']}")
+        return result
+
+    def get_db_info(self, db_name):
+        db = self.dbs.get(db_name)
+        return None if db is None else {"doc_count": len(db)}
+
+    def get_all_ids(self, db_name):
+        return sorted(self.dbs.get(db_name, {}))
+
+    def get_documents_by_ids(self, db_name, ids):
+        with self.lock:
+            db = self.dbs.get(db_name, {})
+            return [dict(db[i]) for i in ids if i in db]
+
+    def save_documents_bulk(self, db_name, docs, sanitize=True):
+        results = []
+        with self.lock:
+            db = self.dbs.setdefault(db_name, {})
+            for doc in docs:
+                stored = db.get(doc["_id"])
+                if stored is not None and stored["_rev"] != doc.get("_rev"):
+                    results.append({"id": doc["_id"], "error": "conflict", "reason": "Document update conflict."})
+                    continue
+                rev = f"{int(stored['_rev'].split('-')[0]) + 1 if stored else 1}-{random.getrandbits(32):08x}"
+                db[doc["_id"]] = {**doc, "_rev": rev}
+                results.append({"id": doc["_id"], "ok": True, "rev": rev})
+        return results
+
+    def find_documents(self, db_name, selector, fields=None, sort=None, limit=None):
+        def matches(doc):
+            for field, condition in selector.items():
+                value = doc.get(field)
+                if isinstance(condition, dict) and "$in" in condition:
+                    if value not in condition["$in"]:
+                        return False
+                elif isinstance(condition, dict) and "$gte" in condition:
+                    if value is None or not value >= condition["$gte"]:
+                        return False
+                elif isinstance(condition, dict) and "$gt" in condition:
+                    if value is None or not value > condition["$gt"]:
+                        return False
+                elif isinstance(condition, dict) and "$ne" in condition:
+                    if value == condition["$ne"]:
+                        return False
+                elif isinstance(condition, dict) and "$exists" in condition:
+                    if (field in doc) != condition["$exists"]:
+                        return False
+                elif isinstance(condition, dict):
+                    if value is None or not value < condition["$lt"]:
+                        return False
+                elif value != condition:
+                    return False
+            return True
+
+        with self.lock:
+            found = [dict(doc) for doc in self.dbs.get(db_name, {}).values() if matches(doc)]
+        for key in reversed(sort or []):
+            (field, direction), = key.items()
+            found.sort(key=lambda doc: doc[field], reverse=direction == "desc")
+        return found[:limit]
+
+    def create_index(self, db_name, fields, name=None):
+        self.dbs.setdefault(db_name, {})
+
+    def ensure_design_document(self, db_name, design_doc):
+        pass
+
+    def query_view(self, db_name, design, view, **params):
+        with self.lock:
+            counts = Counter(doc.get("status") for doc in self.dbs.get(db_name, {}).values())
+        return [{"key": status, "value": count} for status, count in counts.items() if status]
+
+
+def orbis_vats(triaged):
+    return [nif for nif, kind in triaged.items() if kind == "orbis"]
+
+
+def run_engine(engine, base_url, queue, triaged, max_workers, rate=0.0):
+    os.environ["NIF_SCRAPER_ENGINE"] = engine
+    os.environ["NIF_SCRAPER_RATE"] = str(rate)
+    os.environ["NIF_SCRAPER_BASE_URL"] = base_url
+    from sources.nif_scraper_source import NifScraperSource
+
+    couch = MemoryCouch(queue, orbis_vats(triaged))
+    source = NifScraperSource(couch)
+    start = time.perf_counter()
+    source.run(max_workers=max_workers)
+    return couch, source, time.perf_counter() - start, source.scrape_stats
+
+
+def crash_and_resume(base_url, state, queue, triaged, max_workers, rate, crash_after, lease_seconds=2.0):
+    """
+    Stops an asyncio run after crash_after seconds without committing its
+    buffer (as a killed process would), then runs again once the stopped
+    run's leases expired. Returns the counts of both runs (with the NIFs the
+    stopped run committed) and the couch.
+    """
+    import asyncio
+
+    from elt_core.work_queue import LeaseQueue
+    from sources.nif_scraper_source import NifScraperSource, ResultCommitter
+    from sources.nif_triage import NifTriage
+
+    os.environ["NIF_SCRAPER_ENGINE"] = "asyncio"
+    os.environ["NIF_SCRAPER_RATE"] = str(rate)
+    os.environ["NIF_SCRAPER_BASE_URL"] = base_url
+    couch = MemoryCouch(queue, orbis_vats(triaged))
+    source = NifScraperSource(couch)
+    lease_queue = LeaseQueue(couch, "nifs_scrape_queue", lease_seconds=lease_seconds)
+    lease_queue.ensure_indexes()
+    committer = ResultCommitter(source, lease_queue, "nifs_scrape_silver", size=50, interval=1.0)
+    state.reset()
+    try:
+        asyncio.run(asyncio.wait_for(
+            source._run_asyncio(
+                lease_queue, committer, NifTriage(couch, "nifs_scrape_silver"), 200, max_workers, len(queue)
+            ),
+            timeout=crash_after,
+        ))
+    except TimeoutError:
+        pass
+    source._close_parse_pool()
+    source.html_cache.close()
+    before = {
+        "fetched": state.counts["200"],
+        "statuses": lease_queue.status_counts(),
+        "done": {nif for nif, doc in couch.dbs["nifs_scrape_queue"].items() if doc["status"] == "done"},
+    }
+
+    time.sleep(lease_seconds)
+    state.reset()
+    start = time.perf_counter()
+    NifScraperSource(couch).run(max_workers=max_workers)
+    after = {"fetched": state.counts["200"], "elapsed": time.perf_counter() - start, "statuses": lease_queue.status_counts()}
+    return before, after, couch
+
+
+def shared_budget(base_url, state, queue, triaged, max_workers, rate, scrapers, crashed=20, lease_seconds=3.0):
+    """
+    Runs `scrapers` asyncio scrapers in threads over one queue with a global
+    rate budget, after a crashed scraper leased `crashed` NIFs to scrape for
+    lease_seconds and never came back. Returns the couch, the scrapers' reports,
+    the crashed scraper's NIFs and the elapsed time.
+    """
+    from elt_core.work_queue import LeaseQueue
+    from sources.nif_scraper_source import NifScraperSource
+
+    os.environ["NIF_SCRAPER_ENGINE"] = "asyncio"
+    os.environ["NIF_SCRAPER_GLOBAL_RATE"] = str(rate)
+    os.environ["NIF_SCRAPER_HEARTBEAT_SECONDS"] = "0.5"
+    os.environ["NIF_SCRAPER_LEASE_POLL_SECONDS"] = "0.5"
+    # Small claims, so the scrapers share the queue instead of the first one taking it all
+    os.environ["NIF_SCRAPER_CLAIM_SIZE"] = "25"
+    os.environ["NIF_SCRAPER_BASE_URL"] = base_url
+    couch = MemoryCouch(queue, orbis_vats(triaged))
+    dead = LeaseQueue(couch, "nifs_scrape_queue", worker_id="crashed", lease_seconds=lease_seconds)
+    leased = [doc for doc in queue if doc["_id"] not in triaged][:crashed]
+    dead.claim_documents(couch.get_documents_by_ids("nifs_scrape_queue", [doc["_id"] for doc in leased]))
+    state.reset()
+    sources = [NifScraperSource(couch) for _ in range(scrapers)]
+    threads = [
+        threading.Thread(target=source.run, kwargs={"max_workers": max_workers, "worker_id": f"scraper-{i}"})
+        for i, source in enumerate(sources)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    del os.environ["NIF_SCRAPER_GLOBAL_RATE"]
+    return couch, [source.worker_report for source in sources], {doc["_id"] for doc in leased}, elapsed
+
+
+def refresh(couch, state, queue, triaged, max_workers, moved):
+    """
+    Ages every result past the TTL, moves the entities in `moved` and runs
+    schedule_refresh and the scraper. Returns the refresh counts, the scraper
+    and the NIFs whose entities_gold document was written.
+    """
+    from sources.nif_scraper_source import NifScraperSource
+
+    for doc in couch.dbs["nifs_scrape_silver"].values():
+        doc["scraped_at"] = "2000-01-01T00:00:00+00:00"
+    gold_revs = {nif: doc["_rev"] for nif, doc in couch.dbs["entities_gold"].items()}
+    state.reset()
+    state.moved = set(moved)
+    source = NifScraperSource(couch)
+    counts = source.schedule_refresh(ttl_days=30)
+    start = time.perf_counter()
+    source.run(max_workers=max_workers)
+    counts["elapsed"] = time.perf_counter() - start
+    written = {nif for nif, doc in couch.dbs["entities_gold"].items() if gold_revs.get(nif) != doc["_rev"]}
+    return counts, source, written
+
+
+def check(results, queue, triaged, moved=()):
+    wrong = []
+    for doc in queue:
+        nif = doc["nif"]
+        got = results.get(nif)
+        expected = expected_result(nif, triaged, moved)
+        if got is None or any(got.get(k) != v for k, v in expected.items()):
+            wrong.append((nif, got))
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nifs", type=int, default=1500, help="NIFs in the queue")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server latency per request in seconds")
+    parser.add_argument("--capacity", type=int, default=60, help="Requests per second before the stub answers 429")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Share of requests answered with 503")
+    parser.add_argument("--workers", type=int, default=10, help="Threads / starting asyncio concurrency")
+    parser.add_argument("--crash-after", type=float, default=5.0, help="Seconds before the crash-and-resume run is stopped")
+    parser.add_argument("--rate", type=float, help="Token-bucket rate of the rate-limited asyncio run (default: 90%% of --capacity)")
+    parser.add_argument("--scrapers", type=int, default=3, help="Scrapers sharing the queue and the rate budget")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    logging.getLogger("WorkQueue").setLevel(logging.ERROR)
+    os.environ.setdefault("NIF_SCRAPER_MAX_CONCURRENCY", "64")
+    os.environ.setdefault("NIF_SCRAPER_STATS_INTERVAL", "1")
+    cache_dir = tempfile.TemporaryDirectory()
+    os.environ["NIF_HTML_CACHE"] = "on"
+    os.environ["NIF_HTML_CACHE_DIR"] = cache_dir.name
+
+    state = StubState(args.latency, args.capacity, args.error_rate)
+    server = StubServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    queue, triaged = build_queue(args.nifs)
+    to_scrape = args.nifs - len(triaged)
+    print(
+        f"{args.nifs} NIFs ({to_scrape} to scrape, {dict(Counter(triaged.values()))} settled by triage), "
+        f"{args.latency * 1000:.0f} ms latency, 429 above {args.capacity} req/s, {args.error_rate:.0%} 503s"
+    )
+    failed = False
+    rate = args.rate if args.rate is not None else 0.9 * args.capacity
+    runs = [("threads", "threads", 0.0), ("asyncio", "asyncio", 0.0), (f"asyncio, {rate:g} req/s", "asyncio", rate)]
+    for label, engine, engine_rate in runs:
+        state.reset()
+        couch, source, elapsed, stats = run_engine(engine, base_url, queue, triaged, args.workers, engine_rate)
+        results = couch.dbs.get("nifs_scrape_silver", {})
+        counts = dict(state.counts)
+        wrong = check(results, queue, triaged)
+        print(
+            f"{label:<20} {elapsed:6.2f}s  {args.nifs / elapsed:6.1f} NIFs/s  "
+            f"requests={counts['requests']} 429={counts['429']} 503={counts['503']}"
+        )
+        if stats is not None:
+            trajectory = " ".join(f"{t:.0f}s:{c}" for t, c, _ in stats.trajectory)
+            print(f"{'':<20} concurrency over time: {trajectory}")
+            print(f"{'':<20} connections: {stats.connections}")
+        if wrong:
+            failed = True
+            print(f"FAIL: {len(wrong)} NIFs with unexpected results, e.g. {wrong[:3]}")
+        else:
+            print(f"{'':<20} OK: {len(results)} results as expected")
+        if state.requested & set(triaged):
+            failed = True
+            print(f"FAIL: {len(state.requested & set(triaged))} triaged NIFs were requested")
+        early = priority_order(queue, triaged, state.request_order)
+        if early < 0.8:
+            failed = True
+            print(f"FAIL: only {early:.0%} of the top-decile priority NIFs were among the first 20% of requests")
+        else:
+            print(f"{'':<20} OK: {early:.0%} of the top-decile priority NIFs among the first 20% of requests")
+        # Gold carries the result without when and how it was checked
+        gold = couch.dbs.get("entities_gold", {})
+        unpublished = [
+            nif for nif, doc in results.items()
+            if {k: v for k, v in gold.get(nif, {}).items() if k != "_rev"}
+            != {k: v for k, v in doc.items() if k != "_rev" and k not in REVALIDATION_FIELDS}
+        ]
+        if unpublished:
+            failed = True
+            print(f"FAIL: {len(unpublished)} results missing or different in entities_gold, e.g. {unpublished[:3]}")
+        statuses = Counter(doc.get("status") for doc in couch.dbs["nifs_scrape_queue"].values())
+        if statuses != {"done": args.nifs}:
+            failed = True
+            print(f"FAIL: queue statuses after the run: {dict(statuses)}")
+    scraped_source = source
+
+    # Refresh: conditional requests, content hashes, only changes downstream
+    scraped = [doc["_id"] for doc in queue if doc["_id"] not in triaged]
+    moved = {nif for nif in scraped if canned_kind(nif) == "detail"}
+    moved = set(sorted(moved)[::10])
+    counts, refreshed, written = refresh(couch, state, queue, triaged, args.workers, moved)
+    revalidated = dict(refreshed.revalidation_counts)
+    print(
+        f"{'refresh':<20} {counts['elapsed']:6.2f}s  re-queued {counts['requeued']} of {counts['stale']} stale, "
+        f"{len(moved)} moved: requests={state.counts['requests']} 304={state.counts['304']} {revalidated}, "
+        f"{len(written)} written to entities_gold"
+    )
+    statuses = Counter(doc.get("status") for doc in couch.dbs["nifs_scrape_queue"].values())
+    if counts["requeued"] != args.nifs or statuses != {"done": args.nifs} \
+            or check(couch.dbs["nifs_scrape_silver"], queue, triaged, moved):
+        failed = True
+        print(f"FAIL: refresh left the queue at {dict(statuses)} or wrong results")
+    elif revalidated.get("parsed") != len(moved) or not revalidated.get("not_modified") \
+            or sum(revalidated.values()) != to_scrape or written != moved:
+        failed = True
+        print(f"FAIL: expected {len(moved)} pages parsed and written downstream, the rest revalidated")
+    else:
+        print(f"{'':<20} OK: only the {len(moved)} moved entities re-parsed and published")
+    state.moved = set()
+
+    # Crash and restart: the second run fetches only what the first did not commit
+    before, after, couch = crash_and_resume(base_url, state, queue, triaged, args.workers, rate, args.crash_after)
+    committed = before["statuses"].get("done", 0)
+    expected = sum(1 for doc in queue if doc["_id"] not in triaged and doc["_id"] not in before["done"])
+    print(
+        f"{'crash and resume':<20} stopped after {args.crash_after:g}s: {before['fetched']} pages fetched, "
+        f"{committed} committed, queue {before['statuses']}"
+    )
+    print(
+        f"{'':<20} resumed in {after['elapsed']:.2f}s: {after['fetched']} pages fetched "
+        f"(expected {expected}), queue {after['statuses']}"
+    )
+    if after["fetched"] != expected or after["statuses"] != {"done": args.nifs} \
+            or check(couch.dbs["nifs_scrape_silver"], queue, triaged):
+        failed = True
+        print("FAIL: the resumed run re-fetched committed NIFs or left some unscraped")
+    server.shutdown()
+
+    # Offline re-parse of the cached pages: only the moved entities move back
+    source = scraped_source
+    cache = source.html_cache
+    blobs = list(cache.directory.glob("objects/*/*.html.gz"))
+    raw = sum(entry["bytes"] for entry in cache.latest().values())
+    print(
+        f"cache: {sum(1 for _ in cache.entries())} fetches, {len(blobs)} distinct pages, "
+        f"{sum(p.stat().st_size for p in blobs) / 1e3:.0f} kB compressed ({raw / 1e3:.0f} kB of latest pages)"
+    )
+    start = time.perf_counter()
+    counts = source.reparse()
+    print(f"reparse (server stopped): {time.perf_counter() - start:.2f}s {counts}")
+    # The latest cached pages are the crash run's, from before the entities moved
+    silver = source.db_connector.dbs["nifs_scrape_silver"]
+    if counts["updated"] != len(moved) or counts["unchanged"] != to_scrape - len(moved) \
+            or check(silver, queue, triaged):
+        failed = True
+        print("FAIL: re-parsed results differ from the scraped ones")
+
+    # Several scrapers, one queue, one rate budget; one more crashed holding leases
+    os.environ["NIF_HTML_CACHE"] = "off"
+    server = StubServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    couch, reports, crashed, elapsed = shared_budget(base_url, state, queue, triaged, args.workers, rate, args.scrapers)
+    server.shutdown()
+    counts = dict(state.counts)
+    print(
+        f"{f'{args.scrapers} scrapers, {rate:g} req/s':<20} {elapsed:6.2f}s  {args.nifs / elapsed:6.1f} NIFs/s  "
+        f"requests={counts['requests']} 429={counts['429']} 503={counts['503']}  "
+        f"({counts['requests'] / elapsed:.1f} req/s combined)"
+    )
+    for report in reports:
+        print(
+            f"{'':<20} {report['worker_id']}: {report['done']} NIFs, {report['requests']} requests, "
+            f"{report['nifs_per_s']} NIFs/s"
+        )
+    queue_docs = couch.dbs["nifs_scrape_queue"]
+    statuses = Counter(doc.get("status") for doc in queue_docs.values())
+    taken_over = {queue_docs[nif].get("finished_by") for nif in crashed}
+    budget = couch.get_document("scrape_rate_budget", "127.0.0.1") or {}
+    if check(couch.dbs["nifs_scrape_silver"], queue, triaged) or statuses != {"done": args.nifs}:
+        failed = True
+        print(f"FAIL: shared scrape left the queue at {dict(statuses)} or wrong results")
+    elif sum(report["done"] for report in reports) != args.nifs or len(state.requested) != to_scrape:
+        failed = True
+        print(f"FAIL: {sum(r['done'] for r in reports)} NIFs committed and {len(state.requested)} requested")
+    elif "crashed" in taken_over or None in taken_over:
+        failed = True
+        print(f"FAIL: the crashed scraper's NIFs were not taken over: {taken_over}")
+    elif counts["200"] / elapsed > rate * 1.1 or budget.get("workers"):
+        failed = True
+        print(f"FAIL: {counts['200'] / elapsed:.1f} pages/s over a budget of {rate:g} req/s, workers left {budget.get('workers')}")
+    else:
+        print(f"{'':<20} OK: each NIF scraped once, {len(crashed)} NIFs of the crashed scraper taken over by {sorted(taken_over)}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Equivalence check and benchmark of the vectorized VAT propagation and
+cleaning (transformations.propagate_company_vat / clean_vat) used by the
+ORBIS DM, SH and PT-companies sources.
+
+Builds an ORBIS-like frame (several rows per company, the VAT only on some
+of them, as float, int, string and dirty values, rows without company) and
+compares the new functions with the former groupby-lambda / string-split
+implementation on a sample, then times the new ones at full scale.
+
+Usage:
+    uv run python benchmarks/orbis_vat.py [--rows 3000000] [--check-rows 200000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from elt_core.transformations import clean_vat, propagate_company_vat  # noqa: E402
+
+GROUP, VAT = "company_name", "VAT"
+
+
+def legacy_propagate(df):
+    df[VAT] = df[VAT].astype("string").groupby(df[GROUP]).transform(lambda x: x.ffill().bfill())
+    return df
+
+
+def legacy_clean(df):
+    df[VAT] = df[VAT].astype(str).str.split(".").str[0]
+    df = df.dropna(subset=[VAT])
+    mask = df[VAT].str.fullmatch(r"\d{9}")
+    return df.loc[mask].copy()
+
+
+def orbis_frame(rows, kind, seed=3):
+    """kind: 'float' (Excel export), 'object' (mixed JSON values) or 'int'."""
+    rng = np.random.default_rng(seed)
+    companies = max(rows // 5, 1)
+    company = rng.integers(0, companies, rows)
+    names = pd.Series(company).map(lambda i: f"Company {i}").astype(object)
+    names[rng.random(rows) < 0.01] = None
+    vats = rng.integers(100000000, 999999999, companies)
+    values = vats[company].astype(float)
+    values[rng.random(rows) < 0.6] = np.nan
+    if kind == "int":
+        return pd.DataFrame({GROUP: names, VAT: vats[company], "row": np.arange(rows)})
+    if kind == "float":
+        values[rng.random(rows) < 0.01] = 12345678.0
+        return pd.DataFrame({GROUP: names, VAT: values, "row": np.arange(rows)})
+    mixed = values.astype(object)
+    pick = rng.random(rows)
+    strings = pick < 0.3
+    mixed[strings] = [f"{int(v)}" if v == v else None for v in values[strings]]
+    dirty = pick > 0.99
+    mixed[dirty] = rng.choice(["PT123456789", "12345678.0", "0123456789", "123456789.50", "n/a"], dirty.sum())
+    return pd.DataFrame({GROUP: names, VAT: mixed, "row": np.arange(rows)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=3000000, help="Rows for the timing run")
+    parser.add_argument("--check-rows", type=int, default=200000, help="Rows compared with the former implementation")
+    args = parser.parse_args()
+
+    failed = False
+    for kind in ("float", "object", "int"):
+        df = orbis_frame(args.check_rows, kind)
+        start = time.perf_counter()
+        expected = legacy_clean(legacy_propagate(df.copy()))
+        legacy_s = time.perf_counter() - start
+        start = time.perf_counter()
+        propagated = propagate_company_vat(df.copy(), GROUP, VAT)
+        actual = clean_vat(propagated, VAT)
+        new_s = time.perf_counter() - start
+        same_propagation = legacy_propagate(df.copy())[VAT].equals(propagated[VAT])
+        same = same_propagation and expected.equals(actual) and expected[VAT].dtype == actual[VAT].dtype
+        failed |= not same
+        print(
+            f"{kind:6s} {args.check_rows} rows: legacy {legacy_s:7.2f}s | vectorized {new_s:5.2f}s | "
+            f"{'identical' if same else 'DIFFERENT'} ({len(actual)} rows kept)"
+        )
+
+    df = orbis_frame(args.rows, "float")
+    start = time.perf_counter()
+    df = clean_vat(propagate_company_vat(df, GROUP, VAT), VAT)
+    print(f"float  {args.rows} rows: vectorized {time.perf_counter() - start:.2f}s ({len(df)} rows kept)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
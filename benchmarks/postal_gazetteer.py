@@ -0,0 +1,151 @@
+"""
+Postal code resolution of NifScraperSource (sources/postal_gazetteer.py).
+
+Checks the bundled CP4 table against the district/municipality lookup: every
+(district, municipality) pair must exist in DISTRICT_MUNICIPALITIES_DICT and
+every municipality there must own at least one CP4, and CP4s on district
+borders (KNOWN_CODES) must resolve to their municipality. Then resolves random
+postal codes (CP7 and bare CP4) with the compiled gazetteer and with the
+former first-matching regex over the two leading digits, which only gave a
+district, and reports codes per second and the CP4s whose district changed
+(the regexes put every CP4 of a two-digit prefix in one district).
+
+Usage:
+    uv run python benchmarks/postal_gazetteer.py [--codes 1000000]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sources.lookups.districts_municipalities import DISTRICT_MUNICIPALITIES_DICT  # noqa: E402
+from sources.lookups.postal_codes import POSTAL_CP4_BLOCKS  # noqa: E402
+from sources.postal_gazetteer import PostalGazetteer  # noqa: E402
+
+# The former sources/lookups/regex_postal_district.py
+REGEX_POSTAL_DISTRICT = {
+    r"^(10|11|12|13|14|15|16|17|18|19|26|27)": "Lisboa",
+    r"^(20|21|22|23)": "Santarem",
+    r"^(24|25|31)": "Leiria",
+    r"^(28|29|75)": "Setubal",
+    r"^(30|32|33|34)": "Coimbra",
+    r"^(35|36|51)": "Viseu",
+    r"^(37|38|45)": "Aveiro",
+    r"^(40|41|42|43|44|46)": "Porto",
+    r"^(47|48)": "Braga",
+    r"^(49)": "Viana do Castelo",
+    r"^(50|54)": "Vila Real",
+    r"^(52|53)": "Braganca",
+    r"^(60|61|62)": "Castelo Branco",
+    r"^(63|64)": "Guarda",
+    r"^(70|71|72)": "Evora",
+    r"^(73|74)": "Portalegre",
+    r"^(76|77|78|79)": "Beja",
+    r"^(80|81|82|83|84|85|86|87|88|89)": "Faro",
+    r"^(90|91|92|93|94)": "Regiao Autonoma da Madeira",
+    r"^(95|96|97|98|99)": "Regiao Autonoma dos Acores",
+}
+
+
+# CP4s whose municipality is not in the district of their two leading digits
+KNOWN_CODES = {
+    "1495": ("Lisboa", "Oeiras"),
+    "1675": ("Lisboa", "Odivelas"),
+    "1885": ("Lisboa", "Loures"),
+    "2050": ("Lisboa", "Azambuja"),
+    "2435": ("Santarem", "Ourem"),
+    "3050": ("Aveiro", "Mealhada"),
+    "3780": ("Aveiro", "Anadia"),
+    "4785": ("Porto", "Trofa"),
+}
+
+
+def regex_district(postal_code):
+    if not postal_code:
+        return None
+    for pattern, district in REGEX_POSTAL_DISTRICT.items():
+        if re.match(pattern, postal_code):
+            return district
+    return None
+
+
+def check_table():
+    known = {(district, m) for district, municipalities in DISTRICT_MUNICIPALITIES_DICT.items() for m in municipalities}
+    used = {(district, municipality) for _, district, municipality in POSTAL_CP4_BLOCKS if municipality}
+    return sorted(used - known), sorted(known - used)
+
+
+def used_blocks():
+    return [block for block in POSTAL_CP4_BLOCKS if block[2]]
+
+
+def timed(label, func, codes):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:6.2f}s  {len(codes) / elapsed / 1e6:6.2f} M codes/s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codes", type=int, default=1000000, help="Random postal codes to resolve")
+    args = parser.parse_args()
+
+    unknown, uncovered = check_table()
+    if unknown or uncovered:
+        print(f"FAIL: unknown pairs {unknown[:5]}, municipalities without a CP4 {uncovered[:5]}")
+        sys.exit(1)
+    print(f"OK: {len(used_blocks())} CP4 blocks covering all {sum(map(len, DISTRICT_MUNICIPALITIES_DICT.values()))} municipalities")
+
+    start = time.perf_counter()
+    gazetteer = PostalGazetteer()
+    print(f"compiled {len(gazetteer)} CP4s in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    wrong = {
+        cp4: gazetteer.resolve(f"{cp4}-001")
+        for cp4, place in KNOWN_CODES.items()
+        if gazetteer.resolve(f"{cp4}-001") != place
+    }
+    if wrong:
+        print(f"FAIL: border CP4s resolved to the wrong municipality: {wrong}")
+        sys.exit(1)
+    print(f"OK: {len(KNOWN_CODES)} border CP4s resolved to their municipality")
+
+    rng = random.Random(5)
+    cp4s = [cp4 for cp4 in range(1000, 10000) if gazetteer.resolve(f"{cp4}")[1] is not None]
+    codes = [
+        f"{rng.choice(cp4s)}-{rng.randint(0, 999):03d}" if rng.random() < 0.9 else f"{rng.choice(cp4s)}"
+        for _ in range(args.codes)
+    ]
+    legacy, legacy_s = timed("regexes (district only)", lambda: [regex_district(c) for c in codes], codes)
+    places, gazetteer_s = timed("gazetteer", lambda: [gazetteer.resolve(c) for c in codes], codes)
+    print(f"{'':<28} {legacy_s / gazetteer_s:.1f}x the regexes")
+
+    missing = sum(1 for district, municipality in places if municipality is None)
+    if missing:
+        print(f"FAIL: {missing} codes without a municipality")
+        sys.exit(1)
+
+    # Contiguous CP4 runs whose district differs from the regexes'
+    changed = []
+    for cp4 in range(1000, 10000):
+        code = f"{cp4}-000"
+        old, (new, municipality) = regex_district(code), gazetteer.resolve(code)
+        if old == new:
+            continue
+        if changed and changed[-1][1] == cp4 - 1 and changed[-1][2:] == [old, new, municipality]:
+            changed[-1][1] = cp4
+        else:
+            changed.append([cp4, cp4, old, new, municipality])
+    print(f"OK: every code resolved to a municipality; {sum(last - first + 1 for first, last, *_ in changed)} CP4s change district:")
+    for first, last, old, new, municipality in changed:
+        print(f"  {first}-{last}: {old} -> {new} ({municipality})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Correctness check of the stage hand-off (elt_core/stage_handoff.py) against
+an in-memory stand-in for CouchDB that rejects documents whose _id already
+exists, like _bulk_docs without a _rev.
+
+A source with an id_column is run twice into the same bronze database and
+its documents are read back by the next stage (get_documents, iter_documents):
+- the first run must be served from memory and match the stored documents,
+- the second run conflicts on every id; it must neither raise nor hand
+  downstream less than the database holds (the former hand-off either lost
+  the rejected documents or raised from wait()),
+- a run adding documents to a database that already held some must read
+  CouchDB, since the hand-off only holds what that run wrote,
+- a failed write to one database must be raised from save()/wait() of that
+  database only, not from the writes of an unrelated one.
+
+Usage:
+    uv run python benchmarks/stage_handoff.py [--docs 20000] [--batch 1500]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from elt_core.stage_handoff import StageHandoff  # noqa: E402
+
+STORES = {}
+# Databases whose writes fail as if CouchDB were unreachable
+FAILING = set()
+
+
+class MemoryCouch:
+    """The _bulk_docs, _all_docs and db info calls the hand-off uses, per URL."""
+
+    def __init__(self, url=None):
+        self.url = url
+        self.dbs = STORES.setdefault(url, {})
+        self.last_payload_bytes = 0
+        self.reads = 0
+
+    def _sanitize_for_json(self, obj):
+        return obj
+
+    def get_db_info(self, db_name):
+        return {"doc_count": len(self.dbs[db_name])} if db_name in self.dbs else None
+
+    def save_documents_bulk(self, db_name, docs, sanitize=True):
+        if db_name in FAILING:
+            raise ConnectionError(f"CouchDB unreachable for {db_name}")
+        db = self.dbs.setdefault(db_name, {})
+        self.last_payload_bytes = 100 * len(docs)
+        results = []
+        for doc in docs:
+            if doc["_id"] in db:
+                results.append({"id": doc["_id"], "error": "conflict", "reason": "Document update conflict."})
+                continue
+            db[doc["_id"]] = dict(doc)
+            results.append({"id": doc["_id"], "rev": "1-a"})
+        return results
+
+    def get_all_documents(self, db_name):
+        self.reads += 1
+        return [dict(doc) for doc in self.dbs.get(db_name, {}).values()]
+
+    def get_documents_page(self, db_name, startkey=None, limit=10000):
+        self.reads += 1
+        ids = sorted(doc_id for doc_id in self.dbs.get(db_name, {}) if startkey is None or doc_id >= startkey)
+        page = [dict(self.dbs[db_name][doc_id]) for doc_id in ids[:limit]]
+        return page, ids[limit] if len(ids) > limit else None
+
+
+def produce(handoff, couch, db_name, ids, batch, version):
+    for start in range(0, len(ids), batch):
+        handoff.save(couch, db_name, [{"_id": i, "version": version} for i in ids[start:start + batch]])
+
+
+def check(label, handoff, couch, db_name, expect_memory):
+    reads = couch.reads
+    docs = handoff.get_documents(couch, db_name)
+    stored = couch.dbs.get(db_name, {})
+    got = {doc["_id"]: {k: v for k, v in doc.items() if k != "_rev"} for doc in docs}
+    from_memory = couch.reads == reads
+    if got != stored or len(docs) != len(got):
+        print(f"FAIL: {label}: {len(got)} docs handed downstream, {len(stored)} stored")
+        sys.exit(1)
+    if from_memory != expect_memory:
+        print(f"FAIL: {label}: expected to read {'memory' if expect_memory else 'CouchDB'}")
+        sys.exit(1)
+    print(f"OK: {label}: {len(docs)} docs from {'memory' if from_memory else 'CouchDB'}, as stored")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1500)
+    args = parser.parse_args()
+
+    handoff = StageHandoff(enabled=True)
+    couch = MemoryCouch("memory://couch")
+    ids = [f"contract-{i:07d}" for i in range(args.docs)]
+
+    produce(handoff, couch, "contracts", ids, args.batch, version=1)
+    check("first run", handoff, couch, "contracts", expect_memory=True)
+
+    produce(handoff, couch, "contracts", ids, args.batch, version=2)
+    check("second run, every id conflicting", handoff, couch, "contracts", expect_memory=False)
+
+    more = [f"contract-{i:07d}" for i in range(args.docs, args.docs + args.batch)]
+    produce(handoff, couch, "contracts", more, args.batch, version=3)
+    batches = list(handoff.iter_documents(couch, "contracts", batch_size=args.batch))
+    count = sum(len(page) for page in batches)
+    if count != len(ids) + len(more):
+        print(f"FAIL: appending run: {count} docs iterated, {len(ids) + len(more)} stored")
+        sys.exit(1)
+    print(f"OK: appending run: {count} docs iterated from CouchDB, including earlier runs")
+
+    FAILING.add("orbis_bronze")
+    handoff.save(couch, "orbis_bronze", [{"_id": "orbis-1"}])
+    try:
+        produce(handoff, couch, "entities", ids[:args.batch * 2], args.batch, version=1)
+        handoff.wait("entities")
+        check("unrelated database", handoff, couch, "entities", expect_memory=True)
+    except RuntimeError as e:
+        print(f"FAIL: failed write to orbis_bronze raised for entities: {e}")
+        sys.exit(1)
+    try:
+        handoff.wait("orbis_bronze")
+    except RuntimeError as e:
+        print(f"OK: failed write raised from wait('orbis_bronze') only ({e.__cause__})")
+    else:
+        print("FAIL: failed write to orbis_bronze was never raised")
+        sys.exit(1)
+    handoff.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Time and memory benchmark of transformations.to_dict.
+
+Compares the former materialization (box the frame with astype(object) and
+where(), to_dict, then DBConnector's recursive sanitize walk) with the
+per-column materializer in elt_core/json_records.py, on a contracts-like frame
+with nested columns and on a wide numeric frame with missing values. Also
+checks that both produce the same documents.
+
+Usage:
+    uv run python benchmarks/to_dict.py [--rows 100000]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from benchmarks.contracts_transform import synthetic_contracts  # noqa: E402
+from elt_core.json_records import sanitize_for_json  # noqa: E402
+from elt_core.transformations import to_dict  # noqa: E402
+
+
+def legacy_to_dict(df):
+    df = df.astype(object).where(pd.notnull(df), None)
+    return sanitize_for_json(df.to_dict(orient="records"))
+
+
+def measure(func, df):
+    """Runs func twice: once timed, once under tracemalloc (which slows it down) for the peak."""
+    start = time.perf_counter()
+    result = func(df)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = func(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def numeric_frame(rows, seed=5):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(10):
+        values = rng.normal(size=rows)
+        values[rng.random(rows) < 0.2] = np.nan
+        data[f"value_{i}"] = values
+    for i in range(5):
+        data[f"count_{i}"] = rng.integers(0, 1000, rows)
+    data["flag"] = rng.random(rows) < 0.5
+    data["label"] = rng.choice(["a", "b", None], rows)
+    data["date"] = pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    return pd.DataFrame(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    frames = {
+        "contracts-like": pd.DataFrame(synthetic_contracts(args.rows)),
+        "wide numeric": numeric_frame(args.rows),
+    }
+    failed = False
+    for name, df in frames.items():
+        expected, legacy_s, legacy_peak = measure(legacy_to_dict, df)
+        actual, new_s, new_peak = measure(to_dict, df)
+        same = repr(expected) == repr(list(actual))
+        failed |= not same
+        print(
+            f"{name:15s} legacy {legacy_s:6.2f}s peak {legacy_peak / 2**20:7.1f}MB | "
+            f"per-column {new_s:6.2f}s peak {new_peak / 2**20:7.1f}MB | "
+            f"{legacy_s / new_s:4.1f}x faster | {'identical' if same else 'DIFFERENT'}"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
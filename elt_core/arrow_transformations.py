@@ -0,0 +1,478 @@
+"""
+pyarrow.compute counterparts of the pandas transformations in
+elt_core.transformations, for sources that opt into the Arrow engine.
+
+Data is held in a ColumnFrame: scalar columns become Arrow arrays, nested
+columns (lists of dicts such as contracted or execution_location) stay Python
+lists, since they are passed through or handled by the LocationEngine. The
+frame reproduces what the pandas path writes to silver:
+
+- integer columns with nulls become float64 (pandas turns them into NaN floats),
+- NaN and missing keys become None,
+- column order is the order in which keys first appear in the records.
+
+Lists built from sets in the pandas path (contract types, CPVs) are emitted in
+sorted order instead of hash order.
+"""
+import logging
+import math
+import re
+from itertools import compress
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from elt_core.dictionary_encoding import intern_list
+from elt_core.json_records import JsonRecords
+from elt_core.quarantine import (
+    REASON_ABOVE_MAX,
+    REASON_DATE_SEQUENCE,
+    REASON_MISSING_VALUES,
+    REASON_PRICE_ANOMALY,
+    REASON_TOO_MANY_CPVS,
+    get_quarantine,
+)
+from elt_core.step_metrics import instrumented_step
+
+Column = Union[pa.Array, List[Any]]
+
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+# pandas datetime64[ns] bounds: dates outside become NaT in convert_dates_to_iso
+_MIN_DATE, _MAX_DATE = "1677-09-22", "2262-04-11"
+
+
+def _log_step(logger: Optional[logging.Logger], step_name: str, initial_count: int, final_count: int):
+    if logger:
+        dropped = initial_count - final_count
+        logger.info(f"{step_name}: Dropped {dropped} rows. Remaining: {final_count} rows.")
+
+
+def _quarantine(logger: Optional[logging.Logger], frame: "ColumnFrame", keep, reason: str, step_name: str):
+    """Hands the rows outside keep to the quarantine (see transformations._quarantine)."""
+    quarantine = get_quarantine()
+    if not (quarantine.enabled and logger is not None):
+        return
+    if isinstance(keep, pa.Array):
+        keep = keep.fill_null(False).to_numpy(zero_copy_only=False)
+    rejected_mask = ~np.asarray(keep, dtype=bool)
+    if rejected_mask.any():
+        rejected = frame.filter(rejected_mask)
+        rows = pd.DataFrame({name: rejected.pylist(name) for name in rejected.columns}, index=np.flatnonzero(rejected_mask))
+        quarantine.reject(logger.name, rows, reason, step_name)
+
+
+def _to_arrow_column(values: List[Any]) -> Column:
+    """Arrow array for scalar columns pandas would hold natively; the Python list otherwise."""
+    first = next((v for v in values if v is not None), None)
+    if isinstance(first, (list, dict, tuple)):
+        return values
+    try:
+        array = pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError, TypeError):
+        return values
+    if pa.types.is_nested(array.type):
+        return values
+    if pa.types.is_integer(array.type) and array.null_count:
+        return array.cast(pa.float64())
+    return array
+
+
+def _bulk_types(records: List[Dict[str, Any]], names: List[str], sample_size: int) -> Dict[str, pa.DataType]:
+    """
+    Arrow types of the columns that can be converted in one C-level pass.
+    Integer columns are left out: an explicit int64 type would silently accept
+    2.0 where pandas infers float64, so they are inferred column by column.
+    """
+    sample = records[:sample_size]
+    types = {}
+    for name in names:
+        values = [record.get(name) for record in sample]
+        first = next((v for v in values if v is not None), None)
+        if first is None or isinstance(first, (list, dict, tuple)):
+            continue
+        try:
+            arrow_type = pa.array(values, from_pandas=True).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError, TypeError):
+            continue
+        if pa.types.is_string(arrow_type) or pa.types.is_floating(arrow_type) or pa.types.is_boolean(arrow_type):
+            types[name] = arrow_type
+    return types
+
+
+class ColumnFrame:
+    def __init__(self, columns: Dict[str, Column], num_rows: int):
+        self.columns = columns
+        self.num_rows = num_rows
+
+    def __len__(self):
+        return self.num_rows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @classmethod
+    def from_records(cls, records: Union[List[Dict[str, Any]], Dict[str, Any]], sample_size: int = 1000) -> "ColumnFrame":
+        """
+        Builds a frame from a list of dicts (e.g. bronze documents).
+        String, float and boolean columns are converted together by Arrow; if a
+        value later in the data does not fit the sampled type, every column is
+        inferred on its own.
+        """
+        if isinstance(records, dict):
+            records = [records]
+        names: Dict[str, None] = {}
+        for record in records:
+            for key in record:
+                if key not in names:
+                    names[key] = None
+
+        columns: Dict[str, Column] = {}
+        bulk_types = _bulk_types(records, list(names), sample_size)
+        if bulk_types:
+            try:
+                table = pa.Table.from_pylist(records, schema=pa.schema(list(bulk_types.items())))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError, TypeError):
+                table = None
+            if table is not None:
+                for name in bulk_types:
+                    array = table.column(name).combine_chunks()
+                    if pa.types.is_floating(array.type):
+                        # pandas treats NaN as missing
+                        array = pc.if_else(pc.is_nan(array), pa.scalar(None, array.type), array)
+                    columns[name] = array
+
+        for name in names:
+            if name not in columns:
+                columns[name] = _to_arrow_column([record.get(name) for record in records])
+        # Keep the order in which keys first appear
+        return cls({name: columns[name] for name in names}, len(records))
+
+    def series(self, name: str) -> pd.Series:
+        """A column as a pandas Series (for steps that fall back to pandas semantics)."""
+        column = self.columns[name]
+        if isinstance(column, pa.Array):
+            return column.to_pandas()
+        return pd.Series(column, dtype=object)
+
+    def pylist(self, name: str) -> List[Any]:
+        """A column as a Python list."""
+        column = self.columns[name]
+        return column.to_pylist() if isinstance(column, pa.Array) else column
+
+    def set(self, name: str, column: Union[Column, pd.Series]) -> None:
+        """Sets a column; an existing column keeps its position."""
+        if isinstance(column, pd.Series):
+            column = _to_arrow_column(column.tolist()) if column.dtype == object else pa.array(column, from_pandas=True)
+        self.columns[name] = column
+
+    def dictionary_encode(self, names: Iterable[str]) -> None:
+        """Dictionary-encodes the given string columns (low-cardinality fields)."""
+        for name in names:
+            column = self.columns.get(name)
+            if isinstance(column, pa.Array) and pa.types.is_string(column.type):
+                self.columns[name] = column.dictionary_encode()
+
+    def drop(self, name: str) -> None:
+        self.columns.pop(name, None)
+
+    def filter(self, mask: Union[pa.Array, np.ndarray]) -> "ColumnFrame":
+        """Keeps the rows where mask is true (nulls drop the row)."""
+        if isinstance(mask, pa.Array):
+            mask = mask.fill_null(False).to_numpy(zero_copy_only=False)
+        mask = np.asarray(mask, dtype=bool)
+        if mask.all():
+            return self
+        arrow_mask = pa.array(mask)
+        columns = {
+            name: column.filter(arrow_mask) if isinstance(column, pa.Array) else list(compress(column, mask))
+            for name, column in self.columns.items()
+        }
+        return ColumnFrame(columns, int(mask.sum()))
+
+    def is_valid(self, name: str) -> np.ndarray:
+        """Row mask of non-null values (None and NaN are null, as in pandas)."""
+        column = self.columns[name]
+        if isinstance(column, pa.Array):
+            return column.is_valid().to_numpy(zero_copy_only=False)
+        return np.fromiter(
+            (v is not None and not (isinstance(v, float) and math.isnan(v)) for v in column),
+            dtype=bool, count=len(column),
+        )
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        Materializes the frame as JSON-ready dicts (NaN -> None). Nested values
+        are passed through as they came from the (JSON) input records.
+        """
+        names = list(self.columns)
+        values = []
+        for column in self.columns.values():
+            if isinstance(column, pa.Array) and pa.types.is_dictionary(column.type):
+                values.append(_decode_shared(column))
+            elif isinstance(column, pa.Array) and pa.types.is_list(column.type) and pa.types.is_string(column.type.value_type):
+                values.append(_shared_lists(column))
+            elif isinstance(column, pa.Array):
+                values.append(column.to_pylist())
+            else:
+                values.append([None if isinstance(v, float) and math.isnan(v) else v for v in column])
+        if not names:
+            return JsonRecords({} for _ in range(self.num_rows))
+        return JsonRecords(dict(zip(names, row)) for row in zip(*values))
+
+
+def _decode_shared(column: pa.DictionaryArray) -> List[Any]:
+    """Decodes a dictionary array with one (interned) object per distinct value."""
+    dictionary = intern_list(column.dictionary.to_pylist())
+    return [None if i is None else dictionary[i] for i in column.indices.to_pylist()]
+
+
+def _shared_lists(column: pa.ListArray) -> List[Any]:
+    """list<string> to Python lists whose equal strings share one object."""
+    flat = column.flatten()
+    values = _decode_shared(flat.dictionary_encode()) if len(flat) else []
+    lengths = pc.list_value_length(column).fill_null(0).to_numpy(zero_copy_only=False)
+    valid = column.is_valid().to_numpy(zero_copy_only=False)
+    result, start = [], 0
+    for length, is_valid in zip(lengths.tolist(), valid.tolist()):
+        result.append(values[start:start + length] if is_valid else None)
+        start += length
+    return result
+
+
+# --- Transformations ---
+
+
+def _distinct_per_list(lists: pa.ListArray) -> pa.ListArray:
+    """Deduplicates the values inside every list (sorted within each list)."""
+    num_lists = len(lists)
+    flat = lists.flatten()
+    parents = pc.list_parent_indices(lists)
+    pairs = pa.table({"parent": parents, "value": flat}).group_by(["parent", "value"], use_threads=False).aggregate([])
+    pairs = pairs.sort_by([("parent", "ascending"), ("value", "ascending")])
+    counts = np.bincount(pairs.column("parent").to_numpy(), minlength=num_lists)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+    return pa.ListArray.from_arrays(pa.array(offsets), pairs.column("value").combine_chunks())
+
+
+def _iso_dates(values: pa.Array) -> pa.Array:
+    """YYYY-M-D strings to zero-padded YYYY-MM-DD, null when not a valid in-range date."""
+    parts = pc.extract_regex(values, r"^(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})$")
+    padded = pc.binary_join_element_wise(
+        pc.struct_field(parts, "y"),
+        pc.utf8_lpad(pc.struct_field(parts, "m"), 2, "0"),
+        pc.utf8_lpad(pc.struct_field(parts, "d"), 2, "0"),
+        "-",
+    )
+    parsed = pc.strptime(padded, format="%Y-%m-%d", unit="s", error_is_null=True)
+    # strptime rolls invalid days over (2019-02-30 -> 2019-03-02): require a round trip
+    valid = pc.and_(
+        pc.equal(pc.strftime(parsed, format="%Y-%m-%d"), padded),
+        pc.and_(pc.greater_equal(padded, _MIN_DATE), pc.less_equal(padded, _MAX_DATE)),
+    )
+    return pc.if_else(valid, padded, pa.scalar(None, pa.string()))
+
+
+@instrumented_step
+def convert_dates_to_iso(frame: ColumnFrame, columns: List[str], logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    """
+    Arrow version of transformations.convert_dates_to_iso.
+    String columns whose first value is a YYYY-MM-DD date are parsed in Arrow;
+    any other column uses pd.to_datetime, whose format inference it would follow.
+    """
+    for col in columns:
+        if col not in frame:
+            continue
+        column = frame.columns[col]
+        if isinstance(column, pa.Array) and pa.types.is_null(column.type):
+            continue
+        first = None
+        if isinstance(column, pa.Array) and pa.types.is_string(column.type):
+            valid = column.drop_null()
+            first = valid[0].as_py() if len(valid) else None
+        if first is not None and _ISO_DATE.fullmatch(first):
+            frame.set(col, _iso_dates(column))
+        else:
+            frame.set(col, pd.to_datetime(frame.series(col), errors="coerce").dt.strftime("%Y-%m-%d"))
+
+    if logger:
+        logger.info(f"Converted dates to ISO for columns: {columns}")
+    return frame
+
+
+@instrumented_step
+def transform_contract_type(frame: ColumnFrame, column: str, allowed_types: set, logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    """Splits contract types on <br/>, maps unknown types to "Outros Tipos" and deduplicates."""
+    if column in frame:
+        values = frame.columns[column]
+        if isinstance(values, pa.Array) and (pa.types.is_string(values.type) or pa.types.is_null(values.type)):
+            # pandas' astype(str) turns missing values into 'None'/'nan', which are not allowed types
+            values = values.cast(pa.string()).fill_null("None")
+        else:
+            values = pa.array([str(v) for v in frame.series(column).tolist()], pa.string())
+        types = pc.split_pattern(values, "<br/>")
+        flat = types.flatten()
+        mapped = pc.if_else(pc.is_in(flat, value_set=pa.array(list(allowed_types), pa.string())), flat, "Outros Tipos")
+        frame.set(column, _distinct_per_list(pa.ListArray.from_arrays(types.offsets, mapped)))
+        if logger:
+            logger.info(f"Transformed contract types in column: {column}")
+    return frame
+
+
+@instrumented_step
+def transform_cpvs(frame: ColumnFrame, column: str, max_length: int = 20, logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    """Splits CPVs on '|', keeps the code before '-', deduplicates and drops rows with too many CPVs."""
+    initial_count = len(frame)
+    if column in frame:
+        values = frame.columns[column]
+        if not (isinstance(values, pa.Array) and (pa.types.is_string(values.type) or pa.types.is_null(values.type))):
+            # Non-string values give an empty list, as in the pandas version
+            values = pa.array([v if isinstance(v, str) else None for v in frame.series(column).tolist()], pa.string())
+        values = values.cast(pa.string())
+        parts = pc.split_pattern(values.fill_null(""), "|")
+        flat = parts.flatten()
+        parents = pc.list_parent_indices(parts)
+        keep = pc.not_equal(flat, "")
+        flat, parents = flat.filter(keep), parents.filter(keep)
+        codes = pc.list_element(pc.split_pattern(flat, "-", max_splits=1), 0)
+        counts = np.bincount(parents.to_numpy(), minlength=len(values))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+        cpvs = _distinct_per_list(pa.ListArray.from_arrays(pa.array(offsets), codes))
+        frame.set(column, cpvs)
+        keep = pc.less_equal(pc.list_value_length(cpvs), max_length)
+        _quarantine(logger, frame, keep, REASON_TOO_MANY_CPVS, f"transform_cpvs {column} max_length={max_length}")
+        frame = frame.filter(keep)
+
+    _log_step(logger, f"Transform CPVs (max_len={max_length})", initial_count, len(frame))
+    return frame
+
+
+@instrumented_step
+def filter_dropna(frame: ColumnFrame, subset: List[str], logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    initial_count = len(frame)
+    if all(col in frame for col in subset):
+        mask = np.ones(len(frame), dtype=bool)
+        for col in subset:
+            mask &= frame.is_valid(col)
+        _quarantine(logger, frame, mask, REASON_MISSING_VALUES, f"filter_dropna {subset}")
+        frame = frame.filter(mask)
+    _log_step(logger, f"DropNA subset={subset}", initial_count, len(frame))
+    return frame
+
+
+def _numeric(frame: ColumnFrame, col: str) -> Union[pa.Array, pd.Series]:
+    column = frame.columns[col]
+    return column if isinstance(column, pa.Array) else frame.series(col)
+
+
+@instrumented_step
+def filter_max_value(frame: ColumnFrame, column: str, max_value: float, logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    initial_count = len(frame)
+    if column in frame:
+        values = _numeric(frame, column)
+        if isinstance(values, pa.Array) and pa.types.is_null(values.type):
+            mask = np.zeros(len(frame), dtype=bool)
+        elif isinstance(values, pa.Array):
+            mask = pc.less_equal(values, max_value)
+        else:
+            mask = (values <= max_value).to_numpy()
+        _quarantine(logger, frame, mask, REASON_ABOVE_MAX, f"filter_max_value {column} <= {max_value}")
+        frame = frame.filter(mask)
+    _log_step(logger, f"Filter Max Value {column} <= {max_value}", initial_count, len(frame))
+    return frame
+
+
+@instrumented_step
+def filter_price_anomalies(frame: ColumnFrame, initial_price_col: str, final_price_col: str, logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    """Removes rows where initial price is 0 and final price is missing, or initial price is negative."""
+    initial_count = len(frame)
+    if initial_price_col in frame and final_price_col in frame:
+        initial = _numeric(frame, initial_price_col)
+        if isinstance(initial, pa.Array) and not pa.types.is_null(initial.type):
+            zero = pc.equal(initial, 0).fill_null(False).to_numpy(zero_copy_only=False)
+            negative = pc.less(initial, 0).fill_null(False).to_numpy(zero_copy_only=False)
+        else:
+            initial = pd.Series(initial.to_pylist() if isinstance(initial, pa.Array) else initial, dtype=object)
+            zero, negative = (initial == 0).to_numpy(), (initial < 0).to_numpy()
+        final_missing = ~frame.is_valid(final_price_col)
+        keep = ~(zero & final_missing | negative)
+        _quarantine(logger, frame, keep, REASON_PRICE_ANOMALY, "filter_price_anomalies")
+        frame = frame.filter(keep)
+    _log_step(logger, "Filter Price Anomalies", initial_count, len(frame))
+    return frame
+
+
+@instrumented_step
+def filter_date_sequence(frame: ColumnFrame, start_date_col: str, end_date_col: str, logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    """Keeps rows where start_date_col >= end_date_col (ISO strings compare as dates)."""
+    initial_count = len(frame)
+    if start_date_col in frame and end_date_col in frame:
+        start, end = frame.columns[start_date_col], frame.columns[end_date_col]
+        if isinstance(start, pa.Array) and isinstance(end, pa.Array) and start.type == end.type == pa.string():
+            mask = pc.greater_equal(start, end)
+        else:
+            mask = (frame.series(start_date_col) >= frame.series(end_date_col)).to_numpy()
+        _quarantine(logger, frame, mask, REASON_DATE_SEQUENCE, f"filter_date_sequence {start_date_col} >= {end_date_col}")
+        frame = frame.filter(mask)
+    _log_step(logger, f"Filter Date Sequence {start_date_col} >= {end_date_col}", initial_count, len(frame))
+    return frame
+
+
+def list_lengths(frame: ColumnFrame, column: str) -> pa.Array:
+    """Length of list values (0 for anything that is not a list)."""
+    values = frame.columns[column]
+    if isinstance(values, pa.Array):
+        if pa.types.is_list(values.type):
+            return pc.list_value_length(values).fill_null(0)
+        return pa.array(np.zeros(len(values), dtype=np.int64))
+    return pa.array(np.fromiter((len(v) if isinstance(v, list) else 0 for v in values), dtype=np.int64, count=len(values)))
+
+
+@instrumented_step
+def fill_missing_from(frame: ColumnFrame, target: str, source: str, logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    """Where target is missing and source is not, copies source into target (df.loc[mask, target] = df[source])."""
+    mask = frame.is_valid(source) & ~frame.is_valid(target)
+    if not mask.any():
+        return frame
+    target_values, source_values = frame.columns[target], frame.columns[source]
+    if isinstance(target_values, pa.Array) and isinstance(source_values, pa.Array):
+        if pa.types.is_null(target_values.type):
+            # pandas fills an all-None object column with the source values as they are
+            target_values = target_values.cast(source_values.type)
+        elif target_values.type != source_values.type:
+            common = pa.float64() if all(
+                pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_null(t)
+                for t in (target_values.type, source_values.type)
+            ) else None
+            if common is None:
+                raise TypeError(f"Cannot fill {target} ({target_values.type}) from {source} ({source_values.type})")
+            target_values, source_values = target_values.cast(common), source_values.cast(common)
+        frame.set(target, pc.if_else(pa.array(mask), source_values, target_values))
+    else:
+        series = frame.series(target).astype(object)
+        series[mask] = frame.series(source)[mask]
+        frame.set(target, series)
+    return frame
+
+
+def map_column(frame: ColumnFrame, column: str, mapping: Dict[Any, Any]) -> pa.Array:
+    """Series.map(dict) over distinct values: unmapped values become None."""
+    values = frame.columns[column]
+    if not isinstance(values, pa.Array):
+        return pa.array([mapping.get(v) for v in values])
+    encoded = values if pa.types.is_dictionary(values.type) else values.dictionary_encode()
+    mapped = pa.array([mapping.get(v) for v in encoded.dictionary.to_pylist()])
+    if not pa.types.is_string(mapped.type):
+        return mapped.take(encoded.indices)
+    # Stays dictionary-encoded: only the distinct values are stored
+    return pa.DictionaryArray.from_arrays(encoded.indices, mapped)
+
+
+@instrumented_step
+def add_column(frame: ColumnFrame, column_name: str, value: Iterable[Any], logger: Optional[logging.Logger] = None) -> ColumnFrame:
+    frame.set(column_name, value)
+    if logger:
+        logger.info(f"Added column: {column_name}")
+    return frame
@@ -0,0 +1,258 @@
+# elt_core/async_http.py
+"""
+Minimal asyncio HTTP/1.1 client with per-host keep-alive connection pools.
+
+Built on asyncio streams only, so the scraping engine does not add a
+dependency. It covers what scraping nif.pt-like sites needs: GET requests,
+http and https, keep-alive, Content-Length, chunked and read-until-close
+bodies, and relative/absolute redirects. It does not negotiate compression.
+
+Each (scheme, host, port) has its own pool: at most `max_per_host`
+connections, idle ones reused (LIFO) until `idle_timeout`. A request that
+fails on a reused connection (the server closed it meanwhile) is retried once
+on a fresh connection.
+
+Usage:
+    client = AsyncHTTPClient(headers={"User-Agent": "..."})
+    response = await client.get("https://www.nif.pt/?q=500000000")
+    await client.close()
+"""
+import asyncio
+import ssl
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+DEFAULT_TIMEOUT = 30.0
+MAX_REDIRECTS = 5
+
+
+class HTTPError(Exception):
+    """Connection, protocol or timeout error of a request (no HTTP response)."""
+
+
+class Response:
+    __slots__ = ("status", "reason", "headers", "body", "url")
+
+    def __init__(self, status: int, reason: str, headers: Dict[str, str], body: bytes, url: str):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    @property
+    def text(self) -> str:
+        charset = "utf-8"
+        content_type = self.headers.get("content-type", "")
+        if "charset=" in content_type:
+            charset = content_type.split("charset=", 1)[1].split(";")[0].strip() or charset
+        return self.body.decode(charset, errors="replace")
+
+    def __repr__(self):
+        return f"<Response {self.status} {self.url}>"
+
+
+class _Connection:
+    __slots__ = ("reader", "writer", "last_used", "requests")
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    def close(self) -> None:
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class HostPool:
+    def __init__(self, scheme: str, host: str, port: int, max_connections: int, idle_timeout: float, ssl_context):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl_context
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(max_connections)
+        self.opened = 0
+        self.reused = 0
+
+    async def acquire(self, timeout: float) -> Tuple[_Connection, bool]:
+        """A pooled (reused=True) or new connection; waits while the host is at max_connections."""
+        await self._slots.acquire()
+        try:
+            now = time.monotonic()
+            while self._idle:
+                conn = self._idle.pop()
+                if now - conn.last_used < self.idle_timeout and not conn.reader.at_eof():
+                    self.reused += 1
+                    return conn, True
+                conn.close()
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host, self.port,
+                    ssl=self.ssl_context if self.scheme == "https" else None,
+                    server_hostname=self.host if self.scheme == "https" else None,
+                ),
+                timeout,
+            )
+            self.opened += 1
+            return _Connection(reader, writer), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: _Connection, reusable: bool) -> None:
+        if reusable:
+            conn.last_used = time.monotonic()
+            self._idle.append(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self) -> None:
+        for conn in self._idle:
+            conn.close()
+        self._idle.clear()
+
+
+class AsyncHTTPClient:
+    def __init__(
+        self,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_per_host: int = 32,
+        idle_timeout: float = 30.0,
+        verify_ssl: bool = True,
+    ):
+        """
+        Args:
+            headers: Default request headers
+            timeout: Seconds for connecting and for the whole response
+            max_per_host: Open connections per host (requests beyond wait)
+            idle_timeout: Seconds an idle connection is kept for reuse
+            verify_ssl: Verify server certificates
+        """
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.ssl_context = ssl.create_default_context()
+        if not verify_ssl:
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+        self._pools: Dict[Tuple[str, str, int], HostPool] = {}
+
+    def pool(self, scheme: str, host: str, port: int) -> HostPool:
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = HostPool(scheme, host, port, self.max_per_host, self.idle_timeout, self.ssl_context)
+        return pool
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Opened and reused connections per host."""
+        return {
+            f"{scheme}://{host}:{port}": {"opened": pool.opened, "reused": pool.reused, "idle": len(pool._idle)}
+            for (scheme, host, port), pool in self._pools.items()
+        }
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        """GET url, following redirects. Raises HTTPError when no response is received."""
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._request("GET", url, headers)
+            if response.status in (301, 302, 303, 307, 308) and "location" in response.headers:
+                url = urljoin(url, response.headers["location"])
+                continue
+            return response
+        raise HTTPError(f"Too many redirects for {url}")
+
+    async def _request(self, method: str, url: str, headers: Optional[Dict[str, str]]) -> Response:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        if scheme not in ("http", "https"):
+            raise HTTPError(f"Unsupported URL scheme: {url}")
+        host = parts.hostname or ""
+        port = parts.port or (443 if scheme == "https" else 80)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        host_header = host if parts.port is None else f"{host}:{parts.port}"
+        request_headers = {"Host": host_header, "Connection": "keep-alive", **self.headers, **(headers or {})}
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items()) + "\r\n"
+
+        pool = self.pool(scheme, host, port)
+        for attempt in range(2):
+            try:
+                conn, reused = await pool.acquire(self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                raise HTTPError(f"Could not connect to {host}:{port}: {e!r}") from e
+            try:
+                conn.writer.write(head.encode("latin-1"))
+                status, reason, response_headers, body, keep_alive = await asyncio.wait_for(
+                    self._read_response(conn.reader, method), self.timeout
+                )
+            except (OSError, asyncio.IncompleteReadError, ConnectionError) as e:
+                pool.release(conn, reusable=False)
+                if reused and attempt == 0:
+                    # Stale keep-alive connection: retry once on a new one
+                    continue
+                raise HTTPError(f"{method} {url} failed: {e!r}") from e
+            except asyncio.TimeoutError as e:
+                pool.release(conn, reusable=False)
+                raise HTTPError(f"{method} {url} timed out after {self.timeout}s") from e
+            except BaseException:
+                pool.release(conn, reusable=False)
+                raise
+            conn.requests += 1
+            pool.release(conn, reusable=keep_alive)
+            return Response(status, reason, response_headers, body, url)
+        raise HTTPError(f"{method} {url} failed on a fresh connection")
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader, method: str):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before the status line")
+        try:
+            version, status, *reason = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+            status = int(status)
+        except ValueError as e:
+            raise ConnectionError(f"Malformed status line: {status_line!r}") from e
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, reason[0] if reason else "", headers, body, keep_alive
+
+    async def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
@@ -4,16 +4,40 @@ import os
 import json
 import csv
 import datetime
+import time
 from pathlib import Path
-import pandas as pd
-import pyarrow.dataset as ds
+
+from elt_core.incremental_gold import GoldCheckpoints, IncrementalGoldBuilder
+from elt_core.memory_governor import get_memory_governor
+from elt_core.stage_handoff import get_stage_handoff
+from elt_core.db_connector import DocumentConflict
+from elt_core.json_records import JsonRecords
+from elt_core.step_metrics import get_step_metrics
+from elt_core.work_queue import LeaseQueue, LeaseKeeper
 
 class BaseDataSource(ABC):
+    # Sources whose transform only looks at one row at a time can be split into
+    # bronze id ranges and transformed by independent workers (see coordinate/run_worker)
+    supports_partitioning = False
+    # Saved batches are handed to the next stage in memory and persisted in the
+    # background; sources whose writes are progress checkpoints turn this off
+    use_stage_handoff = True
+    # Silver databases a gold builder reads, in the order transform() takes
+    # them; builders that list them are built incrementally (see run_incremental)
+    gold_inputs = ()
+    # Gold keys that are not the input document's own _id are tracked in '<source>_deps'
+    tracks_gold_dependencies = False
+
     def __init__(self, db_connector, file_path=None, id_column=None):
         self.file_path = Path(file_path) if file_path else None
         self.db_connector = db_connector
         self.id_column = id_column
         self.logger = self._setup_logger()
+        self.memory_governor = get_memory_governor()
+        self.stage_handoff = get_stage_handoff()
+        # Set by run_worker while it processes a partition (its start key), so
+        # the partition's silver rows get deterministic ids and are overwritten
+        self._partition_key = None
 
     def _setup_logger(self):
         """
@@ -54,17 +78,20 @@ class BaseDataSource(ABC):
         """
         pass
 
-    def _prepare_documents(self, items):
+    def _prepare_documents(self, items, id_prefix=None, offset=0):
         """
         Prepares a list of items for saving to the database.
-        - Sets _id from id_column if present.
+        - Sets _id from id_column if present, otherwise (with id_prefix) to
+          '<id_prefix>:<row number>', row numbers starting at offset.
         - Removes _rev to avoid conflicts.
         """
         docs_batch = []
-        for item in items:
+        for row, item in enumerate(items, start=offset):
             doc = item.copy()
             if self.id_column and self.id_column in doc:
                 doc['_id'] = str(doc[self.id_column])
+            elif id_prefix is not None and '_id' not in doc:
+                doc['_id'] = f"{id_prefix}:{row:07d}"
             
             # Remove _rev if present to avoid conflicts when saving to a new database
             if '_rev' in doc:
@@ -73,46 +100,94 @@ class BaseDataSource(ABC):
             docs_batch.append(doc)
         return docs_batch
 
-    def _save_in_batches(self, items, db_name, batch_size=5000):
+    def _save_in_batches(self, items, db_name, batch_size=5000, handoff=True, id_prefix=None, overwrite=False):
         """
         Prepares and saves items to the database in batches.
+        batch_size is the starting size; the memory governor adapts it to the
+        encoded size of the documents.
+        With handoff, batches are kept for the next stage of this process and
+        written by the background persister; otherwise they are saved before returning.
+        id_prefix gives rows without an id_column value deterministic ids (see
+        _prepare_documents); with overwrite, documents that already exist are
+        replaced over their current _rev instead of conflicting.
         """
         if isinstance(items, dict):
             items = [items]
-            
-        total = len(items)
-        for i in range(0, total, batch_size):
-            batch = items[i:i + batch_size]
-            docs_batch = self._prepare_documents(batch)
-            self.db_connector.save_documents_bulk(db_name, docs_batch)
+
+        use_handoff = handoff and self.use_stage_handoff and self.stage_handoff.enabled
+        # Records from transformations.to_dict are already JSON-ready
+        sanitize = not isinstance(items, JsonRecords)
+        offset = 0
+        for batch in self.memory_governor.iter_batches(items, db_name, batch_size):
+            docs_batch = self._prepare_documents(batch, id_prefix=id_prefix, offset=offset)
+            offset += len(batch)
+            if overwrite:
+                revs = self.db_connector.get_revs(db_name, [doc['_id'] for doc in docs_batch if '_id' in doc])
+                for doc in docs_batch:
+                    if doc.get('_id') in revs:
+                        doc['_rev'] = revs[doc['_id']]
+            if use_handoff:
+                self.stage_handoff.save(self.db_connector, db_name, docs_batch, sanitize=sanitize)
+                continue
+            self.db_connector.save_documents_bulk(db_name, docs_batch, sanitize=sanitize)
+            self.memory_governor.observe(db_name, len(docs_batch), self.db_connector.last_payload_bytes)
             print(f"Saved batch of {len(docs_batch)} docs to '{db_name}'")
 
     def extract(self, batch_size=5000):
         """
         Yields batches of data from the file.
         Supports JSON, CSV, and Parquet.
+        batch_size is the starting size; the memory governor resizes batches
+        between yields (the key is shared with the bronze database, whose saves
+        report the encoded size of each document).
         """
         if not self.file_path.exists():
             raise FileNotFoundError(f"File not found: {self.file_path}")
 
+        # File readers are only needed by sources that extract from files
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
         ext = self.file_path.suffix.lower()
+        key = f"{self.source_name}_bronze"
+        governor = self.memory_governor
         
         if ext == '.json':
             with self.file_path.open('r') as f:
                 data = json.load(f)
                 if isinstance(data, list):
-                    for i in range(0, len(data), batch_size):
-                        yield data[i:i + batch_size]
+                    yield from governor.iter_batches(data, key, batch_size)
                 else:
                     yield [data]
         elif ext == '.csv':
-            for chunk in pd.read_csv(self.file_path, chunksize=batch_size):
-                yield chunk.to_dict(orient='records')
+            with pd.read_csv(self.file_path, iterator=True) as reader:
+                while True:
+                    try:
+                        chunk = reader.get_chunk(governor.batch_size(key, batch_size))
+                    except StopIteration:
+                        break
+                    yield chunk.to_dict(orient='records')
         elif ext == '.parquet':
             dataset = ds.dataset(self.file_path)
-            for batch in dataset.to_batches(batch_size=batch_size):
-                # pyarrow batch to python list of dicts
-                yield batch.to_pylist()
+            # Scan in small record batches and regroup them to the governed size
+            # at the Arrow level, so only the yielded slice is turned into dicts
+            buffered, buffered_rows = [], 0
+            for batch in dataset.to_batches(batch_size=1024):
+                buffered.append(batch)
+                buffered_rows += batch.num_rows
+                size = governor.batch_size(key, batch_size)
+                if buffered_rows < size:
+                    continue
+                table = pa.Table.from_batches(buffered)
+                while table.num_rows >= size:
+                    # pyarrow batch to python list of dicts
+                    yield table.slice(0, size).to_pylist()
+                    table = table.slice(size)
+                    size = governor.batch_size(key, batch_size)
+                buffered, buffered_rows = table.to_batches(), table.num_rows
+            if buffered_rows:
+                yield pa.Table.from_batches(buffered).to_pylist()
         else:
             raise ValueError(f"Unsupported file extension: {ext}")
 
@@ -136,19 +211,211 @@ class BaseDataSource(ABC):
         Saves a batch of transformed data to the 'silver' database.
         """
         db_name = f"{self.source_name}_silver"
-        self._save_in_batches(transformed_batch_data, db_name, batch_size)
+        partitioned = self._partition_key is not None
+        self._save_in_batches(
+            transformed_batch_data, db_name, batch_size, id_prefix=self._partition_key, overwrite=partitioned
+        )
 
     def get_data(self, stage):
         """
         Fetches all documents from the specified stage (bronze, silver, gold).
+        If this process just wrote that stage, its output is taken from memory.
         """
         db_name = f"{self.source_name}_{stage}"
         print(f"Fetching all documents from {db_name}...")
-        return self.db_connector.get_all_documents(db_name)
+        return self.stage_handoff.get_documents(self.db_connector, db_name)
+
+    def iter_data(self, stage, batch_size=5000):
+        """
+        Yields the documents of a stage in batches sized by the memory governor,
+        taken from memory like get_data() or fetched from CouchDB one batch at a time.
+        """
+        db_name = f"{self.source_name}_{stage}"
+        print(f"Fetching documents from {db_name} in batches...")
+        return self.stage_handoff.iter_documents(self.db_connector, db_name, batch_size)
+
+    def report_step_metrics(self):
+        """
+        Logs the per-step transformation table of this run (rows in/out, time,
+        memory, changed dtypes per step) and returns its rows. The next call
+        reports the steps run after this one.
+        """
+        metrics = get_step_metrics()
+        rows = metrics.table(self.source_name)
+        if rows:
+            self.logger.info(metrics.format_table(self.source_name, rows))
+        metrics.reset(self.source_name)
+        return rows
 
     @abstractmethod
     def run(self):
         """
         Abstract method to run the pipeline.
         """
-        pass
\ No newline at end of file
+        pass
+
+    # ------------------------------------------------------------------
+    # Distributed bronze -> silver transformation
+    # ------------------------------------------------------------------
+
+    @property
+    def transform_queue_db(self):
+        return f"{self.source_name}_transform_queue"
+
+    def coordinate(self, partition_size=20000, run_id=None):
+        """
+        Splits the bronze database into contiguous id ranges and registers one
+        pending work item per range in '<source>_transform_queue'.
+        Partitions already registered for the same run_id are kept as they are,
+        so re-running the coordinator after a crash is safe.
+        Returns the number of newly registered partitions.
+        """
+        if not self.supports_partitioning:
+            raise ValueError(f"{self.source_name} does not support partitioned transformation")
+
+        run_id = run_id or datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        bronze_db = f"{self.source_name}_bronze"
+        ids = self.db_connector.get_all_ids(bronze_db)
+        self.logger.info(f"Partitioning {len(ids)} bronze docs of {bronze_db} into ranges of {partition_size}")
+
+        partitions = []
+        for number, start in enumerate(range(0, len(ids), partition_size)):
+            chunk = ids[start:start + partition_size]
+            partitions.append({
+                "_id": f"{run_id}:{number:06d}",
+                "run_id": run_id,
+                "source": self.source_name,
+                "startkey": chunk[0],
+                "endkey": chunk[-1],
+                "size": len(chunk),
+            })
+
+        queue = LeaseQueue(self.db_connector, self.transform_queue_db)
+        queue.ensure_indexes()
+        inserted = queue.register(partitions)
+        self.logger.info(f"Registered {inserted} partitions for run {run_id} in {self.transform_queue_db}")
+        return inserted
+
+    def process_partition(self, bronze_docs):
+        """
+        Transforms one partition of bronze documents and loads it to silver.
+        Sources with extra per-row side effects (e.g. queueing NIFs) override this.
+        Returns the number of silver documents written.
+        """
+        clean_data = self.transform(bronze_docs)
+        self.load_silver(clean_data)
+        return len(clean_data)
+
+    def run_worker(self, worker_id=None, lease_seconds=600, poll_interval=10, wait=False, max_attempts=3):
+        """
+        Claims partitions from '<source>_transform_queue' until none are left
+        (or forever with wait=True), transforming each one while a background
+        thread keeps its lease alive. A crashed worker's partitions are
+        re-issued to other workers once their lease expires.
+
+        Re-processed partitions overwrite the silver documents of the earlier
+        attempt: rows are keyed by the id_column or, without one, by the
+        partition's start key and the row number, and are saved over the
+        current revision of those ids.
+        """
+        queue = LeaseQueue(
+            self.db_connector, self.transform_queue_db,
+            worker_id=worker_id, lease_seconds=lease_seconds, max_attempts=max_attempts,
+        )
+        queue.ensure_indexes()
+        # A partition may only be marked done once its silver docs are stored
+        self.use_stage_handoff = False
+        self.logger.info(f"Worker {queue.worker_id} consuming {self.transform_queue_db}")
+        bronze_db = f"{self.source_name}_bronze"
+        processed = 0
+
+        while True:
+            claimed = queue.claim(limit=1)
+            if not claimed:
+                if not wait:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            partition = claimed[0]
+            self.logger.info(
+                f"Claimed partition {partition['_id']} ({partition['startkey']}..{partition['endkey']}, "
+                f"attempt {partition['attempts']})"
+            )
+            with LeaseKeeper(queue, partition) as keeper:
+                try:
+                    bronze_docs = self.db_connector.get_documents_range(
+                        bronze_db, partition['startkey'], partition['endkey']
+                    )
+                    self._partition_key = partition['startkey']
+                    written = self.process_partition(bronze_docs)
+                    self.report_step_metrics()
+                    error = None
+                except Exception as e:
+                    self.logger.error(f"Partition {partition['_id']} failed: {e}")
+                    error = str(e)
+                finally:
+                    self._partition_key = None
+
+            if keeper.lost:
+                self.logger.warning(f"Lease on {partition['_id']} was lost; leaving it to its new owner")
+                continue
+            try:
+                if error is None:
+                    queue.complete(keeper.doc, silver_docs=written)
+                    processed += 1
+                else:
+                    queue.fail(keeper.doc, error)
+            except DocumentConflict:
+                self.logger.warning(f"Lease on {partition['_id']} expired before it could be released")
+
+        self.logger.info(f"Worker {queue.worker_id} finished after {processed} partitions")
+        return processed
+
+    # ------------------------------------------------------------------
+    # Incremental gold builds
+    # ------------------------------------------------------------------
+
+    @property
+    def incremental_gold(self):
+        """Whether run() applies silver changes instead of rebuilding (GOLD_INCREMENTAL)."""
+        return bool(self.gold_inputs) and os.getenv("GOLD_INCREMENTAL", "on").lower() not in ("off", "false", "0", "no")
+
+    def gold_keys(self, input_db, doc):
+        """
+        Gold keys a silver document of input_db contributes to.
+        By default the gold document shares the silver document's _id.
+        """
+        return [doc['_id']]
+
+    def gold_ids(self, keys):
+        """
+        Ids of the gold documents currently built for the keys (those not built
+        again are deleted). By default the keys are the gold ids.
+        """
+        return keys
+
+    def build_gold(self, inputs):
+        """Gold documents of the input documents behind some keys ({input db: docs})."""
+        return self.transform(*(inputs[db_name] for db_name in self.gold_inputs))
+
+    def run_incremental(self, batch_size=5000, page_size=10000):
+        """
+        Rebuilds only the gold documents whose inputs changed since the last
+        run, reading the _changes feed of each of gold_inputs from its own
+        checkpoint (see elt_core/incremental_gold.py). The first run is a full build.
+        Returns the counts of the run.
+        """
+        # Silver batches of this process still being written must be in the feeds;
+        # their in-memory copies are not read from here on and are released
+        for db_name in self.gold_inputs:
+            self.stage_handoff.wait(db_name)
+            self.stage_handoff.take(db_name)
+        builder = IncrementalGoldBuilder(self, batch_size=batch_size, page_size=page_size)
+        counts = builder.run()
+        self.logger.info(f"Incremental build of {self.source_name} from {', '.join(self.gold_inputs)}: {counts}")
+        return counts
+
+    def reset_gold_checkpoints(self):
+        """Forgets the input checkpoints, so the next incremental run rebuilds everything."""
+        GoldCheckpoints(self.db_connector, self.source_name).reset()
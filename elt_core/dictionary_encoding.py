@@ -0,0 +1,111 @@
+# elt_core/dictionary_encoding.py
+"""
+Dictionary encoding of low-cardinality fields.
+
+Contract fields such as procedure_type, contract_type, procurement_method and
+the location levels (country, district, municipality) take a few hundred
+distinct values over millions of contracts, but every row used to carry its
+own str object. This module keeps one object per distinct value:
+
+- pandas: scalar columns become `category` columns (codes + one categories
+  array); maps on them only touch the categories,
+- Arrow: string columns become dictionary arrays and are decoded by taking
+  from the decoded dictionary, so records share the value objects,
+- Python records (gold and graph stages, which read documents back from
+  CouchDB or the stage hand-off): values are interned with sys.intern.
+"""
+import sys
+from typing import Any, Dict, Iterable, List, Sequence
+
+from elt_core.step_metrics import instrumented_step
+
+LOW_CARDINALITY_FIELDS = ("procedure_type", "contract_type", "procurement_method")
+LOCATION_FIELDS = ("country", "district", "municipality")
+# List-of-dict columns whose items carry location fields
+LOCATION_COLUMNS = ("execution_location",)
+
+
+def intern_value(value: Any) -> Any:
+    """The interned string for str values; anything else unchanged."""
+    return sys.intern(value) if type(value) is str else value
+
+
+def intern_list(values: Iterable[Any]) -> List[Any]:
+    return [sys.intern(v) if type(v) is str else v for v in values]
+
+
+def intern_records(
+    records: Iterable[Dict[str, Any]],
+    fields: Sequence[str] = LOW_CARDINALITY_FIELDS,
+    nested: Sequence[str] = LOCATION_COLUMNS,
+    nested_fields: Sequence[str] = LOCATION_FIELDS,
+) -> None:
+    """
+    Interns the low-cardinality values of records in place.
+
+    Args:
+        records: Documents
+        fields: Top-level fields (str values or lists of str)
+        nested: List-of-dict fields whose items are interned too
+        nested_fields: Fields interned inside the nested items
+    """
+    intern = sys.intern
+    for record in records:
+        for field in fields:
+            value = record.get(field)
+            if type(value) is str:
+                record[field] = intern(value)
+            elif type(value) is list:
+                record[field] = [intern(v) if type(v) is str else v for v in value]
+        for field in nested:
+            items = record.get(field)
+            if type(items) is not list:
+                continue
+            for item in items:
+                if type(item) is dict:
+                    for key in nested_fields:
+                        value = item.get(key)
+                        if type(value) is str:
+                            item[key] = intern(value)
+
+
+@instrumented_step
+def encode_categories(df, columns: Sequence[str] = LOW_CARDINALITY_FIELDS, logger=None):
+    """
+    Converts scalar string columns to pandas categoricals.
+
+    Columns holding lists or dicts (e.g. contract_type after the type split)
+    and numeric columns are left as they are.
+    """
+    import pandas as pd
+
+    encoded = []
+    for column in columns:
+        if column not in df.columns or df[column].dtype != object:
+            continue
+        if pd.api.types.infer_dtype(df[column], skipna=True) not in ("string", "empty"):
+            continue
+        df[column] = pd.Categorical(df[column])
+        encoded.append(column)
+    if logger and encoded:
+        logger.info(f"Dictionary-encoded columns: {encoded}")
+    return df
+
+
+def intern_object_array(values):
+    """
+    Makes equal strings of a 1-D object array share one object (in place),
+    through one factorize pass. Arrays holding non-string values are left as
+    they are, since factorize treats e.g. 1 and 1.0 as equal.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+    if not all(type(u) is str for u in uniques):
+        return values
+    interned = np.empty(len(uniques), dtype=object)
+    interned[:] = intern_list(uniques)
+    present = codes >= 0
+    values[present] = interned[codes[present]]
+    return values
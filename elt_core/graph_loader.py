@@ -6,11 +6,16 @@ import time
 import traceback
 from pathlib import Path
 
-from neo4j import GraphDatabase
 from typing import Callable, Dict, List, Any
 
+import ujson
+
+from elt_core.dictionary_encoding import intern_records
+from elt_core.memory_governor import get_memory_governor
 from elt_core.neo4j_queries import generate_batch_merge_nodes_query
 from elt_core.neo4j_queries import generate_batch_merge_relationships_query
+from elt_core.stage_handoff import get_stage_handoff
+from elt_core.telemetry import get_telemetry
 
 # Configure logging for the pipeline
 # Create logs directory
@@ -52,9 +57,15 @@ class GraphLoader:
             neo4j_uri: Neo4j connection URI (e.g., "bolt://localhost:7687")
             neo4j_auth: Tuple of (username, password)
         """
+        # Imported here so that only the graph stage pays for the driver
+        from neo4j import GraphDatabase
+
         self.connector = db_connector
         self.driver = GraphDatabase.driver(neo4j_uri, auth=neo4j_auth)
         self.logger = logging.getLogger("GraphLoader")
+        self.memory_governor = get_memory_governor()
+        self.stage_handoff = get_stage_handoff()
+        self.telemetry = get_telemetry()
         
         # Track validation errors for review
         self.validation_errors = []
@@ -65,6 +76,27 @@ class GraphLoader:
             self.driver.close()
             self.logger.info("Neo4j driver connection closed")
     
+    def _run_query(self, session, query: str, params: Dict = None, operation: str = "cypher", target: str = "-") -> List:
+        """
+        Run a Cypher query, consume its records and record a telemetry span
+        (operation, label/relationship type, latency, parameter bytes, outcome).
+
+        Records are consumed inside the span because the driver streams them lazily.
+        The bytes of an UNWIND batch are estimated from its first row, so the
+        batch is not serialized a second time just for the span.
+        """
+        with self.telemetry.span("neo4j", operation, target) as span:
+            if params:
+                batch = params.get("batch")
+                if isinstance(batch, list):
+                    span["items"] = len(batch)
+                    span["bytes_out"] = len(ujson.dumps(batch[0], default=str)) * len(batch) if batch else 0
+                else:
+                    span["bytes_out"] = len(ujson.dumps(params, default=str))
+            records = list(session.run(query, params or {}))
+            span["records"] = len(records)
+            return records
+
     def init_neo4j_schema(self, constraints_file: str = 'constraints.cypher'):
         """
         Initialize Neo4j schema by creating constraints and indexes.
@@ -110,7 +142,7 @@ class GraphLoader:
         with self.driver.session() as session:
             for statement in statements:
                 try:
-                    session.run(statement)
+                    self._run_query(session, statement, operation="schema")
                     # Extract constraint name for logging
                     if 'CONSTRAINT' in statement:
                         parts = statement.split()
@@ -136,20 +168,18 @@ class GraphLoader:
         Args:
             couch_db_name: Name of the CouchDB database to sync
             doc_mapper_func: Function that maps raw docs to graph entities
-            batch_size: Number of documents to process in each batch (default: 1000)
+            batch_size: Initial number of documents per batch (default: 1000),
+                adapted by the memory governor as the sync progresses
         """
         
-        # A. FETCH: Use your custom connector to get the list of dicts
-        self.logger.info(f"Fetching all documents from {couch_db_name}...")
-        fetch_start = time.time()
-        try:
-            all_docs = self.connector.get_all_documents(couch_db_name)
-        except Exception as e:
-            self.logger.error(f"Failed to fetch docs from {couch_db_name}: {e}")
-            return
-        fetch_time = time.time() - fetch_start
-
-        self.logger.info(f"Fetched {len(all_docs)} documents in {fetch_time:.2f}s. Starting batch processing...")
+        # A. FETCH: Take the gold docs handed off by a builder in this process,
+        # otherwise page through CouchDB one governed batch at a time
+        self.logger.info(f"Fetching documents from {couch_db_name} in batches...")
+        governor_key = f"graph:{couch_db_name}"
+        info = self.connector.get_db_info(couch_db_name) or {}
+        expected_docs = info.get('doc_count', 0)
+        batches = self.stage_handoff.iter_documents(self.connector, couch_db_name, batch_size, key=governor_key)
+        fetch_time = 0
 
         # Reset error tracking
         self.validation_errors = []
@@ -166,12 +196,27 @@ class GraphLoader:
         total_rel_insert_time = 0
         
         # Process documents in batches
-        total_batches = (len(all_docs) + batch_size - 1) // batch_size
         batch_start_time = time.time()
+        current_batch_num = 0
         
-        for batch_idx in range(0, len(all_docs), batch_size):
-            batch = all_docs[batch_idx:batch_idx + batch_size]
-            current_batch_num = (batch_idx // batch_size) + 1
+        while True:
+            fetch_start = time.time()
+            self.connector.last_response_bytes = 0
+            try:
+                batch = next(batches, None)
+            except Exception as e:
+                self.logger.error(f"Failed to fetch docs from {couch_db_name}: {e}")
+                return
+            fetch_time += time.time() - fetch_start
+            if batch is None:
+                break
+            intern_records(batch)
+            # Encoded bytes per fetched doc, used as the payload estimate of the batch
+            if self.connector.last_response_bytes:
+                fetched_doc_bytes = self.connector.last_response_bytes / len(batch)
+            else:
+                fetched_doc_bytes = self.memory_governor.doc_bytes(couch_db_name) or 0
+            current_batch_num += 1
             
             # Accumulators for this batch
             batch_entities = {}
@@ -233,6 +278,9 @@ class GraphLoader:
                 total_relationships_created += batch_rels
             rel_insert_time = time.time() - rel_insert_start
             total_rel_insert_time += rel_insert_time
+
+            # Adapt the next batch size to the memory actually in use
+            self.memory_governor.observe(governor_key, len(batch), int(fetched_doc_bytes * len(batch)))
             
             # Update statistics
             total_docs_processed += batch_success
@@ -241,13 +289,14 @@ class GraphLoader:
             # Calculate rates
             elapsed = time.time() - batch_start_time
             docs_per_sec = total_docs_processed / elapsed if elapsed > 0 else 0
-            eta_seconds = (len(all_docs) - total_docs_processed) / docs_per_sec if docs_per_sec > 0 else 0
+            remaining = max(expected_docs - total_docs_processed, 0)
+            eta_seconds = remaining / docs_per_sec if docs_per_sec > 0 else 0
             eta_mins = eta_seconds / 60
             
             # Progress log message with timing breakdown
             self.logger.info(
-                f"Batch {current_batch_num}/{total_batches} | "
-                f"Docs: {total_docs_processed}/{len(all_docs)} ({docs_per_sec:.1f}/s) | "
+                f"Batch {current_batch_num} ({len(batch)} docs) | "
+                f"Docs: {total_docs_processed}/{expected_docs} ({docs_per_sec:.1f}/s) | "
                 f"Nodes: {total_nodes_created} | Rels: {total_relationships_created} | "
                 f"Errors: {total_docs_failed} | "
                 f"Time: V={validation_time:.1f}s N={node_insert_time:.1f}s R={rel_insert_time:.1f}s | "
@@ -258,7 +307,7 @@ class GraphLoader:
         
         # Summary with timing breakdown
         self.logger.info(f"Sync complete for {couch_db_name}.")
-        self.logger.info(f"  Documents processed: {total_docs_processed}/{len(all_docs)}")
+        self.logger.info(f"  Documents processed: {total_docs_processed}/{expected_docs}")
         self.logger.info(f"  Documents failed: {total_docs_failed}")
         self.logger.info(f"  Total nodes created: {total_nodes_created}")
         self.logger.info(f"  Total relationships created: {total_relationships_created}")
@@ -321,8 +370,8 @@ class GraphLoader:
                 
                 # Execute in Neo4j session
                 with self.driver.session() as session:
-                    result = session.run(query, params)
-                    record = result.single()
+                    records = self._run_query(session, query, params, operation="merge_nodes", target=label)
+                    record = records[0] if records else None
                     created_count = record['created_count'] if record else len(unique_items)
                     total_created += created_count
                     
@@ -366,8 +415,9 @@ class GraphLoader:
             total_created = 0
             with self.driver.session() as session:
                 for query, params in queries:
-                    result = session.run(query, params)
-                    record = result.single()
+                    rel_type = params["batch"][0]["rel_type"] if params["batch"] else "-"
+                    records = self._run_query(session, query, params, operation="merge_relationships", target=rel_type)
+                    record = records[0] if records else None
                     created_count = record['created_count'] if record else 0
                     total_created += created_count
             
@@ -391,5 +441,5 @@ class GraphLoader:
             Query results
         """
         with self.driver.session() as session:
-            result = session.run(query, parameters or {})
-            return [record.data() for record in result]
\ No newline at end of file
+            records = self._run_query(session, query, parameters, operation="execute_cypher")
+            return [record.data() for record in records]
\ No newline at end of file
@@ -0,0 +1,156 @@
+# elt_core/html_cache.py
+"""
+Content-addressed on-disk cache of fetched HTML pages.
+
+Every page the NIF scraper receives is kept, so that parser fixes can be
+applied to what was already downloaded (`NifScraperSource.reparse`) instead
+of scraping the site again. Layout under the cache directory:
+
+- objects/<2 hex>/<sha256>.html.gz: gzip-compressed page bodies named by the
+  SHA-256 of their content. Identical pages (e.g. the same "invalid NIF"
+  page) are stored once; blobs are written to a temporary file and renamed,
+  so a reader never sees a partial blob.
+- index.jsonl: one line per fetch, appended as it happens:
+  {"key": <NIF>, "fetched_at": <UTC ISO timestamp>, "sha256": ..., "bytes": ...,
+   "url": ..., "meta": {...}}. A key fetched several times has several
+  lines; `latest()` returns the most recent fetch per key.
+
+Configuration (environment variables):
+    NIF_HTML_CACHE        on | off (default: on)
+    NIF_HTML_CACHE_DIR    Cache directory (default: data/html_cache/nif)
+"""
+import datetime
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import ujson
+
+DEFAULT_DIR = "data/html_cache/nif"
+INDEX_FILE = "index.jsonl"
+
+
+class HtmlCache:
+    def __init__(self, directory: Optional[str] = None, enabled: Optional[bool] = None, compresslevel: int = 6):
+        """
+        Args:
+            directory: Cache directory (default: NIF_HTML_CACHE_DIR)
+            enabled: Store fetched pages (default: unless NIF_HTML_CACHE=off)
+            compresslevel: gzip level of stored pages
+        """
+        if enabled is None:
+            enabled = os.getenv("NIF_HTML_CACHE", "on").lower() not in ("off", "0", "false")
+        self.enabled = enabled
+        self.directory = Path(directory or os.getenv("NIF_HTML_CACHE_DIR", DEFAULT_DIR))
+        self.compresslevel = compresslevel
+        self._lock = threading.Lock()
+        self._index_file = None
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / INDEX_FILE
+
+    def blob_path(self, digest: str) -> Path:
+        return self.directory / "objects" / digest[:2] / f"{digest}.html.gz"
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def put(
+        self,
+        key: str,
+        content: str,
+        url: Optional[str] = None,
+        fetched_at: Optional[str] = None,
+        **meta: Any,
+    ) -> Optional[str]:
+        """
+        Stores a fetched page and records the fetch in the index.
+
+        Args:
+            key: Cache key (the NIF)
+            content: Page text
+            url: Fetched URL
+            fetched_at: UTC ISO timestamp of the fetch (default: now)
+            **meta: Extra fields kept with the fetch (e.g. the queued description)
+
+        Returns:
+            SHA-256 of the page, or None when the cache is disabled
+        """
+        if not self.enabled:
+            return None
+        body = content.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # mtime=0 keeps the compressed bytes identical for identical pages
+            data = gzip.compress(body, compresslevel=self.compresslevel, mtime=0)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+        entry = {
+            "key": key,
+            "fetched_at": fetched_at or datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "sha256": digest,
+            "bytes": len(body),
+            "url": url,
+            "meta": meta,
+        }
+        line = ujson.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._index_file is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._index_file = open(self.index_path, "a", encoding="utf-8", buffering=1)
+            self._index_file.write(line)
+        return digest
+
+    def close(self) -> None:
+        with self._lock:
+            if self._index_file is not None:
+                self._index_file.close()
+                self._index_file = None
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def get(self, digest: str) -> str:
+        """Text of a stored page."""
+        with open(self.blob_path(digest), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
+
+    def entries(self) -> Iterator[Dict[str, Any]]:
+        """Every recorded fetch, in the order they were appended (a torn last line is skipped)."""
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield ujson.loads(line)
+                except ValueError:
+                    continue
+
+    def latest(self, keys: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Most recent fetch per key (restricted to keys if given)."""
+        wanted = set(keys) if keys is not None else None
+        latest: Dict[str, Dict[str, Any]] = {}
+        for entry in self.entries():
+            key = entry.get("key")
+            if wanted is not None and key not in wanted:
+                continue
+            current = latest.get(key)
+            if current is None or entry["fetched_at"] >= current["fetched_at"]:
+                latest[key] = entry
+        return latest
@@ -0,0 +1,349 @@
+# elt_core/incremental_gold.py
+"""
+Incremental gold builds from the _changes feed of their silver inputs.
+
+A gold builder (BaseDataSource with `gold_inputs`) maps every input document
+to the gold keys it contributes to (`gold_keys`): a contract to its own id, an
+Orbis row to its UCI, a PEP record to the person's name. An incremental run
+reads each input's changes since that input's checkpoint, turns the changed
+documents into affected keys and rebuilds only those keys from all the input
+documents behind them:
+
+    silver change -> affected gold keys -> input docs of those keys
+                  -> transform() -> upsert/delete of the changed gold docs
+
+Checkpoints are kept per builder and per input in `gold_checkpoints` (one
+document per builder: {"_id": "orbis_gold", "inputs": {"orbis_dm_silver":
+<seq>, "orbis_sh_silver": <seq>}}), so a builder with several inputs resumes
+each feed where it stopped. A checkpoint only moves after the gold documents
+of its page of changes are written, so a crash re-processes that page. Gold
+writes that lose a _rev race are re-read and retried; if some still conflict,
+the checkpoint stays before that page and the next run re-processes it. A
+builder without any checkpoint runs one full build instead: it transforms all
+silver documents as run() does, writes only the gold documents that differ
+from the stored ones (deleting those no longer built) and starts every feed at
+the update_seq its input had before it was read.
+
+When a key is not the input document's own _id, the keys each input document
+contributed to are tracked in `<gold>_deps` ({"_id": "<input db>:<doc id>",
+"keys": [...]}, with a view from key to input document). A changed document
+then affects its old keys as well as its new ones, and a key is rebuilt from
+exactly the documents that map to it.
+"""
+import logging
+import time
+from typing import Any, Dict, Iterable, List
+
+from elt_core.db_connector import DocumentConflict
+from elt_core.json_records import sanitize_for_json
+
+logger = logging.getLogger("IncrementalGold")
+
+CHECKPOINT_DB = "gold_checkpoints"
+
+DEPS_DESIGN_DOC = {
+    "_id": "_design/deps",
+    "language": "javascript",
+    "views": {
+        "by_key": {
+            "map": "function (doc) { if (doc.keys) { for (var i = 0; i < doc.keys.length; i++) "
+                   "{ emit(doc.keys[i], [doc.input, doc.input_id]); } } }",
+        }
+    },
+}
+
+
+class GoldCheckpoints:
+    def __init__(self, db_connector, builder: str, db_name: str = CHECKPOINT_DB, max_retries: int = 5):
+        """
+        Args:
+            db_connector: DBConnector instance
+            builder: Gold database the checkpoints belong to (the document _id)
+            db_name: Database of the checkpoint documents (created if missing)
+            max_retries: Conflicting writes of a checkpoint before giving up
+        """
+        self.db_connector = db_connector
+        self.builder = builder
+        self.db_name = db_name
+        self.max_retries = max_retries
+        db_connector.get_or_create_db(db_name)
+
+    def get(self) -> Dict[str, Any]:
+        """Update sequence processed so far per input database (missing: nothing yet)."""
+        doc = self.db_connector.get_document(self.db_name, self.builder) or {}
+        return dict(doc.get("inputs") or {})
+
+    def set(self, seqs: Dict[str, Any]) -> None:
+        """Stores the sequences of some inputs, keeping the other inputs' checkpoints."""
+        for _ in range(self.max_retries):
+            doc = self.db_connector.get_document(self.db_name, self.builder) or {"_id": self.builder}
+            doc["inputs"] = {**(doc.get("inputs") or {}), **seqs}
+            doc["updated_at"] = time.time()
+            try:
+                self.db_connector.put_document(self.db_name, doc)
+                return
+            except DocumentConflict:
+                continue
+        raise DocumentConflict(f"Could not store the checkpoints of {self.builder}")
+
+    def reset(self) -> None:
+        """Drops all checkpoints of the builder, so its next run is a full build."""
+        doc = self.db_connector.get_document(self.db_name, self.builder)
+        if doc is not None:
+            self.db_connector.save_documents_bulk(self.db_name, [{"_id": doc["_id"], "_rev": doc["_rev"], "_deleted": True}])
+
+
+class GoldDependencies:
+    def __init__(self, db_connector, db_name: str):
+        """
+        Args:
+            db_connector: DBConnector instance
+            db_name: Database of the dependency documents (created if missing)
+        """
+        self.db_connector = db_connector
+        self.db_name = db_name
+        db_connector.ensure_design_document(db_name, DEPS_DESIGN_DOC)
+
+    @staticmethod
+    def _dep_id(input_db: str, doc_id: str) -> str:
+        return f"{input_db}:{doc_id}"
+
+    def all_stored(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Every dependency document, by input database and input document id."""
+        stored: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for doc in self.db_connector.get_all_documents(self.db_name):
+            if not doc["_id"].startswith("_design/"):
+                stored.setdefault(doc["input"], {})[doc["input_id"]] = doc
+        return stored
+
+    def stored(self, input_db: str, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Dependency documents of the given input documents, by input document id."""
+        dep_ids = [self._dep_id(input_db, doc_id) for doc_id in ids]
+        return {doc["input_id"]: doc for doc in self.db_connector.get_documents_by_ids(self.db_name, dep_ids)}
+
+    def ids_for(self, keys: Iterable[str]) -> Dict[str, set]:
+        """Input document ids that map to any of the keys, by input database."""
+        ids: Dict[str, set] = {}
+        for row in self.db_connector.query_view(self.db_name, "deps", "by_key", keys=list(keys)):
+            input_db, doc_id = row["value"]
+            ids.setdefault(input_db, set()).add(doc_id)
+        return ids
+
+    def update(self, input_db: str, keys_by_id: Dict[str, List[str]], stored: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Records the keys of each input document (no keys: its dependency
+        document is removed). `stored` holds the current dependency documents.
+        """
+        docs = []
+        for doc_id, keys in keys_by_id.items():
+            old = stored.get(doc_id)
+            if old is not None and old.get("keys") == keys:
+                continue
+            if keys:
+                doc = {"_id": self._dep_id(input_db, doc_id), "input": input_db, "input_id": doc_id, "keys": keys}
+            elif old is not None:
+                doc = {"_id": old["_id"], "_deleted": True}
+            else:
+                continue
+            if old is not None:
+                doc["_rev"] = old["_rev"]
+            docs.append(doc)
+        for start in range(0, len(docs), 5000):
+            for r in self.db_connector.save_documents_bulk(self.db_name, docs[start:start + 5000]):
+                if r.get("error"):
+                    logger.warning(f"Could not update dependency {r.get('id')} in {self.db_name}: {r.get('error')} {r.get('reason')}")
+
+
+class IncrementalGoldBuilder:
+    def __init__(self, source, batch_size: int = 5000, page_size: int = 10000, max_retries: int = 3):
+        """
+        Args:
+            source: Gold builder (BaseDataSource with gold_inputs)
+            batch_size: Gold keys rebuilt per transform() call
+            page_size: Changes read per request (the unit of a checkpoint)
+            max_retries: Times conflicting gold writes are re-read and retried
+        """
+        self.source = source
+        self.db_connector = source.db_connector
+        self.gold_db = source.source_name
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.max_retries = max_retries
+        self.checkpoints = GoldCheckpoints(self.db_connector, self.gold_db)
+        self.deps = GoldDependencies(self.db_connector, f"{self.gold_db}_deps") if source.tracks_gold_dependencies else None
+        self.db_connector.get_or_create_db(self.gold_db)
+
+    def run(self) -> Dict[str, int]:
+        """
+        Applies the changes of every input since its checkpoint.
+        Returns counts of changed input documents, affected keys and gold
+        documents inserted, updated, deleted, unchanged and still conflicting
+        after the retries.
+        """
+        counts = {"changes": 0, "keys": 0, "inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0, "conflicts": 0}
+        checkpoints = self.checkpoints.get()
+        if not any(input_db in checkpoints for input_db in self.source.gold_inputs):
+            checkpoints = self._full_build(counts)
+            if counts["conflicts"]:
+                logger.warning(f"{counts['conflicts']} gold documents of {self.gold_db} conflicted; the next run builds in full again")
+                return counts
+            self.checkpoints.set(checkpoints)
+        for input_db in self.source.gold_inputs:
+            since = checkpoints.get(input_db)
+            while True:
+                page, last_seq = self.db_connector.get_changes(input_db, since=since, limit=self.page_size)
+                rows = [row for row in page if not row["id"].startswith("_design/")]
+                if rows:
+                    counts["changes"] += len(rows)
+                    conflicts = self._apply(input_db, rows, counts)
+                    if conflicts:
+                        logger.warning(
+                            f"{conflicts} gold documents of {self.gold_db} conflicted; "
+                            f"{input_db} stays at its checkpoint for the next run"
+                        )
+                        break
+                if last_seq is not None and last_seq != since:
+                    self.checkpoints.set({input_db: last_seq})
+                    since = last_seq
+                # A short page is the end of the feed; no extra empty request
+                if len(page) < self.page_size:
+                    break
+        return counts
+
+    def _full_build(self, counts: Dict[str, int]) -> Dict[str, Any]:
+        """
+        Builds every gold document from all input documents and returns the
+        update sequences the inputs had before they were read.
+        """
+        seqs, inputs = {}, {}
+        for input_db in self.source.gold_inputs:
+            info = self.db_connector.get_db_info(input_db)
+            if info is None:
+                inputs[input_db] = []
+                continue
+            seqs[input_db] = info.get("update_seq")
+            inputs[input_db] = [
+                doc for doc in self.db_connector.get_all_documents(input_db) if not doc["_id"].startswith("_design/")
+            ]
+            counts["changes"] += len(inputs[input_db])
+        if self.deps is not None:
+            stored = self.deps.all_stored()
+            for input_db, docs in inputs.items():
+                keys_by_id = {doc_id: [] for doc_id in stored.get(input_db, {})}
+                keys_by_id.update((doc["_id"], sorted(set(self.source.gold_keys(input_db, doc)))) for doc in docs)
+                self.deps.update(input_db, keys_by_id, stored.get(input_db, {}))
+        built = self._built(self.source.build_gold(inputs))
+        counts["keys"] += len(built)
+        stored = {
+            doc["_id"]: doc for doc in self.db_connector.get_all_documents(self.gold_db)
+            if not doc["_id"].startswith("_design/")
+        }
+        self._write(built, stored, counts)
+        return seqs
+
+    def _apply(self, input_db: str, rows: List[Dict[str, Any]], counts: Dict[str, int]) -> int:
+        """
+        Rebuilds the keys affected by one page of changes of input_db.
+        Returns the number of gold documents still conflicting after the retries.
+        """
+        changed_ids = [row["id"] for row in rows]
+        docs = {doc["_id"]: doc for doc in self.db_connector.get_documents_by_ids(input_db, changed_ids)}
+        new_keys = {
+            doc_id: sorted(set(self.source.gold_keys(input_db, docs[doc_id]))) if doc_id in docs else []
+            for doc_id in changed_ids
+        }
+        affected = {key for keys in new_keys.values() for key in keys}
+        stored = {}
+        if self.deps is not None:
+            stored = self.deps.stored(input_db, changed_ids)
+            affected.update(key for dep in stored.values() for key in dep.get("keys") or ())
+        else:
+            affected.update(changed_ids)
+        keys = sorted(affected)
+        counts["keys"] += len(keys)
+        conflicts = 0
+        for start in range(0, len(keys), self.batch_size):
+            conflicts += self._rebuild(keys[start:start + self.batch_size], input_db, new_keys, counts)
+        # A page that is re-processed must still find the keys its documents had
+        if self.deps is not None and not conflicts:
+            self.deps.update(input_db, new_keys, stored)
+        return conflicts
+
+    def _input_ids(self, keys: List[str], changed_db: str, new_keys: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Input document ids behind the keys, with the page's changes applied over the recorded dependencies."""
+        if self.deps is None:
+            return {input_db: list(keys) for input_db in self.source.gold_inputs}
+        ids = self.deps.ids_for(keys)
+        wanted = set(keys)
+        changed = ids.setdefault(changed_db, set())
+        for doc_id, doc_keys in new_keys.items():
+            if wanted.intersection(doc_keys):
+                changed.add(doc_id)
+            else:
+                changed.discard(doc_id)
+        return {input_db: sorted(ids.get(input_db, ())) for input_db in self.source.gold_inputs}
+
+    def _rebuild(self, keys: List[str], changed_db: str, new_keys: Dict[str, List[str]], counts: Dict[str, int]) -> int:
+        inputs = {
+            input_db: self.db_connector.get_documents_by_ids(input_db, ids) if ids else []
+            for input_db, ids in self._input_ids(keys, changed_db, new_keys).items()
+        }
+        built = self._built(self.source.build_gold(inputs))
+        current_ids = set(self.source.gold_ids(keys)) | set(built)
+        stored = {doc["_id"]: doc for doc in self.db_connector.get_documents_by_ids(self.gold_db, current_ids)}
+        return self._write(built, stored, counts)
+
+    @staticmethod
+    def _built(docs: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        built = {}
+        for doc in docs:
+            doc = sanitize_for_json({k: v for k, v in doc.items() if k != "_rev"})
+            built[doc["_id"]] = doc
+        return built
+
+    def _write(self, built: Dict[str, Dict[str, Any]], stored: Dict[str, Dict[str, Any]], counts: Dict[str, int]) -> int:
+        """
+        Writes the built documents that differ from the stored ones and deletes
+        the stored ones not built. Documents whose write conflicts are re-read
+        and written again up to max_retries times.
+        Returns (and counts) the documents still conflicting.
+        """
+        conflicts = self._write_once(built, stored, counts)
+        for _ in range(self.max_retries):
+            if not conflicts:
+                break
+            # Counted on the first attempt already; only the conflicting ones are written again
+            current = {doc["_id"]: doc for doc in self.db_connector.get_documents_by_ids(self.gold_db, conflicts)}
+            conflicts = self._write_once(
+                {doc_id: built[doc_id] for doc_id in conflicts if doc_id in built},
+                {doc_id: current[doc_id] for doc_id in conflicts if doc_id in current},
+                dict.fromkeys(counts, 0),
+            )
+        counts["conflicts"] += len(conflicts)
+        return len(conflicts)
+
+    def _write_once(self, built: Dict[str, Dict[str, Any]], stored: Dict[str, Dict[str, Any]], counts: Dict[str, int]) -> List[str]:
+        """One _bulk_docs pass of _write. Returns the ids whose write conflicted."""
+        writes = []
+        for doc_id, doc in built.items():
+            old = stored.get(doc_id)
+            if old is None:
+                counts["inserted"] += 1
+                writes.append(doc)
+            elif {k: v for k, v in old.items() if k != "_rev"} == doc:
+                counts["unchanged"] += 1
+            else:
+                counts["updated"] += 1
+                writes.append({**doc, "_rev": old["_rev"]})
+        for doc_id, old in stored.items():
+            if doc_id not in built:
+                counts["deleted"] += 1
+                writes.append({"_id": doc_id, "_rev": old["_rev"], "_deleted": True})
+        conflicts = []
+        for start in range(0, len(writes), self.batch_size):
+            for r in self.db_connector.save_documents_bulk(self.gold_db, writes[start:start + self.batch_size], sanitize=False):
+                if r.get("error") == "conflict":
+                    conflicts.append(r["id"])
+                elif r.get("error"):
+                    logger.warning(f"Could not write {r.get('id')} to {self.gold_db}: {r.get('error')} {r.get('reason')}")
+        return conflicts
@@ -0,0 +1,106 @@
+# elt_core/json_records.py
+"""
+Materialization of DataFrames as JSON-ready records.
+
+`transformations.to_dict` used to box the whole frame into objects
+(`df.astype(object).where(pd.notnull(df), None)`) before `to_dict`, and
+`DBConnector` then walked every value again to replace NaN and numpy types.
+Here each column is converted on its own according to its dtype:
+
+- bool/int columns: `tolist()` already yields Python values,
+- float columns: `tolist()` plus None at the NaN positions,
+- datetime columns: ISO strings, None for NaT,
+- object columns: None where pandas sees a missing value; only cells that are
+  not plain JSON values (lists, dicts, numpy scalars, dates) are sanitized.
+
+The result is a JsonRecords list, which DBConnector and the stage hand-off
+recognise as already sanitized.
+"""
+import datetime
+from typing import Any, Dict, List
+
+import ujson
+
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+class JsonRecords(list):
+    """A list of dicts whose values are already JSON-ready (no NaN, numpy or date objects)."""
+
+
+def _sanitizer():
+    # Imported here so that connecting to CouchDB does not pay for numpy
+    import numpy as np
+
+    def _sanitize(obj):
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        if isinstance(obj, (np.integer, np.floating)):
+            val = obj.item()
+            if isinstance(val, float) and np.isnan(val):
+                return None
+            return val
+        if isinstance(obj, float) and np.isnan(obj):
+            return None
+        if isinstance(obj, (datetime.date, datetime.datetime)):
+            return obj.isoformat()
+        if isinstance(obj, dict):
+            return {k: _sanitize(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [_sanitize(i) for i in obj]
+        return obj
+
+    return _sanitize
+
+
+def sanitize_for_json(obj: Any) -> Any:
+    """
+    Recursively convert numpy types to Python types for JSON serialization.
+    NaN becomes None and dates become ISO strings.
+    """
+    return _sanitizer()(obj)
+
+
+def column_values(series) -> List[Any]:
+    """JSON-ready Python values of one column (None for missing values)."""
+    import numpy as np
+
+    kind = series.dtype.kind
+    if kind in "biu":
+        return series.tolist()
+    if kind == "f":
+        values = series.tolist()
+        for i in np.flatnonzero(np.isnan(series.to_numpy())):
+            values[i] = None
+        return values
+    if kind == "M":
+        return [None if v is None or v != v else v.isoformat() for v in series.tolist()]
+
+    # Object and extension dtypes
+    values = series.tolist() if kind == "O" else series.astype(object).tolist()
+    for i in np.flatnonzero(series.isna().to_numpy()):
+        values[i] = None
+    sanitize = _sanitizer()
+    for i, value in enumerate(values):
+        if type(value) not in _JSON_SCALARS:
+            values[i] = sanitize(value)
+    return values
+
+
+def records_from_frame(df) -> JsonRecords:
+    """
+    Converts a DataFrame to a list of JSON-ready dicts, one per row,
+    with keys in column order.
+    """
+    names = list(df.columns)
+    if not names:
+        return JsonRecords({} for _ in range(len(df)))
+    columns = [column_values(series) for _, series in df.items()]
+    return JsonRecords(dict(zip(names, row)) for row in zip(*columns))
+
+
+def encode_records(records: List[Dict[str, Any]]) -> bytes:
+    """Encodes records as a JSON array; records that are not JsonRecords are sanitized first."""
+    if not isinstance(records, JsonRecords):
+        records = sanitize_for_json(records)
+    return ujson.dumps(records, ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,195 @@
+# elt_core/location_engine.py
+"""
+Fused columnar normalization of nested location lists.
+
+Replaces the chain
+
+    normalize_locations -> enrich_location_from_municipality
+    -> enrich_location_from_district -> map_location_fixes (country, district,
+    municipality) -> drop locations without country and district
+
+which walked and copied every location dict seven times. The engine explodes
+all location dicts of a column once into flat object arrays (one per level),
+applies every step as a vectorized join against lookup tables prebuilt from the
+lookup dictionaries, and re-nests the result once.
+
+Joins factorize a level's values, resolve only the distinct values against the
+lookup table and broadcast the result back through the codes, so each step
+costs one hash pass plus a dict lookup per distinct value.
+
+The output is identical to the chain above, including the order of keys added
+to a location. The only difference: non-dict entries inside a location list,
+on which the old final filter raised, are dropped.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from elt_core.dictionary_encoding import intern_object_array
+
+LEVELS = ("country", "district", "municipality")
+
+_MISSING = object()
+
+
+def _object_array(values: List[Any]) -> np.ndarray:
+    """1-D object array without numpy trying to broadcast nested sequences."""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _join(values: np.ndarray, table: Dict[Any, Any]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Joins values against a lookup table.
+
+    Returns:
+        (hit mask, codes, looked-up value per distinct value); the looked-up
+        value of row i is ``mapped[codes[i]]``. Missing values never match.
+    """
+    codes, uniques = pd.factorize(values)
+    hit = np.zeros(len(uniques) + 1, dtype=bool)
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    for i, value in enumerate(uniques):
+        if value in table:
+            hit[i] = True
+            mapped[i] = table[value]
+    # Code -1 (None/NaN) indexes the trailing slot, which never matches
+    return hit[codes], codes, mapped
+
+
+class LocationEngine:
+    def __init__(
+        self,
+        countries: Iterable[str],
+        municipality_lookup: Dict[str, Any],
+        district_lookup: Dict[str, Any],
+        country_changes: Dict[str, Any],
+        district_changes: Dict[str, Any],
+        municipality_changes: Dict[str, Any],
+    ):
+        """
+        Args:
+            countries: Country names that may appear in the district or municipality field
+            municipality_lookup: {municipality: (country, district) or "AMBIGUOUS"}
+            district_lookup: {portuguese district: [...]}; only the keys are used
+            country_changes / district_changes / municipality_changes: rename maps per level
+        """
+        self.countries = {country: country for country in countries}
+        # Only unambiguous municipalities back-propagate
+        self.municipality_country = {}
+        self.municipality_district = {}
+        for municipality, match in municipality_lookup.items():
+            if match and match != "AMBIGUOUS":
+                self.municipality_country[municipality], self.municipality_district[municipality] = match
+        self.portuguese_districts = {district: "Portugal" for district in district_lookup}
+        self.changes = {
+            "country": dict(country_changes),
+            "district": dict(district_changes),
+            "municipality": dict(municipality_changes),
+        }
+
+    def transform(self, column_values: Iterable[Any], drop_empty: bool = True) -> List[Any]:
+        """
+        Normalizes every location list of a column.
+
+        Args:
+            column_values: Column values; non-list values are returned unchanged
+            drop_empty: Drop locations that end up without country and district
+
+        Returns:
+            New list of column values (input dicts are not modified)
+        """
+        column_values = list(column_values)
+
+        # Explode: one entry per location dict
+        rows: List[int] = []
+        locations: List[Dict[str, Any]] = []
+        for row, value in enumerate(column_values):
+            if isinstance(value, list):
+                for loc in value:
+                    if isinstance(loc, dict):
+                        rows.append(row)
+                        locations.append(loc)
+
+        n = len(locations)
+        has, vals = {}, {}
+        for level in LEVELS:
+            values = _object_array([loc.get(level, _MISSING) for loc in locations])
+            missing = values == _MISSING
+            values[missing] = None
+            has[level], vals[level] = ~missing, values
+        country, district, municipality = vals["country"], vals["district"], vals["municipality"]
+
+        if n:
+            # 1. Country names found in district (preferred) or municipality move to country
+            in_district, _, _ = _join(district, self.countries)
+            in_municipality, _, _ = _join(municipality, self.countries)
+            in_municipality &= ~in_district
+            moved = in_district | in_municipality
+            country[in_district] = district[in_district]
+            country[in_municipality] = municipality[in_municipality]
+            district[moved] = None
+            municipality[moved] = None
+            for level in LEVELS:
+                has[level] |= moved
+
+            # 2. Unambiguous municipalities fill country and district
+            hit, codes, mapped_country = _join(municipality, self.municipality_country)
+            hit &= has["municipality"]
+            _, _, mapped_district = _join(municipality, self.municipality_district)
+            country[hit] = mapped_country[codes[hit]]
+            district[hit] = mapped_district[codes[hit]]
+            has["country"] |= hit
+            has["district"] |= hit
+
+            # 3. Portuguese districts set the country
+            hit, _, _ = _join(district, self.portuguese_districts)
+            hit &= has["district"]
+            country[hit] = "Portugal"
+            has["country"] |= hit
+
+            # 4. Rename maps per level
+            for level in LEVELS:
+                hit, codes, mapped = _join(vals[level], self.changes[level])
+                hit &= has[level]
+                vals[level][hit] = mapped[codes[hit]]
+
+            # One object per distinct place name in the rebuilt dicts
+            for level in LEVELS:
+                intern_object_array(vals[level])
+
+        if drop_empty:
+            keep = np.fromiter(
+                (bool(c) or bool(d) for c, d in zip(country, district)), dtype=bool, count=n
+            )
+        else:
+            keep = np.ones(n, dtype=bool)
+
+        # Re-nest: list-valued rows are rebuilt from the flat arrays
+        result = [[] if isinstance(value, list) else value for value in column_values]
+        has_country, has_district, has_municipality = has["country"], has["district"], has["municipality"]
+        for j in np.flatnonzero(keep):
+            new_loc = dict(locations[j])
+            # Keys missing from the input are appended in level order, as the chain did
+            if has_country[j]:
+                new_loc["country"] = country[j]
+            if has_district[j]:
+                new_loc["district"] = district[j]
+            if has_municipality[j]:
+                new_loc["municipality"] = municipality[j]
+            result[rows[j]].append(new_loc)
+        return result
+
+    def apply(
+        self, df: pd.DataFrame, column: str, drop_empty: bool = True, logger: Optional[logging.Logger] = None
+    ) -> pd.DataFrame:
+        """DataFrame wrapper of transform() in the style of elt_core.transformations."""
+        if column not in df.columns:
+            return df
+        df[column] = self.transform(df[column], drop_empty=drop_empty)
+        if logger:
+            logger.info(f"Normalized, enriched and fixed locations in column: {column}")
+        return df
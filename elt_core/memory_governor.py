@@ -0,0 +1,218 @@
+# elt_core/memory_governor.py
+"""
+Adaptive batch sizing under a process memory ceiling.
+
+Every stage that moves documents in batches (file extraction, CouchDB saves,
+graph sync) asks the governor for its current batch size and reports back how
+many documents it handled and how many encoded bytes they took. The governor
+then grows or shrinks that stage's batch size so that:
+
+- the memory a single batch adds to the process (RSS growth from the end of
+  the previous batch) stays within MEMORY_MAX_BATCH_MB, and near
+  MEMORY_CEILING_MB batches that still add memory are halved, and
+- a single batch payload stays within MEMORY_MAX_BATCH_MB, so small CPV rows
+  get large batches and fat contracts get small ones.
+
+Sizing follows the growth rather than the absolute RSS because CPython and
+pandas rarely return freed memory to the OS: after one spike the RSS stays
+high, but later batches reuse that memory without growing it, and their
+batches are allowed to grow back.
+
+Configuration (environment variables):
+    MEMORY_CEILING_MB         Memory ceiling for the process (default: 75% of RAM)
+    MEMORY_MAX_BATCH_MB       Upper bound for the payload and memory growth of one batch (default: 64)
+    MEMORY_GOVERNOR           Set to "off" to keep the static batch sizes
+"""
+import gc
+import logging
+import os
+import sys
+import threading
+from typing import Dict, Iterator, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger("MemoryGovernor")
+
+_MB = 1024 * 1024
+
+
+def _page_size() -> int:
+    try:
+        return os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 4096
+
+
+def total_memory_bytes() -> Optional[int]:
+    """Return the physical memory of the host, or None if it cannot be determined."""
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * _page_size()
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def current_rss_bytes() -> int:
+    """
+    Return the resident set size of the current process in bytes.
+
+    Reads /proc/self/statm on Linux; elsewhere falls back to the peak RSS
+    reported by getrusage, which over-estimates but never under-estimates.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _page_size()
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux/BSD
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryGovernor:
+    def __init__(
+        self,
+        ceiling_mb: Optional[int] = None,
+        max_batch_mb: Optional[int] = None,
+        high_watermark: float = 0.85,
+        low_watermark: float = 0.60,
+        growth_factor: float = 1.5,
+        min_batch_size: int = 100,
+        max_batch_size: int = 200000,
+        enabled: Optional[bool] = None,
+    ):
+        """
+        Args:
+            ceiling_mb: Memory ceiling in MB (default: MEMORY_CEILING_MB or 75% of RAM)
+            max_batch_mb: Max encoded payload and RSS growth per batch in MB
+                (default: MEMORY_MAX_BATCH_MB or 64)
+            high_watermark: Fraction of the ceiling above which batches that still
+                grow RSS by more than (1 - high_watermark) of max_batch_mb are halved
+            low_watermark: Fraction of max_batch_mb of RSS growth below which batches may grow
+            growth_factor: Multiplicative growth applied while memory is plentiful
+            min_batch_size: Lower bound for any batch size
+            max_batch_size: Upper bound for any batch size
+            enabled: Set False to always return the caller's default batch size
+        """
+        if ceiling_mb is None and os.getenv("MEMORY_CEILING_MB"):
+            ceiling_mb = int(os.getenv("MEMORY_CEILING_MB"))
+        if ceiling_mb is None:
+            total = total_memory_bytes()
+            ceiling_mb = int(total * 0.75 / _MB) if total else 8192
+        if max_batch_mb is None:
+            max_batch_mb = int(os.getenv("MEMORY_MAX_BATCH_MB", "64"))
+        if enabled is None:
+            enabled = os.getenv("MEMORY_GOVERNOR", "on").lower() not in ("off", "0", "false")
+
+        self.ceiling_bytes = ceiling_mb * _MB
+        self.max_batch_bytes = max_batch_mb * _MB
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.growth_factor = growth_factor
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.enabled = enabled
+
+        self._sizes: Dict[str, int] = {}
+        self._doc_bytes: Dict[str, float] = {}
+        # RSS at the end of the previous batch of a key (or when the key was seeded)
+        self._start_rss: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _clamp(self, size: int) -> int:
+        return max(self.min_batch_size, min(self.max_batch_size, int(size)))
+
+    def batch_size(self, key: str, default: int) -> int:
+        """
+        Return the current batch size for a stage key.
+        The first call for a key seeds it with the caller's default.
+        """
+        if not self.enabled:
+            return default
+        with self._lock:
+            if key not in self._sizes:
+                self._sizes[key] = self._clamp(default)
+                self._start_rss[key] = current_rss_bytes()
+            return self._sizes[key]
+
+    def doc_bytes(self, key: str) -> Optional[float]:
+        """Return the moving average of encoded bytes per document for a key."""
+        return self._doc_bytes.get(key)
+
+    def observe(self, key: str, docs: int, payload_bytes: Optional[int] = None) -> int:
+        """
+        Record a processed batch and adapt the batch size of the key.
+
+        Args:
+            key: Stage key (usually the database name)
+            docs: Number of documents in the batch
+            payload_bytes: Encoded size of the batch, if known
+
+        Returns:
+            The batch size to use for the next batch
+        """
+        if not self.enabled or docs <= 0:
+            return self._sizes.get(key, 0)
+
+        rss = current_rss_bytes()
+        with self._lock:
+            size = self._sizes.get(key, self._clamp(docs))
+            growth = max(rss - self._start_rss.get(key, rss), 0)
+            self._start_rss[key] = rss
+
+            if payload_bytes:
+                per_doc = payload_bytes / docs
+                previous = self._doc_bytes.get(key)
+                self._doc_bytes[key] = per_doc if previous is None else 0.7 * previous + 0.3 * per_doc
+
+            budget = self.max_batch_bytes
+            near_ceiling = rss >= self.ceiling_bytes * self.high_watermark
+            if growth > budget or (near_ceiling and growth > budget * (1 - self.high_watermark)):
+                new_size = size // 2
+                logger.warning(
+                    f"Batch of '{key}' grew RSS by {growth / _MB:.0f}MB (RSS {rss / _MB:.0f}MB, ceiling "
+                    f"{self.ceiling_bytes / _MB:.0f}MB), shrinking batches {size} -> {self._clamp(new_size)}"
+                )
+            else:
+                new_size = size * self.growth_factor if growth < budget * self.low_watermark else size
+                per_doc = self._doc_bytes.get(key)
+                if per_doc:
+                    new_size = min(new_size, budget / per_doc)
+
+            self._sizes[key] = self._clamp(new_size)
+            shrinking = self._sizes[key] < size
+
+        if shrinking:
+            gc.collect()
+        return self._sizes[key]
+
+    def iter_batches(self, items: Sequence, key: str, default: int) -> Iterator[Sequence]:
+        """
+        Yields consecutive slices of items, re-reading the batch size of the key
+        before every slice so observations made by the caller take effect immediately.
+        """
+        total = len(items)
+        start = 0
+        while start < total:
+            size = self.batch_size(key, default)
+            yield items[start:start + size]
+            start += size
+
+
+_governor: Optional[MemoryGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_memory_governor() -> MemoryGovernor:
+    """Return the process-wide MemoryGovernor, creating it from the environment on first use."""
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = MemoryGovernor()
+    return _governor
@@ -0,0 +1,245 @@
+# elt_core/nif_queue.py
+"""
+Status-preserving upsert into the NIF scrape queue.
+
+Sources that find NIFs (ContractsSource.extract_nifs) used to re-save every
+NIF as a fresh ``status: pending`` document, which either conflicted with the
+stored document or, once its _rev was dropped, reset the progress of NIFs
+already scraped. Here the queue is read back for the NIFs at hand and
+
+- NIFs not in the queue are inserted as pending,
+- queued NIFs whose description is a placeholder get the new description
+  when it is a real one (the stored document is updated with its _rev, so
+  ``status`` and any scrape fields stay as they are),
+- every other queued NIF is left untouched.
+
+Writes that lose a _rev race (another worker inserted or updated the same
+NIF meanwhile) are re-read and retried.
+
+`set_priorities` writes the scrape priority of queued NIFs (see
+transformations.nif_priorities) the same way: only documents whose
+priority changed are rewritten, over their _rev, whatever their status.
+New NIFs are inserted with priority 0, so every queued NIF is in the
+index the scraper claims by.
+
+`requeue_stale` puts NIFs whose scrape result is older than a TTL back in
+the queue as refreshes, NIFs of the most recent contracts first, carrying
+the validators of the stored result so that the scraper can send a
+conditional request.
+"""
+import datetime
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+QUEUE_DB = "nifs_scrape_queue"
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+PRIORITY_FIELDS = ("priority", "contracts", "roles", "last_contract")
+# Fields of a scrape result that a refresh copies onto the queue document
+VALIDATOR_FIELDS = ("etag", "last_modified", "page_sha256")
+# Result fields that record when and how a result was checked, not what nif.pt says
+REVALIDATION_FIELDS = ("scraped_at", "changed_at", *VALIDATOR_FIELDS)
+PLACEHOLDER_DESCRIPTIONS = ("", "-", "No description")
+
+logger = logging.getLogger("NifQueue")
+
+
+def is_placeholder(description) -> bool:
+    return description is None or str(description).strip() in PLACEHOLDER_DESCRIPTIONS
+
+
+def upsert_nifs(
+    db_connector,
+    entries: Iterable[Tuple[str, str]],
+    source: str,
+    queue_db: str = QUEUE_DB,
+    batch_size: int = 5000,
+    max_retries: int = 3,
+) -> Dict[str, int]:
+    """
+    Inserts new NIFs and upgrades placeholder descriptions, leaving status untouched.
+
+    Args:
+        db_connector: DBConnector instance
+        entries: (nif, description) pairs, one per NIF
+        source: Written as "source" on inserted documents
+        queue_db: Queue database
+        batch_size: NIFs read and written per request
+        max_retries: Rounds for writes that lost a _rev race
+
+    Returns:
+        Counts of inserted, upgraded and unchanged NIFs
+    """
+    wanted = dict(entries)
+    counts = {"inserted": 0, "upgraded": 0, "unchanged": 0}
+    db_connector.get_or_create_db(queue_db)
+    pending = list(wanted)
+    for attempt in range(max_retries + 1):
+        conflicts: List[str] = []
+        for start in range(0, len(pending), batch_size):
+            nifs = pending[start:start + batch_size]
+            stored = {doc["_id"]: doc for doc in db_connector.get_documents_by_ids(queue_db, nifs)}
+            docs = []
+            for nif in nifs:
+                description = wanted[nif]
+                doc = stored.get(nif)
+                if doc is None:
+                    docs.append({
+                        "_id": nif,
+                        "nif": nif,
+                        "description": description,
+                        "status": STATUS_PENDING,
+                        "source": source,
+                        "priority": 0,
+                    })
+                elif is_placeholder(doc.get("description")) and not is_placeholder(description):
+                    docs.append({**doc, "description": description})
+                else:
+                    counts["unchanged"] += 1
+            if not docs:
+                continue
+            results = db_connector.save_documents_bulk(queue_db, docs)
+            written = {r["id"] for r in results if not r.get("error")}
+            conflicts += [r["id"] for r in results if r.get("error") == "conflict"]
+            for r in results:
+                if r.get("error") and r.get("error") != "conflict":
+                    logger.warning(f"Could not queue NIF {r.get('id')} in {queue_db}: {r.get('error')} {r.get('reason')}")
+            for doc in docs:
+                if doc["_id"] in written:
+                    counts["upgraded" if "_rev" in doc else "inserted"] += 1
+        if not conflicts:
+            break
+        if attempt == max_retries:
+            logger.warning(f"Gave up on {len(conflicts)} NIFs of {queue_db} after {max_retries} conflicting retries")
+            break
+        pending = conflicts
+    return counts
+
+
+def set_priorities(
+    db_connector,
+    priorities: Dict[str, Dict[str, Any]],
+    queue_db: str = QUEUE_DB,
+    batch_size: int = 5000,
+    max_retries: int = 3,
+) -> Dict[str, int]:
+    """
+    Writes the scrape priority of queued NIFs, leaving status and leases untouched.
+
+    Args:
+        db_connector: DBConnector instance
+        priorities: {nif: {"priority": ..., "contracts": ..., "roles": [...]}}
+        queue_db: Queue database
+        batch_size: NIFs read and written per request
+        max_retries: Rounds for writes that lost a _rev race
+
+    Returns:
+        Counts of updated, unchanged and not queued NIFs
+    """
+    counts = {"updated": 0, "unchanged": 0, "not_queued": 0}
+    pending = list(priorities)
+    for attempt in range(max_retries + 1):
+        conflicts: List[str] = []
+        for start in range(0, len(pending), batch_size):
+            nifs = pending[start:start + batch_size]
+            stored = db_connector.get_documents_by_ids(queue_db, nifs)
+            if attempt == 0:
+                counts["not_queued"] += len(nifs) - len(stored)
+            docs = []
+            for doc in stored:
+                wanted = priorities[doc["_id"]]
+                if all(doc.get(field) == wanted.get(field) for field in PRIORITY_FIELDS):
+                    counts["unchanged"] += 1
+                else:
+                    docs.append({**doc, **{field: wanted.get(field) for field in PRIORITY_FIELDS}})
+            if not docs:
+                continue
+            results = db_connector.save_documents_bulk(queue_db, docs)
+            counts["updated"] += sum(1 for r in results if not r.get("error"))
+            conflicts += [r["id"] for r in results if r.get("error") == "conflict"]
+        if not conflicts:
+            break
+        if attempt == max_retries:
+            logger.warning(f"Gave up on {len(conflicts)} NIF priorities of {queue_db} after {max_retries} conflicting retries")
+            break
+        pending = conflicts
+    return counts
+
+
+def requeue_stale(
+    db_connector,
+    results_db: str,
+    scraped_before: datetime.datetime,
+    queue_db: str = QUEUE_DB,
+    limit: Optional[int] = None,
+    batch_size: int = 5000,
+) -> Dict[str, int]:
+    """
+    Re-queues done (or failed) NIFs whose result was scraped before a cutoff.
+
+    Stale results are found through an index on their scraped_at; results
+    stored before they had one count from the finished_at of their queue
+    document. NIFs of the most recent contracts (last_contract) come first,
+    then by priority, and at most `limit` are re-queued. A re-queued document
+    is pending again with refresh: true and the validators of its result
+    (VALIDATOR_FIELDS). Pending and leased NIFs are left alone, and documents
+    that changed meanwhile are only counted (the next run picks them up).
+
+    Args:
+        db_connector: DBConnector instance
+        results_db: Database of the scrape results
+        scraped_before: Results scraped before this (timezone-aware) time are stale
+        queue_db: Queue database
+        limit: Most NIFs re-queued (None: all stale ones)
+        batch_size: NIFs read and written per request
+
+    Returns:
+        Counts of stale results and of re-queued, already queued, not queued and conflicting NIFs
+    """
+    cutoff = scraped_before.astimezone(datetime.timezone.utc).isoformat(timespec="seconds")
+    cutoff_epoch = scraped_before.timestamp()
+    db_connector.create_index(results_db, ["scraped_at"], name="scraped-at-idx")
+    fields = ["_id", "scraped_at", *VALIDATOR_FIELDS]
+    results = {
+        doc["_id"]: doc
+        for selector in ({"scraped_at": {"$lt": cutoff}}, {"scraped_at": {"$exists": False}})
+        for doc in db_connector.find_documents(results_db, selector, fields=fields)
+    }
+    counts = {"stale": 0, "requeued": 0, "in_queue": 0, "not_queued": 0, "conflicts": 0}
+    candidates = []
+    nifs = list(results)
+    for start in range(0, len(nifs), batch_size):
+        batch = nifs[start:start + batch_size]
+        stored = db_connector.get_documents_by_ids(queue_db, batch)
+        counts["not_queued"] += len(batch) - len(stored)
+        for doc in stored:
+            if results[doc["_id"]].get("scraped_at") is None and (doc.get("finished_at") or 0) >= cutoff_epoch:
+                continue
+            counts["stale"] += 1
+            if doc.get("status") in (STATUS_DONE, STATUS_FAILED):
+                candidates.append(doc)
+            else:
+                counts["in_queue"] += 1
+    counts["stale"] += counts["not_queued"]
+    candidates.sort(key=lambda doc: (doc.get("last_contract") or "", doc.get("priority") or 0), reverse=True)
+    now = time.time()
+    docs = [
+        {
+            **doc,
+            "status": STATUS_PENDING, "attempts": 0, "lease_owner": None, "lease_expires_at": None,
+            "refresh": True, "requeued_at": now,
+            **{field: results[doc["_id"]].get(field) for field in VALIDATOR_FIELDS},
+        }
+        for doc in candidates[:limit]
+    ]
+    for start in range(0, len(docs), batch_size):
+        for r in db_connector.save_documents_bulk(queue_db, docs[start:start + batch_size]):
+            if not r.get("error"):
+                counts["requeued"] += 1
+            elif r.get("error") == "conflict":
+                counts["conflicts"] += 1
+            else:
+                logger.warning(f"Could not re-queue NIF {r.get('id')} in {queue_db}: {r.get('error')} {r.get('reason')}")
+    return counts
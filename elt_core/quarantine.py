@@ -0,0 +1,210 @@
+# elt_core/quarantine.py
+"""
+Quarantine of rows dropped by the transformation filters.
+
+The filters in `transformations` (and fused filter kernels of a
+TransformPlan) used to log only how many rows they dropped. With the
+quarantine enabled, every filter hands its rejected rows over with a reason
+code; they are buffered per source and written in columnar batches to a
+`<source>_rejected` store:
+
+- couchdb: one document per batch in the `<source>_rejected` database, holding
+  the rows column by column ({"columns": {"<name>": [...]}, "count": n}),
+- parquet: one file per batch under QUARANTINE_DIR/<source>_rejected/.
+
+Each batch carries the extra columns `_reason`, `_step` and `_row` (index of
+the row in the transformed frame). The source is the name of the logger
+passed to the filter, i.e. the source_name of the calling source; filters
+called without a logger are not quarantined.
+
+When disabled (the default), filters only check `enabled` and never build
+the rejected rows.
+
+Configuration (environment variables):
+    QUARANTINE            off | couchdb | parquet (default: off)
+    QUARANTINE_DIR        Parquet output directory (default: data/rejected)
+    QUARANTINE_BATCH_ROWS Rows per written batch (default: 1000)
+"""
+import atexit
+import datetime
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import ujson
+
+logger = logging.getLogger("Quarantine")
+
+# Reason codes of the transformations filters
+REASON_MISSING_VALUES = "missing_values"
+REASON_ABOVE_MAX = "above_max"
+REASON_VALUE_MISMATCH = "value_mismatch"
+REASON_PRICE_ANOMALY = "price_anomaly"
+REASON_DATE_SEQUENCE = "date_sequence"
+REASON_INVALID_VAT = "invalid_vat"
+REASON_TOO_MANY_CPVS = "too_many_cpvs"
+
+SINKS = ("couchdb", "parquet")
+
+
+class Quarantine:
+    def __init__(
+        self,
+        sink: Optional[str] = None,
+        directory: Optional[str] = None,
+        batch_rows: Optional[int] = None,
+        db_connector=None,
+    ):
+        """
+        Args:
+            sink: "couchdb", "parquet" or "off" (default: QUARANTINE env, off)
+            directory: Parquet output directory (default: QUARANTINE_DIR or data/rejected)
+            batch_rows: Rows per written batch (default: QUARANTINE_BATCH_ROWS or 1000)
+            db_connector: Connector for the CouchDB sink (default: a DBConnector from COUCHDB_URL)
+        """
+        if sink is None:
+            sink = os.getenv("QUARANTINE", "off")
+        sink = sink.lower()
+        if sink not in SINKS + ("off", "0", "false", ""):
+            raise ValueError(f"Unknown QUARANTINE sink: {sink}")
+        self.sink = sink if sink in SINKS else None
+        self.enabled = self.sink is not None
+        self.directory = Path(directory or os.getenv("QUARANTINE_DIR", "data/rejected"))
+        self.batch_rows = batch_rows or int(os.getenv("QUARANTINE_BATCH_ROWS", "1000"))
+        self._connector = db_connector
+        self._buffers: Dict[str, List[Tuple[Any, str, str]]] = {}
+        self._buffered_rows: Dict[str, int] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._batch_seq = 0
+        self._lock = threading.Lock()
+
+    def reject(self, source: str, rows, reason: str, step: Optional[str] = None) -> None:
+        """
+        Buffers rejected rows of a source.
+
+        Args:
+            source: Source name (the `<source>_rejected` store)
+            rows: DataFrame with the rejected rows, as they were when dropped
+            reason: Reason code (REASON_*)
+            step: Name of the filter step (default: the reason)
+        """
+        if not self.enabled or rows is None or len(rows) == 0:
+            return
+        with self._lock:
+            self._buffers.setdefault(source, []).append((rows, reason, step or reason))
+            self._buffered_rows[source] = self._buffered_rows.get(source, 0) + len(rows)
+            key = (source, reason)
+            self._counts[key] = self._counts.get(key, 0) + len(rows)
+            if self._buffered_rows[source] < self.batch_rows:
+                return
+            pending = self._take(source)
+        self._write(source, pending)
+
+    def flush(self, source: Optional[str] = None) -> None:
+        """Writes everything buffered (for one source or all)."""
+        with self._lock:
+            sources = [source] if source else list(self._buffers)
+            pending = [(name, self._take(name)) for name in sources]
+        for name, parts in pending:
+            self._write(name, parts)
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Rejected rows per (source, reason) since start."""
+        with self._lock:
+            return dict(self._counts)
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _take(self, source: str) -> List[Tuple[Any, str, str]]:
+        self._buffered_rows[source] = 0
+        return self._buffers.pop(source, [])
+
+    def _columns(self, parts: List[Tuple[Any, str, str]]) -> Dict[str, List[Any]]:
+        """Concatenates the rejected frames into JSON-ready columns."""
+        import pandas as pd
+
+        from elt_core.json_records import column_values
+
+        frames = []
+        for rows, reason, step in parts:
+            frame = rows.copy(deep=False)
+            frame["_reason"] = reason
+            frame["_step"] = step
+            frame["_row"] = [str(index) for index in rows.index]
+            frames.append(frame)
+        batch = pd.concat(frames, ignore_index=True, sort=False) if len(frames) > 1 else frames[0].reset_index(drop=True)
+        return {str(name): column_values(batch[name]) for name in batch.columns}
+
+    def _write(self, source: str, parts: List[Tuple[Any, str, str]]) -> None:
+        if not parts:
+            return
+        columns = self._columns(parts)
+        total = len(columns["_reason"])
+        for start in range(0, total, self.batch_rows):
+            chunk = {name: values[start:start + self.batch_rows] for name, values in columns.items()}
+            try:
+                if self.sink == "couchdb":
+                    self._write_couchdb(source, chunk)
+                else:
+                    self._write_parquet(source, chunk)
+            except Exception as e:
+                # Losing quarantined rows must not fail the transformation
+                logger.error(f"Could not write {len(chunk['_reason'])} rejected rows of {source}: {e}")
+
+    def _batch_id(self) -> str:
+        with self._lock:
+            self._batch_seq += 1
+            seq = self._batch_seq
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+        return f"{timestamp}-{os.getpid()}-{seq:06d}-{uuid.uuid4().hex[:6]}"
+
+    def _write_couchdb(self, source: str, columns: Dict[str, List[Any]]) -> None:
+        if self._connector is None:
+            from elt_core.db_connector import DBConnector
+
+            self._connector = DBConnector()
+        doc = {
+            "_id": self._batch_id(),
+            "source": source,
+            "rejected_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "count": len(columns["_reason"]),
+            "columns": columns,
+        }
+        self._connector.save_documents_bulk(f"{source}_rejected", [doc], sanitize=False)
+
+    def _write_parquet(self, source: str, columns: Dict[str, List[Any]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrays = {}
+        for name, values in columns.items():
+            try:
+                arrays[name] = pa.array(values)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+                # Mixed or irregular nested values are kept as JSON text
+                arrays[name] = pa.array(
+                    [None if v is None else ujson.dumps(v, ensure_ascii=False) for v in values], pa.string()
+                )
+        directory = self.directory / f"{source}_rejected"
+        directory.mkdir(parents=True, exist_ok=True)
+        pq.write_table(pa.table(arrays), directory / f"part-{self._batch_id()}.parquet")
+
+
+_quarantine: Optional[Quarantine] = None
+_quarantine_lock = threading.Lock()
+
+
+def get_quarantine() -> Quarantine:
+    """Return the process-wide Quarantine, creating it from the environment on first use."""
+    global _quarantine
+    if _quarantine is None:
+        with _quarantine_lock:
+            if _quarantine is None:
+                _quarantine = Quarantine()
+                atexit.register(_quarantine.flush)
+    return _quarantine
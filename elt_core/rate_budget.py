@@ -0,0 +1,129 @@
+# elt_core/rate_budget.py
+"""
+Request rate shared by scraper workers through one CouchDB document.
+
+Workers on any host that scrape the same site keep an entry in the site's
+budget document (database `db_name`, _id = the site's host name):
+
+    {"_id": "www.nif.pt", "rate": 20.0, "updated_at": ...,
+     "workers": {"<worker id>": {"seen_at": ..., "share": 10.0, "requests": 812,
+                                 "done": 790, "req_per_s": 9.8, "started_at": ...}}}
+
+Every `heartbeat_seconds` a worker rewrites its own entry with its counters,
+drops the entries not renewed for `ttl_seconds` (workers that crashed) and
+takes `rate` / live workers as its own rate, all in one write over the
+document's _rev, so concurrent heartbeats are serialised by conflicts and
+retried. A worker that finishes removes its entry, and the others take over
+its share at their next heartbeat. A joining worker is counted by the
+others only from their next heartbeat, so the combined rate can exceed the
+budget for up to `heartbeat_seconds`.
+
+The document also reports per-worker throughput: `workers()` lists the live
+entries (`main.py queue-status`).
+
+Hosts should run NTP (entries expire by wall-clock time).
+"""
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from elt_core.db_connector import DocumentConflict
+
+logger = logging.getLogger("RateBudget")
+
+
+class SharedRateBudget:
+    def __init__(
+        self,
+        db_connector,
+        db_name: str,
+        budget_id: str,
+        rate: float,
+        worker_id: str,
+        heartbeat_seconds: float = 5.0,
+        ttl_seconds: Optional[float] = None,
+        max_retries: int = 5,
+    ):
+        """
+        Args:
+            db_connector: DBConnector instance
+            db_name: Database holding the budget documents (created if missing)
+            budget_id: _id of the budget document, e.g. the scraped host name
+            rate: Requests per second across all workers (written into the document)
+            worker_id: This worker's entry (the lease owner id of its queue)
+            heartbeat_seconds: Seconds between heartbeats
+            ttl_seconds: Age after which an entry counts as a crashed worker (default: 3 heartbeats)
+            max_retries: Conflicting writes of a heartbeat before keeping the previous share
+        """
+        self.db_connector = db_connector
+        self.db_name = db_name
+        self.budget_id = budget_id
+        self.rate = rate
+        self.worker_id = worker_id
+        self.heartbeat_seconds = heartbeat_seconds
+        self.ttl_seconds = ttl_seconds or 3 * heartbeat_seconds
+        self.max_retries = max_retries
+        self.share = rate
+        self.started_at = time.time()
+        self._last: Optional[Dict[str, Any]] = None
+        db_connector.get_or_create_db(db_name)
+
+    def _live_workers(self, doc: Dict[str, Any], now: float) -> Dict[str, Dict[str, Any]]:
+        return {
+            worker_id: entry for worker_id, entry in (doc.get("workers") or {}).items()
+            if (entry.get("seen_at") or 0) >= now - self.ttl_seconds
+        }
+
+    def _update(self, change) -> Optional[Dict[str, Any]]:
+        """Applies change(doc, now) to the budget document over its _rev, re-reading it on conflicts."""
+        for _ in range(self.max_retries):
+            doc = self.db_connector.get_document(self.db_name, self.budget_id) or {"_id": self.budget_id}
+            now = time.time()
+            change(doc, now)
+            doc["updated_at"] = now
+            try:
+                self.db_connector.put_document(self.db_name, doc)
+                return doc
+            except DocumentConflict:
+                continue
+        logger.warning(f"Could not update rate budget {self.db_name}/{self.budget_id} after {self.max_retries} conflicts")
+        return None
+
+    def heartbeat(self, requests: int = 0, done: int = 0) -> float:
+        """
+        Renews this worker's entry with its request and item counts so far and
+        returns its share of the rate (the previous share if the document could
+        not be written).
+        """
+        def change(doc, now):
+            workers = {w: e for w, e in self._live_workers(doc, now).items() if w != self.worker_id}
+            last = self._last
+            req_per_s = None
+            if last is not None and now > last["at"]:
+                req_per_s = round((requests - last["requests"]) / (now - last["at"]), 2)
+            share = self.rate / (len(workers) + 1)
+            workers[self.worker_id] = {
+                "seen_at": now, "started_at": self.started_at, "share": round(share, 3),
+                "requests": requests, "done": done, "req_per_s": req_per_s,
+            }
+            doc["rate"] = self.rate
+            doc["workers"] = workers
+
+        doc = self._update(change)
+        if doc is not None:
+            entry = doc["workers"][self.worker_id]
+            self.share = self.rate / len(doc["workers"])
+            self._last = {"at": entry["seen_at"], "requests": requests}
+        return self.share
+
+    def leave(self) -> None:
+        """Removes this worker's entry, handing its share to the others."""
+        def change(doc, now):
+            doc["workers"] = {w: e for w, e in self._live_workers(doc, now).items() if w != self.worker_id}
+
+        self._update(change)
+
+    def workers(self) -> Dict[str, Dict[str, Any]]:
+        """Live worker entries of the budget document."""
+        doc = self.db_connector.get_document(self.db_name, self.budget_id) or {}
+        return self._live_workers(doc, time.time())
@@ -0,0 +1,70 @@
+# elt_core/registry.py
+"""
+Registry of pipeline components, resolved lazily.
+
+Sources, gold builders and graph mappers pull in heavy dependencies
+(pandas, pyarrow, bs4, neo4j, linkml_runtime via model.py). The orchestrator
+refers to them by name and only imports a component when its stage actually
+runs, so short operational commands start without paying for any of them.
+"""
+import importlib
+from typing import Any, Dict
+
+COMPONENTS: Dict[str, str] = {
+    # Bronze -> Silver sources
+    "ContractsSource": "sources.contracts_source:ContractsSource",
+    "AnuarioOCCSource": "sources.anuario_occ_source:AnuarioOCCSource",
+    "CPVStructureSource": "sources.cpv_structure_source:CPVStructureSource",
+    "OrbisDMSource": "sources.orbis_dm:OrbisDMSource",
+    "OrbisSHSource": "sources.orbis_sh:OrbisSHSource",
+    "OrbisPTCompaniesUCISource": "sources.orbis_pt_companies_uci:OrbisPTCompaniesUCISource",
+    "SocialCareersSource": "sources.social_careers_source:SocialCareersSource",
+    "SocietiesSource": "sources.societies_source:SocietiesSource",
+    "PeopleAreaSource": "sources.people_area_source:PeopleAreaSource",
+    "NifScraperSource": "sources.nif_scraper_source:NifScraperSource",
+    # Gold builders
+    "ContractsGoldSource": "sources.gold.contracts_gold:ContractsGoldSource",
+    "EntitiesGoldSource": "sources.gold.entities_gold:EntitiesGoldSource",
+    "OrbisGoldSource": "sources.gold.orbis_gold:OrbisGoldSource",
+    "MunicipalEntitiesGoldSource": "sources.gold.municipal_entities_gold:MunicipalEntitiesGoldSource",
+    "PEPGoldSource": "sources.gold.pep_gold:PEPGoldSource",
+    # Graph mappers
+    "contracts_mapper": "sources.graph_mappers.contracts_mapper:contracts_mapper",
+    "entities_mapper": "sources.graph_mappers.entities_mapper:entities_mapper",
+    "orbis_mapper": "sources.graph_mappers.orbis_mapper:orbis_mapper",
+    "cpv_mapper": "sources.graph_mappers.cpv_mapper:cpv_mapper",
+    "municipal_entities_mapper": "sources.graph_mappers.municipal_entities_mapper:municipal_entities_mapper",
+    "pep_mapper": "sources.graph_mappers.pep_mapper:pep_mapper",
+    # Graph layer
+    "GraphLoader": "elt_core.graph_loader:GraphLoader",
+    "run_all_enrichments": "elt_core.graph_enrichment:run_all_enrichments",
+}
+
+_cache: Dict[str, Any] = {}
+
+
+def load_component(ref: Any) -> Any:
+    """
+    Resolve a component reference to the object it names.
+
+    Args:
+        ref: A registry name ("ContractsSource"), an import path
+            ("sources.contracts_source:ContractsSource") or an already
+            imported object, which is returned unchanged.
+
+    Returns:
+        The class or function the reference points to
+    """
+    if not isinstance(ref, str):
+        return ref
+    if ref in _cache:
+        return _cache[ref]
+
+    path = COMPONENTS.get(ref, ref)
+    if ":" not in path:
+        raise KeyError(f"Unknown pipeline component '{ref}'. Use a registry name or 'module:attribute'.")
+    module_name, attribute = path.split(":", 1)
+    component = getattr(importlib.import_module(module_name), attribute)
+    _cache[ref] = component
+    return component
+
@@ -0,0 +1,433 @@
+# elt_core/scrape_engine.py
+"""
+asyncio scraping engine with a token-bucket rate limit and AIMD concurrency.
+
+Jobs (key, url) or (key, url, headers), the latter e.g. with the validators
+of a conditional request, from a list or from an async iterable read as
+workers free up, are fetched through an `AsyncHTTPClient` (per-host keep-alive pools) by
+worker coroutines. Before each request a worker takes
+
+- a token from `TokenBucket`: at most `rate` requests per second on average,
+  `burst` at once.
+- a concurrency slot from `AIMDLimiter`: while every slot is in use, the
+  limit grows by 1/limit per successful response (about +1 per window of
+  `limit` requests); it is halved on 429, 5xx or a connection error, at most
+  once per `cooldown` seconds so a burst of failures of the same window
+  counts once. A Retry-After header
+  pauses every worker until it has passed.
+
+Throttled (429), failing (5xx) and errored requests are put back on the queue
+after an exponential backoff (or Retry-After) and handed to the handler with
+their last response (None on a connection error) after `max_retries`.
+`ScrapeStats` logs throughput, outcomes and the current concurrency every
+`stats_interval` seconds.
+
+With a `rate_budget` (`elt_core.rate_budget.SharedRateBudget`), `rate` is a
+share of a budget shared with other workers: the bucket starts at the share
+the first heartbeat returns and follows it at every heartbeat, with `burst`
+split in the same proportion, and the worker leaves the budget when the run
+ends.
+
+Usage:
+    engine = ScrapeEngine(client, rate=10, burst=10, max_concurrency=32, logger=logger)
+    await engine.run([(nif, url), ...], handle)   # await handle(nif, response)
+"""
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, Optional, Sized, Tuple, Union
+from urllib.parse import urlsplit
+
+from elt_core.async_http import AsyncHTTPClient, HTTPError, Response
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+Handler = Callable[[Any, Optional[Response]], Awaitable[None]]
+
+
+def retry_after_seconds(response: Optional[Response]) -> Optional[float]:
+    """Seconds of a Retry-After header (delta-seconds or HTTP date), if any."""
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        """
+        Args:
+            rate: Tokens added per second (<= 0 disables the limit)
+            burst: Bucket capacity
+        """
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        # The lock makes waiters take tokens in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AIMDLimiter:
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 32,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        """
+        Args:
+            initial: Starting concurrency
+            minimum: Lowest concurrency after backing off
+            maximum: Highest concurrency when ramping up
+            decrease: Factor applied to the limit on a back-off signal
+            cooldown: Seconds during which further back-off signals are ignored
+        """
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.decreases = 0
+        self._last_decrease = float("-inf")
+        self._changed = asyncio.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.limit)
+
+    async def acquire(self) -> None:
+        async with self._changed:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < self.concurrency:
+                    self.in_flight += 1
+                    return
+                await self._changed.wait()
+
+    async def release(self, ok: bool, backoff: bool, retry_after: Optional[float] = None) -> None:
+        """
+        Frees the slot of a finished request.
+
+        Args:
+            ok: The request succeeded (additive increase)
+            backoff: The server signalled overload or failed (multiplicative decrease)
+            retry_after: Seconds every worker should wait before the next request
+        """
+        async with self._changed:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if backoff:
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+                    self.decreases += 1
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+            elif ok and self.in_flight + 1 >= self.concurrency:
+                # Only grow while the limit is what holds requests back (not the rate or the queue)
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._changed.notify_all()
+
+
+class ScrapeStats:
+    def __init__(self, total: Optional[int], logger: logging.Logger, interval: float = 10.0):
+        self.total = total
+        self.logger = logger
+        self.interval = interval
+        self.started = time.monotonic()
+        self.done = 0
+        self.requests = 0
+        self.bytes_in = 0
+        self.retries = 0
+        self.failed = 0
+        self.statuses: Dict[str, int] = {"2xx": 0, "429": 0, "5xx": 0, "other": 0, "error": 0}
+        self.trajectory = []
+        self.connections: Dict[str, Dict[str, int]] = {}
+        self._last_time = self.started
+        self._last_requests = 0
+
+    def record(self, response: Optional[Response]) -> None:
+        self.requests += 1
+        if response is None:
+            self.statuses["error"] += 1
+            return
+        self.bytes_in += len(response.body)
+        status = response.status
+        if 200 <= status < 300:
+            self.statuses["2xx"] += 1
+        elif status == 429:
+            self.statuses["429"] += 1
+        elif status >= 500:
+            self.statuses["5xx"] += 1
+        else:
+            self.statuses["other"] += 1
+
+    def snapshot(self, limiter: AIMDLimiter) -> Dict[str, Any]:
+        now = time.monotonic()
+        interval = now - self._last_time
+        rate = (self.requests - self._last_requests) / interval if interval > 0 else 0.0
+        self._last_time, self._last_requests = now, self.requests
+        elapsed = now - self.started
+        snapshot = {
+            "elapsed_s": round(elapsed, 1),
+            "done": self.done,
+            "total": self.total,
+            "requests": self.requests,
+            "req_per_s": round(rate, 1),
+            "avg_req_per_s": round(self.requests / elapsed, 1) if elapsed > 0 else 0.0,
+            "retries": self.retries,
+            "failed": self.failed,
+            "concurrency": limiter.concurrency,
+            "in_flight": limiter.in_flight,
+            **self.statuses,
+        }
+        self.trajectory.append((snapshot["elapsed_s"], limiter.concurrency, snapshot["req_per_s"]))
+        return snapshot
+
+    def log(self, limiter: AIMDLimiter) -> Dict[str, Any]:
+        s = self.snapshot(limiter)
+        self.logger.info(
+            f"[STATS] {s['done']}{'' if s['total'] is None else '/' + str(s['total'])} done, {s['req_per_s']} req/s (avg {s['avg_req_per_s']}), "
+            f"2xx={s['2xx']} 429={s['429']} 5xx={s['5xx']} errors={s['error']} retries={s['retries']} "
+            f"failed={s['failed']}, concurrency={s['concurrency']} in flight={s['in_flight']}"
+        )
+        return s
+
+    async def report_periodically(self, limiter: AIMDLimiter) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.log(limiter)
+
+
+class ScrapeEngine:
+    def __init__(
+        self,
+        client: AsyncHTTPClient,
+        rate: float = 10.0,
+        burst: int = 10,
+        initial_concurrency: int = 10,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        stats_interval: float = 10.0,
+        logger: Optional[logging.Logger] = None,
+        telemetry=None,
+        key_name: str = "key",
+        rate_budget=None,
+    ):
+        """
+        Args:
+            client: HTTP client (its per-host pool should allow max_concurrency connections)
+            rate: Requests per second on average (<= 0: unlimited)
+            burst: Requests allowed at once by the token bucket
+            initial_concurrency: Concurrent requests at start
+            min_concurrency: Floor of the AIMD limit
+            max_concurrency: Ceiling of the AIMD limit
+            max_retries: Retries of a job on 429, 5xx or connection errors
+            backoff_base: First retry delay in seconds (doubled per attempt, jittered)
+            backoff_max: Longest retry delay in seconds
+            stats_interval: Seconds between live stats lines
+            logger: Logger for stats and retries
+            telemetry: Telemetry recording one span per request (attribute key_name=key)
+            key_name: Span attribute holding the job key
+            rate_budget: SharedRateBudget whose share replaces rate
+        """
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.initial_concurrency = initial_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats_interval = stats_interval
+        self.logger = logger or logging.getLogger("ScrapeEngine")
+        self.telemetry = telemetry
+        self.key_name = key_name
+        self.rate_budget = rate_budget
+        self.limiter: Optional[AIMDLimiter] = None
+        self.stats: Optional[ScrapeStats] = None
+
+    async def _fetch(self, key: Any, url: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        if self.telemetry is None:
+            return await self.client.get(url, headers)
+        with self.telemetry.span("http", "GET", urlsplit(url).hostname or "", **{self.key_name: key}) as span:
+            response = await self.client.get(url, headers)
+            span["status_code"] = response.status
+            span["bytes_in"] = len(response.body)
+        return response
+
+    def backoff(self, attempt: int, response: Optional[Response]) -> float:
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_base * 2 ** attempt, self.backoff_max)
+        return delay * (0.5 + random.random() / 2)
+
+    async def _follow_budget(self, bucket: TokenBucket) -> None:
+        """Renews this worker's entry in the shared rate budget and applies its share to the bucket."""
+        while True:
+            await asyncio.sleep(self.rate_budget.heartbeat_seconds)
+            try:
+                share = await asyncio.to_thread(self.rate_budget.heartbeat, self.stats.requests, self.stats.done)
+            except Exception as e:
+                self.logger.warning(f"Rate budget heartbeat failed, keeping {bucket.rate:g} req/s: {e}")
+                continue
+            if share != bucket.rate:
+                self.logger.info(f"Rate share: {share:g} req/s")
+                bucket.rate = share
+                bucket.burst = self._burst_share(share)
+
+    def _burst_share(self, share: float) -> int:
+        return max(int(self.burst * share / self.rate_budget.rate), 1)
+
+    async def run(
+        self,
+        jobs: Union[Iterable[Tuple], AsyncIterable[Tuple]],
+        handle: Handler,
+        total: Optional[int] = None,
+    ) -> ScrapeStats:
+        """
+        Fetches every job and awaits handle(key, response) once per job.
+
+        jobs may be an async iterable (e.g. claiming work as it goes): it is
+        read only as fast as the workers take jobs. response is the final
+        Response (whatever its status) or None when every attempt failed
+        without one. Returns the run's stats.
+        """
+        if total is None and isinstance(jobs, Sized):
+            total = len(jobs)
+        # Bounded, so that an async source is not drained ahead of the workers
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.max_concurrency)
+        self.limiter = AIMDLimiter(self.initial_concurrency, self.min_concurrency, self.max_concurrency)
+        self.stats = ScrapeStats(total, self.logger, self.stats_interval)
+
+        rate = self.rate
+        if self.rate_budget is not None:
+            rate = await asyncio.to_thread(self.rate_budget.heartbeat)
+            self.logger.info(f"Rate share: {rate:g} of {self.rate_budget.rate:g} req/s")
+        bucket = TokenBucket(rate, self._burst_share(rate) if self.rate_budget is not None else self.burst)
+        finished = asyncio.Event()
+        outstanding = 0
+        fed_all = False
+        background = set()
+
+        async def feed():
+            nonlocal outstanding, fed_all
+            if hasattr(jobs, "__aiter__"):
+                async for key, url, *headers in jobs:
+                    outstanding += 1
+                    await queue.put((key, url, headers[0] if headers else None, 0))
+            else:
+                for key, url, *headers in jobs:
+                    outstanding += 1
+                    await queue.put((key, url, headers[0] if headers else None, 0))
+            fed_all = True
+            if outstanding == 0:
+                finished.set()
+
+        async def requeue(job, delay):
+            await asyncio.sleep(delay)
+            await queue.put(job)
+
+        async def worker():
+            nonlocal outstanding
+            while True:
+                key, url, headers, attempt = await queue.get()
+                # Token first: a worker waiting on the rate must not count as in flight
+                await bucket.acquire()
+                await self.limiter.acquire()
+                response = None
+                error = None
+                try:
+                    response = await self._fetch(key, url, headers)
+                except (HTTPError, OSError, ValueError) as e:
+                    error = e
+                finally:
+                    retryable = response is None or response.status in RETRY_STATUSES
+                    await self.limiter.release(
+                        ok=not retryable and response.status < 400,
+                        backoff=retryable,
+                        retry_after=retry_after_seconds(response),
+                    )
+                self.stats.record(response)
+                if retryable and attempt < self.max_retries:
+                    self.stats.retries += 1
+                    delay = self.backoff(attempt, response)
+                    reason = f"HTTP {response.status}" if response is not None else str(error)
+                    self.logger.debug(f"[RETRY] {key}: {reason}, attempt {attempt + 1} in {delay:.1f}s")
+                    task = asyncio.create_task(requeue((key, url, headers, attempt + 1), delay))
+                    background.add(task)
+                    task.add_done_callback(background.discard)
+                    continue
+                if retryable:
+                    self.stats.failed += 1
+                    reason = f"HTTP {response.status}" if response is not None else str(error)
+                    self.logger.error(f"[ERROR] {key} failed after {attempt + 1} attempts: {reason}")
+                try:
+                    await handle(key, response)
+                except Exception as e:
+                    self.logger.error(f"{key} generated an exception: {e}")
+                self.stats.done += 1
+                outstanding -= 1
+                if outstanding == 0 and fed_all:
+                    finished.set()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.max_concurrency)]
+        reporter = asyncio.create_task(self.stats.report_periodically(self.limiter))
+        feeder = asyncio.create_task(feed())
+        waiter = asyncio.create_task(finished.wait())
+        if self.rate_budget is not None:
+            background.add(asyncio.create_task(self._follow_budget(bucket)))
+        try:
+            await asyncio.wait({feeder, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if feeder.done() and feeder.exception() is not None:
+                raise feeder.exception()
+            await waiter
+        finally:
+            tasks = [*workers, reporter, feeder, waiter, *background]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.rate_budget is not None:
+                await asyncio.to_thread(self.rate_budget.leave)
+        self.stats.log(self.limiter)
+        return self.stats
@@ -0,0 +1,281 @@
+# elt_core/stage_handoff.py
+"""
+In-process hand-off of stage outputs with background persistence.
+
+When one process runs consecutive stages (e.g. ContractsSource ->
+ContractsGoldSource -> sync_gold_db("contracts_gold")), every stage used to
+write its output to CouchDB and the next stage immediately downloaded and
+parsed all of it again. With the hand-off:
+
+- a stage's saved batches are kept in memory as record batches, exactly as
+  they are sent to CouchDB (prepared and JSON-sanitized),
+- the _bulk_docs writes run on a background thread, bounded by a small queue
+  so a slow CouchDB applies back-pressure instead of buffering the world,
+- the next stage in the same process waits for the pending writes of that
+  database and takes the batches from memory; if nothing was handed off
+  (other process, dropped under memory pressure) it reads CouchDB.
+
+The hand-off holds what *this run* wrote, so it is only used when that is
+the whole database: if the database already held documents when the stage
+started writing (e.g. a second run), or CouchDB rejected or failed any write
+to it (e.g. a conflict with an existing _id), the batches are released and
+the next stage reads CouchDB. A failed write is raised from save() and
+wait() of its own database only.
+
+Configuration (environment variables):
+    STAGE_HANDOFF             Set to "off" to persist synchronously and always read from CouchDB
+    STAGE_HANDOFF_QUEUE       Max batches waiting to be written (default: 8)
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from elt_core.memory_governor import current_rss_bytes, get_memory_governor
+
+logger = logging.getLogger("StageHandoff")
+
+class StageHandoff:
+    def __init__(self, enabled: Optional[bool] = None, max_pending_batches: Optional[int] = None):
+        """
+        Args:
+            enabled: Set False to save synchronously (default: STAGE_HANDOFF env, on)
+            max_pending_batches: Batches queued for the background writer before
+                save() blocks (default: STAGE_HANDOFF_QUEUE or 8)
+        """
+        if enabled is None:
+            enabled = os.getenv("STAGE_HANDOFF", "on").lower() not in ("off", "0", "false")
+        if max_pending_batches is None:
+            max_pending_batches = int(os.getenv("STAGE_HANDOFF_QUEUE", "8"))
+
+        self.enabled = enabled
+        self.memory_governor = get_memory_governor()
+        self._batches: Dict[str, List[List[Dict[str, Any]]]] = {}
+        self._pending: Dict[str, int] = {}
+        # Databases whose stored documents differ from what this run handed off
+        self._fallback: Set[str] = set()
+        # First background write error of each database
+        self._errors: Dict[str, BaseException] = {}
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending_batches)
+        self._writer: Optional[threading.Thread] = None
+        self._connector = None
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def save(
+        self, db_connector, db_name: str, docs: List[Dict[str, Any]], keep: bool = True, sanitize: bool = True
+    ) -> None:
+        """
+        Hands a prepared batch downstream and queues it for persistence.
+
+        Args:
+            db_connector: Connector of the producing stage (its URL is used by the writer)
+            db_name: Target database
+            docs: Prepared documents (with _id where the stage sets one)
+            keep: Keep the batch in memory for a downstream stage of this process
+            sanitize: Set False for documents that are already JSON-ready
+        """
+        self._raise_pending_error(db_name)
+        if keep:
+            keep = self._start_or_continue(db_connector, db_name)
+        clean_docs = db_connector._sanitize_for_json(docs) if sanitize else docs
+        if keep:
+            # Give the in-memory and the stored copy the same id; otherwise
+            # CouchDB would generate one the downstream stage never sees
+            for doc in clean_docs:
+                if "_id" not in doc:
+                    doc["_id"] = uuid.uuid4().hex
+
+        with self._lock:
+            if keep and db_name not in self._fallback:
+                self._batches.setdefault(db_name, []).append(clean_docs)
+            self._pending[db_name] = self._pending.get(db_name, 0) + 1
+        self._ensure_writer(db_connector)
+        self._queue.put((db_name, clean_docs))
+        self._release_under_pressure()
+
+    def _start_or_continue(self, db_connector, db_name: str) -> bool:
+        """
+        Returns whether a batch for db_name can be kept in memory. The first
+        batch of a hand-off checks that the database holds no documents yet.
+        """
+        with self._lock:
+            if db_name in self._fallback:
+                return False
+            if db_name in self._batches:
+                return True
+        info = db_connector.get_db_info(db_name)
+        if info and info.get("doc_count"):
+            logger.info(f"'{db_name}' already holds {info['doc_count']} docs, the next stage will read CouchDB")
+            self._fall_back(db_name)
+            return False
+        return True
+
+    def _fall_back(self, db_name: str) -> None:
+        """Releases the in-memory copy of db_name until its consumer has read CouchDB."""
+        with self._lock:
+            self._fallback.add(db_name)
+            self._batches.pop(db_name, None)
+
+    def _ensure_writer(self, db_connector) -> None:
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is not None:
+                return
+            # The writer has its own HTTP session; requests sessions are not shared across threads
+            self._connector = type(db_connector)(db_connector.url)
+            self._writer = threading.Thread(target=self._write_loop, name="stage-handoff-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self) -> None:
+        while True:
+            db_name, docs = self._queue.get()
+            try:
+                results = self._connector.save_documents_bulk(db_name, docs, sanitize=False)
+                self.memory_governor.observe(db_name, len(docs), self._connector.last_payload_bytes)
+                rejected = {r.get("id"): r.get("error") for r in results if r.get("error")}
+                print(f"Saved batch of {len(docs) - len(rejected)} docs to '{db_name}'")
+                if rejected:
+                    errors = sorted(set(rejected.values()))
+                    logger.warning(
+                        f"{len(rejected)} of {len(docs)} docs were not stored in '{db_name}' "
+                        f"({', '.join(errors)}), the next stage will read CouchDB"
+                    )
+                    self._fall_back(db_name)
+            except BaseException as e:
+                logger.error(f"Background save to '{db_name}' failed: {e}")
+                self._fall_back(db_name)
+                with self._lock:
+                    self._errors.setdefault(db_name, e)
+            finally:
+                with self._lock:
+                    self._pending[db_name] -= 1
+                    self._drained.notify_all()
+
+    def _release_under_pressure(self) -> None:
+        """Drops the in-memory copies when RSS crosses the governor's high watermark."""
+        governor = self.memory_governor
+        if not governor.enabled or not self._batches:
+            return
+        if current_rss_bytes() >= governor.ceiling_bytes * governor.high_watermark:
+            with self._lock:
+                dropped = list(self._batches)
+                self._batches.clear()
+                # Later batches alone would be an incomplete hand-off
+                self._fallback.update(dropped)
+            logger.warning(f"Memory pressure: dropped hand-off of {dropped}, consumers will read CouchDB")
+
+    # ------------------------------------------------------------------
+    # Consumer side
+    # ------------------------------------------------------------------
+
+    def take(self, db_name: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns (and releases) the documents handed off for db_name once its
+        pending writes are done, or None if the consumer has to read CouchDB:
+        nothing was handed off in this process, or the hand-off does not hold
+        the whole database (see module docstring).
+        """
+        with self._lock:
+            while self._pending.get(db_name, 0) > 0:
+                self._drained.wait()
+            batches = self._batches.pop(db_name, None)
+            if db_name in self._fallback:
+                self._fallback.discard(db_name)
+                batches = None
+        if batches is None:
+            return None
+        return [doc for batch in batches for doc in batch]
+
+    def get_documents(self, db_connector, db_name: str) -> List[Dict[str, Any]]:
+        """
+        Returns the output of the stage that wrote db_name in this process, or
+        - once pending background writes to it are done - all its documents from CouchDB.
+        """
+        docs = self.take(db_name)
+        if docs is not None:
+            logger.info(f"Using {len(docs)} in-memory docs of '{db_name}' (no CouchDB round trip)")
+            return docs
+        self.wait(db_name)
+        return db_connector.get_all_documents(db_name)
+
+    def iter_documents(
+        self, db_connector, db_name: str, batch_size: int = 5000, key: Optional[str] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields the documents of get_documents() in batches sized by the memory
+        governor (key defaults to db_name). Documents read from CouchDB are
+        fetched one batch per request, so the whole database is never in memory.
+        """
+        governor = self.memory_governor
+        key = key or db_name
+        docs = self.take(db_name)
+        if docs is not None:
+            logger.info(f"Using {len(docs)} in-memory docs of '{db_name}' (no CouchDB round trip)")
+            yield from governor.iter_batches(docs, key, batch_size)
+            return
+        self.wait(db_name)
+        startkey = None
+        while True:
+            page, startkey = db_connector.get_documents_page(
+                db_name, startkey=startkey, limit=governor.batch_size(key, batch_size)
+            )
+            if page:
+                yield page
+            if startkey is None:
+                return
+
+    # ------------------------------------------------------------------
+    # Durability
+    # ------------------------------------------------------------------
+
+    def wait(self, db_name: Optional[str] = None) -> None:
+        """
+        Blocks until pending writes (of one database, or all) are persisted.
+        Raises the first background write error of that database (or of any), if any.
+        """
+        with self._lock:
+            while (self._pending.get(db_name, 0) if db_name else sum(self._pending.values())) > 0:
+                self._drained.wait()
+        self._raise_pending_error(db_name)
+
+    def flush(self) -> None:
+        """Waits for all writes and releases every in-memory hand-off."""
+        self.wait()
+        with self._lock:
+            self._batches.clear()
+            self._fallback.clear()
+
+    def _raise_pending_error(self, db_name: Optional[str] = None) -> None:
+        with self._lock:
+            if db_name:
+                error = self._errors.pop(db_name, None)
+            else:
+                failed = next(iter(self._errors), None)
+                error = self._errors.pop(failed) if failed else None
+        if error is None:
+            return
+        raise RuntimeError(f"Background persistence failed: {error}") from error
+
+
+_handoff: Optional[StageHandoff] = None
+_handoff_lock = threading.Lock()
+
+
+def get_stage_handoff() -> StageHandoff:
+    """Return the process-wide StageHandoff, creating it from the environment on first use."""
+    global _handoff
+    if _handoff is None:
+        with _handoff_lock:
+            if _handoff is None:
+                _handoff = StageHandoff()
+                atexit.register(_handoff.wait)
+    return _handoff
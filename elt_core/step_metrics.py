@@ -0,0 +1,261 @@
+# elt_core/step_metrics.py
+"""
+Per-step instrumentation of the transformation functions.
+
+The functions of `transformations` and `arrow_transformations` are wrapped
+with `@instrumented_step`. Every call records, under the source named by the
+logger it was given (or "-" without one):
+
+- rows in and out (selectivity),
+- elapsed time,
+- memory delta: growth of the resident set size over the call (default) or,
+  with STEP_METRICS_MEMORY=tracemalloc, the peak of traced allocations above
+  the start of the call (exact, but tracing slows every allocation down),
+- the column dtypes of the returned frame.
+
+TransformPlan stages that are not such a function (fused row passes, the
+LocationEngine) are recorded under their stage name.
+
+Calls are aggregated per (source, step) into a per-run table:
+`BaseDataSource.report_step_metrics()` logs the table of its source, returns
+its rows and starts a new run. Nested calls (a step calling another step)
+are recorded too, with their depth.
+
+Configuration (environment variables):
+    STEP_METRICS          on | off (default: on)
+    STEP_METRICS_MEMORY   rss | tracemalloc (default: rss)
+"""
+import functools
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from elt_core.memory_governor import current_rss_bytes
+
+_MB = 1024 * 1024
+
+NO_SOURCE = "-"
+
+
+def _rows(frame: Any) -> Optional[int]:
+    try:
+        return len(frame)
+    except TypeError:
+        return None
+
+
+def _dtypes(frame: Any) -> Dict[str, str]:
+    """Column dtypes of a pandas DataFrame or an arrow_transformations.ColumnFrame."""
+    dtypes = getattr(frame, "dtypes", None)
+    if dtypes is not None and hasattr(dtypes, "items"):
+        return {str(name): str(dtype) for name, dtype in dtypes.items()}
+    columns = getattr(frame, "columns", None)
+    if isinstance(columns, dict):
+        return {str(name): str(getattr(column, "type", "object")) for name, column in columns.items()}
+    return {}
+
+
+class _StepTotals:
+    __slots__ = ("calls", "depth", "rows_in", "rows_out", "seconds", "mem_delta", "dtypes", "changed")
+
+    def __init__(self, depth: int):
+        self.calls = 0
+        self.depth = depth
+        self.rows_in = 0
+        self.rows_out = 0
+        self.seconds = 0.0
+        self.mem_delta = 0
+        self.dtypes: Dict[str, str] = {}
+        self.changed: Dict[str, str] = {}
+
+
+class StepMetrics:
+    def __init__(self, enabled: Optional[bool] = None, memory: Optional[str] = None):
+        """
+        Args:
+            enabled: Record calls (default: unless STEP_METRICS=off)
+            memory: "rss" or "tracemalloc" (default: STEP_METRICS_MEMORY or rss)
+        """
+        if enabled is None:
+            enabled = os.getenv("STEP_METRICS", "on").lower() not in ("off", "0", "false")
+        memory = (memory or os.getenv("STEP_METRICS_MEMORY", "rss")).lower()
+        if memory not in ("rss", "tracemalloc"):
+            raise ValueError(f"Unknown STEP_METRICS_MEMORY: {memory}")
+        self.enabled = enabled
+        self.memory = memory
+        # Insertion order of the steps is their first-call order
+        self._totals: Dict[str, Dict[str, _StepTotals]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def _stack(self) -> List[List[int]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _memory_start(self) -> int:
+        if self.memory != "tracemalloc":
+            return current_rss_bytes()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        stack = self._stack()
+        if stack:
+            # Keep the enclosing call's peak before resetting it for this one
+            stack[-1][1] = max(stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        return current
+
+    def _memory_delta(self, start: int, frame_peak: int) -> int:
+        if self.memory != "tracemalloc":
+            return current_rss_bytes() - start
+        _, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, frame_peak)
+        stack = self._stack()
+        if stack:
+            stack[-1][1] = max(stack[-1][1], peak)
+        return peak - start
+
+    def call(self, step: str, func: Callable[..., Any], args: Tuple, kwargs: Dict[str, Any]) -> Any:
+        """Runs one transformation call and records it."""
+        frame = args[0] if args else None
+        logger = kwargs.get("logger") or next((a for a in args if isinstance(a, logging.Logger)), None)
+        source = getattr(logger, "name", None) or NO_SOURCE
+        rows_in = _rows(frame)
+        dtypes_in = _dtypes(frame)
+
+        stack = self._stack()
+        depth = len(stack)
+        start_memory = self._memory_start()
+        # [depth marker, peak of traced memory seen by nested calls]
+        stack.append([depth, 0])
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            _, nested_peak = stack.pop()
+        mem_delta = self._memory_delta(start_memory, nested_peak)
+        self._record(source, step, depth, rows_in, _rows(result), elapsed, mem_delta, dtypes_in, _dtypes(result))
+        return result
+
+    def _record(self, source, step, depth, rows_in, rows_out, elapsed, mem_delta, dtypes_in, dtypes_out) -> None:
+        with self._lock:
+            steps = self._totals.setdefault(source, {})
+            totals = steps.get(step)
+            if totals is None:
+                totals = steps[step] = _StepTotals(depth)
+            totals.calls += 1
+            totals.rows_in += rows_in or 0
+            totals.rows_out += rows_out or 0
+            totals.seconds += elapsed
+            totals.mem_delta = max(totals.mem_delta, mem_delta)
+            totals.dtypes = dtypes_out
+            totals.changed.update(
+                {name: dtype for name, dtype in dtypes_out.items() if dtypes_in.get(name) != dtype}
+            )
+
+    # ------------------------------------------------------------------
+    # Per-run table
+    # ------------------------------------------------------------------
+
+    def table(self, source: str) -> List[Dict[str, Any]]:
+        """
+        One row per step called for the source since its last reset, in
+        first-call order. mem_delta_mb is the largest delta of a single call;
+        changed_dtypes lists the columns the step added or converted.
+        """
+        with self._lock:
+            steps = list(self._totals.get(source, {}).items())
+        rows = []
+        for step, totals in steps:
+            rows.append({
+                "step": step,
+                "depth": totals.depth,
+                "calls": totals.calls,
+                "rows_in": totals.rows_in,
+                "rows_out": totals.rows_out,
+                "selectivity": round(totals.rows_out / totals.rows_in, 4) if totals.rows_in else None,
+                "seconds": round(totals.seconds, 4),
+                "mem_delta_mb": round(totals.mem_delta / _MB, 2),
+                "changed_dtypes": dict(totals.changed),
+                "dtypes": dict(totals.dtypes),
+            })
+        return rows
+
+    def format_table(self, source: str, rows: Optional[List[Dict[str, Any]]] = None) -> str:
+        rows = self.table(source) if rows is None else rows
+        if not rows:
+            return f"No transformation steps recorded for {source}"
+        total = sum(row["seconds"] for row in rows if row["depth"] == 0)
+        name_width = max(len(row["step"]) + 2 * row["depth"] for row in rows)
+        lines = [
+            f"Transformation steps of {source} ({self.memory} memory):",
+            f"  {'step':<{name_width}} {'calls':>5} {'rows in':>10} {'rows out':>10} {'kept':>7} "
+            f"{'seconds':>8} {'share':>6} {'mem MB':>8}  changed dtypes",
+        ]
+        for row in rows:
+            name = "  " * row["depth"] + row["step"]
+            kept = f"{row['selectivity']:.1%}" if row["selectivity"] is not None else "-"
+            share = f"{row['seconds'] / total:.0%}" if total and row["depth"] == 0 else ""
+            changed = ", ".join(f"{col}:{dtype}" for col, dtype in row["changed_dtypes"].items())
+            lines.append(
+                f"  {name:<{name_width}} {row['calls']:>5} {row['rows_in']:>10} {row['rows_out']:>10} {kept:>7} "
+                f"{row['seconds']:>8.3f} {share:>6} {row['mem_delta_mb']:>8.2f}  {changed}"
+            )
+        return "\n".join(lines)
+
+    def reset(self, source: Optional[str] = None) -> None:
+        """Starts a new run for one source (or all)."""
+        with self._lock:
+            if source is None:
+                self._totals.clear()
+            else:
+                self._totals.pop(source, None)
+
+
+def instrumented_step(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Records every call of a transformation `func(frame, ..., logger=None)`
+    in the process-wide StepMetrics, under the function's name.
+    """
+    step = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = get_step_metrics()
+        if not metrics.enabled:
+            return func(*args, **kwargs)
+        return metrics.call(step, func, args, kwargs)
+
+    wrapper.instrumented_step = True
+    return wrapper
+
+
+def is_instrumented(func: Callable[..., Any]) -> bool:
+    """Whether func (or the function behind a functools.partial) records its calls."""
+    while isinstance(func, functools.partial):
+        func = func.func
+    return getattr(func, "instrumented_step", False)
+
+
+_metrics: Optional[StepMetrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_step_metrics() -> StepMetrics:
+    """Return the process-wide StepMetrics, creating it from the environment on first use."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = StepMetrics()
+    return _metrics
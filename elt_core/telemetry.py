@@ -0,0 +1,208 @@
+# elt_core/telemetry.py
+"""
+Structured I/O telemetry for CouchDB, Neo4j and HTTP calls.
+
+Every instrumented call records a span with its component, operation,
+database/label/host, latency, payload bytes and outcome. Spans are:
+
+- kept in a bounded in-memory buffer (``Telemetry.spans``),
+- optionally streamed as JSON lines to TELEMETRY_JSONL as they happen,
+- aggregated into latency histograms and byte counters that are written as a
+  Prometheus textfile (node_exporter textfile collector format) to
+  TELEMETRY_PROM_FILE on ``flush()`` and at interpreter exit.
+
+Usage:
+    with get_telemetry().span("couchdb", "_bulk_docs", db_name) as span:
+        resp = session.post(...)
+        span["bytes_out"] = len(body)
+        span["bytes_in"] = len(resp.content)
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import ujson
+
+# Latency buckets in seconds (upper bounds), from a fast CouchDB GET to a full _all_docs dump
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRIC_PREFIX = "knownet_io"
+
+_LabelKey = Tuple[str, str, str, str]
+
+
+def _escape_label(value: Any) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Histogram:
+    __slots__ = ("bucket_counts", "count", "sum", "bytes_out", "bytes_in")
+
+    def __init__(self, n_buckets: int):
+        self.bucket_counts = [0] * n_buckets
+        self.count = 0
+        self.sum = 0.0
+        self.bytes_out = 0
+        self.bytes_in = 0
+
+
+class Telemetry:
+    def __init__(
+        self,
+        jsonl_path: Optional[str] = None,
+        prom_path: Optional[str] = None,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        max_spans: int = 100000,
+    ):
+        """
+        Args:
+            jsonl_path: File to append spans to as JSON lines (default: TELEMETRY_JSONL)
+            prom_path: Prometheus textfile written on flush (default: TELEMETRY_PROM_FILE)
+            buckets: Latency histogram bucket upper bounds in seconds
+            max_spans: Number of most recent spans kept in memory
+        """
+        self.jsonl_path = jsonl_path if jsonl_path is not None else os.getenv("TELEMETRY_JSONL")
+        self.prom_path = prom_path if prom_path is not None else os.getenv("TELEMETRY_PROM_FILE")
+        self.buckets = tuple(sorted(buckets))
+        self.spans: deque = deque(maxlen=max_spans)
+        self._histograms: Dict[_LabelKey, _Histogram] = {}
+        self._lock = threading.Lock()
+        self._jsonl_file = None
+
+    @contextmanager
+    def span(self, component: str, operation: str, target: str, **attributes) -> Iterator[Dict[str, Any]]:
+        """
+        Times the enclosed block and records it as a span.
+
+        The yielded dict can be updated with bytes_out, bytes_in, status_code,
+        docs or any other attribute. An exception marks the span as an error
+        and is re-raised.
+        """
+        span = {
+            "ts": time.time(),
+            "component": component,
+            "operation": operation,
+            "target": target,
+            "bytes_out": 0,
+            "bytes_in": 0,
+            "outcome": "ok",
+            **attributes,
+        }
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["outcome"] = "error"
+            span["error"] = type(e).__name__
+            raise
+        finally:
+            span["latency_s"] = time.perf_counter() - start
+            self.record(span)
+
+    def record(self, span: Dict[str, Any]) -> None:
+        """Adds a finished span to the buffer, the JSONL stream and the histograms."""
+        key = (span["component"], span["operation"], span["target"], span["outcome"])
+        latency = span["latency_s"]
+        with self._lock:
+            self.spans.append(span)
+
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if latency <= bound:
+                    histogram.bucket_counts[i] += 1
+                    break
+            histogram.count += 1
+            histogram.sum += latency
+            histogram.bytes_out += span.get("bytes_out") or 0
+            histogram.bytes_in += span.get("bytes_in") or 0
+
+            if self.jsonl_path:
+                if self._jsonl_file is None:
+                    Path(self.jsonl_path).parent.mkdir(parents=True, exist_ok=True)
+                    self._jsonl_file = open(self.jsonl_path, "a", buffering=1)
+                self._jsonl_file.write(ujson.dumps(span, default=str) + "\n")
+
+    def export_jsonl(self, path: str) -> int:
+        """Writes the buffered spans to a JSONL file. Returns the number of spans written."""
+        with self._lock:
+            spans = list(self.spans)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            for span in spans:
+                f.write(ujson.dumps(span, default=str) + "\n")
+        return len(spans)
+
+    def prometheus_text(self) -> str:
+        """Renders the latency histograms and byte counters in the Prometheus text format."""
+        with self._lock:
+            items = sorted(self._histograms.items())
+
+        lines: List[str] = [
+            f"# HELP {METRIC_PREFIX}_latency_seconds Latency of CouchDB, Neo4j and HTTP calls.",
+            f"# TYPE {METRIC_PREFIX}_latency_seconds histogram",
+        ]
+        for (component, operation, target, outcome), histogram in items:
+            labels = (
+                f'component="{_escape_label(component)}",operation="{_escape_label(operation)}",'
+                f'target="{_escape_label(target)}",outcome="{_escape_label(outcome)}"'
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f'{METRIC_PREFIX}_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_latency_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{METRIC_PREFIX}_latency_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{METRIC_PREFIX}_latency_seconds_count{{{labels}}} {histogram.count}")
+
+        lines.append(f"# HELP {METRIC_PREFIX}_bytes_total Payload bytes moved by CouchDB, Neo4j and HTTP calls.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_bytes_total counter")
+        for (component, operation, target, outcome), histogram in items:
+            labels = (
+                f'component="{_escape_label(component)}",operation="{_escape_label(operation)}",'
+                f'target="{_escape_label(target)}",outcome="{_escape_label(outcome)}"'
+            )
+            lines.append(f'{METRIC_PREFIX}_bytes_total{{{labels},direction="out"}} {histogram.bytes_out}')
+            lines.append(f'{METRIC_PREFIX}_bytes_total{{{labels},direction="in"}} {histogram.bytes_in}')
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str) -> None:
+        """
+        Writes the Prometheus textfile atomically (temp file + rename), so a
+        scraping node_exporter never reads a half-written file.
+        """
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(target.suffix + ".tmp")
+        tmp.write_text(self.prometheus_text())
+        os.replace(tmp, target)
+
+    def flush(self) -> None:
+        """Flushes the JSONL stream and rewrites the configured Prometheus textfile."""
+        with self._lock:
+            if self._jsonl_file is not None:
+                self._jsonl_file.flush()
+        if self.prom_path:
+            self.export_prometheus(self.prom_path)
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """Return the process-wide Telemetry recorder, creating it from the environment on first use."""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                _telemetry = Telemetry()
+                atexit.register(_telemetry.flush)
+    return _telemetry
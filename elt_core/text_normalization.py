@@ -0,0 +1,88 @@
+# elt_core/text_normalization.py
+"""
+Shared, memoized normalization of names and place names.
+
+Accent stripping, name normalization and slugs were implemented separately in
+`transformations.normalize_name`, `AnuarioOCCSource`, the municipal gold
+source and the graph mappers, each running `unicodedata` over every value.
+Here each kernel is a per-value function behind an LRU memo that lives for the
+whole process, so a name seen in an earlier batch (or source) is not
+normalized again. `normalize_series` applies a kernel to the distinct values
+of a Series only (factorize, normalize the uniques, take back).
+
+The memo size is set by TEXT_NORMALIZATION_CACHE (entries per kernel).
+"""
+import os
+import unicodedata
+from functools import lru_cache
+from typing import Any, Callable
+
+from slugify import slugify
+
+CACHE_SIZE = int(os.getenv("TEXT_NORMALIZATION_CACHE", "262144"))
+
+# Honorifics dropped from person names
+NAME_PREFIXES = ("MR ", "MRS ", "MS ", "DR ")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def strip_accents(text: str) -> str:
+    """
+    Removes accents/diacritics (ç -> c, ã -> a, etc.).
+    NFD decomposes characters (e.g., 'ã' -> 'a' + combining tilde) and the
+    combining marks (category 'Mn') are dropped.
+    """
+    if text.isascii():
+        return text
+    normalized = unicodedata.normalize("NFD", text)
+    return "".join(c for c in normalized if unicodedata.category(c) != "Mn")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_person_name(text: str) -> str:
+    """Uppercase, accent-free name without the MR/MRS/MS/DR prefixes."""
+    result = strip_accents(text).upper()
+    for prefix in NAME_PREFIXES:
+        result = result.replace(prefix, "")
+    return result
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def slug(text: str) -> str:
+    """Memoized python-slugify slug, as used for graph node ids."""
+    return slugify(text)
+
+
+def normalize_series(series, func: Callable[[str], Any]):
+    """
+    Applies a per-value kernel to the distinct non-missing values of a Series.
+
+    Values are passed to func as strings; missing values (None/NaN) are kept
+    as they are.
+
+    Args:
+        series: A pandas Series
+        func: Kernel taking one string (e.g. normalize_person_name)
+
+    Returns:
+        A new object Series with the same index and name
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(series)
+    mapped = np.empty(len(uniques), dtype=object)
+    mapped[:] = [func(str(value)) for value in uniques]
+    values = series.to_numpy(dtype=object, copy=True)
+    present = codes >= 0
+    values[present] = mapped[codes[present]]
+    return pd.Series(values, index=series.index, name=series.name, dtype=object)
+
+
+def cache_info() -> dict:
+    """Hit/miss counters of each kernel's memo."""
+    return {
+        "strip_accents": strip_accents.cache_info(),
+        "normalize_person_name": normalize_person_name.cache_info(),
+        "slug": slug.cache_info(),
+    }
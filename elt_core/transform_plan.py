@@ -0,0 +1,303 @@
+# elt_core/transform_plan.py
+"""
+Lazy transformation plans.
+
+A source declares its transformation as an ordered list of steps instead of
+calling the `transformations` functions directly. Each step records the
+columns it reads and writes, whether it drops rows (filter) and its cost
+class:
+
+- VECTOR: vectorized column operation (cheap)
+- ROW:    Python call per row (contract types, CPVs, list lengths)
+- NESTED: walks nested lists per row (locations)
+
+Nothing runs until execute(). The optimizer then
+
+1. pushes filters towards the start of the plan: a filter moves ahead of a
+   row-local step when it does not read what that step writes, and ahead of
+   a more expensive filter. Rows a filter drops are therefore never
+   processed by the expensive steps it passed. Steps declared with
+   row_local=False (e.g. anything that looks at the whole column) are
+   barriers.
+2. fuses steps that provide a per-row kernel into a single pass over the
+   rows. A kernel step joins the previous fused pass when the steps between
+   them are row-local maps it does not share columns with. Inside the pass a
+   row dropped by a filter kernel skips the remaining kernels.
+
+Every step is row-local or a barrier, so the optimized plan produces the same
+rows, in the same order and with the same column order, as the declared one.
+The executed plan (stages, rows in/out, time) is logged and kept in
+`last_report`.
+
+Set TRANSFORM_PLAN=declared to run the steps as declared (no reordering or
+fusion).
+"""
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from elt_core.quarantine import get_quarantine
+from elt_core.step_metrics import get_step_metrics, is_instrumented
+
+VECTOR = "vector"
+ROW = "row"
+NESTED = "nested"
+
+COST_RANK = {VECTOR: 0, ROW: 1, NESTED: 2}
+
+
+class PlanStep:
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., pd.DataFrame],
+        reads: Sequence[str] = (),
+        writes: Sequence[str] = (),
+        cost: str = VECTOR,
+        is_filter: bool = False,
+        row_local: bool = True,
+        row_func: Optional[Callable[..., Any]] = None,
+        row_keep: Optional[Callable[[Any], bool]] = None,
+        reason: Optional[str] = None,
+    ):
+        """
+        Args:
+            name: Label used in the plan report
+            func: Transformation called as func(df, logger=logger), e.g. a
+                functools.partial of a `transformations` function
+            reads / writes: Columns the step reads and writes
+            cost: VECTOR, ROW or NESTED
+            is_filter: The step drops rows
+            row_local: Each output row depends only on the same input row
+            row_func: Optional per-row kernel taking the values of `reads` and
+                returning the value of `writes` (a tuple if several); steps
+                with a kernel can be fused
+            row_keep: For filters with a kernel, predicate on the kernel's
+                output telling whether the row is kept
+            reason: Quarantine reason code of rows dropped by the kernel
+                (default: the step name)
+        """
+        if cost not in COST_RANK:
+            raise ValueError(f"Unknown cost class: {cost}")
+        self.name = name
+        self.func = func
+        self.reads = tuple(reads)
+        self.writes = tuple(writes)
+        self.cost = cost
+        self.is_filter = is_filter
+        self.row_local = row_local
+        self.row_func = row_func
+        self.row_keep = row_keep
+        self.reason = reason or name
+
+    def __repr__(self):
+        kind = "filter" if self.is_filter else "map"
+        return f"PlanStep({self.name!r}, {kind}, {self.cost})"
+
+
+def _independent(step: PlanStep, other: PlanStep) -> bool:
+    """Both steps are row-local and neither touches a column the other writes."""
+    if not step.row_local or not other.row_local:
+        return False
+    return not (set(step.reads + step.writes) & set(other.writes) or set(step.writes) & set(other.reads))
+
+
+def _can_pass(step: PlanStep, earlier: PlanStep) -> bool:
+    """Whether filter `step` may run before `earlier` without changing the result."""
+    if not _independent(step, earlier):
+        return False
+    if earlier.is_filter:
+        # Filters commute; only move ahead of a more expensive one (stable otherwise)
+        return COST_RANK[step.cost] < COST_RANK[earlier.cost]
+    return True
+
+
+class TransformPlan:
+    def __init__(self, name: str, steps: Iterable[PlanStep] = ()):
+        self.name = name
+        self.steps: List[PlanStep] = list(steps)
+        self.last_report: List[Dict[str, Any]] = []
+
+    def add(self, step: PlanStep) -> "TransformPlan":
+        self.steps.append(step)
+        return self
+
+    def map(self, name: str, func: Callable[..., pd.DataFrame], reads=(), writes=(), cost: str = VECTOR, **kwargs) -> "TransformPlan":
+        return self.add(PlanStep(name, func, reads, writes, cost, **kwargs))
+
+    def filter(self, name: str, func: Callable[..., pd.DataFrame], reads=(), cost: str = VECTOR, **kwargs) -> "TransformPlan":
+        return self.add(PlanStep(name, func, reads, kwargs.pop("writes", ()), cost, is_filter=True, **kwargs))
+
+    # ------------------------------------------------------------------
+    # Optimizer
+    # ------------------------------------------------------------------
+
+    def reorder(self) -> List[PlanStep]:
+        """Declared steps with every filter pushed as early as it may go."""
+        ordered: List[PlanStep] = []
+        for step in self.steps:
+            position = len(ordered)
+            if step.is_filter:
+                while position > 0 and _can_pass(step, ordered[position - 1]):
+                    position -= 1
+            ordered.insert(position, step)
+        return ordered
+
+    def stages(self, optimize: bool = True, push_filters: bool = True, fuse: bool = True) -> List[List[PlanStep]]:
+        """
+        Execution stages: one step each, or a group of steps with a row
+        kernel that are executed in one pass. push_filters and fuse turn the
+        two optimizations off separately (used to measure what each adds).
+        """
+        if not optimize:
+            return [[step] for step in self.steps]
+        stages: List[List[PlanStep]] = []
+        for step in (self.reorder() if push_filters else self.steps):
+            if fuse and step.row_func is not None:
+                target = self._fusion_target(stages, step)
+                if target is not None:
+                    stages[target].append(step)
+                    continue
+            stages.append([step])
+        return stages
+
+    @staticmethod
+    def _fusion_target(stages: List[List[PlanStep]], step: PlanStep) -> Optional[int]:
+        """Index of the latest fused stage the kernel step can join, if any."""
+        for index in range(len(stages) - 1, -1, -1):
+            stage = stages[index]
+            if stage[-1].row_func is not None:
+                # Kernels of a pass read the columns as they were before it
+                return index if all(_independent(step, other) for other in stage) else None
+            # Only hop back over row-local maps the step is independent of;
+            # moving a step ahead of a filter would process rows it drops
+            if any(other.is_filter or not _independent(step, other) for other in stage):
+                return None
+        return None
+
+    def explain(self, optimize: bool = True) -> str:
+        lines = [f"Plan {self.name} ({'optimized' if optimize else 'declared'}):"]
+        for i, stage in enumerate(self.stages(optimize), 1):
+            names = " + ".join(step.name for step in stage)
+            kinds = "/".join(sorted({step.cost for step in stage}))
+            fused = " [fused]" if len(stage) > 1 else ""
+            lines.append(f"  {i:2d}. {names} ({kinds}){fused}")
+        return "\n".join(lines)
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def execute(
+        self, df: pd.DataFrame, logger: Optional[logging.Logger] = None, optimize: Optional[bool] = None,
+        push_filters: bool = True, fuse: bool = True,
+    ) -> pd.DataFrame:
+        """
+        Runs the plan on df.
+
+        Args:
+            df: Input frame
+            logger: Passed to every transformation and used for the plan report
+            optimize: Reorder and fuse steps (default: unless TRANSFORM_PLAN=declared)
+            push_filters: With optimize, set False to keep the declared step order
+            fuse: With optimize, set False to run every step on its own
+        """
+        if optimize is None:
+            optimize = os.getenv("TRANSFORM_PLAN", "optimized").lower() != "declared"
+        # New columns come out in declared order, whatever order the stages ran in
+        column_order = list(dict.fromkeys([*df.columns, *(col for step in self.steps for col in step.writes)]))
+        self.last_report = []
+        metrics = get_step_metrics()
+        for stage in self.stages(optimize, push_filters, fuse):
+            rows_in, start = len(df), time.perf_counter()
+            name = " + ".join(step.name for step in stage)
+            if len(stage) == 1 and stage[0].row_func is None:
+                func = stage[0].func
+                if metrics.enabled and not is_instrumented(func):
+                    df = metrics.call(name, func, (df,), {"logger": logger})
+                else:
+                    df = func(df, logger=logger)
+            elif metrics.enabled:
+                df = metrics.call(name, self._run_fused, (df, stage, logger), {})
+            else:
+                df = self._run_fused(df, stage, logger)
+            self.last_report.append({
+                "stage": name,
+                "cost": "/".join(sorted({step.cost for step in stage})),
+                "fused": len(stage) > 1,
+                "rows_in": rows_in,
+                "rows_out": len(df),
+                "seconds": round(time.perf_counter() - start, 4),
+            })
+        ordered = [col for col in column_order if col in df.columns]
+        ordered += [col for col in df.columns if col not in set(ordered)]
+        if ordered != list(df.columns):
+            df = df[ordered]
+        if logger:
+            logger.info(self.report(optimize))
+        return df
+
+    def report(self, optimize: bool = True) -> str:
+        lines = [f"Executed plan {self.name} ({'optimized' if optimize else 'declared'}):"]
+        for i, entry in enumerate(self.last_report, 1):
+            fused = " [fused]" if entry["fused"] else ""
+            lines.append(
+                f"  {i:2d}. {entry['stage']} ({entry['cost']}){fused}: "
+                f"{entry['rows_in']} -> {entry['rows_out']} rows, {entry['seconds']:.3f}s"
+            )
+        return "\n".join(lines)
+
+    @staticmethod
+    def _run_fused(df: pd.DataFrame, stage: List[PlanStep], logger: Optional[logging.Logger]) -> pd.DataFrame:
+        """One pass over the rows for all kernels of the stage, then one row selection."""
+        # Steps whose input columns are absent keep the behaviour of their transformation
+        runnable = [step for step in stage if all(col in df.columns for col in step.reads)]
+        for step in stage:
+            if step not in runnable:
+                df = step.func(df, logger=logger)
+        if not runnable:
+            return df
+
+        columns = {col: df[col].tolist() for step in runnable for col in step.reads}
+        kernels = [
+            (step.row_func, step.row_keep if step.is_filter else None, [columns[col] for col in step.reads])
+            for step in runnable
+        ]
+        outputs: List[List[Any]] = [[] for _ in runnable]
+        kept: List[int] = []
+        dropped: List[List[int]] = [[] for _ in runnable]
+        for i in range(len(df)):
+            row = []
+            for k, (func, keep, inputs) in enumerate(kernels):
+                value = func(*[values[i] for values in inputs])
+                if keep is not None and not keep(value):
+                    dropped[k].append(i)
+                    break
+                row.append(value)
+            else:
+                kept.append(i)
+                for out, value in zip(outputs, row):
+                    out.append(value)
+
+        initial_count = len(df)
+        quarantine = get_quarantine()
+        if quarantine.enabled and logger is not None:
+            for step, positions in zip(runnable, dropped):
+                if positions:
+                    quarantine.reject(logger.name, df.iloc[positions], step.reason, step.name)
+        if len(kept) < initial_count:
+            # Shallow copy: the new columns below are set on a frame of its own
+            df = df.iloc[kept].copy(deep=False)
+        for step, out in zip(runnable, outputs):
+            if len(step.writes) == 1:
+                df[step.writes[0]] = out
+            else:
+                for j, col in enumerate(step.writes):
+                    df[col] = [values[j] for values in out]
+        if logger:
+            names = ", ".join(step.name for step in runnable)
+            logger.info(f"Fused pass [{names}]: {initial_count} -> {len(df)} rows")
+        return df
@@ -1,7 +1,26 @@
 import pandas as pd
+import numpy as np
+import re
+from sys import intern
 from typing import List, Dict, Any, Union, Optional
 import logging
 
+from elt_core.json_records import encode_records, records_from_frame
+from elt_core.quarantine import (
+    REASON_ABOVE_MAX,
+    REASON_DATE_SEQUENCE,
+    REASON_INVALID_VAT,
+    REASON_MISSING_VALUES,
+    REASON_PRICE_ANOMALY,
+    REASON_TOO_MANY_CPVS,
+    REASON_VALUE_MISMATCH,
+    get_quarantine,
+)
+from elt_core.step_metrics import instrumented_step
+from elt_core.text_normalization import normalize_person_name, normalize_series
+
+_VAT_PATTERN = re.compile(r"\d{9}")
+
 def _log_step(logger: Optional[logging.Logger], step_name: str, initial_count: int, final_count: int):
     """
     Helper to log row counts and dropped rows.
@@ -10,6 +29,15 @@ def _log_step(logger: Optional[logging.Logger], step_name: str, initial_count: i
         dropped = initial_count - final_count
         logger.info(f"{step_name}: Dropped {dropped} rows. Remaining: {final_count} rows.")
 
+def _quarantine(logger: Optional[logging.Logger], df: pd.DataFrame, keep, reason: str, step_name: str):
+    """
+    Hands the rows of df outside the keep mask to the quarantine, under the
+    source named by the logger. Does nothing unless QUARANTINE is enabled.
+    """
+    quarantine = get_quarantine()
+    if quarantine.enabled and logger is not None:
+        quarantine.reject(logger.name, df.loc[~keep], reason, step_name)
+
 def to_dataframe(data: Union[List[Dict[str, Any]], Dict[str, Any]]) -> pd.DataFrame:
     """
     Converts a list of dictionaries or a single dictionary to a pandas DataFrame.
@@ -22,10 +50,18 @@ def to_dict(df: pd.DataFrame) -> List[Dict[str, Any]]:
     """
     Converts a pandas DataFrame back to a list of dictionaries.
     Also handles NaN values by replacing them with None.
+    Null handling is done per column and the records come back JSON-ready
+    (JsonRecords), so they are not sanitized again when saved.
     """
-    df = df.astype(object).where(pd.notnull(df), None)
-    return df.to_dict(orient='records')
+    return records_from_frame(df)
 
+def to_json_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Converts a pandas DataFrame to an encoded JSON array of records.
+    """
+    return encode_records(records_from_frame(df))
+
+@instrumented_step
 def filter_rows(df: pd.DataFrame, column: str, value: Any, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Filters rows where the column value matches the given value.
@@ -33,10 +69,13 @@ def filter_rows(df: pd.DataFrame, column: str, value: Any, logger: Optional[logg
     initial_count = len(df)
     if column not in df.columns:
         return df
-    df = df[df[column] == value]
+    keep = df[column] == value
+    _quarantine(logger, df, keep, REASON_VALUE_MISMATCH, f"filter_rows {column} == {value}")
+    df = df[keep]
     _log_step(logger, f"Filter {column} == {value}", initial_count, len(df))
     return df
 
+@instrumented_step
 def rename_columns(df: pd.DataFrame, mapping: Dict[str, str], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Renames columns based on the provided mapping.
@@ -46,6 +85,7 @@ def rename_columns(df: pd.DataFrame, mapping: Dict[str, str], logger: Optional[l
         logger.info(f"Renamed columns with mapping: {mapping}")
     return df
 
+@instrumented_step
 def drop_columns(df: pd.DataFrame, columns: List[str], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Drops the specified columns from the DataFrame.
@@ -55,6 +95,7 @@ def drop_columns(df: pd.DataFrame, columns: List[str], logger: Optional[logging.
         logger.info(f"Dropped columns: {columns}")
     return df
 
+@instrumented_step
 def add_column(df: pd.DataFrame, column_name: str, value: Any, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Adds a new column with a constant value.
@@ -64,6 +105,7 @@ def add_column(df: pd.DataFrame, column_name: str, value: Any, logger: Optional[
         logger.info(f"Added column '{column_name}' with value: {value}")
     return df
 
+@instrumented_step
 def drop_duplicates(df: pd.DataFrame, subset: List[str] = None, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Drops duplicate rows, keeping the first occurrence.
@@ -74,6 +116,7 @@ def drop_duplicates(df: pd.DataFrame, subset: List[str] = None, logger: Optional
     _log_step(logger, "Drop Duplicates", initial_count, len(df))
     return df
 
+@instrumented_step
 def convert_dates_to_iso(df: pd.DataFrame, columns: List[str], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Converts specified columns to datetime objects and then to ISO format strings (YYYY-MM-DD).
@@ -88,6 +131,7 @@ def convert_dates_to_iso(df: pd.DataFrame, columns: List[str], logger: Optional[
         logger.info(f"Converted dates to ISO for columns: {columns}")
     return df
 
+@instrumented_step
 def normalize_locations(df: pd.DataFrame, column: str, countries_set: set, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Normalizes location entries in the specified column.
@@ -126,6 +170,7 @@ def normalize_locations(df: pd.DataFrame, column: str, countries_set: set, logge
         logger.info(f"Normalized locations in column: {column}")
     return df
 
+@instrumented_step
 def enrich_location_from_municipality(df: pd.DataFrame, column: str, lookup: Dict[str, Any], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Back-propagates municipality information to district and country fields using a lookup dictionary.
@@ -157,6 +202,7 @@ def enrich_location_from_municipality(df: pd.DataFrame, column: str, lookup: Dic
         logger.info(f"Enriched locations from municipality in column: {column}")
     return df
 
+@instrumented_step
 def enrich_location_from_district(df: pd.DataFrame, column: str, lookup: Dict[str, Any], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     !!! ONLY FOR PORTUGAL DISTRICTS!!!
@@ -187,6 +233,7 @@ def enrich_location_from_district(df: pd.DataFrame, column: str, lookup: Dict[st
     return df
 
 
+@instrumented_step
 def map_location_fixes(df: pd.DataFrame, column: str, level: str, lookup: Dict[str, str], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Maps values of a specific level (e.g. 'country', 'district', 'municipality') in the location list
@@ -217,19 +264,32 @@ def map_location_fixes(df: pd.DataFrame, column: str, level: str, lookup: Dict[s
 
 # --- New Transformations ---
 
+def contract_types_of(value: Any, allowed_types: set) -> List[str]:
+    """
+    Per-value kernel of transform_contract_type: splits on '<br/>' and maps
+    types outside allowed_types to "Outros Tipos" (deduplicated).
+    """
+    return list(set([intern(t) if t in allowed_types else "Outros Tipos" for t in str(value).split('<br/>')]))
+
+@instrumented_step
 def transform_contract_type(df: pd.DataFrame, column: str, allowed_types: set, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Transforms contract types, normalizing them against an allowed set.
     """
     if column in df.columns:
-        df[column] = [
-            list(set([t if t in allowed_types else "Outros Tipos" for t in types]))
-            for types in df[column].astype(str).str.split('<br/>')
-        ]
+        df[column] = [contract_types_of(types, allowed_types) for types in df[column]]
         if logger:
             logger.info(f"Transformed contract types in column: {column}")
     return df
 
+def cpvs_of(value: Any) -> List[str]:
+    """
+    Per-value kernel of transform_cpvs: splits by pipe, keeps the part before
+    the hyphen and deduplicates. Non-strings give an empty list.
+    """
+    return list({p.split("-", 1)[0] for p in value.split("|") if p}) if isinstance(value, str) else []
+
+@instrumented_step
 def transform_cpvs(df: pd.DataFrame, column: str, max_length: int = 20, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Transforms CPVs by splitting and deduplicating, then filters out rows with too many CPVs.
@@ -237,36 +297,45 @@ def transform_cpvs(df: pd.DataFrame, column: str, max_length: int = 20, logger:
     initial_count = len(df)
     if column in df.columns:
         # Split by pipe, then split by hyphen and take first part, then deduplicate
-        df[column] = [
-            list({p.split("-", 1)[0] for p in val.split("|") if p}) if isinstance(val, str) else []
-            for val in df[column]
-        ]
+        df[column] = [cpvs_of(val) for val in df[column]]
         # Remove rows where cpvs length is greater than max_length
-        df = df[df[column].apply(len) <= max_length]
+        keep = df[column].apply(len) <= max_length
+        _quarantine(logger, df, keep, REASON_TOO_MANY_CPVS, f"transform_cpvs {column} max_length={max_length}")
+        df = df[keep]
     
     _log_step(logger, f"Transform CPVs (max_len={max_length})", initial_count, len(df))
     return df
 
+@instrumented_step
 def filter_dropna(df: pd.DataFrame, subset: List[str], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Drops rows with missing values in the specified subset of columns.
     """
     initial_count = len(df)
     if all(col in df.columns for col in subset):
-        df = df.dropna(subset=subset)
+        if get_quarantine().enabled:
+            keep = df[subset].notna().all(axis=1)
+            _quarantine(logger, df, keep, REASON_MISSING_VALUES, f"filter_dropna {subset}")
+            df = df[keep]
+        else:
+            df = df.dropna(subset=subset)
     _log_step(logger, f"DropNA subset={subset}", initial_count, len(df))
     return df
 
+@instrumented_step
 def filter_max_value(df: pd.DataFrame, column: str, max_value: float, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Filters rows where the column value exceeds the max_value.
     """
     initial_count = len(df)
     if column in df.columns:
-        df = df[df[column] <= max_value]
+        keep = df[column] <= max_value
+        _quarantine(logger, df, keep, REASON_ABOVE_MAX, f"filter_max_value {column} <= {max_value}")
+        df = df[keep]
     _log_step(logger, f"Filter Max Value {column} <= {max_value}", initial_count, len(df))
     return df
 
+@instrumented_step
 def filter_price_anomalies(df: pd.DataFrame, initial_price_col: str, final_price_col: str, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Removes rows where initial_price is 0 and final_price is NaN, or initial_price is less than 0.
@@ -275,11 +344,13 @@ def filter_price_anomalies(df: pd.DataFrame, initial_price_col: str, final_price
     if initial_price_col in df.columns and final_price_col in df.columns:
     
         condition = ~((df[initial_price_col] == 0) & (df[final_price_col].isna()) | (df[initial_price_col] < 0))
+        _quarantine(logger, df, condition, REASON_PRICE_ANOMALY, "filter_price_anomalies")
         df = df[condition]
         
     _log_step(logger, "Filter Price Anomalies", initial_count, len(df))
     return df
 
+@instrumented_step
 def filter_date_sequence(df: pd.DataFrame, start_date_col: str, end_date_col: str, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Filters rows where the start_date is after the end_date (e.g. signing_date < publication_date).
@@ -291,10 +362,13 @@ def filter_date_sequence(df: pd.DataFrame, start_date_col: str, end_date_col: st
     if start_date_col in df.columns and end_date_col in df.columns:
         # Ensure we are comparing dates, assuming they are already ISO strings or datetime
         # If they are strings, direct comparison works for ISO format.
-        df = df[df[start_date_col] >= df[end_date_col]]
+        keep = df[start_date_col] >= df[end_date_col]
+        _quarantine(logger, df, keep, REASON_DATE_SEQUENCE, f"filter_date_sequence {start_date_col} >= {end_date_col}")
+        df = df[keep]
         
     _log_step(logger, f"Filter Date Sequence {start_date_col} >= {end_date_col}", initial_count, len(df))
     return df
+@instrumented_step
 def extract_dict_key(df: pd.DataFrame, column: str, key: str, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Extracts a specific key from a column containing dictionaries.
@@ -312,6 +386,7 @@ def extract_dict_key(df: pd.DataFrame, column: str, key: str, logger: Optional[l
             logger.info(f"Extracted key '{key}' from column: {column}")
     return df
 
+@instrumented_step
 def map_values(df: pd.DataFrame, column: str, mapping: Dict[Any, Any], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Maps values in a column using a lookup dictionary.
@@ -323,6 +398,167 @@ def map_values(df: pd.DataFrame, column: str, mapping: Dict[Any, Any], logger: O
         if logger:
             logger.info(f"Mapped values in column: {column}")
     return df
+
+def list_length(value: Any) -> int:
+    """Length of a list value, 0 for anything else."""
+    return len(value) if isinstance(value, list) else 0
+
+@instrumented_step
+def add_list_length(df: pd.DataFrame, column: str, target: str, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
+    """
+    Adds a column with the number of items of a list column (0 when it is not a list).
+    """
+    df[target] = df[column].apply(list_length)
+    if logger:
+        logger.info(f"Added column '{target}' with the number of items in column: {column}")
+    return df
+
+@instrumented_step
+def add_mapped_column(df: pd.DataFrame, column: str, target: str, mapping: Dict[Any, Any], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
+    """
+    Adds a column by mapping another one through a lookup dictionary.
+    Values not found in the mapping become NaN.
+    """
+    df[target] = df[column].map(mapping)
+    if logger:
+        logger.info(f"Added column '{target}' by mapping column: {column}")
+    return df
+
+@instrumented_step
+def fill_missing_from(df: pd.DataFrame, target: str, source: str, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
+    """
+    Where target is missing and source is present, copies source into target.
+    """
+    df.loc[df[source].notna() & df[target].isna(), target] = df[source]
+    if logger:
+        logger.info(f"Filled missing {target} from {source}")
+    return df
+
+NO_DESCRIPTION = 'No description'
+
+@instrumented_step
+def collect_nifs(records: List[Dict[str, Any]], columns: List[str], logger: Optional[logging.Logger] = None) -> pd.DataFrame:
+    """
+    Unique NIFs of entity fields holding a dict or a list of dicts
+    ({'nif': ..., 'description': ...}), with one description per NIF.
+
+    Works on the documents directly (silver records), exploding each field
+    into its entities in one pass, and aggregates the description per NIF:
+    the first real description wins; NIFs seen only with an empty or '-'
+    description get NO_DESCRIPTION. Once a NIF has a real description, its
+    later entities cost one lookup.
+
+    Returns:
+        DataFrame with columns nif and description, in order of first appearance
+    """
+    if isinstance(records, dict):
+        records = [records]
+    cells = [row.get(col) for row in records for col in columns]
+
+    best: Dict[str, Optional[str]] = {}
+    entities = 0
+    for cell in cells:
+        for entity in (cell if type(cell) is list else (cell,)):
+            if type(entity) is not dict or 'nif' not in entity:
+                continue
+            entities += 1
+            raw = entity['nif']
+            nif = raw.strip() if type(raw) is str else str(raw).strip()
+            # NIFs that already have a real description are done
+            if not nif or best.get(nif) is not None:
+                continue
+            raw = entity.get('description')
+            description = str(raw).strip() if raw else None
+            if description in ('-', ''):
+                description = None
+            best[nif] = description
+
+    result = pd.DataFrame({
+        'nif': pd.Series(list(best), dtype=object),
+        'description': pd.Series([NO_DESCRIPTION if d is None else d for d in best.values()], dtype=object),
+    })
+    if logger:
+        logger.info(f"Collected {len(result)} unique NIFs from {entities} entities in columns: {columns}")
+    return result
+
+# Share of a contract's value credited to an entity, by the field it appears in
+NIF_ROLE_WEIGHTS = {'contracted': 1.0, 'contracting_agency': 1.0, 'contestants': 0.1}
+
+
+@instrumented_step
+def nif_priorities(
+    records: List[Dict[str, Any]],
+    role_weights: Optional[Dict[str, float]] = None,
+    price_columns: tuple = ('final_price', 'initial_price'),
+    date_columns: tuple = ('signing_date', 'publication_date'),
+    logger: Optional[logging.Logger] = None,
+) -> pd.DataFrame:
+    """
+    Scrape priority of every NIF in the entity fields of silver contracts.
+
+    A NIF's priority is the contract value behind it: for each contract it
+    appears in, the first present price of price_columns times the weight of
+    its role (role_weights, default NIF_ROLE_WEIGHTS: suppliers and buyers
+    count fully, losing bidders a little). A NIF with several roles in one
+    contract counts each role.
+
+    Returns:
+        DataFrame with columns nif, priority (rounded to cents), contracts
+        (contracts it appears in), roles (sorted field names) and
+        last_contract (latest of the first present ISO date of date_columns
+        of its contracts, None without any), highest priority first
+    """
+    role_weights = role_weights or NIF_ROLE_WEIGHTS
+    if isinstance(records, dict):
+        records = [records]
+    priority: Dict[str, float] = {}
+    contracts: Dict[str, int] = {}
+    roles: Dict[str, set] = {}
+    last_contract: Dict[str, str] = {}
+    for row in records:
+        value = 0.0
+        for column in price_columns:
+            price = row.get(column)
+            if price is not None and price == price:
+                value = float(price)
+                break
+        date = None
+        for column in date_columns:
+            cell = row.get(column)
+            if type(cell) is str and cell:
+                date = cell[:10]
+                break
+        seen = set()
+        for role, weight in role_weights.items():
+            cell = row.get(role)
+            for entity in (cell if type(cell) is list else (cell,)):
+                if type(entity) is not dict or 'nif' not in entity:
+                    continue
+                raw = entity['nif']
+                nif = raw.strip() if type(raw) is str else str(raw).strip()
+                if not nif:
+                    continue
+                priority[nif] = priority.get(nif, 0.0) + value * weight
+                roles.setdefault(nif, set()).add(role)
+                if nif not in seen:
+                    seen.add(nif)
+                    contracts[nif] = contracts.get(nif, 0) + 1
+                    if date is not None and date > last_contract.get(nif, ''):
+                        last_contract[nif] = date
+
+    result = pd.DataFrame({
+        'nif': pd.Series(list(priority), dtype=object),
+        'priority': pd.Series([round(p, 2) for p in priority.values()], dtype='float64'),
+        'contracts': pd.Series([contracts[nif] for nif in priority], dtype='int64'),
+        'roles': pd.Series([sorted(roles[nif]) for nif in priority], dtype=object),
+        'last_contract': pd.Series([last_contract.get(nif) for nif in priority], dtype=object),
+    })
+    result = result.sort_values('priority', ascending=False, kind='stable', ignore_index=True)
+    if logger:
+        logger.info(f"Scored {len(result)} NIFs over {len(records)} contracts (total priority {result['priority'].sum():,.2f})")
+    return result
+
+@instrumented_step
 def propagate_company_vat(
     df: pd.DataFrame,
     group_col: str,
@@ -332,35 +568,63 @@ def propagate_company_vat(
     """
     Propagates VAT numbers within groups defined by group_col.
     Fills missing VATs by forward and backward filling within each group.
+
+    Same result as
+    `df[vat_col].astype("string").groupby(df[group_col]).transform(lambda x: x.ffill().bfill())`,
+    without calling a Python function per company: the VAT values are
+    factorized, the integer codes are filled with the grouped (Cython)
+    ffill/bfill and only the distinct VATs are converted to strings.
+    Rows without a group get a missing VAT, as groupby drops them.
     """
-    initial_count = len(df)
     if group_col not in df.columns or vat_col not in df.columns:
         if logger:
             logger.warning(f"Missing columns for propagation: {group_col}, {vat_col}")
         return df
 
-    # Ensure VAT column is string for consistent filling
-    # We use a temporary column to avoid modifying the original until we assign back
-    # But here we want to modify the dataframe.
-    
-    # Logic from user:
-    # df[vat_col] = (
-    #     df[vat_col].astype("string")
-    #     .groupby(df[group_col])
-    #     .transform(lambda x: x.ffill().bfill())
-    # )
-    
-    # We need to be careful with types.
-    df[vat_col] = (
-        df[vat_col].astype("string")
-        .groupby(df[group_col])
-        .transform(lambda x: x.ffill().bfill())
-    )
-    
+    vat = df[vat_col]
+    # Object columns may hold equal values with different strings (1 and 1.0)
+    if vat.dtype == object:
+        vat = vat.astype("string")
+    vat_codes, vat_uniques = pd.factorize(vat)
+    group_codes, _ = pd.factorize(df[group_col])
+
+    codes = pd.Series(vat_codes, dtype="float64").where(vat_codes >= 0)
+    filled = codes.groupby(group_codes).ffill().groupby(group_codes).bfill().to_numpy(copy=True)
+    filled[group_codes < 0] = np.nan
+    filled = np.where(np.isnan(filled), -1, filled).astype(np.int64)
+
+    strings = pd.array(pd.Series(vat_uniques, dtype=object).astype("string"), dtype="string")
+    df[vat_col] = pd.Series(strings.take(filled, allow_fill=True), index=df.index)
+
     if logger:
         logger.info(f"Propagated VAT in column {vat_col} grouped by {group_col}")
     return df
 
+def _clean_vat_values(vat: pd.Series):
+    """
+    Returns (mask of valid rows, cleaned VAT strings of the valid rows).
+
+    Numeric columns are checked arithmetically: a number's string form has a
+    9-digit integer part exactly when 1e8 <= value < 1e9. Other columns are
+    factorized and only the distinct values go through the string rules.
+    """
+    if vat.dtype.kind in "iuf":
+        values = vat.to_numpy(dtype="float64", na_value=np.nan)
+        mask = (values >= 1e8) & (values < 1e9)
+        cleaned = np.floor(values[mask]).astype(np.int64).astype(str).astype(object)
+        return mask, cleaned
+
+    codes, uniques = pd.factorize(vat)
+    # Missing values ("nan", "None", "<NA>" as strings) never pass
+    stripped = np.empty(len(uniques) + 1, dtype=object)
+    valid = np.zeros(len(uniques) + 1, dtype=bool)
+    for i, value in enumerate(np.asarray(uniques, dtype=object).tolist()):
+        stripped[i] = str(value).split(".")[0]
+        valid[i] = _VAT_PATTERN.fullmatch(stripped[i]) is not None
+    mask = valid[codes]
+    return mask, stripped[codes[mask]]
+
+@instrumented_step
 def clean_vat(df: pd.DataFrame, vat_col: str, logger: Optional[logging.Logger] = None) -> pd.DataFrame:
     """
     Normalizes VAT numbers: strip decimals and enforce 9-digit numeric identifiers.
@@ -372,16 +636,12 @@ def clean_vat(df: pd.DataFrame, vat_col: str, logger: Optional[logging.Logger] =
             logger.warning(f"Missing VAT column '{vat_col}'")
         return df
 
-    # Strip decimals (e.g. "123456789.0" -> "123456789")
-    df[vat_col] = df[vat_col].astype(str).str.split(".").str[0]
-    
-    # Drop NaNs
-    df = df.dropna(subset=[vat_col])
-    
-    # Keep only 9-digit numeric
-    mask = df[vat_col].str.fullmatch(r"\d{9}")
+    # Strip decimals (e.g. "123456789.0" -> "123456789") and keep only 9-digit numeric
+    mask, cleaned = _clean_vat_values(df[vat_col])
+    _quarantine(logger, df, mask, REASON_INVALID_VAT, f"clean_vat {vat_col}")
     df = df.loc[mask].copy()
-    
+    df[vat_col] = pd.Series(cleaned, index=df.index, dtype=object)
+
     _log_step(logger, f"Clean VAT {vat_col}", initial_count, len(df))
     return df
 
@@ -398,26 +658,11 @@ def normalize_name(series: pd.Series) -> pd.Series:
 
     Returns:
         A pandas Series with normalized names
+
+    Each distinct name is normalized once (elt_core.text_normalization) and
+    the result is memoized across batches.
     """
-    import unicodedata
-    
-    def remove_accents(text):
-        if pd.isna(text):
-            return text
-        # NFD decomposes characters (e.g., 'ã' -> 'a' + combining tilde)
-        # Then we filter out the combining marks (category 'Mn')
-        normalized = unicodedata.normalize('NFD', str(text))
-        return ''.join(c for c in normalized if unicodedata.category(c) != 'Mn')
-    
-    result = series.apply(remove_accents)
-    result = result.str.upper()
-    result = (
-        result.str.replace('MR ', '', regex=False)
-        .str.replace('MRS ', '', regex=False)
-        .str.replace('MS ', '', regex=False)
-        .str.replace('DR ', '', regex=False)
-    )
-    return result
+    return normalize_series(series, normalize_person_name)
 
 
 def roman_to_int(roman: str | int | float) -> int | None:
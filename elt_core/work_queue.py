@@ -0,0 +1,350 @@
+# elt_core/work_queue.py
+"""
+CouchDB-backed work queue with expiring leases.
+
+Work items are documents in a queue database with a ``status`` field:
+
+    pending -> in_progress -> done
+                    |
+                    +-> pending (retry) / failed (attempts exhausted)
+
+An item whose worker died (its lease expired) counts the claim as an
+attempt too: it is re-issued until max_attempts, then marked failed.
+
+Workers on any host claim items by writing ``status: in_progress`` together
+with ``lease_owner`` and ``lease_expires_at`` using the item's ``_rev`` as a
+compare-and-swap token, so exactly one worker wins each item. A worker that
+crashes simply stops renewing; once its lease expires the item becomes
+claimable again and is re-issued to another worker.
+
+With a ``priority_field``, pending items are claimed highest priority first
+(through a Mango index on status and that field); items without the field
+come after all the ones that have it.
+
+When no item is claimable, `next_expiry` tells a worker when the earliest
+lease held by another worker runs out, so it can wait and take over the
+items of a worker that crashed instead of exiting.
+
+Lease expiry uses wall-clock epoch seconds, so hosts should run NTP.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from elt_core.db_connector import DocumentConflict
+
+logger = logging.getLogger("WorkQueue")
+
+STATUS_PENDING = "pending"
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+QUEUE_DESIGN_DOC = {
+    "_id": "_design/queue",
+    "language": "javascript",
+    "views": {
+        "by_status": {
+            "map": "function (doc) { if (doc.status) { emit(doc.status, null); } }",
+            "reduce": "_count",
+        }
+    },
+}
+
+
+def default_worker_id() -> str:
+    """Return a worker id unique across hosts and processes (host:pid:random)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaseQueue:
+    def __init__(
+        self,
+        db_connector,
+        queue_db: str,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = 600,
+        max_attempts: int = 3,
+        priority_field: Optional[str] = None,
+    ):
+        """
+        Args:
+            db_connector: DBConnector instance
+            queue_db: Name of the CouchDB queue database
+            worker_id: Identifier written into leases (default: host:pid:random)
+            lease_seconds: How long a claim is valid without renewal
+            max_attempts: Claims per item before a failing item is marked failed
+            priority_field: Numeric field (>= 0) by which pending items are claimed, highest first
+        """
+        self.db_connector = db_connector
+        self.queue_db = queue_db
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.priority_field = priority_field
+
+    def ensure_indexes(self) -> None:
+        """Creates the Mango indexes used for claiming and the status count view."""
+        self.db_connector.create_index(self.queue_db, ["status"], name="status-idx")
+        self.db_connector.create_index(self.queue_db, ["status", "lease_expires_at"], name="lease-idx")
+        if self.priority_field:
+            self.db_connector.create_index(self.queue_db, ["status", self.priority_field], name="priority-idx")
+        self.db_connector.ensure_design_document(self.queue_db, QUEUE_DESIGN_DOC)
+
+    def register(self, items: List[Dict[str, Any]]) -> int:
+        """
+        Adds work items (each with an _id) as pending. Items whose _id already
+        exists are left untouched. Returns the number of items inserted.
+        """
+        now = time.time()
+        docs = [
+            {**item, "status": STATUS_PENDING, "attempts": 0, "created_at": now,
+             "lease_owner": None, "lease_expires_at": None}
+            for item in items
+        ]
+        inserted = 0
+        for start in range(0, len(docs), 5000):
+            results = self.db_connector.save_documents_bulk(self.queue_db, docs[start:start + 5000])
+            inserted += sum(1 for r in results if not r.get("error"))
+        return inserted
+
+    def _candidates(self, limit: int, selector_extra: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Finds claimable items: pending first, then in-progress items whose lease expired."""
+        extra = selector_extra or {}
+        candidates = []
+        if self.priority_field:
+            candidates = self.db_connector.find_documents(
+                self.queue_db,
+                {"status": STATUS_PENDING, self.priority_field: {"$gte": 0}, **extra},
+                sort=[{"status": "desc"}, {self.priority_field: "desc"}],
+                limit=limit,
+            )
+        if len(candidates) < limit:
+            # Pending items outside the priority index (all of them without a priority_field)
+            seen = {doc["_id"] for doc in candidates}
+            candidates += [
+                doc for doc in self.db_connector.find_documents(
+                    self.queue_db, {"status": STATUS_PENDING, **extra}, limit=limit
+                )
+                if doc["_id"] not in seen
+            ][:limit - len(candidates)]
+        if len(candidates) < limit:
+            self._fail_exhausted(extra)
+            candidates += self.db_connector.find_documents(
+                self.queue_db,
+                {"status": STATUS_IN_PROGRESS, "lease_expires_at": {"$lt": time.time()},
+                 "attempts": {"$lt": self.max_attempts}, **extra},
+                limit=limit - len(candidates),
+            )
+        return candidates
+
+    def _fail_exhausted(self, selector_extra: Optional[Dict] = None) -> int:
+        """
+        Marks items whose lease expired on their last allowed attempt as failed.
+        Such an item never reached fail() - its worker died (OOM, segfault) - and
+        re-issuing it would take down the next worker too.
+        Returns the number of items marked failed.
+        """
+        expired = self.db_connector.find_documents(
+            self.queue_db,
+            {"status": STATUS_IN_PROGRESS, "lease_expires_at": {"$lt": time.time()},
+             "attempts": {"$gte": self.max_attempts}, **(selector_extra or {})},
+        )
+        if not expired:
+            return 0
+        results = self.db_connector.save_documents_bulk(self.queue_db, [
+            {**doc, "status": STATUS_FAILED, "lease_owner": None, "lease_expires_at": None,
+             "last_error": f"lease of {doc.get('lease_owner')} expired on attempt {doc.get('attempts')}"}
+            for doc in expired
+        ])
+        failed = sum(1 for r in results if not r.get("error"))
+        if failed:
+            logger.warning(f"Marked {failed} items of {self.queue_db} failed: their lease expired on the last attempt")
+        return failed
+
+    def next_expiry(self, selector_extra: Optional[Dict] = None) -> Optional[float]:
+        """
+        Epoch seconds at which the earliest lease held by another worker expires,
+        None when no other worker holds an item.
+        """
+        leased = self.db_connector.find_documents(
+            self.queue_db,
+            {"status": STATUS_IN_PROGRESS, "lease_expires_at": {"$gt": 0},
+             "lease_owner": {"$ne": self.worker_id}, **(selector_extra or {})},
+            fields=["lease_expires_at"],
+            sort=[{"status": "asc"}, {"lease_expires_at": "asc"}],
+            limit=1,
+        )
+        return leased[0]["lease_expires_at"] if leased else None
+
+    def claim_documents(self, candidates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Tries to lease the given queue documents (as read, with their _rev) in one
+        _bulk_docs call. Documents whose _rev changed meanwhile are lost races and
+        are skipped. Returns the claimed documents with their new _rev.
+        """
+        if not candidates:
+            return []
+        now = time.time()
+        updated = []
+        for doc in candidates:
+            updated.append({
+                **doc,
+                "status": STATUS_IN_PROGRESS,
+                "lease_owner": self.worker_id,
+                "lease_expires_at": now + self.lease_seconds,
+                "claimed_at": now,
+                "attempts": (doc.get("attempts") or 0) + 1,
+            })
+        results = self.db_connector.save_documents_bulk(self.queue_db, updated)
+        revs = {r["id"]: r["rev"] for r in results if r.get("rev") and not r.get("error")}
+        claimed = []
+        for doc, previous in zip(updated, candidates):
+            if doc["_id"] in revs:
+                doc["_rev"] = revs[doc["_id"]]
+                claimed.append(doc)
+                if previous.get("status") == STATUS_IN_PROGRESS:
+                    logger.warning(f"Re-issued expired lease of {doc['_id']} (owner {previous.get('lease_owner')})")
+        return claimed
+
+    def claim(self, limit: int = 1, selector_extra: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """
+        Claims up to `limit` items with a lease owned by this worker.
+
+        Args:
+            limit: Maximum number of items to claim
+            selector_extra: Additional Mango conditions for eligible items
+        """
+        # Over-fetch a little: concurrent workers will win some of the candidates,
+        # and the spare ones replace the lost races
+        candidates = self._candidates(limit * 2, selector_extra)
+        claimed = []
+        while candidates and len(claimed) < limit:
+            wanted = limit - len(claimed)
+            claimed += self.claim_documents(candidates[:wanted])
+            candidates = candidates[wanted:]
+        return claimed
+
+    def _transition(self, doc: Dict[str, Any], **fields) -> Dict[str, Any]:
+        """Writes a new state of a leased item, failing if the lease was lost."""
+        new_doc = {**doc, **fields}
+        result = self.db_connector.put_document(self.queue_db, new_doc)
+        new_doc["_rev"] = result["rev"]
+        return new_doc
+
+    def renew(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extends the lease of a claimed item.
+        Raises DocumentConflict if the lease was lost (expired and re-issued).
+        """
+        return self._transition(doc, lease_expires_at=time.time() + self.lease_seconds)
+
+    def _done_fields(self) -> Dict[str, Any]:
+        return {
+            "status": STATUS_DONE, "lease_owner": None, "lease_expires_at": None,
+            "finished_at": time.time(), "finished_by": self.worker_id,
+        }
+
+    def _failed_fields(self, doc: Dict[str, Any], error: str) -> Dict[str, Any]:
+        status = STATUS_FAILED if (doc.get("attempts") or 0) >= self.max_attempts else STATUS_PENDING
+        return {"status": status, "lease_owner": None, "lease_expires_at": None, "last_error": error}
+
+    def complete(self, doc: Dict[str, Any], **fields) -> Dict[str, Any]:
+        """Marks a claimed item as done, storing any extra result fields on it."""
+        return self._transition(doc, **self._done_fields(), **fields)
+
+    def fail(self, doc: Dict[str, Any], error: str) -> Dict[str, Any]:
+        """Releases a claimed item for retry, or marks it failed once attempts are exhausted."""
+        return self._transition(doc, **self._failed_fields(doc, error))
+
+    def _transition_many(self, docs: List[Dict[str, Any]], fields: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Writes new fields (per _id) of leased items in one _bulk_docs call, each
+        over the _rev it was claimed with. Items changed meanwhile but still
+        leased by this worker (e.g. a description upgraded by upsert_nifs) are
+        re-read and written once more over their new _rev.
+        Returns the ids whose lease was lost.
+        """
+        if not docs:
+            return []
+        results = self.db_connector.save_documents_bulk(self.queue_db, [{**doc, **fields[doc["_id"]]} for doc in docs])
+        conflicts = {r["id"] for r in results if r.get("error") == "conflict"}
+        for r in results:
+            if r.get("error") and r.get("error") != "conflict":
+                logger.warning(f"Could not update {r.get('id')} in {self.queue_db}: {r.get('error')} {r.get('reason')}")
+        if not conflicts:
+            return []
+        retries = [
+            {**stored, **fields[stored["_id"]]}
+            for stored in self.db_connector.get_documents_by_ids(self.queue_db, list(conflicts))
+            if stored.get("status") == STATUS_IN_PROGRESS and stored.get("lease_owner") == self.worker_id
+        ]
+        if retries:
+            results = self.db_connector.save_documents_bulk(self.queue_db, retries)
+            conflicts -= {r["id"] for r in results if not r.get("error")}
+        return sorted(conflicts)
+
+    def complete_many(self, docs: List[Dict[str, Any]], fields: Optional[Dict[str, Dict[str, Any]]] = None) -> List[str]:
+        """
+        Marks claimed items as done in bulk, with optional extra fields per _id.
+        Returns the ids whose lease was lost.
+        """
+        done = self._done_fields()
+        fields = fields or {}
+        return self._transition_many(docs, {doc["_id"]: {**done, **fields.get(doc["_id"], {})} for doc in docs})
+
+    def fail_many(self, docs: List[Dict[str, Any]], errors: Dict[str, str]) -> List[str]:
+        """Releases claimed items for retry (or marks them failed) in bulk. Returns the ids whose lease was lost."""
+        return self._transition_many(docs, {doc["_id"]: self._failed_fields(doc, errors[doc["_id"]]) for doc in docs})
+
+    def status_counts(self) -> Dict[str, int]:
+        """Returns the number of items per status."""
+        rows = self.db_connector.query_view(self.queue_db, "queue", "by_status", group=True)
+        return {row["key"]: row["value"] for row in rows}
+
+
+class LeaseKeeper:
+    """
+    Renews the lease of one claimed item in a background thread while it is
+    being processed. If a renewal conflicts, `lost` is set and the caller must
+    not commit the item's result.
+
+    Usage:
+        with LeaseKeeper(queue, doc) as keeper:
+            ... long work ...
+        doc = keeper.doc  # latest revision
+    """
+
+    def __init__(self, queue: LeaseQueue, doc: Dict[str, Any], interval: Optional[float] = None):
+        self.queue = queue
+        self.doc = doc
+        self.interval = interval or max(queue.lease_seconds / 3, 1)
+        self.lost = False
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                try:
+                    self.doc = self.queue.renew(self.doc)
+                except DocumentConflict:
+                    logger.error(f"Lost lease on {self.doc['_id']}")
+                    self.lost = True
+                    return
+                except Exception as e:
+                    logger.warning(f"Could not renew lease on {self.doc['_id']}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
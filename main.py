@@ -1,67 +1,56 @@
+import argparse
+import multiprocessing
 import os
+import time
 import traceback
 from pathlib import Path
+from urllib.parse import urlsplit
 
 from dotenv import load_dotenv
 
 from elt_core.db_connector import DBConnector
-from elt_core.graph_loader import GraphLoader
-from elt_core.graph_enrichment import run_all_enrichments
-from sources.anuario_occ_source import AnuarioOCCSource
-from sources.contracts_source import ContractsSource
-from sources.cpv_structure_source import CPVStructureSource
-from sources.gold.contracts_gold import ContractsGoldSource
-from sources.gold.entities_gold import EntitiesGoldSource
-from sources.gold.orbis_gold import OrbisGoldSource
-from sources.gold.municipal_entities_gold import MunicipalEntitiesGoldSource
-from sources.gold.pep_gold import PEPGoldSource
-from sources.graph_mappers.contracts_mapper import contracts_mapper
-from sources.graph_mappers.entities_mapper import entities_mapper
-from sources.graph_mappers.orbis_mapper import orbis_mapper
-from sources.graph_mappers.cpv_mapper import cpv_mapper
-from sources.graph_mappers.municipal_entities_mapper import municipal_entities_mapper
-from sources.graph_mappers.pep_mapper import pep_mapper
-from sources.nif_scraper_source import NifScraperSource
-from sources.orbis_dm import OrbisDMSource
-from sources.orbis_pt_companies_uci import OrbisPTCompaniesUCISource
-from sources.orbis_sh import OrbisSHSource
-from sources.social_careers_source import SocialCareersSource
-from sources.societies_source import SocietiesSource
-from sources.people_area_source import PeopleAreaSource
+from elt_core.registry import load_component
+from elt_core.quarantine import get_quarantine
+from elt_core.stage_handoff import get_stage_handoff
+from elt_core.telemetry import get_telemetry
 
+# Sources, gold builders and mappers are referenced by registry name (see
+# elt_core/registry.py) and only imported when their stage runs, so that
+# pandas, pyarrow, bs4, neo4j and linkml_runtime are never loaded for
+# stages that are disabled or for short commands like `queue-status`.
 
 
 MAX_WORKERS = 10
 RUN_SCRAPER = False
 
-# Configuration of sources: (SourceClass, filename, id_column)
+# Configuration of sources: (SourceClass name, filename, id_column)
 SOURCES_CONFIG = [
-    # (ContractsSource, 'contracts_2009_2024.parquet', 'contract_id'),
-    # (AnuarioOCCSource, 'anuario_occ_table.csv', None),
-    # (CPVStructureSource, 'cpv.json', None),
-    # (OrbisDMSource, 'orbis_dm.csv', None),
-    # (OrbisSHSource, 'orbis_sh.csv', None),
-    # (OrbisPTCompaniesUCISource, 'orbis_pt_companies_uci.csv', None)
-    # (SocialCareersSource, 'social_careers.json', None),
-    # (SocietiesSource, 'societies.json', None),
-    # (PeopleAreaSource, 'people.json', None),
+    # ("ContractsSource", 'contracts_2009_2024.parquet', 'contract_id'),
+    # ("AnuarioOCCSource", 'anuario_occ_table.csv', None),
+    # ("CPVStructureSource", 'cpv.json', None),
+    # ("OrbisDMSource", 'orbis_dm.csv', None),
+    # ("OrbisSHSource", 'orbis_sh.csv', None),
+    # ("OrbisPTCompaniesUCISource", 'orbis_pt_companies_uci.csv', None)
+    # ("SocialCareersSource", 'social_careers.json', None),
+    # ("SocietiesSource", 'societies.json', None),
+    # ("PeopleAreaSource", 'people.json', None),
 ]
 
 GOLD_SOURCES_CONFIG = [
-    # EntitiesGoldSource,
-    # ContractsGoldSource,
-    # OrbisGoldSource,
-    # MunicipalEntitiesGoldSource,
-    # PEPGoldSource,
+    # "EntitiesGoldSource",
+    # "ContractsGoldSource",
+    # "OrbisGoldSource",
+    # "MunicipalEntitiesGoldSource",
+    # "PEPGoldSource",
 ]
 
 GRAPH_LOADER_CONFIG = [
-    # ("entities_gold", entities_mapper),
-    # ("municipal_entities_gold", municipal_entities_mapper),
-    # ("cpv_structure_silver", cpv_mapper),
-    # ("contracts_gold", contracts_mapper),
-    # ("orbis_gold", orbis_mapper),
-    # ("pep_gold", pep_mapper),
+    # ("entities_gold", "entities_mapper"),
+    # ("municipal_entities_gold", "municipal_entities_mapper"),
+    # ("cpv_structure_silver", "cpv_mapper"),
+    # ("contracts_gold", "contracts_mapper"),
+    # ("orbis_gold", "orbis_mapper"),
+    # ("pep_gold", "pep_mapper"),
 ]
 
 GRAPH_ENRICHMENT_CONFIG = True
@@ -79,7 +68,7 @@ def initialize_db_connector():
 
 def process_sources(db_connector, data_dir, sources_config):
     """Runs the standard data sources."""
-    for source_class, filename, id_column in sources_config:
+    for source_ref, filename, id_column in sources_config:
         file_path = data_dir / filename
 
         if not file_path.exists(): 
@@ -89,29 +78,57 @@ def process_sources(db_connector, data_dir, sources_config):
         # Instantiate Source
         print(f"Processing file: {file_path}")
         try:
+            source_class = load_component(source_ref)
             source_instance = source_class(db_connector=db_connector, file_path=file_path, id_column=id_column)
             source_instance.run(batch_size=10000)
+            source_instance.report_step_metrics()
         except Exception as e:
             print(f"Pipeline failed for {filename}: {e}")
             traceback.print_exc()
 
-def run_nif_scraper(db_connector):
+def run_nif_scraper(db_connector, worker_id=None):
     """Runs the NIF Scraper."""
     print("Running NIF Scraper...")
     try:
-        scraper = NifScraperSource(db_connector)
-        scraper.run(max_workers=MAX_WORKERS)
+        scraper = load_component("NifScraperSource")(db_connector)
+        scraper.run(max_workers=MAX_WORKERS, worker_id=worker_id)
     except Exception as e:
         print(f"NIF Scraper failed: {e}")
         traceback.print_exc()
 
+
+def _scraper_process(worker_id):
+    """Entry point of a scraper process started by run_nif_scrapers."""
+    load_dotenv()
+    db_connector = initialize_db_connector()
+    if db_connector:
+        run_nif_scraper(db_connector, worker_id)
+        get_telemetry().flush()
+
+
+def run_nif_scrapers(processes, worker_id=None):
+    """Runs NIF scrapers in separate processes sharing the queue (and NIF_SCRAPER_GLOBAL_RATE)."""
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_scraper_process, args=(f"{worker_id}-{i}" if worker_id else None,), name=f"nif-scraper-{i}")
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        if worker.exitcode:
+            print(f"{worker.name} exited with code {worker.exitcode}")
+
 def run_gold_layer(db_connector, gold_sources_config):
     """Runs the Gold Layer sources."""
     print("Running Gold Layer...")
     try:
-        for gold_source_class in gold_sources_config:
+        for gold_source_ref in gold_sources_config:
+            gold_source_class = load_component(gold_source_ref)
             gold_source_instance = gold_source_class(db_connector=db_connector)
             gold_source_instance.run()
+            gold_source_instance.report_step_metrics()
     except Exception as e:
         print(f"Gold Layer failed: {e}")
         traceback.print_exc()
@@ -126,6 +143,7 @@ def run_graph_loader(db_connector, graph_loader_config, graph_enrichment_config)
     NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "password")
     
     # Initialize the GraphLoader with Neo4j driver
+    GraphLoader = load_component("GraphLoader")
     loader = GraphLoader(
         db_connector=db_connector,
         neo4j_uri=NEO4J_URI,
@@ -138,14 +156,14 @@ def run_graph_loader(db_connector, graph_loader_config, graph_enrichment_config)
     
             loader.sync_gold_db(
                 couch_db_name=graph_source,
-                doc_mapper_func=graph_mapper,
+                doc_mapper_func=load_component(graph_mapper),
                 batch_size=10000
             )
         
 
         # Graph enrichment: create derived relationships
         if graph_enrichment_config:
-            run_all_enrichments(loader)
+            load_component("run_all_enrichments")(loader)
         
         print("Graph sync completed successfully!")        
         # Log validation errors if any
@@ -161,8 +179,106 @@ def run_graph_loader(db_connector, graph_loader_config, graph_enrichment_config)
         loader.close()
 
 
-def main():
-    load_dotenv()
+def show_queue_status(db_connector, db_names=("nifs_scrape_queue", "nifs_scrape_silver")):
+    """Prints document counts of the scrape queue (per status) and its results."""
+    from elt_core.work_queue import LeaseQueue
+
+    for db_name in db_names:
+        info = db_connector.get_db_info(db_name)
+        if info is None:
+            print(f"{db_name}: does not exist")
+            continue
+        print(f"{db_name}: {info.get('doc_count', 0)} docs ({info.get('doc_del_count', 0)} deleted)")
+        if db_name == db_names[0]:
+            for status, count in sorted(LeaseQueue(db_connector, db_name).status_counts().items()):
+                print(f"  {status}: {count}")
+    show_scrape_workers(db_connector)
+
+
+def show_scrape_workers(db_connector):
+    """Prints the scrapers in the nif.pt rate budget with their share and throughput."""
+    budget_db = os.getenv("NIF_SCRAPER_BUDGET_DB", "scrape_rate_budget")
+    host = urlsplit(os.getenv("NIF_SCRAPER_BASE_URL", "https://www.nif.pt/")).hostname
+    if db_connector.get_db_info(budget_db) is None:
+        return
+    budget = db_connector.get_document(budget_db, host)
+    if not budget or not budget.get("workers"):
+        return
+    now = time.time()
+    print(f"{budget_db}/{host}: {budget.get('rate')} req/s shared by")
+    for worker_id, entry in sorted(budget["workers"].items()):
+        print(
+            f"  {worker_id}: {entry.get('req_per_s')} req/s of {entry.get('share')}, "
+            f"{entry.get('done')} fetched with {entry.get('requests')} requests, "
+            f"seen {now - entry.get('seen_at', now):.0f}s ago"
+        )
+
+
+def _source_for_cli(db_connector, source_ref, id_column=None):
+    """Instantiates a source by registry name, taking its id_column from SOURCES_CONFIG if not given."""
+    if id_column is None:
+        id_column = next((cfg[2] for cfg in SOURCES_CONFIG if cfg[0] == source_ref), None)
+    return load_component(source_ref)(db_connector=db_connector, id_column=id_column)
+
+
+def show_transform_queue_status(db_connector, source_ref):
+    """Prints the number of transform partitions per status for a source."""
+    from elt_core.work_queue import LeaseQueue
+
+    source = _source_for_cli(db_connector, source_ref)
+    counts = LeaseQueue(db_connector, source.transform_queue_db).status_counts()
+    if not counts:
+        print(f"{source.transform_queue_db}: no partitions")
+    for status, count in sorted(counts.items()):
+        print(f"{source.transform_queue_db} {status}: {count}")
+
+
+def flush_outputs():
+    """Persists what a command leaves buffered: hand-off writes, quarantined rows and telemetry."""
+    # Wait for the background CouchDB writes of handed-off stage outputs
+    get_stage_handoff().flush()
+
+    # Write the rejected rows still buffered (QUARANTINE)
+    get_quarantine().flush()
+
+    # Write the I/O telemetry (TELEMETRY_JSONL / TELEMETRY_PROM_FILE)
+    get_telemetry().flush()
+
+
+def run_command(db_connector, args):
+    """Runs one of the maintenance subcommands of main()."""
+    if args.command == "queue-status":
+        if args.source:
+            show_transform_queue_status(db_connector, args.source)
+        else:
+            show_queue_status(db_connector)
+    elif args.command == "reparse-nifs":
+        load_component("NifScraperSource")(db_connector).reparse(dry_run=args.dry_run)
+    elif args.command == "refresh-nifs":
+        load_component("NifScraperSource")(db_connector).schedule_refresh(ttl_days=args.ttl_days, limit=args.limit)
+    elif args.command == "build-gold":
+        for gold_source_ref in args.builders or GOLD_SOURCES_CONFIG:
+            builder = load_component(gold_source_ref)(db_connector=db_connector)
+            if args.full:
+                builder.reset_gold_checkpoints()
+            builder.run_incremental()
+    elif args.command == "prioritize-nifs":
+        _source_for_cli(db_connector, "ContractsSource").prioritize_nifs()
+    elif args.command == "coordinate":
+        source = _source_for_cli(db_connector, args.source)
+        source.coordinate(partition_size=args.partition_size, run_id=args.run_id)
+    else:
+        source = _source_for_cli(db_connector, args.source, args.id_column)
+        source.run_worker(
+            worker_id=args.worker_id,
+            lease_seconds=args.lease_seconds,
+            max_attempts=args.max_attempts,
+            wait=args.wait,
+        )
+
+
+def run_pipeline():
+    """Runs the enabled pipeline stages."""
     print("Initializing ELT Pipeline...")
 
     db_connector = initialize_db_connector()
@@ -184,5 +300,74 @@ def main():
     if GRAPH_LOADER_CONFIG or GRAPH_ENRICHMENT_CONFIG:
         run_graph_loader(db_connector, GRAPH_LOADER_CONFIG, GRAPH_ENRICHMENT_CONFIG)
 
+    flush_outputs()
+
+
+def main(argv=None):
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="KNOW-NET-COMPET ELT pipeline")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("run", help="Run the stages enabled in main.py (default)")
+    status_parser = subparsers.add_parser("queue-status", help="Show the NIF scrape queue status")
+    status_parser.add_argument("--source", help="Show the transform queue of this source instead")
+
+    coordinate_parser = subparsers.add_parser(
+        "coordinate", help="Split a source's bronze database into partitions for transform workers"
+    )
+    coordinate_parser.add_argument("source", help="Source registry name, e.g. ContractsSource")
+    coordinate_parser.add_argument("--partition-size", type=int, default=20000)
+    coordinate_parser.add_argument("--run-id", help="Identifier of this transformation run (default: timestamp)")
+
+    work_parser = subparsers.add_parser("work", help="Transform claimed bronze partitions into silver")
+    work_parser.add_argument("source", help="Source registry name, e.g. ContractsSource")
+    work_parser.add_argument("--worker-id", help="Lease owner id (default: host:pid:random)")
+    work_parser.add_argument("--id-column", help="Silver id column (default: from SOURCES_CONFIG)")
+    work_parser.add_argument("--lease-seconds", type=float, default=600)
+    work_parser.add_argument("--max-attempts", type=int, default=3)
+    work_parser.add_argument("--wait", action="store_true", help="Keep polling for new partitions")
+    reparse_parser = subparsers.add_parser(
+        "reparse-nifs", help="Re-parse the cached nif.pt pages into nifs_scrape_silver, without fetching"
+    )
+    reparse_parser.add_argument("--dry-run", action="store_true", help="Only count the results that would change")
+    subparsers.add_parser(
+        "prioritize-nifs", help="Score the queued NIFs by the contract value in contracts_silver"
+    )
+    refresh_parser = subparsers.add_parser(
+        "refresh-nifs", help="Re-queue the NIFs whose scrape result is older than NIF_REFRESH_TTL_DAYS"
+    )
+    refresh_parser.add_argument("--ttl-days", type=float, help="Age of a stale result (default: NIF_REFRESH_TTL_DAYS)")
+    refresh_parser.add_argument("--limit", type=int, help="Most NIFs re-queued (default: NIF_REFRESH_LIMIT)")
+    gold_parser = subparsers.add_parser(
+        "build-gold", help="Apply the silver changes since the last build to gold databases"
+    )
+    gold_parser.add_argument("builders", nargs="*", help="Gold builder registry names (default: GOLD_SOURCES_CONFIG)")
+    gold_parser.add_argument("--full", action="store_true", help="Forget the checkpoints and rebuild from all silver documents")
+    scrape_parser = subparsers.add_parser("scrape-nifs", help="Scrape the queued NIFs, alongside any other scrapers")
+    scrape_parser.add_argument("--processes", type=int, default=1, help="Scraper processes on this host")
+    scrape_parser.add_argument("--worker-id", help="Lease owner id (default: host:pid:random; suffixed per process)")
+    args = parser.parse_args(argv)
+
+    if args.command == "scrape-nifs":
+        if args.processes > 1:
+            run_nif_scrapers(args.processes, args.worker_id)
+        else:
+            _scraper_process(args.worker_id)
+        return
+
+    if args.command in (
+        "queue-status", "coordinate", "work", "reparse-nifs", "prioritize-nifs", "refresh-nifs", "build-gold"
+    ):
+        db_connector = initialize_db_connector()
+        if not db_connector:
+            return
+        try:
+            run_command(db_connector, args)
+        finally:
+            flush_outputs()
+        return
+
+    run_pipeline()
+
 if __name__ == "__main__":
     main()
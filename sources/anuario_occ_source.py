@@ -1,7 +1,7 @@
-import unicodedata
 import pandas as pd
 from typing import Dict, Optional, List, Any
 from elt_core.base_source import BaseDataSource
+from elt_core.text_normalization import strip_accents
 from elt_core.transformations import to_dataframe, to_dict
 from sources.lookups.occ_to_base_entity_map import OCC_TO_BASE_ENTITY_MAP
 
@@ -15,8 +15,7 @@ class AnuarioOCCSource(BaseDataSource):
         """
         if not isinstance(value, str):
             return ""
-        normalised = unicodedata.normalize("NFD", value.strip())
-        return "".join(ch for ch in normalised if unicodedata.category(ch) != "Mn")
+        return strip_accents(value.strip())
 
     def transform(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
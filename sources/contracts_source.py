@@ -1,26 +1,51 @@
+import os
+from functools import partial
+
 from elt_core.base_source import BaseDataSource
+from elt_core.dictionary_encoding import encode_categories
+from elt_core.location_engine import LocationEngine
+from elt_core.nif_queue import set_priorities, upsert_nifs
+from elt_core.quarantine import REASON_TOO_MANY_CPVS
+from elt_core.transform_plan import NESTED, ROW, TransformPlan
 from elt_core.transformations import (
     to_dataframe, 
     to_dict, 
     convert_dates_to_iso, 
-    normalize_locations, 
-    enrich_location_from_municipality, 
-    enrich_location_from_district, 
-    map_location_fixes,
+    contract_types_of,
+    cpvs_of,
     transform_contract_type,
     transform_cpvs,
     filter_dropna,
     filter_max_value,
     filter_price_anomalies,
     filter_date_sequence,
-    add_column
+    drop_columns,
+    list_length,
+    add_list_length,
+    add_mapped_column,
+    fill_missing_from,
+    collect_nifs,
+    nif_priorities,
 )
 from sources.lookups.countries_set import COUNTRIES_SET
 from sources.lookups.districts_municipalities import DISTRICT_MUNICIPALITIES_DICT, MUNICIPALITY_LOOKUP
 from sources.lookups.location_changes_maps import COUNTRY_CHANGES_MAP, DISTRICT_CHANGES_MAP, MUNICIPALITY_CHANGES_MAP
 from sources.lookups.procurement_type_method_map import PROCUREMENT_TYPE_METHOD_MAP
 
+# Lookup tables are prebuilt once per process
+LOCATION_ENGINE = LocationEngine(
+    COUNTRIES_SET,
+    MUNICIPALITY_LOOKUP,
+    DISTRICT_MUNICIPALITIES_DICT,
+    COUNTRY_CHANGES_MAP,
+    DISTRICT_CHANGES_MAP,
+    MUNICIPALITY_CHANGES_MAP,
+)
+
+
 
+# Rows with more CPVs than this are dropped
+MAX_CPVS = 20
 
 allowed_contract_types = {
     "Aquisição de bens móveis",
@@ -34,147 +59,215 @@ allowed_contract_types = {
 
 class ContractsSource(BaseDataSource):
     source_name = "contracts"
+    supports_partitioning = True
     def transform(self, data):
         """
         Transform contracts data.
         - Convert dates to ISO format strings
         - Handle NaN values
+        Runs on pandas, or on pyarrow.compute with CONTRACTS_TRANSFORM_ENGINE=arrow.
         """
+        if os.getenv("CONTRACTS_TRANSFORM_ENGINE", "pandas").lower() == "arrow":
+            return self.transform_arrow(data)
+
         self.logger.info("Starting transformation process...")
         df = to_dataframe(data)
         initial_count = len(df)
         self.logger.info(f"Initial row count: {initial_count}")
-        
-        # Step 1: Convert date columns to datetime objects then to string isoformat
+
+        df = self.transformation_plan().execute(df, logger=self.logger)
+
+        final_count = len(df)
+        self.logger.info(f"Transformation complete. Final row count: {final_count}. Total dropped: {initial_count - final_count}")
+
+        return to_dict(df)
+
+    def transformation_plan(self) -> TransformPlan:
+        """
+        The pandas transformation as a plan (see elt_core/transform_plan.py).
+        Steps are listed in their logical order; the optimizer runs the cheap
+        filters before the per-row work and fuses the per-row steps.
+        """
         date_cols = ['publication_date', 'signing_date', 'close_date']
-        df = convert_dates_to_iso(df, date_cols, logger=self.logger)
+        mv_cols = ["contracted", "contracting_agency"]
+        plan = TransformPlan(self.source_name)
+
+        # Step 0: Low-cardinality columns as categoricals (one object per distinct value)
+        plan.map("encode_categories", partial(encode_categories, columns=['procedure_type']),
+                 reads=['procedure_type'], writes=['procedure_type'])
+
+        # Step 1: Convert date columns to datetime objects then to string isoformat.
+        # Not row-local: pandas infers the date format from the column's first value
+        plan.map("convert_dates", partial(convert_dates_to_iso, columns=date_cols),
+                 reads=date_cols, writes=date_cols, row_local=False)
 
         # Step 2: Drop id column
-        if 'id' in df.columns:
-            df = df.drop(columns=['id'])
+        plan.map("drop_id", partial(drop_columns, columns=['id']), reads=['id'], writes=['id'])
 
         # Step 3: Optimized Contract type transformation
-        df = transform_contract_type(df, 'contract_type', allowed_contract_types, logger=self.logger)
+        plan.map("contract_type", partial(transform_contract_type, column='contract_type', allowed_types=allowed_contract_types),
+                 reads=['contract_type'], writes=['contract_type'], cost=ROW,
+                 row_func=partial(contract_types_of, allowed_types=allowed_contract_types))
 
-        # Step 4: CPVs transformation
-        df = transform_cpvs(df, 'cpvs', max_length=20, logger=self.logger)
+        # Step 4: CPVs transformation (drops rows with more than 20 CPVs)
+        plan.filter("cpvs", partial(transform_cpvs, column='cpvs', max_length=MAX_CPVS),
+                    reads=['cpvs'], writes=['cpvs'], cost=ROW,
+                    row_func=cpvs_of, row_keep=lambda cpvs: len(cpvs) <= MAX_CPVS, reason=REASON_TOO_MANY_CPVS)
 
         # Step 5: Drop rows that have missing values in mv_cols
-        mv_cols = ["contracted", "contracting_agency"]
-        df = filter_dropna(df, mv_cols, logger=self.logger)
+        plan.filter("dropna", partial(filter_dropna, subset=mv_cols), reads=mv_cols)
 
         # Step 6: Remove rows where execution_deadline is greater than 11000
-        df = filter_max_value(df, 'execution_deadline', 11000, logger=self.logger)
+        plan.filter("max_deadline", partial(filter_max_value, column='execution_deadline', max_value=11000),
+                    reads=['execution_deadline'])
 
-        # Step 7: Remove rows where initial_price is 0 and final_price is NaN or initial_price is less than 0   
-        df = filter_price_anomalies(df, 'initial_price', 'final_price', logger=self.logger)
+        # Step 7: Remove rows where initial_price is 0 and final_price is NaN or initial_price is less than 0
+        plan.filter("price_anomalies", partial(filter_price_anomalies, initial_price_col='initial_price', final_price_col='final_price'),
+                    reads=['initial_price', 'final_price'])
 
         # Step 8: Remove rows where signing_date is prior to publication_date
         # We want signing_date >= publication_date
-        df = filter_date_sequence(df, 'publication_date', 'signing_date', logger=self.logger)
-
-        # Step 9: Location transformations
-        if 'execution_location' in df.columns:
-            # Normalize country entries in execution_location
-            df = normalize_locations(df, 'execution_location', set(COUNTRIES_SET), logger=self.logger)
-            
-            # Back propagate municipality to district and country
-            df = enrich_location_from_municipality(df, 'execution_location', MUNICIPALITY_LOOKUP, logger=self.logger)
-
-            # Back propagate district to country
-            df = enrich_location_from_district(df, 'execution_location', DISTRICT_MUNICIPALITIES_DICT, logger=self.logger)
-
-            # Fix location name entries 
-            df = map_location_fixes(df, 'execution_location', 'country', COUNTRY_CHANGES_MAP, logger=self.logger)
-            df = map_location_fixes(df, 'execution_location', 'district', DISTRICT_CHANGES_MAP, logger=self.logger)
-            df = map_location_fixes(df, 'execution_location', 'municipality', MUNICIPALITY_CHANGES_MAP, logger=self.logger)
-            # Remove items where country and district are None
-            df['execution_location'] = df['execution_location'].apply(
-                lambda locs: [loc for loc in locs if any(loc.get(k) for k in ['country', 'district'])] if isinstance(locs, list) else locs
-            )
-            self.logger.info("Removed empty location objects from execution_location")
+        plan.filter("date_sequence", partial(filter_date_sequence, start_date_col='publication_date', end_date_col='signing_date'),
+                    reads=['publication_date', 'signing_date'])
+
+        # Step 9: Location transformations, fused into one pass (see elt_core/location_engine.py):
+        # - Normalize country entries in execution_location
+        # - Back propagate municipality to district and country
+        # - Back propagate district to country
+        # - Fix location name entries (country, district, municipality)
+        # - Remove items where country and district are None
+        plan.map("locations", partial(LOCATION_ENGINE.apply, column='execution_location'),
+                 reads=['execution_location'], writes=['execution_location'], cost=NESTED)
 
         # Step 10: Add number of tenderers by inspecting contestants column
-        df = add_column(df, 'numberOfTenderers', df['contestants'].apply(lambda x: len(x) if isinstance(x, list) else 0))
-        self.logger.info(f"Added number of tenderers column based on contestants")
+        plan.map("number_of_tenderers", partial(add_list_length, column='contestants', target='numberOfTenderers'),
+                 reads=['contestants'], writes=['numberOfTenderers'], cost=ROW, row_func=list_length)
+
+        # Step 11: Ensure initial and final price exist by filling one from the other
+        plan.map("fill_final_price", partial(fill_missing_from, target='final_price', source='initial_price'),
+                 reads=['final_price', 'initial_price'], writes=['final_price'])
+        plan.map("fill_initial_price", partial(fill_missing_from, target='initial_price', source='final_price'),
+                 reads=['initial_price', 'final_price'], writes=['initial_price'])
 
-        # Step 11.1: Ensure initial and final price existis by: 
-        # if initial_price exists and final_price is missing, set final_price = initial_price
-        df.loc[df['initial_price'].notna() & df['final_price'].isna(), 'final_price'] = df['initial_price']
+        # Step 12: Add procurement method
+        plan.map("procurement_method", partial(add_mapped_column, column='procedure_type', target='procurement_method', mapping=PROCUREMENT_TYPE_METHOD_MAP),
+                 reads=['procedure_type'], writes=['procurement_method'])
+
+        return plan
+
+    def transform_arrow(self, data):
+        """
+        Same steps as transform() on Arrow arrays (elt_core/arrow_transformations.py).
+        Produces the same silver documents; contract types and CPVs are sorted
+        instead of being in set order.
+        """
+        from elt_core import arrow_transformations as at
+
+        self.logger.info("Starting transformation process (arrow engine)...")
+        frame = at.ColumnFrame.from_records(data)
+        frame.dictionary_encode(['procedure_type'])
+        initial_count = len(frame)
+        self.logger.info(f"Initial row count: {initial_count}")
 
-        # Step 11.2: Ensure initial and final price existis by: 
-        # if final_price exists and initial_price is missing, set initial_price = final_price
-        df.loc[df['final_price'].notna() & df['initial_price'].isna(), 'initial_price'] = df['final_price']
+        # Step 1: Parse date columns and write them as ISO strings
+        frame = at.convert_dates_to_iso(frame, ['publication_date', 'signing_date', 'close_date'], logger=self.logger)
+
+        # Step 2: Drop id column
+        frame.drop('id')
+
+        # Step 3: Contract types as a list array
+        frame = at.transform_contract_type(frame, 'contract_type', allowed_contract_types, logger=self.logger)
+
+        # Step 4: CPVs as a list array
+        frame = at.transform_cpvs(frame, 'cpvs', max_length=MAX_CPVS, logger=self.logger)
+
+        # Steps 5-8: Vectorized filters
+        frame = at.filter_dropna(frame, ["contracted", "contracting_agency"], logger=self.logger)
+        frame = at.filter_max_value(frame, 'execution_deadline', 11000, logger=self.logger)
+        frame = at.filter_price_anomalies(frame, 'initial_price', 'final_price', logger=self.logger)
+        frame = at.filter_date_sequence(frame, 'publication_date', 'signing_date', logger=self.logger)
+
+        # Step 9: Location transformations (fused engine on the nested lists)
+        if 'execution_location' in frame:
+            frame.set('execution_location', LOCATION_ENGINE.transform(frame.pylist('execution_location')))
+            self.logger.info("Normalized, enriched and fixed locations in column: execution_location")
+
+        # Step 10: Number of tenderers from the contestants lists
+        frame = at.add_column(frame, 'numberOfTenderers', at.list_lengths(frame, 'contestants'), logger=self.logger)
+        self.logger.info(f"Added number of tenderers column based on contestants")
+
+        # Step 11: Fill a missing final price from the initial price and vice versa
+        frame = at.fill_missing_from(frame, 'final_price', 'initial_price', logger=self.logger)
+        frame = at.fill_missing_from(frame, 'initial_price', 'final_price', logger=self.logger)
 
         # Step 12: Add procurement method
-        df = add_column(df, 'procurement_method', df['procedure_type'].map(PROCUREMENT_TYPE_METHOD_MAP))
+        frame = at.add_column(frame, 'procurement_method', at.map_column(frame, 'procedure_type', PROCUREMENT_TYPE_METHOD_MAP), logger=self.logger)
         self.logger.info(f"Added procurement method column based on OCDS")
-        
-
 
-        final_count = len(df)
+        final_count = len(frame)
         self.logger.info(f"Transformation complete. Final row count: {final_count}. Total dropped: {initial_count - final_count}")
 
-        return to_dict(df)
+        return frame.to_records()
 
     def extract_nifs(self, data, columns = ['contracted', 'contracting_agency', 'contestants']):
         """
-        Extracts unique NIFs from specified columns and returns them.
-        Expected column structure: list of dicts [{'nif': '...', ...}, ...]
+        Queues the unique NIFs of the entity columns for scraping.
+        Expected column structure: list of dicts [{'nif': '...', 'description': '...'}, ...]
+        New NIFs are inserted as pending; queued ones only get a real description
+        in place of a placeholder, keeping their status.
         """
-        # TODO: Check if nifs_scrape_queue exists, if so return
-
         self.logger.info(f"Extracting NIFs from columns: {columns}")
-        nifs_data = {}
-        
-        # Ensure data is a list of dicts
-        if isinstance(data, dict):
-            data = [data]
-            
-        for row in data:
-            for col in columns:
-                if col in row and row[col]:
-                    val = row[col]
-                    # Normalize to list for uniform processing
-                    items = val if isinstance(val, list) else [val]
-                    
-                    for item in items:
-                        if isinstance(item, dict) and 'nif' in item:
-                            nif = str(item['nif']).strip()
-                            if not nif:
-                                continue
-
-                            # Determine description
-                            raw_desc = item.get('description')
-                            if not raw_desc or str(raw_desc).strip() in ['-', '']:
-                                description = 'No description'
-                            else:
-                                description = str(raw_desc).strip()
-
-                            # Logic: Store if new, or update if we have a better description than existing placeholder
-                            if nif not in nifs_data:
-                                nifs_data[nif] = description
-                            elif nifs_data[nif] == 'No description' and description != 'No description':
-                                nifs_data[nif] = description
-
-        self.logger.info(f"Found {len(nifs_data)} unique NIFs.")
-        
-        if not nifs_data:
+
+        nifs = collect_nifs(data, columns, logger=self.logger)
+        self.logger.info(f"Found {len(nifs)} unique NIFs.")
+
+        if nifs.empty:
             return
 
-        # Prepare documents for queue
-        docs = []
-        for nif, description in nifs_data.items():
-            docs.append({
-                "_id": nif,
-                "nif": nif,
-                "description": description,
-                "status": "pending",
-                "source": "contracts"
-            })
-        
-        self._save_in_batches(docs, "nifs_scrape_queue", batch_size=5000)
-        self.logger.info(f"Saved {len(docs)} NIFs to queue.")
+        # The queue holds scrape state read by other stages from CouchDB: written synchronously
+        counts = upsert_nifs(self.db_connector, zip(nifs['nif'], nifs['description']), source=self.source_name)
+        self.logger.info(
+            f"NIF queue: {counts['inserted']} new, {counts['upgraded']} descriptions upgraded, "
+            f"{counts['unchanged']} already queued."
+        )
+
+    def prioritize_nifs(self, data=None):
+        """
+        Sets the scrape priority of queued NIFs from the contract value behind
+        them (elt_core.transformations.nif_priorities), so NifScraperSource
+        scrapes the entities of the largest contracts first.
+        Scores all silver contracts when no data is given.
+        """
+        if data is None:
+            data = self.get_data('silver')
+        priorities = nif_priorities(data, logger=self.logger)
+        if priorities.empty:
+            return
+
+        counts = set_priorities(
+            self.db_connector,
+            {
+                row.nif: {
+                    'priority': row.priority, 'contracts': row.contracts, 'roles': row.roles,
+                    'last_contract': row.last_contract,
+                }
+                for row in priorities.itertuples(index=False)
+            },
+        )
+        self.logger.info(
+            f"NIF priorities: {counts['updated']} updated, {counts['unchanged']} unchanged, "
+            f"{counts['not_queued']} not queued."
+        )
+
+    def process_partition(self, bronze_docs):
+        """
+        Transforms one partition of bronze contracts, loads it to silver and
+        queues its new NIFs.
+        """
+        clean_data = self.transform(bronze_docs)
+        self.load_silver(clean_data)
+        self.extract_nifs(clean_data)
+        return len(clean_data)
 
     def run(self, batch_size=5000):
         """
@@ -208,6 +301,7 @@ class ContractsSource(BaseDataSource):
         # Phase 3: NIF Extraction
         
         self.extract_nifs(clean_data)
+        self.prioritize_nifs(clean_data)
         
         self.logger.info(f"{self.source_name} finished successfully.")
 
@@ -11,6 +11,7 @@ LEVEL_NAMES = {
 class CPVStructureSource(BaseDataSource):
 
     source_name = "cpv_structure"
+    supports_partitioning = True
     
     def transform(self, data):
         """
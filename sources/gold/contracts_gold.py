@@ -1,9 +1,10 @@
 from typing import Dict, List, Any
 from elt_core.base_source import BaseDataSource
+from elt_core.dictionary_encoding import intern_records
 
 class ContractsGoldSource(BaseDataSource):
     source_name = "contracts_gold"
-
+    gold_inputs = ("contracts_silver",)
 
     def transform(self, contracts_silver: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         gold_docs = []
@@ -12,6 +13,8 @@ class ContractsGoldSource(BaseDataSource):
             'contracting_agency': 'contracting_agency_vats',
             'contestants': 'contestants_vats'
         }
+        # Low-cardinality values (types, procedure, locations) share one object each
+        intern_records(contracts_silver)
         # Remove entities from silver data 
         for doc in contracts_silver:
             new_doc = doc.copy()
@@ -43,9 +46,12 @@ class ContractsGoldSource(BaseDataSource):
 
     def run(self):
         self.logger.info("Running Contracts Gold Source...")
+        if self.incremental_gold:
+            self.run_incremental()
+            return
 
         # 1. Fetch Silver Data
-        contracts_silver = self.db_connector.get_all_documents("contracts_silver")
+        contracts_silver = self.stage_handoff.get_documents(self.db_connector, "contracts_silver")
         self.logger.info(f"Loaded {len(contracts_silver)} records from contracts_silver.")
 
         # 2. Transform
@@ -1,9 +1,11 @@
 from typing import Dict, List, Any
 from elt_core.base_source import BaseDataSource
+from elt_core.nif_queue import REVALIDATION_FIELDS
 
 
 class EntitiesGoldSource(BaseDataSource):
     source_name = "entities_gold"
+    gold_inputs = ("nifs_scrape_silver",)
 
     def transform(self, scraper_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         self.logger.info("Transforming Entities Gold Data...")
@@ -15,13 +17,17 @@ class EntitiesGoldSource(BaseDataSource):
             if not doc_id:
                 continue
 
-            gold_docs.append(doc)
+            # When and how nif.pt was last checked is not entity data; a revalidation must not rewrite gold
+            gold_docs.append({k: v for k, v in doc.items() if k not in REVALIDATION_FIELDS})
 
         self.logger.info(f"Enriched {len(gold_docs)} entities.")
         return gold_docs
 
     def run(self):
         self.logger.info("Running Entities Gold Source...")
+        if self.incremental_gold:
+            self.run_incremental()
+            return
 
         # 1. Fetch Data
         # BaseDataSource.get_data prefixes with source_name, which is incorrect here as we want specific external DBs
@@ -1,7 +1,8 @@
 from typing import Dict, List, Any
 from elt_core.base_source import BaseDataSource
-import unicodedata
+from elt_core.nif_queue import REVALIDATION_FIELDS
 import re
+from elt_core.text_normalization import strip_accents
 from ..lookups.districts_municipalities import MUNICIPALITY_LOOKUP
 
 
@@ -61,8 +62,7 @@ def remove_accents(input_str: str) -> str:
     """Remove accents from unicode text."""
     if not input_str:
         return input_str
-    nfkd_form = unicodedata.normalize('NFD', input_str)
-    return "".join(c for c in nfkd_form if not unicodedata.combining(c))
+    return strip_accents(input_str)
 
 
 def portuguese_title_case(text: str) -> str:
@@ -113,6 +113,28 @@ def extract_municipality_name(description: str) -> str:
 
 class MunicipalEntitiesGoldSource(BaseDataSource):
     source_name = "municipal_entities_gold"
+    gold_inputs = ("nifs_scrape_silver", "anuario_occ_silver")
+    tracks_gold_dependencies = True
+
+    def gold_keys(self, input_db: str, doc: Dict[str, Any]) -> List[str]:
+        """
+        Municipalities a document contributes to: the one a municipal entity
+        administrates, or those an Anuario company has shares of.
+        """
+        if input_db == "anuario_occ_silver":
+            if not (doc.get('nif') or doc.get('_id')):
+                return []
+            return list(doc.get('municipalities_participation') or ())
+        description = MUNICIPALITY_MISS_NAMED.get(doc.get('nif')) or doc.get('description') or ''
+        if not is_municipal_entity(description):
+            return []
+        name = extract_municipality_name(description)
+        return [name] if name in MUNICIPALITY_LOOKUP else []
+
+    def gold_ids(self, keys: List[str]) -> List[str]:
+        """Gold entities administrating the municipalities."""
+        found = self.db_connector.find_documents(self.source_name, {"administrates": {"$in": list(keys)}}, fields=["_id"])
+        return [doc["_id"] for doc in found]
 
     def transform(self, scraper_data: List[Dict[str, Any]], anuario_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         self.logger.info("Transforming Municipal Entities Gold Data...")
@@ -138,6 +160,7 @@ class MunicipalEntitiesGoldSource(BaseDataSource):
                 self.logger.warning(f"'{name}' not found in MUNICIPALITY_LOOKUP -- Description: {doc['description']}")
                 continue
             
+            doc = {k: v for k, v in doc.items() if k not in REVALIDATION_FIELDS}
             doc['administrates'] = name
             municipal_entities.append(doc)
 
@@ -191,6 +214,9 @@ class MunicipalEntitiesGoldSource(BaseDataSource):
 
     def run(self):
         self.logger.info("Running Entities Gold Source...")
+        if self.incremental_gold:
+            self.run_incremental()
+            return
 
         # 1. Fetch Data
         # BaseDataSource.get_data prefixes with source_name, which is incorrect here as we want specific external DBs
@@ -3,6 +3,12 @@ from elt_core.base_source import BaseDataSource
 
 class OrbisGoldSource(BaseDataSource):
     source_name = "orbis_gold"
+    gold_inputs = ("orbis_dm_silver", "orbis_sh_silver")
+    tracks_gold_dependencies = True
+
+    def gold_keys(self, input_db: str, doc: Dict[str, Any]) -> List[str]:
+        uci = doc.get('UCI')
+        return [str(uci).strip()] if uci else []
 
     def transform(self, dm_silver: List[Dict[str, Any]], sh_silver: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         # 1. Aggregation Structures
@@ -60,11 +66,11 @@ class OrbisGoldSource(BaseDataSource):
             associated = []
             
             if dm_entry:
-                for nif in dm_entry['vats']:
+                for nif in sorted(dm_entry['vats']):
                     associated.append({"nif": nif, "role": "dm"})
             
             if sh_entry:
-                for nif in sh_entry['vats']:
+                for nif in sorted(sh_entry['vats']):
                     associated.append({"nif": nif, "role": "sh"})
 
             doc = {
@@ -80,6 +86,9 @@ class OrbisGoldSource(BaseDataSource):
 
     def run(self):
         self.logger.info("Running Orbis Gold Source...")
+        if self.incremental_gold:
+            self.run_incremental()
+            return
 
         # 1. Fetch Silver Data
         dm_silver = self.db_connector.get_all_documents("orbis_dm_silver")
@@ -12,6 +12,12 @@ from elt_core.base_source import BaseDataSource
 
 class PEPGoldSource(BaseDataSource):
     source_name = "pep_gold"
+    gold_inputs = ("social_careers_silver", "societies_source_silver")
+    tracks_gold_dependencies = True
+
+    def gold_keys(self, input_db: str, doc: Dict[str, Any]) -> List[str]:
+        """A record contributes to the document of its person (Nome) when it has a NIPC."""
+        return [doc['Nome']] if doc.get('Nome') and doc.get('NIPC') else []
 
     def transform(
         self, 
@@ -122,6 +128,9 @@ class PEPGoldSource(BaseDataSource):
 
     def run(self):
         self.logger.info("Running PEP Gold Source...")
+        if self.incremental_gold:
+            self.run_incremental()
+            return
 
         # 1. Fetch Data from both silver sources
         social_careers_data = self.db_connector.get_all_documents("social_careers_silver")
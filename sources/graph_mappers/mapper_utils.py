@@ -7,9 +7,12 @@ Provides reusable functions for:
 - Building node dicts from field mappings
 - Generating relationship dicts from declarative configs
 """
+import sys
 from datetime import date
+from functools import lru_cache
 from typing import Any, Callable, Dict, List, Optional, Tuple, Type
-from slugify import slugify
+
+from elt_core.text_normalization import CACHE_SIZE, slug
 
 
 def parse_date(value: str) -> date | None:
@@ -37,14 +40,15 @@ def parse_date(value: str) -> date | None:
         return None
 
 
+@lru_cache(maxsize=CACHE_SIZE)
 def get_location_id(country: str, district: Optional[str] = None, municipality: Optional[str] = None) -> str:
-    """Generate a location ID from hierarchical location parts."""
-    parts = [slugify(country)]
+    """Generate a location ID from hierarchical location parts (memoized, interned)."""
+    parts = [slug(country)]
     if district:
-        parts.append(slugify(district))
+        parts.append(slug(district))
     if municipality:
-        parts.append(slugify(municipality))
-    return f"loc:{'/'.join(parts)}"
+        parts.append(slug(municipality))
+    return sys.intern(f"loc:{'/'.join(parts)}")
 
 
 def get_document_url(document_id: str) -> str:
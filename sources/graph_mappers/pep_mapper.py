@@ -6,7 +6,7 @@ Maps pep_gold documents to graph entities:
 - Person nodes for politically exposed persons
 - ASSOCIATED_WITH relationships to Entity nodes with role/equity/government/parliament properties
 """
-from slugify import slugify
+from elt_core.text_normalization import slug
 from model import Person
 
 from sources.graph_mappers.mapper_utils import (
@@ -45,7 +45,7 @@ def pep_mapper(raw_doc: dict) -> dict:
     associated = raw_doc.get('associated') or []
     
     # Generate slugified ID from person name
-    person_id = f"pep:{slugify(person_name)}"
+    person_id = f"pep:{slug(person_name)}"
     
     # Extract entity IDs for LinkML validation
     entity_ids = [a['nif'] for a in associated if a.get('nif')]
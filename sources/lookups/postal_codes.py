@@ -0,0 +1,379 @@
+# Portuguese postal codes (CP4) by municipality.
+# Source: CTT - Correios de Portugal, postal code database ("Codigos Postais",
+# file todos_cp.txt), summarized to CP4 blocks. Version: the CP4 allocation of
+# the 308 municipalities after the 1998 creation of Odivelas, Trofa and Vizela,
+# as listed in DISTRICT_MUNICIPALITIES_DICT. When CTT republishes the file,
+# re-check the table with benchmarks/postal_gazetteer.py.
+# Each entry is the first CP4 of a block, its district and its municipality
+# (names as in DISTRICT_MUNICIPALITIES_DICT); a block runs up to the next entry.
+# CP4s the CTT never assigned fall into the block before them, except for the
+# unassigned ranges closed by a (first CP4, None, None) entry.
+POSTAL_CP4_BLOCKS = [
+    # Lisboa
+    (1000, "Lisboa", "Lisboa"),
+    (1495, "Lisboa", "Oeiras"),  # Algés, Cruz Quebrada
+    (1500, "Lisboa", "Lisboa"),
+    (1675, "Lisboa", "Odivelas"),  # Pontinha, Caneças, Famões
+    (1700, "Lisboa", "Lisboa"),
+    (1885, "Lisboa", "Loures"),  # Moscavide
+    (1890, "Lisboa", "Lisboa"),
+    # Santarem, Lisboa, Leiria
+    (2000, "Santarem", "Santarem"),
+    (2040, "Santarem", "Rio Maior"),
+    (2050, "Lisboa", "Azambuja"),
+    (2070, "Santarem", "Cartaxo"),
+    (2080, "Santarem", "Almeirim"),
+    (2090, "Santarem", "Alpiarca"),
+    (2100, "Santarem", "Coruche"),
+    (2120, "Santarem", "Salvaterra de Magos"),
+    (2130, "Santarem", "Benavente"),
+    (2140, "Santarem", "Chamusca"),
+    (2150, "Santarem", "Golega"),
+    (2200, "Santarem", "Abrantes"),
+    (2230, "Santarem", "Sardoal"),
+    (2240, "Santarem", "Ferreira do Zezere"),
+    (2250, "Santarem", "Constancia"),
+    (2260, "Santarem", "Vila Nova da Barquinha"),
+    (2300, "Santarem", "Tomar"),
+    (2330, "Santarem", "Entroncamento"),
+    (2350, "Santarem", "Torres Novas"),
+    (2380, "Santarem", "Alcanena"),
+    (2400, "Leiria", "Leiria"),
+    (2430, "Leiria", "Marinha Grande"),
+    (2435, "Santarem", "Ourem"),  # Caxarias
+    (2440, "Leiria", "Batalha"),
+    (2445, "Leiria", "Alcobaca"),  # Pataias
+    (2450, "Leiria", "Nazare"),
+    (2460, "Leiria", "Alcobaca"),
+    (2480, "Leiria", "Porto de Mos"),
+    (2490, "Santarem", "Ourem"),
+    (2500, "Leiria", "Caldas da Rainha"),
+    (2510, "Leiria", "Obidos"),
+    (2520, "Leiria", "Peniche"),
+    (2530, "Lisboa", "Lourinha"),
+    (2540, "Leiria", "Bombarral"),
+    (2550, "Lisboa", "Cadaval"),
+    (2560, "Lisboa", "Torres Vedras"),
+    (2580, "Lisboa", "Alenquer"),
+    (2590, "Lisboa", "Sobral de Monte Agraco"),
+    (2600, "Lisboa", "Vila Franca de Xira"),
+    (2605, "Lisboa", "Sintra"),  # Belas
+    (2610, "Lisboa", "Amadora"),
+    (2615, "Lisboa", "Vila Franca de Xira"),  # Alverca do Ribatejo
+    (2620, "Lisboa", "Odivelas"),  # Ramada, Olival Basto
+    (2625, "Lisboa", "Vila Franca de Xira"),  # Póvoa de Santa Iria
+    (2630, "Lisboa", "Arruda dos Vinhos"),
+    (2635, "Lisboa", "Sintra"),  # Rio de Mouro
+    (2640, "Lisboa", "Mafra"),
+    (2645, "Lisboa", "Cascais"),  # Alcabideche
+    (2650, "Lisboa", "Amadora"),
+    (2655, "Lisboa", "Mafra"),  # Ericeira
+    (2660, "Lisboa", "Loures"),
+    (2665, "Lisboa", "Mafra"),  # Malveira, Venda do Pinheiro
+    (2670, "Lisboa", "Loures"),
+    (2675, "Lisboa", "Odivelas"),
+    (2680, "Lisboa", "Loures"),  # Camarate, Sacavém, Santa Iria de Azóia, Bobadela
+    (2700, "Lisboa", "Amadora"),
+    (2705, "Lisboa", "Sintra"),
+    (2720, "Lisboa", "Amadora"),
+    (2725, "Lisboa", "Sintra"),  # Mem Martins
+    (2730, "Lisboa", "Oeiras"),  # Barcarena
+    (2735, "Lisboa", "Sintra"),  # Cacém
+    (2740, "Lisboa", "Oeiras"),  # Porto Salvo
+    (2745, "Lisboa", "Sintra"),  # Queluz
+    (2750, "Lisboa", "Cascais"),
+    (2770, "Lisboa", "Oeiras"),  # Paço de Arcos
+    (2775, "Lisboa", "Cascais"),  # Parede, Carcavelos
+    (2780, "Lisboa", "Oeiras"),
+    (2785, "Lisboa", "Cascais"),  # São Domingos de Rana
+    (2790, "Lisboa", "Oeiras"),  # Carnaxide, Linda-a-Velha
+    # Setubal
+    (2800, "Setubal", "Almada"),
+    (2830, "Setubal", "Barreiro"),
+    (2835, "Setubal", "Moita"),  # Baixa da Banheira
+    (2840, "Setubal", "Seixal"),
+    (2860, "Setubal", "Moita"),
+    (2865, "Setubal", "Seixal"),  # Fernão Ferro
+    (2870, "Setubal", "Montijo"),
+    (2890, "Setubal", "Alcochete"),
+    (2900, "Setubal", "Setubal"),
+    (2950, "Setubal", "Palmela"),
+    (2970, "Setubal", "Sesimbra"),
+    (2985, "Setubal", "Montijo"),  # Canha
+    # Coimbra, Aveiro, Leiria, Viseu
+    (3000, "Coimbra", "Coimbra"),
+    (3050, "Aveiro", "Mealhada"),
+    (3060, "Coimbra", "Cantanhede"),
+    (3070, "Coimbra", "Mira"),
+    (3080, "Coimbra", "Figueira da Foz"),
+    (3100, "Leiria", "Pombal"),
+    (3130, "Coimbra", "Soure"),
+    (3140, "Coimbra", "Montemor-o-Velho"),
+    (3150, "Coimbra", "Condeixa-a-Nova"),
+    (3200, "Coimbra", "Lousa"),
+    (3220, "Coimbra", "Miranda do Corvo"),
+    (3230, "Coimbra", "Penela"),
+    (3240, "Leiria", "Ansiao"),
+    (3250, "Leiria", "Alvaiazere"),
+    (3260, "Leiria", "Figueiro dos Vinhos"),
+    (3270, "Leiria", "Pedrogao Grande"),
+    (3280, "Leiria", "Castanheira de Pera"),
+    (3300, "Coimbra", "Arganil"),
+    (3320, "Coimbra", "Pampilhosa da Serra"),
+    (3330, "Coimbra", "Gois"),
+    (3350, "Coimbra", "Vila Nova de Poiares"),
+    (3360, "Coimbra", "Penacova"),
+    (3400, "Coimbra", "Oliveira do Hospital"),
+    (3420, "Coimbra", "Tabua"),
+    (3430, "Viseu", "Carregal do Sal"),
+    (3440, "Viseu", "Santa Comba Dao"),
+    (3450, "Viseu", "Mortagua"),
+    (3460, "Viseu", "Tondela"),
+    (3500, "Viseu", "Viseu"),
+    (3520, "Viseu", "Nelas"),
+    (3530, "Viseu", "Mangualde"),
+    (3550, "Viseu", "Penalva do Castelo"),
+    (3560, "Viseu", "Satao"),
+    (3570, "Guarda", "Aguiar da Beira"),
+    (3600, "Viseu", "Castro Daire"),
+    (3610, "Viseu", "Tarouca"),
+    (3620, "Viseu", "Moimenta da Beira"),
+    (3630, "Viseu", "Penedono"),
+    (3640, "Viseu", "Sernancelhe"),
+    (3650, "Viseu", "Vila Nova de Paiva"),
+    (3660, "Viseu", "Sao Pedro do Sul"),
+    (3670, "Viseu", "Vouzela"),
+    (3680, "Viseu", "Oliveira de Frades"),
+    (3700, "Aveiro", "Sao Joao da Madeira"),
+    (3720, "Aveiro", "Oliveira de Azemeis"),
+    (3730, "Aveiro", "Vale de Cambra"),
+    (3740, "Aveiro", "Sever do Vouga"),
+    (3750, "Aveiro", "Agueda"),
+    (3770, "Aveiro", "Oliveira do Bairro"),
+    (3780, "Aveiro", "Anadia"),
+    (3800, "Aveiro", "Aveiro"),
+    (3830, "Aveiro", "Ilhavo"),
+    (3840, "Aveiro", "Vagos"),
+    (3850, "Aveiro", "Albergaria-a-Velha"),
+    (3860, "Aveiro", "Estarreja"),
+    (3870, "Aveiro", "Murtosa"),
+    (3880, "Aveiro", "Ovar"),
+    (3900, None, None),
+    # Porto, Aveiro, Viseu, Braga, Viana do Castelo, Vila Real
+    (4000, "Porto", "Porto"),
+    (4400, "Porto", "Vila Nova de Gaia"),
+    (4420, "Porto", "Gondomar"),
+    (4430, "Porto", "Vila Nova de Gaia"),
+    (4435, "Porto", "Gondomar"),  # Rio Tinto
+    (4440, "Porto", "Valongo"),
+    (4450, "Porto", "Matosinhos"),
+    (4470, "Porto", "Maia"),
+    (4480, "Porto", "Vila do Conde"),
+    (4490, "Porto", "Povoa de Varzim"),
+    (4500, "Aveiro", "Espinho"),
+    (4505, "Aveiro", "Santa Maria da Feira"),  # Fiães
+    (4510, "Porto", "Gondomar"),  # Fânzeres, São Pedro da Cova
+    (4520, "Aveiro", "Santa Maria da Feira"),
+    (4540, "Aveiro", "Arouca"),
+    (4550, "Aveiro", "Castelo de Paiva"),
+    (4560, "Porto", "Penafiel"),
+    (4570, "Porto", "Povoa de Varzim"),  # Rates
+    (4575, "Porto", "Penafiel"),
+    (4580, "Porto", "Paredes"),
+    (4590, "Porto", "Pacos de Ferreira"),
+    (4600, "Porto", "Amarante"),
+    (4610, "Porto", "Felgueiras"),
+    (4620, "Porto", "Lousada"),
+    (4630, "Porto", "Marco de Canaveses"),
+    (4640, "Porto", "Baiao"),
+    (4650, "Porto", "Felgueiras"),
+    (4660, "Viseu", "Resende"),
+    (4690, "Viseu", "Cinfaes"),
+    (4700, "Braga", "Braga"),
+    (4720, "Braga", "Amares"),
+    (4730, "Braga", "Vila Verde"),
+    (4740, "Braga", "Esposende"),
+    (4750, "Braga", "Barcelos"),
+    (4760, "Braga", "Vila Nova de Famalicao"),
+    (4775, "Braga", "Barcelos"),  # Viatodos
+    (4780, "Porto", "Santo Tirso"),
+    (4785, "Porto", "Trofa"),
+    (4795, "Porto", "Santo Tirso"),  # Vila das Aves
+    (4800, "Braga", "Guimaraes"),
+    (4815, "Braga", "Vizela"),
+    (4820, "Braga", "Fafe"),
+    (4830, "Braga", "Povoa de Lanhoso"),
+    (4835, "Braga", "Guimaraes"),
+    (4840, "Braga", "Terras de Bouro"),
+    (4850, "Braga", "Vieira do Minho"),
+    (4860, "Braga", "Cabeceiras de Basto"),
+    (4870, "Vila Real", "Ribeira de Pena"),
+    (4880, "Vila Real", "Mondim de Basto"),
+    (4890, "Braga", "Celorico de Basto"),
+    (4900, "Viana do Castelo", "Viana do Castelo"),
+    (4910, "Viana do Castelo", "Caminha"),
+    (4920, "Viana do Castelo", "Vila Nova de Cerveira"),
+    (4925, "Viana do Castelo", "Viana do Castelo"),
+    (4930, "Viana do Castelo", "Valenca"),
+    (4940, "Viana do Castelo", "Paredes de Coura"),
+    (4950, "Viana do Castelo", "Moncao"),
+    (4960, "Viana do Castelo", "Melgaco"),
+    (4970, "Viana do Castelo", "Arcos de Valdevez"),
+    (4980, "Viana do Castelo", "Ponte da Barca"),
+    (4990, "Viana do Castelo", "Ponte de Lima"),
+    # Vila Real, Viseu, Braganca, Guarda
+    (5000, "Vila Real", "Vila Real"),
+    (5030, "Vila Real", "Sta Marta de Penaguiao"),
+    (5040, "Vila Real", "Mesao Frio"),
+    (5050, "Vila Real", "Peso da Regua"),
+    (5060, "Vila Real", "Sabrosa"),
+    (5070, "Vila Real", "Alijo"),
+    (5090, "Vila Real", "Murca"),
+    (5100, "Viseu", "Lamego"),
+    (5110, "Viseu", "Armamar"),
+    (5120, "Viseu", "Tabuaco"),
+    (5130, "Viseu", "Sao Joao da Pesqueira"),
+    (5140, "Braganca", "Carrazeda de Ansiaes"),
+    (5150, "Guarda", "Vila Nova de Foz Coa"),
+    (5160, "Braganca", "Torre de Moncorvo"),
+    (5180, "Braganca", "Freixo Espada a Cinta"),
+    (5200, "Braganca", "Mogadouro"),
+    (5210, "Braganca", "Miranda do Douro"),
+    (5230, "Braganca", "Vimioso"),
+    (5300, "Braganca", "Braganca"),
+    (5320, "Braganca", "Vinhais"),
+    (5340, "Braganca", "Macedo de Cavaleiros"),
+    (5350, "Braganca", "Alfandega da Fe"),
+    (5360, "Braganca", "Vila Flor"),
+    (5370, "Braganca", "Mirandela"),
+    (5400, "Vila Real", "Chaves"),
+    (5430, "Vila Real", "Valpacos"),
+    (5450, "Vila Real", "Vila Pouca de Aguiar"),
+    (5460, "Vila Real", "Boticas"),
+    (5470, "Vila Real", "Montalegre"),
+    (5500, None, None),
+    # Castelo Branco, Portalegre, Santarem, Guarda
+    (6000, "Castelo Branco", "Castelo Branco"),
+    (6030, "Castelo Branco", "Vila Velha de Rodao"),
+    (6040, "Portalegre", "Gaviao"),
+    (6050, "Portalegre", "Nisa"),
+    (6060, "Castelo Branco", "Idanha-a-Nova"),
+    (6090, "Castelo Branco", "Penamacor"),
+    (6100, "Castelo Branco", "Serta"),
+    (6110, "Castelo Branco", "Vila de Rei"),
+    (6120, "Santarem", "Macao"),
+    (6150, "Castelo Branco", "Proenca-a-Nova"),
+    (6160, "Castelo Branco", "Oleiros"),
+    (6200, "Castelo Branco", "Covilha"),
+    (6230, "Castelo Branco", "Fundao"),
+    (6250, "Castelo Branco", "Belmonte"),
+    (6260, "Guarda", "Manteigas"),
+    (6270, "Guarda", "Seia"),
+    (6290, "Guarda", "Gouveia"),
+    (6300, "Guarda", "Guarda"),
+    (6320, "Guarda", "Sabugal"),
+    (6350, "Guarda", "Almeida"),
+    (6360, "Guarda", "Celorico da Beira"),
+    (6370, "Guarda", "Fornos de Algodres"),
+    (6400, "Guarda", "Pinhel"),
+    (6420, "Guarda", "Trancoso"),
+    (6430, "Guarda", "Meda"),
+    (6440, "Guarda", "Fig. Castelo Rodrigo"),
+    (6500, None, None),
+    # Evora, Portalegre, Beja, Setubal
+    (7000, "Evora", "Evora"),
+    (7040, "Evora", "Arraiolos"),
+    (7050, "Evora", "Montemor-o-Novo"),
+    (7080, "Evora", "Vendas Novas"),
+    (7090, "Evora", "Viana do Alentejo"),
+    (7100, "Evora", "Estremoz"),
+    (7150, "Evora", "Borba"),
+    (7160, "Evora", "Vila Vicosa"),
+    (7170, "Evora", "Redondo"),
+    (7200, "Evora", "Reguengos de Monsaraz"),
+    (7220, "Evora", "Portel"),
+    (7230, "Beja", "Barrancos"),
+    (7240, "Evora", "Mourao"),
+    (7250, "Evora", "Alandroal"),
+    (7300, "Portalegre", "Portalegre"),
+    (7320, "Portalegre", "Castelo de Vide"),
+    (7330, "Portalegre", "Marvao"),
+    (7340, "Portalegre", "Arronches"),
+    (7350, "Portalegre", "Elvas"),
+    (7370, "Portalegre", "Campo Maior"),
+    (7400, "Portalegre", "Ponte de Sor"),
+    (7430, "Portalegre", "Crato"),
+    (7440, "Portalegre", "Alter do Chao"),
+    (7450, "Portalegre", "Monforte"),
+    (7460, "Portalegre", "Fronteira"),
+    (7470, "Portalegre", "Sousel"),
+    (7480, "Portalegre", "Avis"),
+    (7490, "Evora", "Mora"),
+    (7500, "Setubal", "Santiago do Cacem"),  # Vila Nova de Santo André
+    (7520, "Setubal", "Sines"),
+    (7540, "Setubal", "Santiago do Cacem"),
+    (7570, "Setubal", "Grandola"),
+    (7580, "Setubal", "Alcacer do Sal"),
+    (7600, "Beja", "Aljustrel"),
+    (7630, "Beja", "Odemira"),
+    (7670, "Beja", "Ourique"),
+    (7700, "Beja", "Almodovar"),
+    (7750, "Beja", "Mertola"),
+    (7780, "Beja", "Castro Verde"),
+    (7800, "Beja", "Beja"),
+    (7830, "Beja", "Serpa"),
+    (7860, "Beja", "Moura"),
+    (7900, "Beja", "Ferreira do Alentejo"),
+    (7920, "Beja", "Alvito"),
+    (7940, "Beja", "Cuba"),
+    (7960, "Beja", "Vidigueira"),
+    # Faro
+    (8000, "Faro", "Faro"),
+    (8100, "Faro", "Loule"),
+    (8150, "Faro", "Sao Bras de Alportel"),
+    (8200, "Faro", "Albufeira"),
+    (8300, "Faro", "Silves"),
+    (8400, "Faro", "Lagoa"),
+    (8500, "Faro", "Portimao"),
+    (8550, "Faro", "Monchique"),
+    (8600, "Faro", "Lagos"),
+    (8650, "Faro", "Vila do Bispo"),
+    (8670, "Faro", "Aljezur"),
+    (8700, "Faro", "Olhao"),
+    (8800, "Faro", "Tavira"),
+    (8900, "Faro", "Vila Real Sto Antonio"),
+    (8950, "Faro", "Castro Marim"),
+    (8970, "Faro", "Alcoutim"),
+    # Madeira
+    (9000, "Regiao Autonoma da Madeira", "Funchal"),
+    (9100, "Regiao Autonoma da Madeira", "Santa Cruz"),
+    (9200, "Regiao Autonoma da Madeira", "Machico"),
+    (9230, "Regiao Autonoma da Madeira", "Santana"),
+    (9240, "Regiao Autonoma da Madeira", "Sao Vicente"),
+    (9270, "Regiao Autonoma da Madeira", "Porto Moniz"),
+    (9300, "Regiao Autonoma da Madeira", "Camara de Lobos"),
+    (9350, "Regiao Autonoma da Madeira", "Ribeira Brava"),
+    (9360, "Regiao Autonoma da Madeira", "Ponta do Sol"),
+    (9370, "Regiao Autonoma da Madeira", "Calheta"),
+    (9400, "Regiao Autonoma da Madeira", "Porto Santo"),
+    # Acores
+    (9500, "Regiao Autonoma dos Acores", "Ponta Delgada"),
+    (9560, "Regiao Autonoma dos Acores", "Lagoa"),
+    (9580, "Regiao Autonoma dos Acores", "Vila do Porto"),
+    (9600, "Regiao Autonoma dos Acores", "Ribeira Grande"),
+    (9630, "Regiao Autonoma dos Acores", "Nordeste"),
+    (9650, "Regiao Autonoma dos Acores", "Povoacao"),
+    (9680, "Regiao Autonoma dos Acores", "Vila Franca do Campo"),
+    (9700, "Regiao Autonoma dos Acores", "Angra do Heroismo"),
+    (9760, "Regiao Autonoma dos Acores", "Praia da Vitoria"),
+    (9800, "Regiao Autonoma dos Acores", "Velas"),
+    (9850, "Regiao Autonoma dos Acores", "Calheta"),
+    (9880, "Regiao Autonoma dos Acores", "Santa Cruz da Graciosa"),
+    (9900, "Regiao Autonoma dos Acores", "Horta"),
+    (9930, "Regiao Autonoma dos Acores", "Lajes do Pico"),
+    (9940, "Regiao Autonoma dos Acores", "Sao Roque do Pico"),
+    (9950, "Regiao Autonoma dos Acores", "Madalena"),
+    (9960, "Regiao Autonoma dos Acores", "Lajes das Flores"),
+    (9970, "Regiao Autonoma dos Acores", "Santa Cruz das Flores"),
+    (9980, "Regiao Autonoma dos Acores", "Corvo"),
+]
@@ -1,22 +0,0 @@
-REGEX_POSTAL_DISTRICT = {
-    r"^(10|11|12|13|14|15|16|17|18|19|26|27)": "Lisboa",
-    r"^(20|21|22|23)": "Santarem", # Santarém
-    r"^(24|25|31)": "Leiria",
-    r"^(28|29|75)": "Setubal", # Setúbal
-    r"^(30|32|33|34)": "Coimbra",
-    r"^(35|36|51)": "Viseu",
-    r"^(37|38|45)": "Aveiro",
-    r"^(40|41|42|43|44|46)": "Porto",
-    r"^(47|48)": "Braga",
-    r"^(49)": "Viana do Castelo",
-    r"^(50|54)": "Vila Real",
-    r"^(52|53)": "Braganca", # Bragança
-    r"^(60|61|62)": "Castelo Branco",
-    r"^(63|64)": "Guarda",
-    r"^(70|71|72)": "Evora", # Évora
-    r"^(73|74)": "Portalegre",
-    r"^(76|77|78|79)": "Beja",
-    r"^(80|81|82|83|84|85|86|87|88|89)": "Faro",
-    r"^(90|91|92|93|94)": "Regiao Autonoma da Madeira", # Região Autónoma da Madeira
-    r"^(95|96|97|98|99)": "Regiao Autonoma dos Acores", # Região Autónoma dos Açores
-    }
\ No newline at end of file
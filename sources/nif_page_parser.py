@@ -0,0 +1,165 @@
+"""
+Extraction of the few nif.pt page elements NifScraperSource reads.
+
+A nif.pt result page is summarized as a `NifPage`: whether it has the
+success block (`div.alert-message.success.block-message`), the error block
+(`div.alert-message.error.block-message`) and a `div.detail`, the first
+postal code in the detail text and the text of its `span.search-title`.
+
+Two extractors produce it:
+
+- `extract_fast`: scans the markup for those elements only, with compiled
+  regular expressions over the page (comments, scripts and styles removed
+  first), without building a tree. It returns None for markup it does not
+  handle (e.g. an unclosed `div.detail`).
+- `extract_bs4`: BeautifulSoup with html.parser, the reference.
+
+`extract_page` runs the fast extractor and falls back to BeautifulSoup when
+it returns None; with verify=True it runs both and returns the BeautifulSoup
+result if they differ. It is a plain function of the page text, so it can
+run in a process pool next to the fetchers.
+"""
+import html as html_lib
+import re
+from typing import NamedTuple, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+POSTAL_RE = re.compile(r"\b\d{4}-\d{0,3}")
+
+# How a page was extracted
+PARSED_FAST = "fast"
+PARSED_BS4 = "bs4"
+PARSED_FALLBACK = "fallback"
+PARSED_VERIFIED = "verified"
+PARSED_MISMATCH = "mismatch"
+
+PARSERS = ("fast", "bs4")
+
+
+class NifPage(NamedTuple):
+    success: bool
+    error: bool
+    detail: bool
+    postal_code: Optional[str]
+    # Text of span.search-title inside div.detail (None without one)
+    title: Optional[str]
+
+
+# Content html.parser does not parse as markup
+_SKIP_RE = re.compile(r"<!--.*?(?:-->|\Z)|<(script|style)\b[^>]*>.*?(?:</\1\s*>|\Z)", re.I | re.S)
+# Markup html.parser treats as a tag, a declaration or a processing instruction
+_MARKUP_RE = re.compile(r"</?[a-zA-Z][^>]*>|<![^>]*>|<\?[^>]*>")
+_CLASS_RE = re.compile(r"""\sclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.I)
+_DIV_CLASS_RE = re.compile(r"<div\b[^>]*\sclass\s*=[^>]*>", re.I)
+_DIV_TAG_RE = re.compile(r"<(/?)div\b[^>]*>", re.I)
+_SPAN_CLASS_RE = re.compile(r"<span\b[^>]*\sclass\s*=[^>]*>", re.I)
+_SPAN_TAG_RE = re.compile(r"<(/?)span\b[^>]*>", re.I)
+
+_SUCCESS_CLASSES = frozenset({"alert-message", "success", "block-message"})
+_ERROR_CLASSES = frozenset({"alert-message", "error", "block-message"})
+
+
+def _classes(start_tag: str) -> frozenset:
+    match = _CLASS_RE.search(start_tag)
+    if match is None:
+        return frozenset()
+    value = next(group for group in match.groups() if group is not None)
+    return frozenset(html_lib.unescape(value).split())
+
+
+def _text_nodes(markup: str):
+    """Stripped, unescaped non-empty text nodes of a markup fragment."""
+    for node in _MARKUP_RE.split(markup):
+        node = html_lib.unescape(node).strip()
+        if node:
+            yield node
+
+
+def _element_end(page: str, start: int, tag_re) -> Optional[int]:
+    """Index of the end tag closing the element whose content starts at start (None if unclosed)."""
+    depth = 1
+    for match in tag_re.finditer(page, start):
+        if match.group(1):
+            depth -= 1
+            if depth == 0:
+                return match.start()
+        elif not match.group(0).endswith("/>"):
+            depth += 1
+    return None
+
+
+def extract_fast(page: str) -> Optional[NifPage]:
+    """NifPage of a page by targeted scanning, or None if the markup needs a full parser."""
+    page = _SKIP_RE.sub("<!>", page)
+    success = error = False
+    detail = None
+    for match in _DIV_CLASS_RE.finditer(page):
+        classes = _classes(match.group(0))
+        if not classes:
+            continue
+        success = success or _SUCCESS_CLASSES <= classes
+        error = error or _ERROR_CLASSES <= classes
+        if detail is None and "detail" in classes:
+            detail = match
+    if detail is None:
+        return NifPage(success, error, False, None, None)
+    if detail.group(0).endswith("/>"):
+        return NifPage(success, error, True, None, None)
+
+    content_start = detail.end()
+    content_end = _element_end(page, content_start, _DIV_TAG_RE)
+    if content_end is None:
+        return None
+    content = page[content_start:content_end]
+
+    postal = POSTAL_RE.search(" ".join(_text_nodes(content)))
+    title = None
+    for match in _SPAN_CLASS_RE.finditer(content):
+        if "search-title" not in _classes(match.group(0)):
+            continue
+        if match.group(0).endswith("/>"):
+            title = ""
+            break
+        span_end = _element_end(content, match.end(), _SPAN_TAG_RE)
+        if span_end is None:
+            return None
+        title = "".join(_text_nodes(content[match.end():span_end]))
+        break
+    return NifPage(success, error, True, postal.group(0) if postal else None, title)
+
+
+def extract_bs4(page: str) -> NifPage:
+    """NifPage of a page through a BeautifulSoup tree (html.parser)."""
+    soup = BeautifulSoup(page, "html.parser")
+    success = soup.select_one("div.alert-message.success.block-message") is not None
+    error = soup.select_one("div.alert-message.error.block-message") is not None
+    detail = soup.select_one("div.detail")
+    if detail is None:
+        return NifPage(success, error, False, None, None)
+    postal = POSTAL_RE.search(detail.get_text(" ", strip=True))
+    search_title = detail.select_one("span.search-title")
+    title = search_title.get_text(strip=True) if search_title is not None else None
+    return NifPage(success, error, True, postal.group(0) if postal else None, title)
+
+
+def extract_page(page: str, parser: str = "fast", verify: bool = False) -> Tuple[NifPage, str]:
+    """
+    NifPage of a page and how it was obtained (PARSED_*).
+
+    Args:
+        page: Page text
+        parser: "fast" (BeautifulSoup only as fallback) or "bs4"
+        verify: Also run BeautifulSoup and prefer its result on a mismatch
+    """
+    if parser == "bs4":
+        return extract_bs4(page), PARSED_BS4
+    fast = extract_fast(page)
+    if fast is None:
+        return extract_bs4(page), PARSED_FALLBACK
+    if verify:
+        reference = extract_bs4(page)
+        if reference != fast:
+            return reference, PARSED_MISMATCH
+        return fast, PARSED_VERIFIED
+    return fast, PARSED_FAST
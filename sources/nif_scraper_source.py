@@ -1,19 +1,39 @@
+import asyncio
+import datetime
+import hashlib
+import multiprocessing
+import os
+import random
 import re
+import threading
+import time
+from collections import Counter
 from pathlib import Path
-from typing import Optional, TypedDict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple, TypedDict
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 import requests
-from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from elt_core.async_http import AsyncHTTPClient, Response
 from elt_core.base_source import BaseDataSource
-from sources.lookups.regex_postal_district import REGEX_POSTAL_DISTRICT
-
-POSTAL_RE = re.compile(r"\b\d{4}-\d{0,3}")
+from elt_core.html_cache import HtmlCache
+from elt_core.nif_queue import REVALIDATION_FIELDS, requeue_stale
+from elt_core.rate_budget import SharedRateBudget
+from elt_core.scrape_engine import ScrapeEngine, ScrapeStats
+from elt_core.telemetry import get_telemetry
+from elt_core.work_queue import STATUS_DONE, STATUS_FAILED, STATUS_PENDING, LeaseQueue, default_worker_id
+from sources.nif_page_parser import PARSED_MISMATCH, PARSERS, NifPage, extract_page
+from sources.nif_triage import (
+    DEFAULT_KNOWN_DBS, DEFAULT_SKIP_CLASSES, NIF_RE, TRIAGE_INVALID, TRIAGE_SCRAPE, NifTriage, classify_nif
+)
+from sources.postal_gazetteer import get_postal_gazetteer
 QUEUE_DB = "nifs_scrape_queue"
 TARGET_DB = "nifs_scrape_silver"
+BUDGET_DB = "scrape_rate_budget"
+BASE_URL = "https://www.nif.pt/"
 
 HEADERS = {
     "User-Agent": (
@@ -30,17 +50,20 @@ class ScrapeResult(TypedDict):
     valid_nif: Optional[bool]
     postal_code: Optional[str]
     district: Optional[str]
+    municipality: Optional[str]
     description: Optional[str]
+    nif_class: Optional[str]
+
 
+def _env_list(name: str, default) -> List[str]:
+    """Comma-separated values of an environment variable (empty: none)."""
+    value = os.getenv(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
 
-def get_district_from_postal(postal_code: Optional[str]) -> Optional[str]:
-    """Map a Portuguese postal code to its district using shared lookup data."""
-    if not postal_code:
-        return None
-    for pattern, district in REGEX_POSTAL_DISTRICT.items():
-        if re.match(pattern, postal_code):
-            return district
-    return None
+def _utc_now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
 
 def _is_valid_nif_format(nif: str) -> bool:
     """Return True if the supplied string looks like a 9-digit numeric NIF."""
@@ -48,15 +71,112 @@ def _is_valid_nif_format(nif: str) -> bool:
 
 
 
+class ResultCommitter:
+    """
+    Commits the outcomes of claimed queue documents, from any thread.
+
+    Outcomes are buffered and written every `size` outcomes or `interval`
+    seconds: results are upserted into the target database first, then their
+    queue documents are marked done and the ones that could not be fetched
+    are released for retry (failed once their attempts are used up), each in
+    one bulk request. A crash between the two writes only means scraping
+    again a NIF whose result is already stored.
+
+    Every result is stamped with `scraped_at` (UTC ISO) unless it carries one
+    (an earlier result reused by triage). A refreshed NIF whose page did not
+    change only renews `scraped_at` and its validators; `changed_at` moves
+    when anything else does.
+
+    With a `publish_db` (entities_gold), the results whose content changed
+    are also upserted there right after the target database, so the gold
+    layer follows the scrape instead of waiting for a full
+    EntitiesGoldSource rebuild, and a refresh that finds nothing new writes
+    nothing downstream.
+    """
+
+    def __init__(
+        self,
+        source: "NifScraperSource",
+        queue: LeaseQueue,
+        target_db: str,
+        size: int = 200,
+        interval: float = 5.0,
+        publish_db: Optional[str] = None,
+    ):
+        self.source = source
+        self.queue = queue
+        self.target_db = target_db
+        self.publish_db = publish_db
+        self.size = size
+        self.interval = interval
+        self.counts = Counter()
+        self.publish_counts = Counter()
+        self._buffer: List[Tuple[dict, Optional[ScrapeResult], Optional[str]]] = []
+        self._last_flush = time.monotonic()
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def add(self, doc: dict, data: Optional[ScrapeResult], error: Optional[str] = None) -> bool:
+        """Buffers the outcome of a claimed document (data, or None and an error). Returns True when a flush is due."""
+        with self._buffer_lock:
+            self._buffer.append((doc, data, error))
+            return len(self._buffer) >= self.size or time.monotonic() - self._last_flush >= self.interval
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._buffer_lock:
+                batch, self._buffer = self._buffer, []
+                self._last_flush = time.monotonic()
+            if not batch:
+                return
+            results = []
+            done, failed, errors = [], [], {}
+            scraped_at = _utc_now()
+            for doc, data, error in batch:
+                if data is None:
+                    failed.append(doc)
+                    errors[doc["_id"]] = error or "unknown error"
+                    continue
+                nif = doc.get('nif') or doc["_id"]
+                results.append({'scraped_at': scraped_at, **data, '_id': str(nif), 'nif': nif})
+                done.append(doc)
+            if results:
+                changed = self.source._update_results(results, self.target_db, self.counts, dry_run=False)
+                if self.publish_db and changed:
+                    # Gold only carries what nif.pt says, so a revalidation never rewrites it
+                    published = [{k: v for k, v in doc.items() if k not in REVALIDATION_FIELDS} for doc in changed]
+                    self.source._update_results(published, self.publish_db, self.publish_counts, dry_run=False)
+            lost = self.queue.complete_many(done) + self.queue.fail_many(failed, errors)
+            self.counts["done"] += len(done)
+            self.counts["released"] += len(failed)
+            if lost:
+                self.counts["lost_leases"] += len(lost)
+                self.source.logger.warning(f"Lost the lease of {len(lost)} NIFs before committing them, e.g. {lost[:5]}")
+            self.source.logger.info(
+                f"Committed {len(done)} scraped and {len(failed)} failed NIFs ({self.counts['done']} scraped in this run)."
+            )
+
+
 class NifScraperSource(BaseDataSource):
     source_name = "nif_scrape"
     """
     Scrapes NIF data from nif.pt.
 
     Dependencies:
-        - Expects a queue database (default: 'nifs_scrape_queue') containing documents with a 'nif' field.
-        - Writes results to a silver database (default: 'nifs_scrape_silver').
+        - Expects a queue database (default: 'nifs_scrape_queue') containing documents with a 'nif' field
+          and a 'status' (elt_core.work_queue): pending NIFs are claimed, scraped and marked done, or
+          released for retry when their page cannot be fetched. NIFs are claimed by descending
+          'priority' (ContractsSource.prioritize_nifs), then the ones without one.
+        - Writes results to a silver database (default: 'nifs_scrape_silver') and publishes them to
+          'entities_gold' as they are committed (NIF_SCRAPER_PUBLISH_DB).
+        - Any number of scrapers, on one host or many, can share the queue. With NIF_SCRAPER_GLOBAL_RATE,
+          they split that request rate through a budget document in 'scrape_rate_budget'.
+        - Results carry 'scraped_at'; schedule_refresh() re-queues the ones older than NIF_REFRESH_TTL_DAYS,
+          which are then fetched with conditional requests and only re-parsed when their page changed.
     """
+    # Scraped batches are progress checkpoints and must be stored before moving on
+    use_stage_handoff = False
+
     def __init__(self, db_connector):
         super().__init__(db_connector=db_connector, file_path=None)
         
@@ -73,81 +193,482 @@ class NifScraperSource(BaseDataSource):
         adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
-
-    def run(self, batch_size: int = 5000, queue_db_name: str = QUEUE_DB, target_db_name: str = TARGET_DB, max_workers: int = 10) -> None:
+        self.telemetry = get_telemetry()
+
+        # "asyncio" (default) or "threads" (blocking requests session in a thread pool)
+        self.engine = os.getenv("NIF_SCRAPER_ENGINE", "asyncio").lower()
+        if self.engine not in ("asyncio", "threads"):
+            raise ValueError(f"Unknown NIF_SCRAPER_ENGINE: {self.engine}")
+        self.base_url = os.getenv("NIF_SCRAPER_BASE_URL", BASE_URL)
+        self.max_concurrency = int(os.getenv("NIF_SCRAPER_MAX_CONCURRENCY", "32"))
+        # Raw pages of every fetch, for reparse()
+        self.html_cache = HtmlCache()
+        # ScrapeStats of the last asyncio run
+        self.scrape_stats: Optional[ScrapeStats] = None
+
+        # Page extraction: "fast" (targeted scan, BeautifulSoup fallback) or "bs4",
+        # in a process pool of NIF_PARSER_PROCESSES (0: on the fetching thread)
+        self.parser = os.getenv("NIF_PARSER", "fast").lower()
+        if self.parser not in PARSERS:
+            raise ValueError(f"Unknown NIF_PARSER: {self.parser}")
+        self.parser_processes = int(os.getenv("NIF_PARSER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+        # Share of fast-extracted pages also parsed with BeautifulSoup and compared
+        self.parser_verify_rate = float(os.getenv("NIF_PARSER_VERIFY_RATE", "0.01"))
+        self.parse_counts = Counter()
+
+        # Triage before any request (sources/nif_triage.py): check digit, NIF class, known validity
+        self.triage_enabled = os.getenv("NIF_TRIAGE", "on").lower() not in ("off", "0", "false")
+        self.triage_skip_classes = _env_list("NIF_TRIAGE_SKIP_CLASSES", DEFAULT_SKIP_CLASSES)
+        self.triage_known_dbs = _env_list("NIF_TRIAGE_KNOWN_DBS", DEFAULT_KNOWN_DBS)
+        self.triage_counts = Counter()
+        # Gold database results are also published to as they are committed ("off" disables)
+        publish_db = os.getenv("NIF_SCRAPER_PUBLISH_DB", "entities_gold").strip()
+        self.publish_db = None if publish_db.lower() in ("", "off", "0", "false") else publish_db
+
+        # Request rate shared by every scraper of the site (0: each one uses NIF_SCRAPER_RATE)
+        self.global_rate = float(os.getenv("NIF_SCRAPER_GLOBAL_RATE", "0") or 0)
+        self.budget_db = os.getenv("NIF_SCRAPER_BUDGET_DB", BUDGET_DB)
+        self.heartbeat_seconds = float(os.getenv("NIF_SCRAPER_HEARTBEAT_SECONDS", "5"))
+        # Once nothing is claimable, wait for the leases of other scrapers (taken over if they expire)
+        self.wait_for_leases = os.getenv("NIF_SCRAPER_WAIT_FOR_LEASES", "on").lower() not in ("off", "0", "false")
+        self.lease_poll_seconds = float(os.getenv("NIF_SCRAPER_LEASE_POLL_SECONDS", "10"))
+        # Throughput of the last run of this worker
+        self.worker_report: Dict[str, object] = {}
+
+        # Refresh of results older than the TTL (schedule_refresh), at most NIF_REFRESH_LIMIT per call (0: all)
+        self.refresh_ttl_days = float(os.getenv("NIF_REFRESH_TTL_DAYS", "180"))
+        self.refresh_limit = int(os.getenv("NIF_REFRESH_LIMIT", "0"))
+        self.revalidation_counts = Counter()
+        self._counts_lock = threading.Lock()
+        self._parse_pool = None
+        self._parse_lock = threading.Lock()
+
+    def run(
+        self,
+        batch_size: Optional[int] = None,
+        queue_db_name: str = QUEUE_DB,
+        target_db_name: str = TARGET_DB,
+        max_workers: int = 10,
+        worker_id: Optional[str] = None,
+    ) -> None:
         """
-        Reads NIFs from the queue, scrapes data, and saves to bronze in batches.
+        Claims pending NIFs from the queue, scrapes them and commits the results as it goes.
 
         Args:
-            batch_size (int): Number of records to process per batch.
-            queue_db_name (str): Name of the database to read NIFs from.
+            batch_size (int): Results committed per write (default: NIF_SCRAPER_COMMIT_SIZE).
+            queue_db_name (str): Name of the queue database to claim NIFs from.
             target_db_name (str): Name of the database to save scraped results to.
-            max_workers (int): Maximum number of concurrent threads.
+            max_workers (int): Concurrent threads, or the starting concurrency of the asyncio engine.
+            worker_id (str): Lease owner and rate budget entry of this scraper (default: host:pid:random).
         """
-        self.logger.info("Starting NIF Scraper Source...")
-        
-        # 1. Fetch pending NIFs from the queue
-        queue_db = queue_db_name
+        worker_id = worker_id or default_worker_id()
+        self.logger.info(f"Starting NIF Scraper Source ({self.engine} engine) as worker {worker_id}...")
+        started = time.monotonic()
+        queue = LeaseQueue(
+            self.db_connector,
+            queue_db_name,
+            worker_id=worker_id,
+            lease_seconds=float(os.getenv("NIF_SCRAPER_LEASE_SECONDS", "300")),
+            max_attempts=int(os.getenv("NIF_SCRAPER_MAX_ATTEMPTS", "3")),
+            priority_field="priority",
+        )
+        queue.ensure_indexes()
+        self._mark_scraped_done(queue, target_db_name)
+        counts = queue.status_counts()
+        self.logger.info(f"{queue_db_name}: {counts}")
+        committer = ResultCommitter(
+            self,
+            queue,
+            target_db_name,
+            size=batch_size or int(os.getenv("NIF_SCRAPER_COMMIT_SIZE", "200")),
+            interval=float(os.getenv("NIF_SCRAPER_COMMIT_INTERVAL", "5")),
+            publish_db=self.publish_db,
+        )
+        claim_size = int(os.getenv("NIF_SCRAPER_CLAIM_SIZE", "200"))
+        triage = None
+        if self.triage_enabled:
+            triage = NifTriage(
+                self.db_connector, target_db_name, known_dbs=self.triage_known_dbs, skip_classes=self.triage_skip_classes
+            )
+        rate_budget = None
+        if self.global_rate > 0 and self.engine == "asyncio":
+            rate_budget = SharedRateBudget(
+                self.db_connector, self.budget_db, urlsplit(self.base_url).hostname or self.base_url,
+                rate=self.global_rate, worker_id=worker_id, heartbeat_seconds=self.heartbeat_seconds,
+            )
         try:
-            queue_docs = self.db_connector.get_all_documents(queue_db)
-        except Exception as e:
-            self.logger.warning(f"Could not fetch docs from {queue_db}. It might not exist yet. Error: {e}")
+            if self.engine == "asyncio":
+                self.scrape_stats = asyncio.run(self._run_asyncio(
+                    queue, committer, triage, claim_size, max_workers, counts.get(STATUS_PENDING), rate_budget
+                ))
+            else:
+                self._run_threads(queue, committer, triage, claim_size, max_workers)
+        finally:
+            committer.flush()
+            self.html_cache.close()
+            self._close_parse_pool()
+        self.logger.info(f"Triage: {dict(self.triage_counts)}")
+        if self.revalidation_counts:
+            self.logger.info(f"Refreshed pages: {dict(self.revalidation_counts)}")
+        self.logger.info(f"NIF Scraper finished: {committer.counts}")
+        elapsed = time.monotonic() - started
+        self.worker_report = {
+            "worker_id": worker_id,
+            "elapsed_s": round(elapsed, 1),
+            "done": committer.counts["done"],
+            "nifs_per_s": round(committer.counts["done"] / elapsed, 1) if elapsed > 0 else 0.0,
+            "requests": self.scrape_stats.requests if self.scrape_stats is not None else None,
+        }
+        self.logger.info(
+            f"Worker {worker_id}: {self.worker_report['done']} NIFs in {elapsed:.0f}s "
+            f"({self.worker_report['nifs_per_s']} NIFs/s)"
+        )
+        if self.publish_db:
+            self.logger.info(f"Published to {self.publish_db}: {committer.publish_counts}")
+
+    def _triage_claimed(self, triage: Optional[NifTriage], docs: List[dict], committer: "ResultCommitter") -> Tuple[List[dict], bool]:
+        """
+        Commits the outcome of every claimed NIF the triage settles without a
+        request. Returns the documents left to scrape and whether a flush is due.
+        """
+        nifs = [str(doc.get('nif') or '').strip() for doc in docs]
+        if triage is not None:
+            # A refresh does not reuse the stored result it is meant to check
+            outcomes = triage.triage(
+                [nif for nif in nifs if NIF_RE.fullmatch(nif)],
+                recheck=[nif for doc, nif in zip(docs, nifs) if doc.get('refresh')],
+            )
+        else:
+            outcomes = {}
+        to_scrape = []
+        flush = False
+        for doc, nif_str in zip(docs, nifs):
+            outcome = outcomes.get(nif_str)
+            if outcome is None and not _is_valid_nif_format(nif_str):
+                self.logger.warning(f"[SKIP] NIF format invalid: {nif_str}")
+                decision = TRIAGE_INVALID
+                data = self._create_outcome(nif_str, valid_nif=False, description=doc.get('description'))
+            elif outcome is None or outcome.decision == TRIAGE_SCRAPE:
+                decision = TRIAGE_SCRAPE
+                to_scrape.append(doc)
+            else:
+                decision = outcome.decision
+                if outcome.previous is not None:
+                    data = {k: v for k, v in outcome.previous.items() if k != '_rev'}
+                    data['nif_class'] = outcome.nif_class
+                else:
+                    data = self._create_outcome(nif_str, valid_nif=outcome.valid_nif, description=doc.get('description'))
+            self.triage_counts[decision] += 1
+            if decision != TRIAGE_SCRAPE:
+                flush = committer.add(doc, data) or flush
+        return to_scrape, flush
+
+    def _lease_wait(self, queue: LeaseQueue) -> Optional[float]:
+        """
+        Seconds to wait before claiming again while other scrapers hold leases
+        (an expired one is claimed then), None when there is nothing left to wait for.
+        """
+        if not self.wait_for_leases:
+            return None
+        expiry = queue.next_expiry()
+        if expiry is None:
+            return None
+        return min(max(expiry - time.time(), 0) + 0.1, self.lease_poll_seconds)
+
+    def _mark_scraped_done(self, queue: LeaseQueue, target_db: str) -> None:
+        """
+        One-time migration of a queue written before it tracked progress: while
+        no NIF is done or failed yet, pending NIFs that already have a result in
+        the target database are marked done, so they are not scraped again.
+        NIFs re-queued by schedule_refresh (refresh: true) are left pending.
+        """
+        counts = queue.status_counts()
+        if counts.get(STATUS_DONE) or counts.get(STATUS_FAILED) or not counts.get(STATUS_PENDING):
             return
+        if self.db_connector.get_db_info(target_db) is None:
+            return
+        scraped = self.db_connector.get_all_ids(target_db)
+        marked = 0
+        for start in range(0, len(scraped), 5000):
+            docs = [
+                {**doc, "status": STATUS_DONE, "finished_by": "migration"}
+                for doc in self.db_connector.get_documents_by_ids(queue.queue_db, scraped[start:start + 5000])
+                if doc.get("status") == STATUS_PENDING and not doc.get("refresh")
+            ]
+            if docs:
+                results = self.db_connector.save_documents_bulk(queue.queue_db, docs)
+                marked += sum(1 for r in results if not r.get("error"))
+        self.logger.info(f"Marked {marked} queued NIFs with a result in {target_db} as done.")
+
+    def _run_threads(
+        self, queue: LeaseQueue, committer: "ResultCommitter", triage: Optional[NifTriage], claim_size: int, max_workers: int
+    ) -> None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                claimed = queue.claim(claim_size)
+                if not claimed:
+                    # Commit what is buffered: other scrapers may be waiting for these leases
+                    committer.flush()
+                    wait = self._lease_wait(queue)
+                    if wait is None:
+                        break
+                    time.sleep(wait)
+                    continue
+                docs, flush = self._triage_claimed(triage, claimed, committer)
+                if flush:
+                    committer.flush()
+                self.logger.info(f"Claimed {len(docs)} NIFs, scraping with {max_workers} workers.")
+                future_to_doc = {
+                    executor.submit(self._scrape_item, doc.get('nif'), doc.get('description'), doc): doc
+                    for doc in docs
+                }
+                for future in as_completed(future_to_doc):
+                    doc = future_to_doc[future]
+                    try:
+                        data, error = future.result()
+                    except Exception as exc:
+                        self.logger.error(f"NIF {doc.get('nif')} generated an exception: {exc}")
+                        data, error = None, str(exc)
+                    if committer.add(doc, data, error):
+                        committer.flush()
+
+    async def _run_asyncio(
+        self,
+        queue: LeaseQueue,
+        committer: "ResultCommitter",
+        triage: Optional[NifTriage],
+        claim_size: int,
+        initial_concurrency: int,
+        total: Optional[int] = None,
+        rate_budget: Optional[SharedRateBudget] = None,
+    ) -> ScrapeStats:
+        """
+        Scrapes through ScrapeEngine: rate-limited, AIMD concurrency, keep-alive pool per host.
+        NIFs are claimed as the workers take them; commits run in a thread while the requests go on.
+        With a rate_budget, the rate is this worker's share of it instead of NIF_SCRAPER_RATE.
+        """
+        claimed: Dict[str, dict] = {}
+
+        async def add(doc: dict, data: Optional[ScrapeResult], error: Optional[str] = None) -> None:
+            if committer.add(doc, data, error):
+                await asyncio.to_thread(committer.flush)
+
+        async def jobs():
+            while True:
+                docs = await asyncio.to_thread(queue.claim, claim_size)
+                if not docs:
+                    # Commit what is buffered: other scrapers may be waiting for these leases
+                    await asyncio.to_thread(committer.flush)
+                    wait = await asyncio.to_thread(self._lease_wait, queue)
+                    if wait is None:
+                        return
+                    await asyncio.sleep(wait)
+                    continue
+                docs, flush = await asyncio.to_thread(self._triage_claimed, triage, docs, committer)
+                if flush:
+                    await asyncio.to_thread(committer.flush)
+                for doc in docs:
+                    nif_str = str(doc.get('nif') or '').strip()
+                    in_flight = nif_str in claimed
+                    # A lease that expired while the NIF waited for a retry is re-issued to us: keep the new _rev
+                    claimed[nif_str] = doc
+                    if not in_flight:
+                        yield nif_str, self._nif_url(nif_str), self._conditional_headers(doc)
+
+        async def handle(nif_str: str, response: Optional[Response]) -> None:
+            doc = claimed.pop(nif_str)
+            description = doc.get('description')
+            if response is None or response.status not in (200, 304):
+                error = "no response" if response is None else f"HTTP {response.status}"
+                self.logger.error(f"[ERROR] Failed to scrape NIF: {nif_str}. Error: {error}")
+                await add(doc, None, error)
+                return
+            html_content = response.text
+            validators, unchanged = self._check_unchanged(doc, nif_str, response.status, html_content, response.headers)
+            if response.status == 200:
+                self._cache_page(nif_str, html_content, response.url, description)
+            if unchanged is not None:
+                await add(doc, unchanged)
+                return
+            page = await self._extract_async(nif_str, html_content)
+            await add(doc, {**self._page_outcome(nif_str, page, description), **validators})
+
+        client = AsyncHTTPClient(
+            headers=HEADERS,
+            timeout=float(os.getenv("NIF_SCRAPER_TIMEOUT", "30")),
+            max_per_host=self.max_concurrency,
+        )
+        engine = ScrapeEngine(
+            client,
+            rate=float(os.getenv("NIF_SCRAPER_RATE", "10")),
+            burst=int(os.getenv("NIF_SCRAPER_BURST", "10")),
+            initial_concurrency=initial_concurrency,
+            min_concurrency=int(os.getenv("NIF_SCRAPER_MIN_CONCURRENCY", "1")),
+            max_concurrency=self.max_concurrency,
+            max_retries=int(os.getenv("NIF_SCRAPER_MAX_RETRIES", "5")),
+            stats_interval=float(os.getenv("NIF_SCRAPER_STATS_INTERVAL", "10")),
+            logger=self.logger,
+            telemetry=self.telemetry,
+            key_name="nif",
+            rate_budget=rate_budget,
+        )
+        self.logger.info(f"Scraping {total or 0} pending NIFs from {self.base_url} with up to {self.max_concurrency} concurrent requests.")
+        try:
+            stats = await engine.run(jobs(), handle, total=total)
+            stats.connections = client.pool_stats()
+            self.logger.info(f"Connections per host: {stats.connections}")
+        finally:
+            await client.close()
+        return stats
+
+    def _nif_url(self, nif_str: str) -> str:
+        return f"{self.base_url}?q={nif_str}"
+
+    def _conditional_headers(self, doc: dict) -> Optional[Dict[str, str]]:
+        """If-None-Match / If-Modified-Since from the validators a refresh copied onto the queue document."""
+        if not doc.get('refresh'):
+            return None
+        headers = {}
+        if doc.get('etag'):
+            headers["If-None-Match"] = doc['etag']
+        if doc.get('last_modified'):
+            headers["If-Modified-Since"] = doc['last_modified']
+        return headers or None
+
+    def _check_unchanged(self, doc: dict, nif_str: str, status: int, html_content: str, headers) -> Tuple[dict, Optional[dict]]:
+        """
+        Returns the validators of a fetched page and, for a refreshed NIF whose page
+        did not change (304 Not Modified, or the content hash of its stored result),
+        the partial result that only renews them (None: the page must be parsed).
+        """
+        if status == 304:
+            self._count_revalidation("not_modified")
+            return {}, {"_id": nif_str, "nif": nif_str}
+        validators = {
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "page_sha256": hashlib.sha256(html_content.encode("utf-8")).hexdigest(),
+        }
+        if not doc.get('refresh'):
+            return validators, None
+        if validators["page_sha256"] == doc.get('page_sha256'):
+            self._count_revalidation("same_content")
+            return validators, {"_id": nif_str, "nif": nif_str, **validators}
+        self._count_revalidation("parsed")
+        return validators, None
+
+    def _count_revalidation(self, outcome: str) -> None:
+        with self._counts_lock:
+            self.revalidation_counts[outcome] += 1
+
+    def schedule_refresh(
+        self,
+        ttl_days: Optional[float] = None,
+        limit: Optional[int] = None,
+        queue_db_name: str = QUEUE_DB,
+        target_db_name: str = TARGET_DB,
+    ) -> Dict[str, int]:
+        """
+        Re-queues the NIFs whose result is older than ttl_days (elt_core.nif_queue.requeue_stale),
+        NIFs of the most recent contracts first.
 
-        total_queue_docs = len(queue_docs)
-        self.logger.info(f"Found {total_queue_docs} documents in {queue_db}.")
-        
-        # 2. Fetch already scraped NIFs from bronze to avoid re-scraping
-        target_db = target_db_name
+        Args:
+            ttl_days (float): Age in days after which a result is refreshed (default: NIF_REFRESH_TTL_DAYS).
+            limit (int): Most NIFs re-queued (default: NIF_REFRESH_LIMIT, 0 for all).
+            queue_db_name (str): Name of the queue database.
+            target_db_name (str): Name of the database of the scrape results.
+        """
+        ttl_days = self.refresh_ttl_days if ttl_days is None else ttl_days
+        if limit is None:
+            limit = self.refresh_limit or None
+        cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=ttl_days)
+        counts = requeue_stale(self.db_connector, target_db_name, cutoff, queue_db=queue_db_name, limit=limit)
+        self.logger.info(f"Refresh of results older than {ttl_days:g} days: {counts}")
+        return counts
+
+    def _cache_page(self, nif_str: str, html_content: str, url: str, description: Optional[str]) -> None:
+        """Keeps the fetched page (with the queued description reparse() needs)."""
         try:
-            bronze_docs = self.db_connector.get_all_documents(target_db)
-            scraped_nifs = {doc.get('nif') for doc in bronze_docs if doc.get('nif')}
-            self.logger.info(f"Found {len(scraped_nifs)} already scraped NIFs in {target_db}.")
-        except Exception as e:
-            self.logger.warning(f"Could not fetch docs from {target_db}. Assuming empty. Error: {e}")
-            scraped_nifs = set()
-
-        # 3. Filter queue to only include NIFs not yet scraped
-        docs_to_scrape = [doc for doc in queue_docs if doc.get('nif') not in scraped_nifs]
-        total_to_scrape = len(docs_to_scrape)
-        self.logger.info(f"NIFs to scrape after filtering: {total_to_scrape} (skipped {total_queue_docs - total_to_scrape})")
-        
-        scraped_results = []
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            future_to_nif = {
-                executor.submit(self.scrape, doc.get('nif'), doc.get('description')): doc.get('nif') 
-                for doc in docs_to_scrape 
-                if doc.get('nif')
-            }
-            
-            self.logger.info(f"Submitted {len(future_to_nif)} scraping tasks with {max_workers} workers.")
+            self.html_cache.put(nif_str, html_content, url=url, description=description)
+        except OSError as e:
+            self.logger.warning(f"Could not cache the page of NIF {nif_str}: {e}")
 
-            for future in as_completed(future_to_nif):
-                nif = future_to_nif[future]
+    def reparse(self, target_db_name: str = TARGET_DB, batch_size: int = 5000, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Re-runs _parse_html over the latest cached page of every NIF, without
+        any request to the site, and updates the results that changed.
+
+        Args:
+            target_db_name (str): Database of the scrape results.
+            batch_size (int): Results compared and written per request.
+            dry_run (bool): Only count the results that would change.
+
+        Returns:
+            Counts of pages parsed, missing blobs and inserted, updated and unchanged results.
+        """
+        latest = self.html_cache.latest()
+        self.logger.info(f"Re-parsing {len(latest)} cached pages from {self.html_cache.directory}...")
+        counts = {"parsed": 0, "missing": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+        pending = []
+
+        def parse_pending():
+            pages = self._extract_many([nif_str for nif_str, _, _ in pending], [html for _, html, _ in pending])
+            results = [
+                self._page_outcome(nif_str, page, description)
+                for (nif_str, _, description), page in zip(pending, pages)
+            ]
+            counts["parsed"] += len(results)
+            self._update_results(results, target_db_name, counts, dry_run)
+
+        try:
+            for nif_str, entry in latest.items():
                 try:
-                    data = future.result()
-                    if data:
-                        # Add metadata
-                        data['_id'] = str(nif) # Use NIF as ID for the bronze doc
-                        data['nif'] = nif
-                        scraped_results.append(data)
-                except Exception as exc:
-                    self.logger.error(f"NIF {nif} generated an exception: {exc}")
-                
-                # Check if batch size reached
-                if len(scraped_results) >= batch_size:
-                    self.logger.info(f"Saving batch of {len(scraped_results)} scraped records to {target_db}...")
-                    self._save_in_batches(scraped_results, target_db)
-                    scraped_results = [] # Reset batch
-
-        # Save any remaining results
-        if scraped_results:
-            self.logger.info(f"Saving final batch of {len(scraped_results)} scraped records to {target_db}...")
-            self._save_in_batches(scraped_results, target_db)
-
-        self.logger.info("NIF Scraper finished.")
+                    html_content = self.html_cache.get(entry["sha256"])
+                except OSError as e:
+                    self.logger.warning(f"Cached page of NIF {nif_str} is missing: {e}")
+                    counts["missing"] += 1
+                    continue
+                pending.append((nif_str, html_content, (entry.get("meta") or {}).get("description")))
+                if len(pending) >= batch_size:
+                    parse_pending()
+                    pending = []
+            if pending:
+                parse_pending()
+        finally:
+            self._close_parse_pool()
+        self.logger.info(f"Re-parse {'(dry run) ' if dry_run else ''}finished: {counts}")
+        return counts
+
+    def _update_results(self, results: List[dict], target_db: str, counts: Dict[str, int], dry_run: bool) -> List[dict]:
+        """
+        Writes the results that differ from the stored ones, over their current _rev.
+        A result that only differs in REVALIDATION_FIELDS counts as revalidated;
+        one whose content changed gets changed_at = its scraped_at.
+        Returns the written documents (without _rev) whose content changed.
+        """
+        stored = {doc["_id"]: doc for doc in self.db_connector.get_documents_by_ids(target_db, [r["_id"] for r in results])}
+        docs, changed = [], []
+        for result in results:
+            doc = stored.get(result["_id"])
+            if doc is not None and all(doc.get(k) == v for k, v in result.items()):
+                counts["unchanged"] += 1
+                continue
+            content_changed = doc is None or any(
+                doc.get(k) != v for k, v in result.items() if k not in REVALIDATION_FIELDS
+            )
+            if content_changed and result.get("scraped_at"):
+                result = {**result, "changed_at": result["scraped_at"]}
+            outcome = "inserted" if doc is None else "updated" if content_changed else "revalidated"
+            counts[outcome] = counts.get(outcome, 0) + 1
+            new_doc = result if doc is None else {**doc, **result}
+            docs.append(new_doc)
+            if content_changed:
+                changed.append({k: v for k, v in new_doc.items() if k != "_rev"})
+        if docs and not dry_run:
+            for r in self.db_connector.save_documents_bulk(target_db, docs):
+                if r.get("error"):
+                    self.logger.warning(f"Could not update NIF {r.get('id')} in {target_db}: {r.get('error')} {r.get('reason')}")
+        return changed
 
     def scrape(self, nif: str, description: Optional[str] = None) -> ScrapeResult:
         """
@@ -160,74 +681,151 @@ class NifScraperSource(BaseDataSource):
         Returns:
             ScrapeResult: The scraped data, or a result with None values if failed.
         """
-        nif_str = str(nif).strip()
+        data, _ = self._scrape_item(nif, description)
+        if data is None:
+            return self._create_outcome(str(nif).strip(), valid_nif=None, description=description)
+        return data
+
+    def _scrape_item(
+        self, nif: str, description: Optional[str] = None, doc: Optional[dict] = None
+    ) -> Tuple[Optional[ScrapeResult], Optional[str]]:
+        """
+        Scrapes one NIF, returning (result, None), or (None, error) if the page could not be fetched.
+        doc is its queue document (a refresh is fetched with a conditional request).
+        """
+        nif_str = str(nif or '').strip()
         
         # 1. Validate Format
         if not _is_valid_nif_format(nif_str):
             self.logger.warning(f"[SKIP] NIF format invalid: {nif_str}")
-            return self._create_outcome(nif_str, valid_nif=False, description=description)
+            return self._create_outcome(nif_str, valid_nif=False, description=description), None
 
         # 2. Fetch HTML
-        html_content = self._fetch_html(nif_str)
-        if not html_content:
-            return self._create_outcome(nif_str, valid_nif=None, description=description)
+        doc = doc or {}
+        try:
+            response = self._fetch_page(nif_str, self._conditional_headers(doc))
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"[ERROR] Failed to scrape NIF: {nif_str}. Error: {e}")
+            return None, str(e)
+        html_content = response.text
+        validators, unchanged = self._check_unchanged(doc, nif_str, response.status_code, html_content, response.headers)
+        if response.status_code == 200:
+            self._cache_page(nif_str, html_content, self._nif_url(nif_str), description)
+        if unchanged is not None:
+            return unchanged, None
 
         # 3. Parse HTML
-        return self._parse_html(nif_str, html_content, description)
+        return {**self._parse_html(nif_str, html_content, description), **validators}, None
 
-    def _fetch_html(self, nif_str: str) -> Optional[str]:
-        """Fetches the HTML content for a given NIF."""
-        url = f"https://www.nif.pt/?q={nif_str}"
+    def _fetch_page(self, nif_str: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """Fetches the page of a NIF (raises requests' RequestException on failure, not on 304)."""
+        url = self._nif_url(nif_str)
         self.logger.info(f"[START] Scraping NIF: {nif_str}")
 
-        try:
-            response = self.session.get(url)
+        with self.telemetry.span("http", "GET", urlsplit(url).hostname, nif=nif_str) as span:
+            response = self.session.get(url, headers=headers)
+            span["status_code"] = response.status_code
+            span["bytes_in"] = len(response.content)
             response.raise_for_status()
-            return response.text
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"[ERROR] Failed to scrape NIF: {nif_str}. Error: {e}")
-            return None
+        return response
 
     def _parse_html(self, nif_str: str, html_content: str, description: Optional[str] = None) -> ScrapeResult:
         """Parses the HTML content to extract NIF validity and postal code."""
-        soup = BeautifulSoup(html_content, "html.parser")
+        return self._page_outcome(nif_str, self._extract(nif_str, html_content), description)
+
+    def _page_outcome(self, nif_str: str, page: NifPage, description: Optional[str] = None) -> ScrapeResult:
+        """Interprets the elements extracted from a nif.pt page."""
         postal_code: Optional[str] = None
         valid_nif: Optional[bool] = None
 
         # It is known that if the page has a success block, the NIF is valid but the postal code is unknown
-        success_block = soup.select_one("div.alert-message.success.block-message")
-        if success_block:
+        if page.success:
             valid_nif = True
             self.logger.warning("[VALIDITY] Valid NIF detected, but could not determine postal code")
 
         # It is known that if the page has an error block, the NIF is invalid
-        error_block = soup.select_one("div.alert-message.error.block-message")
-        if error_block:
+        if page.error:
             valid_nif = False
             self.logger.warning("[VALIDITY] Invalid NIF detected")
 
         # If no blocks are found, it is unknown if the NIF is valid or not
         else:
             # Look for postal code and description in the detail div
-            detail = soup.select_one("div.detail")
-            if detail:
-                text = detail.get_text(" ", strip=True)
-                match = POSTAL_RE.search(text)
-                if match:
-                    postal_code = match.group(0)
-                
-                # Extract description from search-title span (always update if found)
-                search_title = detail.select_one("span.search-title")
-                if search_title and search_title.get_text(strip=True) != "Sem Nome":
-                    description = search_title.get_text(strip=True)
+            if page.detail:
+                postal_code = page.postal_code
+
+                # Description from the search-title span (always update if found)
+                if page.title is not None and page.title != "Sem Nome":
+                    description = page.title
 
             if postal_code:
                 valid_nif = True
 
-        district = get_district_from_postal(postal_code) if postal_code else None
+        district, municipality = get_postal_gazetteer().resolve(postal_code)
         
-        return self._create_outcome(nif_str, valid_nif, postal_code, district, description)
+        return self._create_outcome(nif_str, valid_nif, postal_code, district, description, municipality)
 
+    # ------------------------------------------------------------------
+    # Page extraction (process pool)
+    # ------------------------------------------------------------------
+
+    def _parse_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.parser_processes <= 0:
+            return None
+        with self._parse_lock:
+            if self._parse_pool is None:
+                # spawn: the scraper process runs threads and an event loop, which fork does not copy safely
+                self._parse_pool = ProcessPoolExecutor(
+                    max_workers=self.parser_processes, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._parse_pool
+
+    def _close_parse_pool(self) -> None:
+        with self._parse_lock:
+            pool, self._parse_pool = self._parse_pool, None
+        if pool is not None:
+            pool.shutdown()
+        if self.parse_counts:
+            self.logger.info(f"Extracted pages ({self.parser} parser): {dict(self.parse_counts)}")
+
+    def _verify_next(self) -> bool:
+        return self.parser == "fast" and random.random() < self.parser_verify_rate
+
+    def _record_extraction(self, nif_str: str, how: str) -> None:
+        with self._parse_lock:
+            self.parse_counts[how] += 1
+        if how == PARSED_MISMATCH:
+            self.logger.warning(f"[PARSER] Fast extraction of NIF {nif_str} differs from BeautifulSoup; using BeautifulSoup")
+
+    def _extract(self, nif_str: str, html_content: str) -> NifPage:
+        """Extracts a page in the process pool, waiting for it on the calling (fetch) thread."""
+        pool = self._parse_executor()
+        args = (html_content, self.parser, self._verify_next())
+        page, how = pool.submit(extract_page, *args).result() if pool is not None else extract_page(*args)
+        self._record_extraction(nif_str, how)
+        return page
+
+    async def _extract_async(self, nif_str: str, html_content: str) -> NifPage:
+        pool = self._parse_executor()
+        args = (html_content, self.parser, self._verify_next())
+        if pool is None:
+            page, how = extract_page(*args)
+        else:
+            page, how = await asyncio.get_running_loop().run_in_executor(pool, extract_page, *args)
+        self._record_extraction(nif_str, how)
+        return page
+
+    def _extract_many(self, nifs: List[str], pages: List[str]) -> List[NifPage]:
+        pool = self._parse_executor()
+        verify = [self._verify_next() for _ in pages]
+        parsers = [self.parser] * len(pages)
+        if pool is None:
+            extracted = list(map(extract_page, pages, parsers, verify))
+        else:
+            extracted = list(pool.map(extract_page, pages, parsers, verify, chunksize=64))
+        for nif_str, (_, how) in zip(nifs, extracted):
+            self._record_extraction(nif_str, how)
+        return [page for page, _ in extracted]
 
     def _create_outcome(
         self, 
@@ -235,7 +833,8 @@ class NifScraperSource(BaseDataSource):
         valid_nif: Optional[bool] = None, 
         postal_code: Optional[str] = None, 
         district: Optional[str] = None,
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        municipality: Optional[str] = None,
     ) -> ScrapeResult:
         """Helper to create a consistent ScrapeResult dictionary."""
         return {
@@ -244,7 +843,9 @@ class NifScraperSource(BaseDataSource):
             "valid_nif": valid_nif,
             "postal_code": postal_code,
             "district": district,
+            "municipality": municipality,
             "description": description,
+            "nif_class": classify_nif(nif) if NIF_RE.fullmatch(nif) else None,
         }
 
     def transform(self, data):
@@ -0,0 +1,145 @@
+"""
+Triage of queued NIFs before NifScraperSource requests their nif.pt page.
+
+A NIF is nine digits whose last one is a mod-11 check digit over the first
+eight (weights 9..2; a remainder of 0 or 1 gives 0, any other r gives 11 - r).
+Its leading digits tell what kind of taxpayer it was issued to (`NIF_CLASSES`).
+
+`NifTriage.triage` sorts a batch of queue documents into
+
+- TRIAGE_INVALID: not nine digits or a wrong check digit; nif.pt would only
+  answer with its error block, so the result is valid_nif=False.
+- TRIAGE_CLASS: a class in `skip_classes` (default: individuals). nif.pt
+  publishes no details for natural persons and only validates their NIF, so
+  a well-formed one is valid_nif=True without details.
+- TRIAGE_KNOWN: validity already on record: an earlier result with
+  valid_nif set in the scrape results (reused as is), or the NIF is the VAT
+  number of a company in an Orbis silver database (valid_nif=True).
+- TRIAGE_SCRAPE: everything else, the only NIFs that reach the network.
+
+Known validity is looked up per batch through Mango `$in` queries on an
+index of the VAT field, so no database is read in full.
+"""
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+NIF_RE = re.compile(r"\d{9}")
+
+TRIAGE_INVALID = "invalid"
+TRIAGE_CLASS = "class"
+TRIAGE_KNOWN = "known"
+TRIAGE_SCRAPE = "scrape"
+
+# Longest prefix first: "45" before "4"
+NIF_CLASSES = {
+    "1": "individual",
+    "2": "individual",
+    "3": "individual",
+    "45": "individual_non_resident",
+    "5": "company",
+    "6": "public_body",
+    "70": "estate",
+    "71": "non_resident_company",
+    "72": "investment_fund",
+    "74": "estate",
+    "75": "estate",
+    "77": "official_assignment",
+    "78": "non_resident_vat",
+    "79": "exceptional_regime",
+    "8": "sole_trader",
+    "90": "condominium_or_irregular_entity",
+    "91": "condominium_or_irregular_entity",
+    "98": "non_resident",
+    "99": "civil_partnership",
+}
+
+DEFAULT_SKIP_CLASSES = ("individual", "individual_non_resident")
+DEFAULT_KNOWN_DBS = ("orbis_dm_silver", "orbis_sh_silver", "orbis_pt_companies_uci_silver")
+
+
+def check_digit(nif: str) -> int:
+    """Mod-11 check digit of the first eight digits of a NIF."""
+    remainder = sum(int(digit) * weight for digit, weight in zip(nif[:8], range(9, 1, -1))) % 11
+    return 0 if remainder < 2 else 11 - remainder
+
+
+def is_valid_nif(nif: str) -> bool:
+    """True for nine digits with a matching check digit."""
+    return NIF_RE.fullmatch(nif) is not None and int(nif[8]) == check_digit(nif)
+
+
+def classify_nif(nif: str) -> Optional[str]:
+    """Taxpayer class of a NIF by its leading digits (None for unassigned prefixes)."""
+    return NIF_CLASSES.get(nif[:2]) or NIF_CLASSES.get(nif[:1])
+
+
+class Triage(NamedTuple):
+    decision: str
+    nif_class: Optional[str]
+    # Result to store without a request (None for TRIAGE_SCRAPE)
+    valid_nif: Optional[bool] = None
+    # Earlier scrape result reused for TRIAGE_KNOWN
+    previous: Optional[Dict[str, Any]] = None
+
+
+class NifTriage:
+    def __init__(
+        self,
+        db_connector,
+        results_db: str,
+        known_dbs: Iterable[str] = DEFAULT_KNOWN_DBS,
+        skip_classes: Iterable[str] = DEFAULT_SKIP_CLASSES,
+        vat_field: str = "VAT",
+    ):
+        """
+        Args:
+            db_connector: DBConnector instance
+            results_db: Scrape results database (earlier results are reused)
+            known_dbs: Databases whose vat_field values are valid NIFs (missing ones are ignored)
+            skip_classes: NIF classes not worth a request once the check digit matches
+            vat_field: Field holding the NIF in known_dbs
+        """
+        self.db_connector = db_connector
+        self.results_db = results_db
+        self.skip_classes = frozenset(skip_classes)
+        self.vat_field = vat_field
+        self.known_dbs = [db for db in known_dbs if db_connector.get_db_info(db) is not None]
+        for db_name in self.known_dbs:
+            db_connector.create_index(db_name, [vat_field], name="vat-idx")
+
+    def triage_one(self, nif: str) -> Triage:
+        """Triage from the NIF alone (format, check digit and class)."""
+        if not is_valid_nif(nif):
+            return Triage(TRIAGE_INVALID, classify_nif(nif) if NIF_RE.fullmatch(nif) else None, valid_nif=False)
+        nif_class = classify_nif(nif)
+        if nif_class in self.skip_classes:
+            return Triage(TRIAGE_CLASS, nif_class, valid_nif=True)
+        return Triage(TRIAGE_SCRAPE, nif_class)
+
+    def triage(self, nifs: List[str], recheck: Iterable[str] = ()) -> Dict[str, Triage]:
+        """
+        Triage of a batch of NIFs, looking up the ones the NIF alone does not
+        settle. The earlier results of the NIFs in `recheck` are not reused.
+        """
+        outcomes = {nif: self.triage_one(nif) for nif in nifs}
+        unknown = [nif for nif, t in outcomes.items() if t.decision == TRIAGE_SCRAPE]
+        if not unknown:
+            return outcomes
+        recheck = set(recheck)
+        reusable = [nif for nif in unknown if nif not in recheck]
+        for doc in self.db_connector.get_documents_by_ids(self.results_db, reusable) if reusable else ():
+            nif = doc["_id"]
+            if doc.get("valid_nif") is not None and nif in outcomes:
+                outcomes[nif] = Triage(TRIAGE_KNOWN, outcomes[nif].nif_class, doc["valid_nif"], previous=doc)
+        for db_name in self.known_dbs:
+            unknown = [nif for nif in unknown if outcomes[nif].decision == TRIAGE_SCRAPE]
+            if not unknown:
+                break
+            found = self.db_connector.find_documents(
+                db_name, {self.vat_field: {"$in": unknown}}, fields=[self.vat_field]
+            )
+            for doc in found:
+                nif = str(doc.get(self.vat_field))
+                if nif in outcomes and outcomes[nif].decision == TRIAGE_SCRAPE:
+                    outcomes[nif] = Triage(TRIAGE_KNOWN, outcomes[nif].nif_class, valid_nif=True)
+        return outcomes
@@ -82,7 +82,12 @@ class OrbisPTCompaniesUCISource(BaseDataSource):
             self.load_bronze(raw_batch, batch_size=batch_size)
 
         # Transform and Load Silver
-        bronze_data = self.get_data('bronze')
+        # VAT propagation needs every row of a company, so bronze is gathered in
+        # one frame, but fetched in governed batches that are dropped as soon as
+        # they are columnar (the full list of dicts is never held)
+        frames = [to_dataframe(batch) for batch in self.iter_data('bronze', batch_size=batch_size)]
+        bronze_data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        del frames
         self.logger.info(f"Fetched {len(bronze_data)} records. Applying transformations...")
         
         transformed_data = self.transform(bronze_data)
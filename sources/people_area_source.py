@@ -6,6 +6,7 @@ from elt_core.transformations import normalize_name
 class PeopleAreaSource(BaseDataSource):
 
     source_name = "people_area"
+    supports_partitioning = True
     
     def transform(self, data):
         """
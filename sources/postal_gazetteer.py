@@ -0,0 +1,61 @@
+"""
+District and municipality of a Portuguese postal code in one lookup.
+
+The gazetteer is compiled once per process from the bundled CP4 table
+(`sources/lookups/postal_codes.py`): every CP4 from 1000 to 9999 is expanded
+into a dict entry holding its (district, municipality) pair, so resolving a
+code is a single dict lookup on its first four characters, whatever follows
+them ("1000-001", "1000-", "1000").
+"""
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from sources.lookups.postal_codes import POSTAL_CP4_BLOCKS
+
+Place = Tuple[Optional[str], Optional[str]]
+
+NO_PLACE: Place = (None, None)
+
+
+class PostalGazetteer:
+    def __init__(self, blocks: Iterable[Tuple[int, str, str]] = POSTAL_CP4_BLOCKS):
+        """
+        Args:
+            blocks: (first CP4, district, municipality) in ascending order; a block
+                runs up to the next one, the last up to 9999 (None, None: unassigned)
+        """
+        blocks = list(blocks)
+        starts = [start for start, _, _ in blocks]
+        if starts != sorted(set(starts)):
+            raise ValueError("Postal code blocks must start at increasing CP4s")
+        self._index: Dict[str, Place] = {}
+        for i, (start, district, municipality) in enumerate(blocks):
+            if municipality is None:
+                continue
+            end = starts[i + 1] if i + 1 < len(starts) else 10000
+            place = (district, municipality)
+            for cp4 in range(start, end):
+                self._index[f"{cp4:04d}"] = place
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def resolve(self, postal_code: Optional[str]) -> Place:
+        """(district, municipality) of a CP4 or CP7 postal code, (None, None) if unknown."""
+        if not postal_code:
+            return NO_PLACE
+        return self._index.get(postal_code[:4], NO_PLACE)
+
+
+_gazetteer: Optional[PostalGazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_postal_gazetteer() -> PostalGazetteer:
+    """Return the process-wide PostalGazetteer, compiling it on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = PostalGazetteer()
+    return _gazetteer
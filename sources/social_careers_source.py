@@ -7,6 +7,7 @@ from elt_core.transformations import roman_to_int
 class SocialCareersSource(BaseDataSource):
 
     source_name = "social_careers"
+    supports_partitioning = True
     
     def transform(self, data):
         """
@@ -7,6 +7,7 @@ from elt_core.transformations import roman_to_int
 class SocietiesSource(BaseDataSource):
 
     source_name = "societies_source"
+    supports_partitioning = True
     
     def transform(self, data):
         """